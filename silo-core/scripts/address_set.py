@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+Address Set Operations
+
+Deduplication, union, intersection and difference of address files too large for Python
+sets of strings, such as holder exports with tens of millions of rows. Inputs are read with
+address_stream (JSON array, one address per line or CSV) and addresses are compared as
+20-byte binary keys, so letter case does not matter.
+
+Inputs whose size fits the memory budget are processed with a set of keys in one pass.
+Larger inputs are sorted on disk: (key, file, position) records are sorted in chunks of the
+budget into temporary run files, the runs are merged to pick the addresses of the result,
+and the inputs are read again to write them. Either way the result keeps input order (first
+file first) and the spelling of the first occurrence.
+
+Usage:
+    python3 address_set.py union users-a.json users-b.json -o users.json
+    python3 address_set.py difference market-a.json market-b.json -o only-a.txt --format lines
+    python3 address_set.py intersection a.csv b.json c.txt -o common.json --memory-mb 512
+
+    stats = SetStats()
+    for address in select_addresses(["market-a.json", "market-b.json"], 'difference', stats=stats):
+        ...
+"""
+
+import argparse
+import heapq
+import logging
+import os
+import sys
+import tempfile
+from typing import BinaryIO, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from address_stream import iter_addresses
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+OPERATIONS = ('union', 'intersection', 'difference')
+OUTPUT_FORMATS = ('json', 'lines')
+
+DEFAULT_MEMORY_BUDGET = 256 << 20
+
+KEY_SIZE = 20
+
+# Sort record: key, input file index and position of the address in that file
+FILE_INDEX_SIZE = 2
+POSITION_SIZE = 6
+RECORD_SIZE = KEY_SIZE + FILE_INDEX_SIZE + POSITION_SIZE
+
+# Memory per address of the in-memory set (bytes object and set slot), and per buffered sort record
+SET_BYTES_PER_ADDRESS = 100
+RECORD_BYTES_IN_MEMORY = 80
+
+# Smallest input bytes per address (42 characters and a newline), to estimate address counts from file sizes
+MIN_BYTES_PER_ADDRESS = 43
+
+RUN_READ_RECORDS = 8192
+
+PROGRESS_INTERVAL = 1_000_000
+
+
+class SetStats:
+    """Aggregate counters of a set operation."""
+
+    def __init__(self):
+        self.read = 0
+        self.invalid = 0
+        self.unique = 0
+        self.written = 0
+        self.runs = 0
+
+    @property
+    def duplicates(self) -> int:
+        return self.read - self.unique
+
+    def count_read(self):
+        self.read += 1
+        if self.read % PROGRESS_INTERVAL == 0:
+            logger.info(f"Read {self.read} addresses, {self.invalid} invalid")
+
+    def count_invalid(self, value: object):
+        self.invalid += 1
+
+    def summary(self) -> str:
+        return (
+            f"{self.read} addresses read, {self.invalid} invalid, {self.unique} unique, "
+            f"{self.duplicates} duplicates, {self.written} written" + (f", {self.runs} sorted runs" if self.runs else "")
+        )
+
+
+def address_key(address: str) -> bytes:
+    """20-byte key of a 0x-prefixed address, the same for any letter case."""
+    return bytes.fromhex(address[2:])
+
+
+def estimate_addresses(paths: Sequence[str]) -> int:
+    """Upper bound of the number of addresses in `paths`, from their sizes."""
+    return sum(os.path.getsize(path) for path in paths) // MIN_BYTES_PER_ADDRESS
+
+
+def in_result(operation: str, files: Iterable[int], file_count: int) -> bool:
+    """Whether a key found in the input `files` (indexes, first one first) belongs to the result."""
+    files = set(files)
+    if operation == 'union':
+        return True
+    if operation == 'intersection':
+        return len(files) == file_count
+    return files == {0}
+
+
+def select_in_memory(paths: Sequence[str], operation: str, stats: SetStats) -> Iterator[str]:
+    """Result addresses with a set of keys: the inputs after the first are loaded, the first is streamed."""
+    others = []
+    if operation != 'union':
+        for path in paths[1:]:
+            keys = set()
+            for address in iter_addresses(path, on_invalid=stats.count_invalid):
+                stats.count_read()
+                keys.add(address_key(address))
+            others.append(keys)
+
+    seen = set()
+    for path in (paths if operation == 'union' else paths[:1]):
+        for address in iter_addresses(path, on_invalid=stats.count_invalid):
+            stats.count_read()
+            key = address_key(address)
+            if key in seen:
+                continue
+
+            seen.add(key)
+            if operation == 'union' or in_result(operation, [0] + [i + 1 for i, keys in enumerate(others) if key in keys], len(paths)):
+                yield address
+
+    if operation == 'union':
+        stats.unique = len(seen)
+    else:
+        stats.unique = len(seen.union(*others))
+
+
+def write_run(records: List[bytes], temp_dir: Optional[str]) -> BinaryIO:
+    """Sort `records` into a temporary run file, rewound for reading."""
+    records.sort()
+    run = tempfile.TemporaryFile(dir=temp_dir)
+    run.write(b"".join(records))
+    run.seek(0)
+    return run
+
+
+def iter_run(run: BinaryIO) -> Iterator[bytes]:
+    """Records of a run file."""
+    while True:
+        chunk = run.read(RECORD_SIZE * RUN_READ_RECORDS)
+        if not chunk:
+            return
+        for offset in range(0, len(chunk), RECORD_SIZE):
+            yield chunk[offset:offset + RECORD_SIZE]
+
+
+def sort_runs(paths: Sequence[str], memory_budget: int, temp_dir: Optional[str], stats: SetStats) -> Tuple[List[BinaryIO], List[bytes], List[int]]:
+    """Sorted run files of all input records, the sorted records left in memory and the address count of every input."""
+    records_per_run = max(1, memory_budget // RECORD_BYTES_IN_MEMORY)
+    runs: List[BinaryIO] = []
+    buffer: List[bytes] = []
+    counts = []
+
+    for file_index, path in enumerate(paths):
+        prefix = file_index.to_bytes(FILE_INDEX_SIZE, 'big')
+        position = -1
+        for position, address in enumerate(iter_addresses(path, on_invalid=stats.count_invalid)):
+            stats.count_read()
+            buffer.append(address_key(address) + prefix + position.to_bytes(POSITION_SIZE, 'big'))
+            if len(buffer) >= records_per_run:
+                runs.append(write_run(buffer, temp_dir))
+                buffer = []
+        counts.append(position + 1)
+
+    buffer.sort()
+    stats.runs = len(runs) + (1 if buffer else 0)
+    return runs, buffer, counts
+
+
+def mark(selected: List[bytearray], record: bytes):
+    """Set the bit of the input address a sort record points to."""
+    file_index = int.from_bytes(record[KEY_SIZE:KEY_SIZE + FILE_INDEX_SIZE], 'big')
+    position = int.from_bytes(record[KEY_SIZE + FILE_INDEX_SIZE:], 'big')
+    selected[file_index][position >> 3] |= 1 << (position & 7)
+
+
+def select_external(
+    paths: Sequence[str],
+    operation: str,
+    memory_budget: int,
+    temp_dir: Optional[str],
+    stats: SetStats
+) -> Iterator[str]:
+    """Result addresses by sort-merge: runs are merged to mark the result positions, then the inputs are read again."""
+    runs, buffer, counts = sort_runs(paths, memory_budget, temp_dir, stats)
+    logger.info(f"Sorted {stats.read} addresses into {stats.runs} runs")
+
+    # one bit per input address, set for the first occurrence of every result key
+    selected = [bytearray((count + 7) // 8) for count in counts]
+    try:
+        merged = heapq.merge(buffer, *(iter_run(run) for run in runs))
+        group_key = None
+        first = b""
+        files = []
+        for record in merged:
+            key = record[:KEY_SIZE]
+            if key != group_key:
+                if group_key is not None and in_result(operation, files, len(paths)):
+                    mark(selected, first)
+                group_key, first, files = key, record, []
+                stats.unique += 1
+            file_index = int.from_bytes(record[KEY_SIZE:KEY_SIZE + FILE_INDEX_SIZE], 'big')
+            if not files or files[-1] != file_index:
+                files.append(file_index)
+
+        if group_key is not None and in_result(operation, files, len(paths)):
+            mark(selected, first)
+    finally:
+        for run in runs:
+            run.close()
+
+    del buffer
+    for file_index, path in enumerate(paths):
+        bits = selected[file_index]
+        if not any(bits):
+            continue
+        for position, address in enumerate(iter_addresses(path, on_invalid=lambda value: None)):
+            if bits[position >> 3] & (1 << (position & 7)):
+                yield address
+
+
+def select_addresses(
+    paths: Sequence[str],
+    operation: str = 'union',
+    memory_budget: int = DEFAULT_MEMORY_BUDGET,
+    temp_dir: Optional[str] = None,
+    stats: Optional[SetStats] = None,
+    external: Optional[bool] = None
+) -> Iterator[str]:
+    """Addresses of the `operation` over `paths`, each once, in input order and first spelling.
+
+    union: in any input; intersection: in every input; difference: in the first input only.
+    Uses the in-memory set when the inputs fit `memory_budget`, sort-merge on disk otherwise
+    (or as forced by `external`).
+    """
+    if operation not in OPERATIONS:
+        raise ValueError(f"unknown operation {operation}, expected one of {', '.join(OPERATIONS)}")
+    if not paths:
+        raise ValueError("no input files")
+    if len(paths) >= 1 << (8 * FILE_INDEX_SIZE):
+        raise ValueError(f"too many input files: {len(paths)}")
+
+    stats = stats if stats is not None else SetStats()
+    if external is None:
+        external = estimate_addresses(paths) * SET_BYTES_PER_ADDRESS > memory_budget
+
+    logger.info(f"{operation} of {len(paths)} inputs, {'sort-merge on disk' if external else 'in memory'}")
+    selected = select_external(paths, operation, memory_budget, temp_dir, stats) if external \
+        else select_in_memory(paths, operation, stats)
+
+    for address in selected:
+        stats.written += 1
+        yield address
+
+    logger.info(f"{operation}: {stats.summary()}")
+
+
+def write_json_array(addresses: Iterable[str], path: str) -> int:
+    """Write addresses as an indented JSON array, as json.dump(addresses, f, indent=2) would. Returns the count."""
+    count = 0
+    with open(path, 'w') as f:
+        for address in addresses:
+            f.write(("[\n" if count == 0 else ",\n") + f'  "{address}"')
+            count += 1
+        f.write("\n]" if count else "[]")
+    return count
+
+
+def write_lines(addresses: Iterable[str], path: str) -> int:
+    """Write one address per line. Returns the count."""
+    count = 0
+    with open(path, 'w') as f:
+        for address in addresses:
+            f.write(address + "\n")
+            count += 1
+    return count
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Deduplicate, unite, intersect or subtract address files")
+    parser.add_argument('operation', choices=OPERATIONS,
+                        help="union: in any input, intersection: in every input, difference: in the first input only")
+    parser.add_argument('inputs', nargs='+', help="address files: JSON array, one address per line or CSV")
+    parser.add_argument('-o', '--output', required=True, help="output file")
+    parser.add_argument('--format', choices=OUTPUT_FORMATS, default=None,
+                        help="output format (default: lines for .txt/.csv outputs, json otherwise)")
+    parser.add_argument('--memory-mb', type=int, default=DEFAULT_MEMORY_BUDGET >> 20,
+                        help=f"memory budget, larger inputs are sorted on disk (default {DEFAULT_MEMORY_BUDGET >> 20})")
+    parser.add_argument('--temp-dir', default=None, help="directory for sorted runs (default: system temp)")
+    return parser.parse_args()
+
+
+def main():
+    """Main function."""
+    args = parse_args()
+    output_format = args.format or ('lines' if os.path.splitext(args.output)[1].lower() in ('.txt', '.csv') else 'json')
+    write = write_lines if output_format == 'lines' else write_json_array
+
+    try:
+        count = write(select_addresses(args.inputs, args.operation, args.memory_mb << 20, args.temp_dir), args.output)
+    except (OSError, ValueError) as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+    logger.info(f"Saved {count} addresses to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
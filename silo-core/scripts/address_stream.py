@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Streaming Address Ingestion
+
+Reads user addresses from files far larger than memory: a JSON array, newline-delimited
+text (one address per line, bare or as a JSON string) or CSV (the `address`, `user_address`
+or `user` column, else the first one). Files are parsed incrementally and addresses are
+yielded one at a time, so the collector can start its first RPC request while the rest of
+the file is still unread.
+
+Addresses are only checked for their format (0x and 40 hex digits) and yielded as written.
+Checksumming costs a keccak hash per address, so it is left to whoever writes addresses out
+(`checksum`); comparisons should use the lowercase form.
+
+Usage:
+    from address_stream import iter_addresses
+
+    for address in iter_addresses("users-54-unique.json"):
+        ...
+
+    # format from the extension (.json, .csv, anything else sniffed), or given explicitly
+    addresses = iter_addresses("users.ndjson", input_format="lines")
+"""
+
+import csv
+import json
+import logging
+import os
+import re
+from typing import Callable, IO, Iterator, Optional
+
+from web3 import Web3
+
+logger = logging.getLogger(__name__)
+
+ADDRESS_PATTERN = re.compile(r"0x[0-9a-fA-F]{40}")
+
+INPUT_FORMATS = ('json', 'lines', 'csv')
+
+# CSV columns holding the address, first match wins
+CSV_ADDRESS_COLUMNS = ('address', 'user_address', 'user')
+
+# Characters read from a JSON array per chunk
+JSON_CHUNK_SIZE = 1 << 20
+
+# Longest array element buffered while looking for its end; a malformed file fails here
+# instead of being read into memory whole
+JSON_MAX_ELEMENT_SIZE = 1 << 16
+
+JSON_WHITESPACE = " \t\r\n"
+
+JSON_DELIMITER = re.compile(r"[,\]\s]")
+
+
+def is_address(value: object) -> bool:
+    """True for a 0x-prefixed 40 hex digit string, without checking the checksum."""
+    return isinstance(value, str) and len(value) == 42 and ADDRESS_PATTERN.fullmatch(value) is not None
+
+
+def checksum(address: str) -> str:
+    """EIP-55 form of an address, for output."""
+    return Web3.to_checksum_address(address)
+
+
+def detect_format(path: str) -> str:
+    """Input format from the extension, or from the first character for other files."""
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return 'csv'
+
+    with open(path, 'r', encoding='utf-8') as f:
+        while True:
+            char = f.read(1)
+            if not char or char not in JSON_WHITESPACE:
+                return 'json' if char == '[' else 'lines'
+
+
+def iter_json_array(f: IO[str], chunk_size: int = JSON_CHUNK_SIZE) -> Iterator[object]:
+    """Elements of a top-level JSON array, decoded one at a time from `chunk_size` character reads."""
+    decoder = json.JSONDecoder()
+    buffer = ""
+    position = 0
+    eof = False
+
+    def fill() -> bool:
+        nonlocal buffer, position, eof
+        chunk = f.read(chunk_size)
+        if not chunk:
+            eof = True
+            return False
+        buffer = buffer[position:] + chunk
+        position = 0
+        return True
+
+    def skip_whitespace():
+        nonlocal position
+        while True:
+            while position < len(buffer) and buffer[position] in JSON_WHITESPACE:
+                position += 1
+            if position < len(buffer) or not fill():
+                return
+
+    skip_whitespace()
+    if position >= len(buffer) or buffer[position] != '[':
+        raise ValueError("JSON input must be an array of addresses")
+    position += 1
+
+    expect_value = True
+    first = True
+    while True:
+        skip_whitespace()
+        if position >= len(buffer):
+            raise ValueError("JSON array is not closed")
+
+        char = buffer[position]
+        if char == ']' and (first or not expect_value):
+            return
+        if not expect_value:
+            if char != ',':
+                raise ValueError(f"expected ',' or ']' in JSON array, got {char!r}")
+            position += 1
+            expect_value = True
+            continue
+
+        while True:
+            try:
+                value, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                # value cut by the end of the chunk, unless the file is over
+                if eof or len(buffer) - position > JSON_MAX_ELEMENT_SIZE or not fill():
+                    raise
+                continue
+
+            if isinstance(value, (int, float)) and not JSON_DELIMITER.search(buffer, end) and not eof and fill():
+                # a number may continue in the next chunk, decode it again in full
+                continue
+            break
+
+        position = end
+        expect_value = False
+        first = False
+        yield value
+
+
+def iter_lines(f: IO[str]) -> Iterator[str]:
+    """Non-empty lines, JSON string quotes and trailing commas removed."""
+    for line in f:
+        value = line.strip().rstrip(',')
+        if value.startswith('"') and value.endswith('"') and len(value) >= 2:
+            value = value[1:-1]
+        if value:
+            yield value
+
+
+def iter_csv(f: IO[str]) -> Iterator[str]:
+    """Address column of a CSV, the header row skipped when there is one."""
+    reader = csv.reader(f)
+    header = next(reader, None)
+    if header is None:
+        return
+
+    column = 0
+    names = [name.strip().lower() for name in header]
+    known = [names.index(name) for name in CSV_ADDRESS_COLUMNS if name in names]
+    if known:
+        column = known[0]
+    elif header and is_address(header[0].strip()):
+        yield header[0].strip()
+
+    for row in reader:
+        if len(row) > column:
+            yield row[column].strip()
+        elif row:
+            yield ""
+
+
+def iter_addresses(
+    path: str,
+    input_format: Optional[str] = None,
+    on_invalid: Optional[Callable[[object], None]] = None
+) -> Iterator[str]:
+    """Valid addresses of `path` as written, in file order. Invalid entries go to `on_invalid`, by default a warning."""
+    input_format = input_format or detect_format(path)
+    if input_format not in INPUT_FORMATS:
+        raise ValueError(f"unknown input format {input_format}, expected one of {', '.join(INPUT_FORMATS)}")
+
+    if on_invalid is None:
+        def on_invalid(value):
+            logger.warning(f"Invalid address format: {value}")
+
+    valid = 0
+    invalid = 0
+    with open(path, 'r', encoding='utf-8', newline='' if input_format == 'csv' else None) as f:
+        if input_format == 'json':
+            values = iter_json_array(f)
+        elif input_format == 'csv':
+            values = iter_csv(f)
+        else:
+            values = iter_lines(f)
+
+        for value in values:
+            if is_address(value):
+                valid += 1
+                yield value
+            else:
+                invalid += 1
+                on_invalid(value)
+
+    logger.info(f"Read {valid} valid addresses from {path}" + (f", skipped {invalid} invalid" if invalid else ""))
@@ -0,0 +1,389 @@
+#!/usr/bin/env python3
+"""
+Mock Silo JSON-RPC Node
+
+Local JSON-RPC server answering the calls made by the Silo scripts with synthetic,
+deterministic data: Silo (asset, config, getLiquidity, maxWithdraw, maxRepay, factory,
+convertToAssets), SiloConfig (getSilos, getConfig), SiloLens (collateralBalanceOfUnderlying,
+getUserLTV, getUsersHealth, getUsersLT, getAPRs), oracle quote(), token balanceOf, decimals
+and symbol, Multicall3 aggregate3, eth_getCode (ERC-1167 proxies) and eth_getLogs.
+
+Every value is derived from a hash of the call, so repeated runs see identical state.
+Only convertToAssets depends on the block of the call, growing like accrued interest.
+Latency, transport error rate, revert rate and the share of users holding a position
+are configurable, for load tests of the collection modes.
+
+Usage:
+    python3 mock_silo_node.py --port 8545 --latency-ms 20 --error-rate 0.01
+    RPC_SONIC=http://127.0.0.1:8545 python3 silo-sonic-54-state/silo_data_collector.py
+
+    # in-process, e.g. from silo_benchmark.py
+    node = MockSiloNode(port=0, latency=0.005)
+    node.start()
+    ...
+    node.stop()
+"""
+
+import argparse
+import hashlib
+import json
+import logging
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, Optional
+
+from eth_abi import decode, encode
+from web3 import Web3
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8545
+DEFAULT_CHAIN_ID = 146
+DEFAULT_BLOCK_NUMBER = 42802010
+
+# getUsersHealth/getUsersLT fail with -32000 out of gas above this many borrowers, like a node
+# hitting its eth_call gas cap
+LENS_BATCH_LIMIT = 256
+
+# eth_getLogs ranges wider than this fail like on a public RPC
+MAX_LOG_RANGE = 10_000
+
+CONFIG_DATA_TYPE = (
+    "(uint256,uint256,address,address,address,address,address,address,address,address,"
+    "uint256,uint256,uint256,uint256,uint256,address,bool)"
+)
+
+ERC1167_PREFIX = "363d3d373d3d3d363d73"
+ERC1167_SUFFIX = "5af43d82803e903d91602b57fd5bf3"
+
+
+class Revert(Exception):
+    """Inner call reverts."""
+
+
+class ExecutionError(Exception):
+    """The node gives up executing the call (gas cap, response size), answered as -32000."""
+
+
+def selector(signature: str) -> bytes:
+    return bytes(Web3.keccak(text=signature)[:4])
+
+
+class SyntheticState:
+    """Deterministic contract state derived from `seed`."""
+
+    def __init__(self, seed: int = 0, revert_rate: float = 0.0, active_ratio: float = 1.0):
+        self.seed = seed
+        self.revert_rate = revert_rate
+        self.active_ratio = active_ratio
+        # block of the eth_call being answered, per server thread
+        self.context = threading.local()
+        self.handlers: Dict[bytes, Callable[[str, bytes], bytes]] = {
+            selector("aggregate3((address,bool,bytes)[])"): self.aggregate3,
+            selector("balanceOf(address)"): self.balance_of,
+            selector("maxWithdraw(address)"): self.user_value("maxWithdraw"),
+            selector("maxRepay(address)"): self.user_value("maxRepay"),
+            selector("collateralBalanceOfUnderlying(address,address)"): self.silo_user_value("collateral"),
+            selector("getUserLTV(address,address)"): self.silo_user_value("ltv"),
+            selector("getUsersHealth((address,address)[])"): self.users_health,
+            selector("getUsersLT((address,address)[])"): self.users_lt,
+            selector("getAPRs(address[])"): self.aprs,
+            selector("getSilos()"): self.silos,
+            selector("getConfig(address)"): self.config_data,
+            selector("config()"): self.address_value("config"),
+            selector("asset()"): self.address_value("asset"),
+            selector("factory()"): self.address_value("factory"),
+            selector("getLiquidity()"): self.contract_value("liquidity"),
+            selector("convertToAssets(uint256,uint8)"): self.convert_to_assets,
+            selector("quote(uint256,address)"): self.contract_value("quote"),
+            selector("decimals()"): lambda to, args: encode(["uint8"], [18]),
+            selector("symbol()"): lambda to, args: encode(["string"], ["MOCK" + to[2:6].upper()]),
+        }
+
+    def number(self, *parts: Any) -> int:
+        """Deterministic 64 bit number for `parts`."""
+        digest = hashlib.sha256(repr((self.seed,) + parts).encode()).digest()
+        return int.from_bytes(digest[:8], "big")
+
+    def address(self, *parts: Any) -> str:
+        digest = hashlib.sha256(repr((self.seed, "address") + parts).encode()).digest()
+        return Web3.to_checksum_address(digest[:20])
+
+    def chance(self, rate: float, *parts: Any) -> bool:
+        return rate > 0 and self.number("chance", *parts) % 1_000_000 < rate * 1_000_000
+
+    def is_active(self, user: str) -> bool:
+        """True for users holding a position, `active_ratio` of all users."""
+        return self.active_ratio >= 1 or self.chance(self.active_ratio, "active", user.lower())
+
+    def call(self, to: str, data: bytes, block: int = 0) -> bytes:
+        """Return data of a view call at `block`, Revert for unknown or reverting calls."""
+        self.context.block = block
+        handler = self.handlers.get(data[:4])
+        if handler is None:
+            raise Revert(f"unknown selector 0x{data[:4].hex()}")
+
+        return handler(to.lower(), data[4:])
+
+    def aggregate3(self, to: str, args: bytes) -> bytes:
+        (calls,) = decode(["(address,bool,bytes)[]"], args)
+        results = []
+
+        for target, allow_failure, call_data in calls:
+            try:
+                results.append((True, self.call(target, call_data, self.context.block)))
+            except Revert:
+                if not allow_failure:
+                    raise
+                results.append((False, b""))
+
+        return encode(["(bool,bytes)[]"], [results])
+
+    def balance_of(self, to: str, args: bytes) -> bytes:
+        (user,) = decode(["address"], args)
+        balance = self.number("balance", to, user.lower()) if self.is_active(user) else 0
+        return encode(["uint256"], [balance])
+
+    def user_value(self, name: str) -> Callable[[str, bytes], bytes]:
+        def handler(to: str, args: bytes) -> bytes:
+            (user,) = decode(["address"], args)
+            if self.chance(self.revert_rate, name, to, user.lower()):
+                raise Revert(name)
+            return encode(["uint256"], [self.number(name, to, user.lower()) if self.is_active(user) else 0])
+        return handler
+
+    def silo_user_value(self, name: str) -> Callable[[str, bytes], bytes]:
+        def handler(to: str, args: bytes) -> bytes:
+            silo, user = decode(["address", "address"], args)
+            return encode(["uint256"], [self.borrower_value(name, silo, user)])
+        return handler
+
+    def borrower_value(self, name: str, silo: str, user: str) -> int:
+        if self.chance(self.revert_rate, name, silo.lower(), user.lower()):
+            raise Revert(name)
+        return self.number(name, silo.lower(), user.lower()) if self.is_active(user) else 0
+
+    def users_health(self, to: str, args: bytes) -> bytes:
+        (borrowers,) = decode(["(address,address)[]"], args)
+        if len(borrowers) > LENS_BATCH_LIMIT:
+            raise ExecutionError("out of gas")
+        healths = [(self.number("lt", silo.lower()), self.borrower_value("ltv", silo, user)) for silo, user in borrowers]
+        return encode(["(uint256,uint256)[]"], [healths])
+
+    def users_lt(self, to: str, args: bytes) -> bytes:
+        (borrowers,) = decode(["(address,address)[]"], args)
+        if len(borrowers) > LENS_BATCH_LIMIT:
+            raise ExecutionError("out of gas")
+        return encode(["uint256[]"], [[self.number("lt", silo.lower()) for silo, _ in borrowers]])
+
+    def aprs(self, to: str, args: bytes) -> bytes:
+        (silos,) = decode(["address[]"], args)
+        return encode(["(uint256,uint256)[]"], [[(self.number("deposit", s.lower()), self.number("borrow", s.lower())) for s in silos]])
+
+    def silos(self, to: str, args: bytes) -> bytes:
+        return encode(["address", "address"], [self.address("silo0", to), self.address("silo1", to)])
+
+    def config_data(self, to: str, args: bytes) -> bytes:
+        (silo,) = decode(["address"], args)
+        silo = silo.lower()
+        config = (
+            10**17, 0, Web3.to_checksum_address(silo), self.address("token", silo), self.address("protected", silo),
+            self.address("collateral", silo), self.address("debt", silo), self.address("oracle", silo),
+            self.address("oracle", silo), self.address("irm", silo), 75 * 10**16, 85 * 10**16, 80 * 10**16,
+            5 * 10**16, 0, self.address("hook", silo), False
+        )
+        return encode([CONFIG_DATA_TYPE], [config])
+
+    def convert_to_assets(self, to: str, args: bytes) -> bytes:
+        """Shares carry 3 extra decimals; assets per share grow 1e-9 per block, debt twice as fast."""
+        shares, asset_type = decode(["uint256", "uint8"], args)
+        growth = self.context.block * (2 if asset_type == 2 else 1)
+        return encode(["uint256"], [shares * (10**9 + growth) // 10**12])
+
+    def address_value(self, name: str) -> Callable[[str, bytes], bytes]:
+        return lambda to, args: encode(["address"], [self.address(name, to)])
+
+    def contract_value(self, name: str) -> Callable[[str, bytes], bytes]:
+        return lambda to, args: encode(["uint256"], [self.number(name, to)])
+
+    def code(self, address: str) -> str:
+        """ERC-1167 proxy code pointing at a synthetic implementation."""
+        return "0x" + ERC1167_PREFIX + self.address("implementation")[2:].lower() + ERC1167_SUFFIX
+
+    def logs(self, query: Dict[str, Any]) -> list:
+        """One Deposit-like log per contract every 1000 blocks, for a rotating set of 500 accounts."""
+        from_block, to_block = int(query["fromBlock"], 16), int(query["toBlock"], 16)
+        contracts = query["address"] if isinstance(query["address"], list) else [query["address"]]
+        topic = query["topics"][0][0] if query.get("topics") else "0x" + "00" * 32
+        logs = []
+
+        for block in range(from_block + (-from_block % 1000), to_block + 1, 1000):
+            account = "0x" + "00" * 12 + self.address("account", self.number(block) % 500)[2:].lower()
+            for contract in contracts:
+                logs.append({"address": contract, "blockNumber": hex(block), "topics": [topic, "0x" + "00" * 32, account]})
+
+        return logs
+
+
+class MockRpcHandler(BaseHTTPRequestHandler):
+    """JSON-RPC over HTTP, single and batch requests."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        node: MockSiloNode = self.server.node
+        payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+
+        if node.latency:
+            time.sleep(node.latency)
+
+        if node.fail_request():
+            # throttled like a public RPC: plain HTTP 429 or a JSON-RPC limit error
+            if node.random.random() < 0.5:
+                self.send_error(429, "Too Many Requests")
+                return
+            body = self.error_body(payload, -32005, "rate limit exceeded")
+        elif isinstance(payload, list):
+            body = [node.answer(request) for request in payload]
+        else:
+            body = node.answer(payload)
+
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    @staticmethod
+    def error_body(payload: Any, code: int, message: str) -> Any:
+        requests = payload if isinstance(payload, list) else [payload]
+        bodies = [{"jsonrpc": "2.0", "id": r.get("id"), "error": {"code": code, "message": message}} for r in requests]
+        return bodies if isinstance(payload, list) else bodies[0]
+
+
+class MockSiloNode:
+    """Threaded mock node. `port=0` picks a free port, see `url`."""
+
+    def __init__(
+        self,
+        port: int = DEFAULT_PORT,
+        latency: float = 0.0,
+        error_rate: float = 0.0,
+        revert_rate: float = 0.0,
+        active_ratio: float = 1.0,
+        seed: int = 0,
+        chain_id: int = DEFAULT_CHAIN_ID,
+        block_number: int = DEFAULT_BLOCK_NUMBER
+    ):
+        self.state = SyntheticState(seed, revert_rate, active_ratio)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.chain_id = chain_id
+        self.block_number = block_number
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.requests = 0
+        self.failed = 0
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", port), MockRpcHandler)
+        self.server.daemon_threads = True
+        self.server.node = self
+        self.thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def fail_request(self) -> bool:
+        """Count a request, deciding whether it fails at transport level."""
+        with self.lock:
+            self.requests += 1
+            failed = self.error_rate > 0 and self.random.random() < self.error_rate
+            self.failed += failed
+        return failed
+
+    def answer(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        method, params = request.get("method"), request.get("params") or []
+        response = {"jsonrpc": "2.0", "id": request.get("id")}
+
+        if method == "eth_call":
+            try:
+                block = params[1] if len(params) > 1 and str(params[1]).startswith("0x") else hex(self.block_number)
+                data = self.state.call(
+                    params[0]["to"], bytes.fromhex(params[0].get("data", params[0].get("input", "0x"))[2:]), int(block, 16)
+                )
+                response["result"] = "0x" + data.hex()
+            except Revert:
+                response["error"] = {"code": 3, "message": "execution reverted"}
+            except ExecutionError as e:
+                response["error"] = {"code": -32000, "message": str(e)}
+        elif method == "eth_getLogs":
+            query = params[0]
+            if int(query["toBlock"], 16) - int(query["fromBlock"], 16) > MAX_LOG_RANGE:
+                response["error"] = {"code": -32005, "message": f"block range exceeds {MAX_LOG_RANGE}"}
+            else:
+                response["result"] = self.state.logs(query)
+        elif method == "eth_getCode":
+            response["result"] = self.state.code(params[0])
+        elif method == "eth_chainId":
+            response["result"] = hex(self.chain_id)
+        elif method == "eth_blockNumber":
+            response["result"] = hex(self.block_number)
+        elif method in ("net_version", "web3_clientVersion"):
+            response["result"] = str(self.chain_id) if method == "net_version" else "mock-silo-node/1.0"
+        else:
+            response["error"] = {"code": -32601, "message": f"method {method} not supported"}
+
+        return response
+
+    def start(self) -> "MockSiloNode":
+        """Serve in a background thread."""
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Mock JSON-RPC node with synthetic Silo state")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--latency-ms', type=float, default=0.0, help="delay added to every HTTP request")
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help="share of HTTP requests failing with 429 or a rate limit error")
+    parser.add_argument('--revert-rate', type=float, default=0.0, help="share of per-user calls that revert")
+    parser.add_argument('--active-ratio', type=float, default=1.0, help="share of users holding a position")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--chain-id', type=int, default=DEFAULT_CHAIN_ID)
+    parser.add_argument('--block', type=int, default=DEFAULT_BLOCK_NUMBER, help="eth_blockNumber answer")
+    return parser.parse_args()
+
+
+def main():
+    """Main function."""
+    args = parse_args()
+    node = MockSiloNode(
+        args.port, args.latency_ms / 1000, args.error_rate, args.revert_rate, args.active_ratio,
+        args.seed, args.chain_id, args.block
+    )
+    logger.info(f"Mock Silo node on {node.url}, chain {args.chain_id}, block {args.block}")
+
+    try:
+        node.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        node.server.server_close()
+        logger.info(f"Served {node.requests} requests, {node.failed} failed on purpose")
+
+
+if __name__ == "__main__":
+    main()
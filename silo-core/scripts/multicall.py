@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+Multicall3 Batching Helpers
+
+Packs many read-only contract calls into Multicall3 `aggregate3` requests so that a
+single eth_call returns the results of hundreds of view calls. Every inner call is
+sent with `allowFailure = true`, so one reverting call does not fail the whole batch
+and each failure is reported on its own. Calldata and results go through the precompiled
+encoders and decoders of silo_codec.
+
+Multicall3 is deployed at the same address on every chain we use
+(see https://www.multicall3.com/deployments).
+
+Usage:
+    from multicall import Call, multicall
+
+    calls = [Call(silo, "maxWithdraw(address)", (user,), ("uint256",)) for user in users]
+    results = multicall(w3, calls, block_identifier=BLOCK_NUMBER, batch_size=500)
+
+    # one call as a plain eth_call, same encoding and decoding
+    result = execute_call(w3, calls[0], BLOCK_NUMBER)
+
+    # with rpc_async.AsyncRpcClient
+    results = await execute_aggregate3_async(client, calls, BLOCK_NUMBER)
+"""
+
+import logging
+from typing import Any, List, NamedTuple, Sequence, Tuple
+
+from eth_abi import decode
+from web3 import Web3
+
+from rpc_metrics import METRICS
+from silo_codec import codec_for, decode_aggregate3_output, encode_aggregate3_calls
+
+logger = logging.getLogger(__name__)
+
+MULTICALL3_ADDRESS = "0xcA11bde05977b3631167028862bE2a173976CA11"
+
+# Default number of inner calls packed into a single aggregate3 request
+DEFAULT_BATCH_SIZE = 500
+
+# Error(string) selector used by `revert("...")` and `require(..., "...")`
+ERROR_STRING_SELECTOR = bytes.fromhex("08c379a0")
+
+
+class Call(NamedTuple):
+    """Single view call: target contract, function signature, arguments and output types."""
+    target: str
+    signature: str
+    args: Tuple[Any, ...] = ()
+    output_types: Tuple[str, ...] = ("uint256",)
+
+
+class CallResult(NamedTuple):
+    """Outcome of a single call inside an aggregate3 batch."""
+    success: bool
+    value: Any = None
+    error: str = ""
+
+
+def encode_call(call: Call) -> bytes:
+    """Encode calldata for a single call."""
+    return codec_for(call.signature, call.output_types).encode(call.args)
+
+
+def decode_revert_reason(data: bytes) -> str:
+    """Turn revert data into a readable reason."""
+    if not data:
+        return "reverted without reason"
+
+    if data[:4] == ERROR_STRING_SELECTOR:
+        try:
+            return decode(["string"], data[4:])[0]
+        except Exception:
+            pass
+
+    return f"reverted with data 0x{data.hex()}"
+
+
+def decode_call_result(call: Call, success: bool, return_data: bytes) -> CallResult:
+    """Decode the raw aggregate3 result of a single call."""
+    if not success:
+        return CallResult(False, error=decode_revert_reason(return_data))
+
+    if not return_data and call.output_types:
+        # call to an address without code "succeeds" with empty return data
+        return CallResult(False, error="empty return data")
+
+    try:
+        values = codec_for(call.signature, call.output_types).decode(return_data)
+    except Exception as e:
+        return CallResult(False, error=f"decode error: {e}")
+
+    return CallResult(True, values[0] if len(values) == 1 else values)
+
+
+def encode_aggregate3(calls: Sequence[Call]) -> bytes:
+    """Encode aggregate3 calldata with allowFailure set for every call."""
+    return encode_aggregate3_calls([(call.target, encode_call(call)) for call in calls])
+
+
+def execute_call(w3: Web3, call: Call, block_identifier: Any = "latest") -> CallResult:
+    """Run a single call as a plain eth_call. Reverts are returned as failures, other errors are raised.
+
+    The request goes straight to the provider: web3's request formatters and validation cost
+    more than the call itself and the calldata is built by the codec anyway.
+    """
+    block = hex(block_identifier) if isinstance(block_identifier, int) else block_identifier
+    response = w3.provider.make_request("eth_call", [{"to": call.target, "data": "0x" + encode_call(call).hex()}, block])
+
+    error = response.get("error")
+    if error:
+        if error.get("code") != 3 and "revert" not in str(error.get("message", "")).lower():
+            raise ValueError(f"eth_call to {call.target} failed: {error}")
+
+        data = error.get("data")
+        reason = decode_revert_reason(bytes.fromhex(data[2:])) if isinstance(data, str) and data.startswith("0x") else ""
+        return CallResult(False, error=reason or str(error.get("message")))
+
+    return decode_call_result(call, True, bytes.fromhex(response["result"][2:]))
+
+
+def execute_aggregate3(w3: Web3, calls: Sequence[Call], block_identifier: Any = "latest") -> List[CallResult]:
+    """Run all `calls` in one aggregate3 eth_call. Transport errors are raised to the caller."""
+    if not calls:
+        return []
+
+    data = encode_aggregate3(calls)
+    raw = w3.eth.call({"to": MULTICALL3_ADDRESS, "data": "0x" + data.hex()}, block_identifier)
+    return decode_aggregate3_result(calls, bytes(raw))
+
+
+async def execute_aggregate3_async(client: Any, calls: Sequence[Call], block_identifier: Any = "latest") -> List[CallResult]:
+    """Async variant of execute_aggregate3 for an `rpc_async.AsyncRpcClient`."""
+    if not calls:
+        return []
+
+    raw = await client.eth_call(MULTICALL3_ADDRESS, encode_aggregate3(calls), block_identifier)
+    return decode_aggregate3_result(calls, raw)
+
+
+def decode_aggregate3_result(calls: Sequence[Call], raw: bytes) -> List[CallResult]:
+    """Decode aggregate3 `(bool,bytes)[]` output into one CallResult per call."""
+    results = decode_aggregate3_output(raw)
+
+    if len(results) != len(calls):
+        raise ValueError(f"aggregate3 returned {len(results)} results for {len(calls)} calls")
+
+    decoded = [decode_call_result(call, success, return_data) for call, (success, return_data) in zip(calls, results)]
+    METRICS.observe_calls((call.signature for call in calls), (result.success for result in decoded))
+    return decoded
+
+
+def multicall(
+    w3: Web3,
+    calls: Sequence[Call],
+    block_identifier: Any = "latest",
+    batch_size: int = DEFAULT_BATCH_SIZE
+) -> List[CallResult]:
+    """Run `calls` in aggregate3 batches of at most `batch_size` calls, preserving order."""
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+
+    results: List[CallResult] = []
+
+    for start in range(0, len(calls), batch_size):
+        batch = calls[start:start + batch_size]
+        logger.debug(f"aggregate3 batch {start // batch_size + 1}: {len(batch)} calls")
+        results.extend(execute_aggregate3(w3, batch, block_identifier))
+
+    return results
@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+"""
+Async JSON-RPC Client
+
+Minimal aiohttp based JSON-RPC client for the Silo scripts. Requests go through a
+RequestScheduler which bounds the number of in-flight requests and spaces them out
+with a token bucket, so we can saturate an RPC provider up to its quota without
+getting throttled.
+
+Usage:
+    scheduler = RequestScheduler(concurrency=16, requests_per_second=25)
+
+    async with AsyncRpcClient(rpc_url, scheduler) as client:
+        raw = await client.eth_call(target, calldata, BLOCK_NUMBER)
+
+Block-pinned requests are answered from an `rpc_cache.RpcCache` when one is passed.
+
+`rpc_url` may be a comma separated list of endpoints; requests are then spread over them by
+an `rpc_pool.EndpointPool`, with retries on other endpoints and optional hedging.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import time
+from typing import Any, List, Optional, Sequence, Union
+
+import aiohttp
+
+from rpc_cache import RpcCache, cache_key, is_cacheable_response
+from rpc_metrics import METRICS
+from rpc_pool import (
+    DEFAULT_BACKOFF_SECONDS, DEFAULT_MAX_ATTEMPTS, Endpoint, EndpointPool, RpcPoolError, is_final_response
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CONCURRENCY = 8
+DEFAULT_REQUESTS_PER_SECOND = 20.0
+DEFAULT_TIMEOUT_SECONDS = 60
+
+JSON_HEADERS = {"Content-Type": "application/json"}
+
+
+class RpcError(Exception):
+    """JSON-RPC error response or unexpected HTTP status."""
+
+    def __init__(self, message: str, code: Optional[int] = None, data: Any = None):
+        super().__init__(message)
+        self.code = code
+        self.data = data
+
+
+class TokenBucket:
+    """Token bucket rate limiter: `rate` tokens per second, up to `capacity` tokens of burst."""
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        """Wait until a token is available and take it. A rate of 0 disables limiting."""
+        if self.rate <= 0:
+            return
+
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class RequestScheduler:
+    """Bounds in-flight requests and request rate. Share one instance between clients to share the quota."""
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.bucket = TokenBucket(requests_per_second)
+
+    async def __aenter__(self):
+        await self.semaphore.acquire()
+
+        try:
+            await self.bucket.acquire()
+        except BaseException:
+            self.semaphore.release()
+            raise
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.semaphore.release()
+
+
+class AsyncRpcClient:
+    """JSON-RPC client over a (possibly shared) aiohttp session."""
+
+    def __init__(
+        self,
+        rpc_url: Union[str, Sequence[str]],
+        scheduler: Optional[RequestScheduler] = None,
+        session: Optional[aiohttp.ClientSession] = None,
+        timeout: float = DEFAULT_TIMEOUT_SECONDS,
+        cache: Optional[RpcCache] = None,
+        chain_id: Optional[int] = None,
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        backoff: float = DEFAULT_BACKOFF_SECONDS,
+        hedge_after: Optional[float] = None
+    ):
+        if cache is not None and chain_id is None:
+            raise ValueError("chain_id is required when using a cache")
+
+        self.pool = EndpointPool(rpc_url, max_attempts, backoff, hedge_after)
+        self.cache = cache
+        self.chain_id = chain_id
+        self.scheduler = scheduler or RequestScheduler()
+        self.session = session
+        self.owns_session = session is None
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.ids = itertools.count(1)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+    async def close(self):
+        """Close the session if this client created it."""
+        if self.owns_session and self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def request(self, method: str, params: list) -> Any:
+        """Send a single JSON-RPC request and return its `result`."""
+        key = None
+
+        if self.cache is not None:
+            if method == "eth_chainId":
+                return hex(self.chain_id)
+
+            key = cache_key(method, params)
+            cached = self.cache.get(self.chain_id, method, key) if key is not None else None
+            if cached is not None:
+                return self.unwrap(cached)
+
+        body = await self.send(method, params)
+
+        if key is not None and is_cacheable_response(body):
+            self.cache.put(self.chain_id, method, key, body)
+
+        return self.unwrap(body)
+
+    async def send(self, method: str, params: list) -> dict:
+        """POST a JSON-RPC request and return the response body, retrying on other endpoints.
+
+        Raises RpcPoolError when no attempt got a result or a revert.
+        """
+        if self.session is None:
+            self.session = aiohttp.ClientSession()
+
+        payload = {"jsonrpc": "2.0", "id": next(self.ids), "method": method, "params": params}
+        tried: List[Endpoint] = []
+        error: Exception = None
+
+        for attempt in range(self.pool.max_attempts):
+            if attempt:
+                self.pool.retries += 1
+                METRICS.observe_retry(method)
+                await asyncio.sleep(self.pool.backoff_delay(attempt))
+
+            endpoint = self.pool.pick(exclude=tried)
+            tried.append(endpoint)
+
+            try:
+                if self.pool.hedge_after:
+                    return await self._post_hedged(endpoint, payload)
+                return await self._post(endpoint, payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                error = e
+                logger.warning(f"{method} attempt {attempt + 1}/{self.pool.max_attempts} failed: {e!r}")
+
+        raise RpcPoolError(f"{method} failed after {self.pool.max_attempts} attempts: {error!r}")
+
+    async def _post(self, endpoint: Endpoint, payload: dict) -> dict:
+        """Single attempt against one endpoint. Non-final error responses raise."""
+        method, params = payload["method"], payload["params"]
+        data = json.dumps(payload).encode()
+        raw = b""
+
+        async with self.scheduler:
+            started = time.monotonic()
+            try:
+                async with self.session.post(endpoint.url, data=data, headers=JSON_HEADERS, timeout=self.timeout) as response:
+                    raw = await response.read()
+                    if response.status != 200:
+                        raise RpcError(f"HTTP {response.status} for {method}", code=response.status)
+
+                    body = json.loads(raw)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.pool.record_failure(endpoint, e)
+                METRICS.observe_request(method, params, len(data), len(raw), time.monotonic() - started, error=True)
+                raise
+
+        latency = time.monotonic() - started
+        if not is_final_response(body):
+            self.pool.record_failure(endpoint, body.get("error"))
+            METRICS.observe_request(method, params, len(data), len(raw), latency, error=True)
+            error = body.get("error") or {}
+            raise RpcError(f"{endpoint.url}: {error.get('message', error)}", code=error.get("code"), data=error.get("data"))
+
+        self.pool.record_success(endpoint, latency)
+        METRICS.observe_request(method, params, len(data), len(raw), latency, revert="error" in body)
+        return body
+
+    async def _post_hedged(self, endpoint: Endpoint, payload: dict) -> dict:
+        """Attempt on `endpoint`, racing a second endpoint if no answer came within `hedge_after`."""
+        primary = asyncio.ensure_future(self._post(endpoint, payload))
+        done, _ = await asyncio.wait({primary}, timeout=self.pool.hedge_after)
+        if done:
+            return primary.result()
+
+        self.pool.record_hedge(endpoint)
+        backup = asyncio.ensure_future(self._post(self.pool.pick(exclude=[endpoint]), payload))
+        pending = {primary, backup}
+        error = None
+
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for future in done:
+                    if future.exception() is None:
+                        return future.result()
+                    error = future.exception()
+        finally:
+            for future in pending:
+                future.cancel()
+
+        raise error
+
+    async def check_endpoints(self) -> int:
+        """Query eth_blockNumber on every endpoint. Returns the number of healthy endpoints."""
+        if self.session is None:
+            self.session = aiohttp.ClientSession()
+
+        async def head(endpoint: Endpoint) -> Optional[int]:
+            try:
+                body = await self._post(endpoint, {"jsonrpc": "2.0", "id": next(self.ids), "method": "eth_blockNumber", "params": []})
+                return int(body["result"], 16)
+            except Exception as e:
+                logger.debug(f"Health check of {endpoint.url} failed: {e!r}")
+                return None
+
+        heads = await asyncio.gather(*(head(endpoint) for endpoint in self.pool.endpoints))
+        return self.pool.record_heads(dict(zip(self.pool.endpoints, heads)))
+
+    @staticmethod
+    def unwrap(body: dict) -> Any:
+        """`result` of a response body, RpcError for an error response."""
+        if "error" in body:
+            error = body["error"]
+            raise RpcError(error.get("message", str(error)), code=error.get("code"), data=error.get("data"))
+
+        return body["result"]
+
+    async def eth_call(self, to: str, data: bytes, block_identifier: Any = "latest") -> bytes:
+        """eth_call returning raw bytes."""
+        block = hex(block_identifier) if isinstance(block_identifier, int) else block_identifier
+        result = await self.request("eth_call", [{"to": to, "data": "0x" + data.hex()}, block])
+        return bytes.fromhex(result[2:])
@@ -0,0 +1,241 @@
+#!/usr/bin/env python3
+"""
+Block-Pinned RPC Response Cache
+
+Disk-backed (SQLite) cache for JSON-RPC calls whose answer can never change: eth_call,
+eth_getCode, eth_getStorageAt, eth_getBalance and eth_getTransactionCount pinned to an
+explicit block number. Entries are keyed
+by (chain id, block, method, target, calldata). Calls against a block tag such as
+"latest" are never cached.
+
+When the database grows past `max_bytes`, least recently used entries are evicted.
+
+Usage:
+    cache = RpcCache("rpc-cache.sqlite", max_bytes=512 * 1024 * 1024)
+    w3 = Web3(CachingHTTPProvider(rpc_url, cache, chain_id=146))
+
+    # or with rpc_async.AsyncRpcClient(rpc_url, cache=cache, chain_id=146)
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional, Sequence, Tuple, Union
+
+from web3 import Web3
+
+from rpc_pool import PooledHTTPProvider
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".cache", "silo-scripts", "rpc-cache.sqlite")
+DEFAULT_MAX_BYTES = 1024 * 1024 * 1024
+
+# After eviction the cache is shrunk to this fraction of `max_bytes`
+EVICTION_TARGET_RATIO = 0.9
+
+# Methods answered from the cache, with the index of their block parameter
+CACHEABLE_METHODS = {
+    "eth_call": 1,
+    "eth_getCode": 1,
+    "eth_getStorageAt": 2,
+    "eth_getBalance": 1,
+    "eth_getTransactionCount": 1,
+}
+
+# eth_call responses that are as deterministic as a result: the call reverted at that block
+REVERT_ERROR_CODES = (3, -32015)
+
+
+def parse_block_number(block: Any) -> Optional[int]:
+    """Block number from an int or hex string, None for tags like "latest"."""
+    if isinstance(block, int):
+        return block
+
+    if isinstance(block, str) and block.startswith("0x"):
+        return int(block, 16)
+
+    return None
+
+
+def cache_key(method: str, params: Any) -> Optional[Tuple[int, str, bytes]]:
+    """(block, target, calldata) for a cacheable request, None if the request must go to the node."""
+    block_index = CACHEABLE_METHODS.get(method)
+    if block_index is None or len(params) <= block_index:
+        return None
+
+    block = parse_block_number(params[block_index])
+    if block is None:
+        return None
+
+    if method == "eth_call":
+        tx = params[0]
+        # only plain view calls, anything with from/gas/value could change the outcome
+        if set(tx.keys()) - {"to", "data", "input"}:
+            return None
+        data = tx.get("data", tx.get("input", "0x"))
+        return block, str(tx["to"]).lower(), bytes(Web3.to_bytes(hexstr=data) if isinstance(data, str) else data)
+
+    if method == "eth_getStorageAt":
+        return block, str(params[0]).lower(), str(params[1]).encode()
+
+    return block, str(params[0]).lower(), b""
+
+
+def is_cacheable_response(response: Dict[str, Any]) -> bool:
+    """Results and reverts are final at a pinned block, transport or node errors are not."""
+    if "result" in response:
+        return True
+
+    error = response.get("error") or {}
+    return error.get("code") in REVERT_ERROR_CODES or "revert" in str(error.get("message", "")).lower()
+
+
+class RpcCache:
+    """SQLite store of JSON-RPC responses with size based LRU eviction."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.touched: Dict[int, float] = {}
+
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS rpc_cache (
+                chain_id INTEGER NOT NULL,
+                block INTEGER NOT NULL,
+                method TEXT NOT NULL,
+                target TEXT NOT NULL,
+                calldata BLOB NOT NULL,
+                response BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                accessed REAL NOT NULL,
+                PRIMARY KEY (chain_id, block, method, target, calldata)
+            )
+            """
+        )
+        self.db.execute("CREATE INDEX IF NOT EXISTS rpc_cache_accessed ON rpc_cache (accessed)")
+        self.db.commit()
+
+        self.total_bytes = self.db.execute("SELECT COALESCE(SUM(size), 0) FROM rpc_cache").fetchone()[0]
+        logger.info(f"RPC cache {path}: {self.total_bytes / 1024 / 1024:.1f} MB in use")
+
+    def get(self, chain_id: int, method: str, key: Tuple[int, str, bytes]) -> Optional[Dict[str, Any]]:
+        """Cached response (`{"result": ...}` or `{"error": ...}`) or None."""
+        block, target, calldata = key
+
+        with self.lock:
+            row = self.db.execute(
+                "SELECT rowid, response FROM rpc_cache WHERE chain_id = ? AND block = ? AND method = ? AND target = ? AND calldata = ?",
+                (chain_id, block, method, target, calldata)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            self.hits += 1
+            # access times are written together with the next insert to keep reads cheap
+            self.touched[row[0]] = time.time()
+
+        return json.loads(zlib.decompress(row[1]))
+
+    def put(self, chain_id: int, method: str, key: Tuple[int, str, bytes], response: Dict[str, Any]):
+        """Store a response, evicting old entries when the cache is over its size limit."""
+        block, target, calldata = key
+        stored = {k: response[k] for k in ("result", "error") if k in response}
+        blob = zlib.compress(json.dumps(stored, separators=(",", ":")).encode())
+        size = len(blob) + len(calldata) + len(target)
+
+        with self.lock:
+            self._flush_touched()
+            previous = self.db.execute(
+                "SELECT size FROM rpc_cache WHERE chain_id = ? AND block = ? AND method = ? AND target = ? AND calldata = ?",
+                (chain_id, block, method, target, calldata)
+            ).fetchone()
+            self.db.execute(
+                "INSERT OR REPLACE INTO rpc_cache VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (chain_id, block, method, target, calldata, blob, size, time.time())
+            )
+            self.total_bytes += size - (previous[0] if previous else 0)
+
+            if self.total_bytes > self.max_bytes:
+                self._evict()
+
+            self.db.commit()
+
+    def _flush_touched(self):
+        if self.touched:
+            self.db.executemany("UPDATE rpc_cache SET accessed = ? WHERE rowid = ?", [(t, r) for r, t in self.touched.items()])
+            self.touched.clear()
+
+    def _evict(self):
+        target_bytes = int(self.max_bytes * EVICTION_TARGET_RATIO)
+        evicted = 0
+
+        while self.total_bytes > target_bytes:
+            rows = self.db.execute("SELECT rowid, size FROM rpc_cache ORDER BY accessed LIMIT 256").fetchall()
+            if not rows:
+                break
+
+            freed = 0
+            for rowid, size in rows:
+                if self.total_bytes - freed <= target_bytes:
+                    break
+                self.db.execute("DELETE FROM rpc_cache WHERE rowid = ?", (rowid,))
+                freed += size
+                evicted += 1
+
+            self.total_bytes -= freed
+
+        logger.info(f"RPC cache: evicted {evicted} entries, {self.total_bytes / 1024 / 1024:.1f} MB in use")
+
+    def close(self):
+        """Persist pending access times and close the database."""
+        with self.lock:
+            self._flush_touched()
+            self.db.commit()
+            self.db.close()
+
+        logger.info(f"RPC cache: {self.hits} hits, {self.misses} misses")
+
+
+class CachingHTTPProvider(PooledHTTPProvider):
+    """PooledHTTPProvider answering block-pinned calls from an RpcCache. eth_chainId is answered locally."""
+
+    def __init__(self, endpoint_uri: Union[str, Sequence[str]], cache: RpcCache, chain_id: int, **kwargs):
+        super().__init__(endpoint_uri, **kwargs)
+        self.cache = cache
+        self.chain_id = chain_id
+
+    def make_request(self, method, params):
+        if method == "eth_chainId":
+            return {"jsonrpc": "2.0", "id": 0, "result": hex(self.chain_id)}
+
+        key = cache_key(method, params)
+        if key is None:
+            return super().make_request(method, params)
+
+        cached = self.cache.get(self.chain_id, method, key)
+        if cached is not None:
+            return {"jsonrpc": "2.0", "id": 0, **cached}
+
+        response = super().make_request(method, params)
+        if is_cacheable_response(response):
+            self.cache.put(self.chain_id, method, key, response)
+
+        return response
@@ -0,0 +1,356 @@
+#!/usr/bin/env python3
+"""
+RPC Instrumentation
+
+Process-wide accounting of JSON-RPC traffic, fed by the rpc_pool transports (sync
+PooledHTTPProvider and async AsyncRpcClient) and by the multicall helpers:
+
+- per JSON-RPC method: requests, errors, reverts, retries, request/response bytes and a
+  latency histogram
+- per contract function (by signature, e.g. `maxRepay(address)`): calls and failures,
+  including the calls packed into aggregate3
+
+The summary is written as JSON or Prometheus text format at exit, and optionally every
+`interval` seconds while the script runs.
+
+Per-call log lines are replaced by SampledLog, which writes the first and then every n-th
+occurrence of an event as a structured `event key=value ...` line and reports how many
+were skipped.
+
+Usage:
+    from rpc_metrics import METRICS, add_metrics_arguments, start_metrics_reporting
+
+    add_metrics_arguments(parser)
+    ...
+    start_metrics_reporting(args.metrics, args.metrics_format, args.metrics_interval)
+"""
+
+import argparse
+import atexit
+import bisect
+import json
+import logging
+import os
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+from web3 import Web3
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency histogram buckets, in seconds
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+DEFAULT_LOG_SAMPLE_EVERY = 100
+
+METRICS_FORMATS = ('json', 'prometheus')
+
+
+class Histogram:
+    """Fixed-bucket latency histogram."""
+
+    def __init__(self, buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def quantile(self, share: float) -> float:
+        """Upper bound of the bucket holding the `share` quantile (inf past the last bucket)."""
+        if not self.count:
+            return 0.0
+
+        rank = share * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= rank:
+                return self.buckets[index] if index < len(self.buckets) else float('inf')
+
+        return float('inf')
+
+    def to_dict(self) -> Dict[str, Any]:
+        cumulative = 0
+        buckets = {}
+        for bound, count in zip(list(self.buckets) + ['+Inf'], self.counts):
+            cumulative += count
+            buckets[str(bound)] = cumulative
+
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 6),
+            'p50_le': self.quantile(0.5),
+            'p99_le': self.quantile(0.99),
+            'buckets': buckets,
+        }
+
+
+class MethodStats:
+    """Counters of one JSON-RPC method."""
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.reverts = 0
+        self.retries = 0
+        self.request_bytes = 0
+        self.response_bytes = 0
+        self.latency = Histogram()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'reverts': self.reverts,
+            'retries': self.retries,
+            'request_bytes': self.request_bytes,
+            'response_bytes': self.response_bytes,
+            'latency_seconds': self.latency.to_dict(),
+        }
+
+
+class FunctionStats:
+    """Counters of one contract function."""
+
+    def __init__(self):
+        self.calls = 0
+        self.failures = 0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'calls': self.calls, 'failures': self.failures}
+
+
+class RpcMetrics:
+    """Thread-safe registry of method and function counters."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.methods: Dict[str, MethodStats] = {}
+        self.functions: Dict[str, FunctionStats] = {}
+        self.signatures: Dict[str, str] = {}
+        self.listeners: List[Callable[[str, float, bool], None]] = []
+
+    def add_listener(self, listener: Callable[[str, float, bool], None]):
+        """Also hand every request to `listener(method, latency, error)`, e.g. to keep raw latencies."""
+        with self.lock:
+            self.listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str, float, bool], None]):
+        with self.lock:
+            self.listeners.remove(listener)
+
+    def register_signature(self, signature: str):
+        """Make calls with this signature's selector show up by name."""
+        selector = Web3.keccak(text=signature)[:4].hex()
+        self.signatures[selector.removeprefix('0x')] = signature
+
+    def register_abi(self, abi: Iterable[Dict[str, Any]]):
+        """Register every function of a contract ABI."""
+        for item in abi:
+            if item.get('type') == 'function':
+                types = ','.join(canonical_type(i) for i in item.get('inputs', []))
+                self.register_signature(f"{item['name']}({types})")
+
+    def function_name(self, calldata: str) -> str:
+        """Signature for hex calldata, the bare selector when unknown."""
+        selector = calldata.removeprefix('0x')[:8].lower()
+        return self.signatures.get(selector, '0x' + selector)
+
+    def observe_request(
+        self,
+        method: str,
+        params: Any,
+        request_bytes: int,
+        response_bytes: int,
+        latency: float,
+        error: bool = False,
+        revert: bool = False
+    ):
+        """Account for one HTTP round trip of a JSON-RPC request."""
+        function = None
+        if method == 'eth_call' and params and isinstance(params[0], dict):
+            function = self.function_name(params[0].get('data') or params[0].get('input') or '')
+
+        with self.lock:
+            stats = self.methods.setdefault(method, MethodStats())
+            stats.requests += 1
+            stats.errors += error
+            stats.reverts += revert
+            stats.request_bytes += request_bytes
+            stats.response_bytes += response_bytes
+            stats.latency.observe(latency)
+
+            for listener in self.listeners:
+                listener(method, latency, error)
+
+            if function is not None:
+                calls = self.functions.setdefault(function, FunctionStats())
+                calls.calls += 1
+                calls.failures += error or revert
+
+    def observe_retry(self, method: str):
+        with self.lock:
+            self.methods.setdefault(method, MethodStats()).retries += 1
+
+    def observe_calls(self, signatures: Iterable[str], successes: Iterable[bool]):
+        """Account for calls packed into one multicall request."""
+        with self.lock:
+            for signature, success in zip(signatures, successes):
+                calls = self.functions.setdefault(signature, FunctionStats())
+                calls.calls += 1
+                calls.failures += not success
+
+    def to_dict(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'methods': {name: stats.to_dict() for name, stats in sorted(self.methods.items())},
+                'functions': {name: stats.to_dict() for name, stats in sorted(self.functions.items())},
+            }
+
+    def to_prometheus(self) -> str:
+        """Prometheus text exposition format."""
+        lines: List[str] = []
+
+        def family(name: str, kind: str, help_text: str):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        with self.lock:
+            methods = sorted(self.methods.items())
+            functions = sorted(self.functions.items())
+
+            for field, help_text in (
+                ('requests', 'JSON-RPC requests sent'),
+                ('errors', 'JSON-RPC requests failed by transport or node errors'),
+                ('reverts', 'JSON-RPC requests answered with a revert'),
+                ('retries', 'JSON-RPC requests retried'),
+                ('request_bytes', 'JSON-RPC request bytes sent'),
+                ('response_bytes', 'JSON-RPC response bytes received'),
+            ):
+                name = f"silo_rpc_{field}_total"
+                family(name, 'counter', help_text)
+                lines.extend(f'{name}{{method="{method}"}} {getattr(stats, field)}' for method, stats in methods)
+
+            family('silo_rpc_latency_seconds', 'histogram', 'JSON-RPC request latency')
+            for method, stats in methods:
+                histogram = stats.latency
+                cumulative = 0
+                for bound, count in zip(list(histogram.buckets) + ['+Inf'], histogram.counts):
+                    cumulative += count
+                    lines.append(f'silo_rpc_latency_seconds_bucket{{method="{method}",le="{bound}"}} {cumulative}')
+                lines.append(f'silo_rpc_latency_seconds_sum{{method="{method}"}} {histogram.sum:.6f}')
+                lines.append(f'silo_rpc_latency_seconds_count{{method="{method}"}} {histogram.count}')
+
+            family('silo_contract_calls_total', 'counter', 'Contract function calls, including calls inside aggregate3')
+            lines.extend(f'silo_contract_calls_total{{function="{name}"}} {stats.calls}' for name, stats in functions)
+            family('silo_contract_call_failures_total', 'counter', 'Contract function calls that reverted or failed')
+            lines.extend(f'silo_contract_call_failures_total{{function="{name}"}} {stats.failures}' for name, stats in functions)
+
+        return "\n".join(lines) + "\n"
+
+    def dump(self, path: str, fmt: str = 'json'):
+        """Write the summary to `path`, replacing it atomically."""
+        content = self.to_prometheus() if fmt == 'prometheus' else json.dumps(self.to_dict(), indent=2) + "\n"
+        temporary = path + '.tmp'
+        with open(temporary, 'w') as f:
+            f.write(content)
+        # readers polling the file never see a half written summary
+        os.replace(temporary, path)
+
+
+def canonical_type(param: Dict[str, Any]) -> str:
+    """ABI input type with tuples expanded, as used in signatures."""
+    kind = param['type']
+    if kind.startswith('tuple'):
+        return '(' + ','.join(canonical_type(c) for c in param.get('components', [])) + ')' + kind[len('tuple'):]
+    return kind
+
+
+# Shared by every pool and multicall helper in the process
+METRICS = RpcMetrics()
+
+
+def format_field(value: Any) -> str:
+    """Log field value, quoted when it contains whitespace or quotes."""
+    text = str(value)
+    return json.dumps(text) if any(c.isspace() or c in '"=' for c in text) or not text else text
+
+
+class SampledLog:
+    """Logs the first and every `every`-th occurrence of each event as `event key=value ...`."""
+
+    def __init__(self, log: logging.Logger, every: int = DEFAULT_LOG_SAMPLE_EVERY):
+        self.log = log
+        self.every = max(every, 1)
+        self.lock = threading.Lock()
+        self.counts: Dict[str, int] = {}
+
+    def _emit(self, level: int, event: str, fields: Dict[str, Any]):
+        with self.lock:
+            count = self.counts.get(event, 0) + 1
+            self.counts[event] = count
+
+        if count == 1 or count % self.every == 0:
+            details = ' '.join(f"{key}={format_field(value)}" for key, value in fields.items())
+            self.log.log(level, f"event={event} count={count} {details}".rstrip())
+
+    def info(self, event: str, **fields: Any):
+        self._emit(logging.INFO, event, fields)
+
+    def warning(self, event: str, **fields: Any):
+        self._emit(logging.WARNING, event, fields)
+
+    def summary(self):
+        """Log the total count of every sampled event."""
+        with self.lock:
+            counts = dict(self.counts)
+        for event, count in sorted(counts.items()):
+            if count > 1:
+                self.log.info(f"event={event} total={count}")
+
+
+def start_metrics_reporting(path: Optional[str], fmt: str = 'json', interval: Optional[float] = None):
+    """Dump METRICS to `path` at exit, and every `interval` seconds when given. No-op without a path."""
+    if not path:
+        return
+
+    stopped = threading.Event()
+    lock = threading.Lock()
+
+    def dump():
+        with lock:
+            try:
+                METRICS.dump(path, fmt)
+            except OSError as e:
+                logger.warning(f"Could not write metrics to {path}: {e}")
+
+    def stop():
+        # the periodic reporter must not overwrite the final summary
+        stopped.set()
+        dump()
+
+    atexit.register(stop)
+
+    if interval:
+        def report():
+            while not stopped.wait(interval):
+                dump()
+
+        threading.Thread(target=report, name='metrics-reporter', daemon=True).start()
+
+    logger.info(f"Writing RPC metrics ({fmt}) to {path}" + (f" every {interval:g}s" if interval else " at exit"))
+
+
+def add_metrics_arguments(parser: argparse.ArgumentParser):
+    """--metrics, --metrics-format and --metrics-interval options."""
+    parser.add_argument('--metrics', default=None, metavar='PATH',
+                        help="write per-method and per-function RPC metrics to PATH at exit")
+    parser.add_argument('--metrics-format', choices=METRICS_FORMATS, default='json',
+                        help="metrics file format (default json)")
+    parser.add_argument('--metrics-interval', type=float, default=None, metavar='SECONDS',
+                        help="also rewrite the metrics file every SECONDS while running")
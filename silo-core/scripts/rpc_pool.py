@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+RPC Endpoint Pool
+
+Spreads JSON-RPC traffic of one chain over several endpoints. RPC environment variables
+may hold a comma separated list of URLs (e.g. RPC_SONIC="https://a,https://b"); every
+request then goes to an endpoint picked at random, weighted by the inverse of its observed
+latency, so fast endpoints get most of the load while slow ones keep being measured.
+
+Failed requests (transport errors, HTTP errors, throttling and other non-revert JSON-RPC
+errors) are retried on another endpoint after a jittered exponential backoff. An endpoint
+failing several times in a row is put on cooldown. With `hedge_after`, a request still
+unanswered after that many seconds is sent to a second endpoint as well and the first
+answer wins.
+
+Reverts are final answers and are returned as-is, and so are node-side execution failures
+reported as -32000 (out of gas, eth_call gas cap, response size limit): the same call fails
+the same way on every endpoint, and callers like silo_lens split the call instead. eth_getLogs
+block range and result size limits are final for the same reason. When every
+attempt fails the error is raised, so a caller can never mistake an unreachable node for a
+zero value.
+
+Usage:
+    w3 = Web3(PooledHTTPProvider("https://a,https://b", hedge_after=2.0))
+    w3.provider.check_endpoints()
+
+    # async: rpc_async.AsyncRpcClient("https://a,https://b", hedge_after=2.0)
+"""
+
+import logging
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Sequence, Union
+
+from web3 import HTTPProvider
+
+from rpc_metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ATTEMPTS = 4
+DEFAULT_BACKOFF_SECONDS = 0.25
+MAX_BACKOFF_SECONDS = 8.0
+
+# Weight of a new sample in the moving average of endpoint latency
+LATENCY_SMOOTHING = 0.2
+
+# Consecutive failures that put an endpoint on cooldown, and for how long
+FAILURES_BEFORE_COOLDOWN = 3
+COOLDOWN_SECONDS = 30.0
+
+# Endpoints this many blocks behind the best one fail the health check
+MAX_BLOCK_LAG = 50
+
+# JSON-RPC errors about the request itself, retrying them elsewhere does not help
+FINAL_ERROR_CODES = (3, -32015, -32600, -32601, -32602)
+
+# Server error code nodes use for failed execution as well as for transient trouble
+SERVER_ERROR_CODE = -32000
+
+# Messages of -32000 errors caused by executing the call, not by the node's state
+EXECUTION_ERROR_MESSAGES = (
+    "out of gas", "gas required exceeds", "gas limit", "execution", "response size", "returndata", "return data"
+)
+
+# Messages of eth_getLogs errors about the block range or result size, every endpoint of a
+# provider refuses the same query and the caller has to ask for a smaller range instead
+LOG_LIMIT_MESSAGES = (
+    "block range", "range exceeds", "range is too", "range too", "returned more than", "max results",
+    "too many blocks", "too many logs", "log response size", "is limited to", "query timeout"
+)
+
+
+class RpcPoolError(Exception):
+    """Every attempt of a request failed."""
+
+
+def parse_endpoints(endpoints: Union[str, Sequence[str]]) -> List[str]:
+    """Endpoint list from a comma separated string or a sequence of URLs."""
+    if isinstance(endpoints, str):
+        endpoints = endpoints.split(',')
+
+    urls = [url.strip() for url in endpoints if url and url.strip()]
+    if not urls:
+        raise ValueError("no RPC endpoint given")
+
+    return urls
+
+
+def is_log_limit_error(error: Any) -> bool:
+    """True for a JSON-RPC error refusing an eth_getLogs query for its block range or result size."""
+    message = str(error.get("message", "") if isinstance(error, dict) else error).lower()
+    return any(text in message for text in LOG_LIMIT_MESSAGES)
+
+
+def is_final_response(response: Dict[str, Any]) -> bool:
+    """Results, reverts, execution failures and log limits are final, other errors (throttling, node trouble) are worth a retry."""
+    if "result" in response:
+        return True
+
+    error = response.get("error") or {}
+    message = str(error.get("message", "")).lower()
+    if error.get("code") in FINAL_ERROR_CODES or "revert" in message or is_log_limit_error(error):
+        return True
+
+    return error.get("code") == SERVER_ERROR_CODE and any(text in message for text in EXECUTION_ERROR_MESSAGES)
+
+
+class Endpoint:
+    """Observed state of one RPC endpoint."""
+
+    def __init__(self, url: str):
+        self.url = url
+        self.latency: Optional[float] = None
+        self.failures = 0
+        self.down_until = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    def available(self, now: float) -> bool:
+        """False while the endpoint is on cooldown."""
+        return now >= self.down_until
+
+    def record_success(self, latency: float):
+        """Fold a successful request into the latency average."""
+        self.requests += 1
+        self.failures = 0
+        self.latency = latency if self.latency is None else (1 - LATENCY_SMOOTHING) * self.latency + LATENCY_SMOOTHING * latency
+
+    def record_failure(self, now: float, cooldown: bool = False):
+        """Count a failure, starting a cooldown after repeated failures."""
+        self.requests += 1
+        self.errors += 1
+        self.failures += 1
+
+        if cooldown or self.failures >= FAILURES_BEFORE_COOLDOWN:
+            self.down_until = now + COOLDOWN_SECONDS
+            logger.warning(f"RPC endpoint {self.url} on cooldown for {COOLDOWN_SECONDS:g}s after {self.failures} failures")
+
+
+class EndpointPool:
+    """Endpoint selection, backoff and bookkeeping shared by the sync and async transports."""
+
+    def __init__(
+        self,
+        endpoints: Union[str, Sequence[str]],
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        backoff: float = DEFAULT_BACKOFF_SECONDS,
+        hedge_after: Optional[float] = None
+    ):
+        self.endpoints = [Endpoint(url) for url in parse_endpoints(endpoints)]
+        self.max_attempts = max(max_attempts, 1)
+        self.backoff = backoff
+        self.hedge_after = hedge_after if hedge_after and len(self.endpoints) > 1 else None
+        self.lock = threading.Lock()
+        self.retries = 0
+        self.hedges = 0
+
+    def pick(self, exclude: Sequence[Endpoint] = ()) -> Endpoint:
+        """Endpoint for the next attempt, weighted by inverse latency, avoiding `exclude` when possible."""
+        now = time.monotonic()
+
+        with self.lock:
+            available = [e for e in self.endpoints if e.available(now)]
+            if not available:
+                # everything is on cooldown: use the endpoint coming back first
+                return min(self.endpoints, key=lambda e: e.down_until)
+
+            candidates = [e for e in available if e not in exclude] or available
+            measured = [e.latency for e in candidates if e.latency is not None]
+            # unmeasured endpoints get the best weight so they are tried early
+            fastest = min(measured) if measured else 1.0
+            weights = [1 / max(e.latency if e.latency is not None else fastest, 1e-3) for e in candidates]
+            return random.choices(candidates, weights)[0]
+
+    def backoff_delay(self, attempt: int) -> float:
+        """Full-jitter exponential backoff before retry number `attempt` (from 1)."""
+        return random.uniform(0, min(MAX_BACKOFF_SECONDS, self.backoff * 2 ** (attempt - 1)))
+
+    def record_success(self, endpoint: Endpoint, latency: float):
+        with self.lock:
+            endpoint.record_success(latency)
+
+    def record_hedge(self, endpoint: Endpoint):
+        """`endpoint` did not answer within `hedge_after`: count that as its latency so far."""
+        with self.lock:
+            self.hedges += 1
+            endpoint.record_success(max(self.hedge_after, endpoint.latency or 0))
+            endpoint.requests -= 1
+
+    def record_failure(self, endpoint: Endpoint, error: Any, cooldown: bool = False):
+        with self.lock:
+            endpoint.record_failure(time.monotonic(), cooldown)
+        logger.debug(f"RPC request to {endpoint.url} failed: {error}")
+
+    def record_heads(self, heads: Dict[Endpoint, Optional[int]]) -> int:
+        """Apply health check results (latest block per endpoint, None when unreachable). Returns healthy count."""
+        best = max((head for head in heads.values() if head is not None), default=None)
+        healthy = 0
+
+        for endpoint, head in heads.items():
+            if head is None or best - head > MAX_BLOCK_LAG:
+                reason = "unreachable" if head is None else f"{best - head} blocks behind"
+                self.record_failure(endpoint, reason, cooldown=True)
+                logger.warning(f"RPC endpoint {endpoint.url}: {reason}")
+                continue
+
+            healthy += 1
+            logger.info(f"RPC endpoint {endpoint.url}: block {head}, {endpoint.latency * 1000:.0f} ms")
+
+        return healthy
+
+    def log_summary(self):
+        """Per-endpoint request, error and latency counters."""
+        for e in self.endpoints:
+            latency = f"{e.latency * 1000:.0f} ms" if e.latency is not None else "n/a"
+            logger.info(f"RPC endpoint {e.url}: {e.requests} requests, {e.errors} errors, latency {latency}")
+        logger.info(f"RPC pool: {self.retries} retries, {self.hedges} hedged requests")
+
+
+class PooledHTTPProvider(HTTPProvider):
+    """HTTPProvider sending each request to the best endpoint of an EndpointPool, with retries and hedging.
+
+    Posts through the request session manager of web3 7 and later.
+    """
+
+    def __init__(
+        self,
+        endpoints: Union[str, Sequence[str]],
+        max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+        backoff: float = DEFAULT_BACKOFF_SECONDS,
+        hedge_after: Optional[float] = None,
+        **kwargs
+    ):
+        self.pool = EndpointPool(endpoints, max_attempts, backoff, hedge_after)
+        # retries are handled by the pool, across endpoints
+        super().__init__(self.pool.endpoints[0].url, exception_retry_configuration=None, **kwargs)
+        self.executor = ThreadPoolExecutor(max_workers=8) if self.pool.hedge_after else None
+        # web3 asks for the chain id around every eth_call; it cannot change, so it is asked once
+        self.chain_id_response: Optional[Dict[str, Any]] = None
+
+    def check_endpoints(self) -> int:
+        """Query eth_blockNumber on every endpoint. Returns the number of healthy endpoints."""
+        heads = {}
+        for endpoint in self.pool.endpoints:
+            try:
+                response = self._post(endpoint, "eth_blockNumber", [], self.encode_rpc_request("eth_blockNumber", []))
+                heads[endpoint] = int(response["result"], 16)
+            except Exception as e:
+                logger.debug(f"Health check of {endpoint.url} failed: {e}")
+                heads[endpoint] = None
+
+        return self.pool.record_heads(heads)
+
+    def _post(self, endpoint: Endpoint, method: str, params: Any, request_data: bytes) -> Dict[str, Any]:
+        """Single attempt against one endpoint. Non-final error responses raise."""
+        started = time.monotonic()
+        raw = b""
+        try:
+            raw = self._request_session_manager.make_post_request(endpoint.url, request_data, **self.get_request_kwargs())
+            response = self.decode_rpc_response(raw)
+        except Exception as e:
+            self.pool.record_failure(endpoint, e)
+            METRICS.observe_request(method, params, len(request_data), len(raw), time.monotonic() - started, error=True)
+            raise
+
+        latency = time.monotonic() - started
+        if not is_final_response(response):
+            self.pool.record_failure(endpoint, response.get("error"))
+            METRICS.observe_request(method, params, len(request_data), len(raw), latency, error=True)
+            raise RpcPoolError(f"{endpoint.url}: {response.get('error')}")
+
+        self.pool.record_success(endpoint, latency)
+        METRICS.observe_request(method, params, len(request_data), len(raw), latency, revert="error" in response)
+        return response
+
+    def _post_hedged(self, endpoint: Endpoint, method: str, params: Any, request_data: bytes) -> Dict[str, Any]:
+        """Attempt on `endpoint`, racing a second endpoint if no answer came within `hedge_after`."""
+        primary = self.executor.submit(self._post, endpoint, method, params, request_data)
+        done, _ = wait([primary], timeout=self.pool.hedge_after)
+        if done:
+            return primary.result()
+
+        self.pool.record_hedge(endpoint)
+        backup = self.executor.submit(self._post, self.pool.pick(exclude=[endpoint]), method, params, request_data)
+        pending = {primary, backup}
+        error = None
+
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    return future.result()
+                error = future.exception()
+
+        raise error
+
+    def make_request(self, method, params):
+        if method == "eth_chainId" and self.chain_id_response is not None:
+            return self.chain_id_response
+
+        response = self._make_request(method, params)
+        if method == "eth_chainId" and "result" in response:
+            self.chain_id_response = response
+
+        return response
+
+    def _make_request(self, method, params):
+        request_data = self.encode_rpc_request(method, params)
+        tried: List[Endpoint] = []
+        error: Exception = None
+
+        for attempt in range(self.pool.max_attempts):
+            if attempt:
+                self.pool.retries += 1
+                METRICS.observe_retry(method)
+                time.sleep(self.pool.backoff_delay(attempt))
+
+            endpoint = self.pool.pick(exclude=tried)
+            tried.append(endpoint)
+
+            try:
+                if self.executor is not None:
+                    return self._post_hedged(endpoint, method, params, request_data)
+                return self._post(endpoint, method, params, request_data)
+            except Exception as e:
+                error = e
+                logger.warning(f"{method} attempt {attempt + 1}/{self.pool.max_attempts} failed: {e}")
+
+        raise RpcPoolError(f"{method} failed after {self.pool.max_attempts} attempts: {error}")
@@ -0,0 +1,270 @@
+#!/usr/bin/env python3
+"""
+JSON-RPC Record / Replay Server
+
+Local HTTP stand-in for an RPC node, so the Silo scripts can be tested and profiled
+without network access.
+
+`record` runs a proxy that forwards every JSON-RPC request to a real endpoint and appends
+each distinct request with its response to a fixture file (gzip compressed JSON lines).
+Only final answers are recorded: results, reverts and the other errors rpc_pool does not
+retry. Throttling, timeouts and node trouble are passed to the client but not recorded, so
+its retry gets recorded instead, and a result replaces an error recorded for the same request.
+`serve` answers requests from a fixture only, with optional artificial latency. Requests
+are matched on method and params (hex strings compared case-insensitively), so a replayed
+run sees exactly the responses of the recorded one. A request missing from the fixture
+gets a JSON-RPC error and is logged.
+
+Usage:
+    # record a run
+    python3 rpc_replay.py record --upstream "$RPC_SONIC" --fixture sonic.rpc.gz --port 8545 &
+    RPC_SONIC=http://127.0.0.1:8545 python3 silo-sonic-54-state/silo_data_collector.py
+
+    # replay it, 20 ms +- 5 ms per request
+    python3 rpc_replay.py serve --fixture sonic.rpc.gz --port 8545 --latency-ms 20 --jitter-ms 5 &
+    RPC_SONIC=http://127.0.0.1:8545 python3 silo-sonic-54-state/silo_data_collector.py
+
+    # same for avalanche_silo_analyzer.py with RPC_AVALANCHE and --block, so no call uses "latest"
+"""
+
+import argparse
+import gzip
+import hashlib
+import json
+import logging
+import os
+import random
+import signal
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Optional
+
+import requests
+
+from rpc_pool import is_final_response
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_PORT = 8545
+DEFAULT_UPSTREAM_TIMEOUT_SECONDS = 60
+
+# JSON-RPC error returned for requests that are not in the fixture
+NOT_RECORDED_ERROR_CODE = -32099
+
+
+def normalize(value: Any) -> Any:
+    """Params with hex strings lowercased, so checksummed and lowercase addresses match."""
+    if isinstance(value, str):
+        return value.lower() if value.startswith("0x") else value
+    if isinstance(value, list):
+        return [normalize(item) for item in value]
+    if isinstance(value, dict):
+        return {key: normalize(item) for key, item in value.items()}
+    return value
+
+
+def request_key(method: str, params: Any) -> str:
+    """Canonical fixture key of a request."""
+    return json.dumps([method, normalize(params or [])], sort_keys=True, separators=(",", ":"))
+
+
+def load_fixture(path: str) -> Dict[str, Dict[str, Any]]:
+    """{request key: {"result": ...} or {"error": ...}} from a fixture file.
+
+    Retryable errors of older recordings are skipped and a result wins over an error of the same request.
+    """
+    entries = {}
+
+    with gzip.open(path, 'rt', encoding='utf-8') as f:
+        try:
+            for line in f:
+                entry = json.loads(line)
+                response = {k: entry[k] for k in ("result", "error") if k in entry}
+                key = request_key(entry["method"], entry["params"])
+                if is_final_response(response) and "result" not in entries.get(key, {}):
+                    entries[key] = response
+        except (EOFError, json.JSONDecodeError):
+            # a recorder killed mid-write leaves a truncated last line
+            logger.warning(f"{path}: ignoring truncated tail")
+
+    logger.info(f"Loaded {len(entries)} recorded requests from {path}")
+    return entries
+
+
+class FixtureRecorder:
+    """Appends final answers of distinct requests to a gzip fixture, flushing after each one."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.lock = threading.Lock()
+        # request key -> True once a result is recorded, False while only an error is
+        self.seen = {key: "result" in entry for key, entry in load_fixture(path).items()} if os.path.exists(path) else {}
+        # gzip files may hold several members, appending keeps earlier recordings readable
+        self.file = gzip.open(path, 'at', encoding='utf-8')
+
+    def record(self, method: str, params: Any, response: Dict[str, Any]) -> bool:
+        """Record a final answer, unless one is recorded already. A result replaces a recorded error."""
+        if not is_final_response(response):
+            return False
+
+        key = request_key(method, params)
+        has_result = "result" in response
+
+        with self.lock:
+            if key in self.seen and (self.seen[key] or not has_result):
+                return False
+            self.seen[key] = has_result
+
+            entry = {"method": method, "params": params, **{k: response[k] for k in ("result", "error") if k in response}}
+            self.file.write(json.dumps(entry, separators=(",", ":")) + "\n")
+            self.file.flush()
+
+        return True
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+        logger.info(f"Recorded {len(self.seen)} requests to {self.path}")
+
+
+class RpcHandler(BaseHTTPRequestHandler):
+    """Answers single and batch JSON-RPC requests through `self.server.answer`."""
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        try:
+            payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))))
+        except json.JSONDecodeError:
+            self.send_error(400, "invalid JSON")
+            return
+
+        if isinstance(payload, list):
+            body = [self.server.answer(request) for request in payload]
+        else:
+            body = self.server.answer(payload)
+
+        data = json.dumps(body).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class RecordingServer(ThreadingHTTPServer):
+    """Proxy to `upstream` recording every final answer into a FixtureRecorder."""
+
+    daemon_threads = True
+
+    def __init__(self, port: int, upstream: str, recorder: FixtureRecorder):
+        super().__init__(("127.0.0.1", port), RpcHandler)
+        self.upstream = upstream
+        self.recorder = recorder
+        self.session = requests.Session()
+
+    def answer(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        response = self.session.post(self.upstream, json=request, timeout=DEFAULT_UPSTREAM_TIMEOUT_SECONDS).json()
+
+        if "result" in response or "error" in response:
+            self.recorder.record(request["method"], request.get("params", []), response)
+
+        return response
+
+
+class ReplayServer(ThreadingHTTPServer):
+    """Answers requests from a loaded fixture, optionally sleeping `latency` +- `jitter` seconds."""
+
+    daemon_threads = True
+
+    def __init__(self, port: int, entries: Dict[str, Dict[str, Any]], latency: float = 0.0, jitter: float = 0.0):
+        super().__init__(("127.0.0.1", port), RpcHandler)
+        self.entries = entries
+        self.latency = latency
+        self.jitter = jitter
+        self.lock = threading.Lock()
+        self.answered = 0
+        self.missing = 0
+
+    def delay(self, key: str) -> float:
+        """Latency of a request, the same for every replay of it."""
+        if not self.jitter:
+            return self.latency
+
+        seed = int.from_bytes(hashlib.sha256(key.encode()).digest()[:8], "big")
+        return max(self.latency + random.Random(seed).uniform(-self.jitter, self.jitter), 0.0)
+
+    def answer(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        key = request_key(request.get("method"), request.get("params", []))
+        time.sleep(self.delay(key))
+
+        recorded: Optional[Dict[str, Any]] = self.entries.get(key)
+        with self.lock:
+            if recorded is None:
+                self.missing += 1
+            else:
+                self.answered += 1
+
+        if recorded is None:
+            logger.warning(f"Not recorded: {key[:200]}")
+            recorded = {"error": {"code": NOT_RECORDED_ERROR_CODE, "message": "request not in fixture"}}
+
+        return {"jsonrpc": "2.0", "id": request.get("id"), **recorded}
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Record or replay JSON-RPC traffic")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    record = commands.add_parser('record', help="proxy to an upstream RPC, recording responses")
+    record.add_argument('--upstream', required=True, help="RPC URL to forward requests to")
+    record.add_argument('--fixture', required=True, help="fixture file to append to (gzip JSON lines)")
+    record.add_argument('--port', type=int, default=DEFAULT_PORT)
+
+    serve = commands.add_parser('serve', help="answer requests from a fixture")
+    serve.add_argument('--fixture', required=True, help="fixture file written by `record`")
+    serve.add_argument('--port', type=int, default=DEFAULT_PORT)
+    serve.add_argument('--latency-ms', type=float, default=0.0, help="artificial latency per request")
+    serve.add_argument('--jitter-ms', type=float, default=0.0,
+                       help="deterministic per-request deviation from --latency-ms")
+
+    return parser.parse_args()
+
+
+def main():
+    """Main function."""
+    args = parse_args()
+
+    if args.command == 'record':
+        recorder = FixtureRecorder(args.fixture)
+        server = RecordingServer(args.port, args.upstream, recorder)
+        logger.info(f"Recording {args.upstream} on http://127.0.0.1:{args.port} into {args.fixture}")
+    else:
+        if not os.path.exists(args.fixture):
+            logger.error(f"Fixture {args.fixture} not found")
+            sys.exit(1)
+        server = ReplayServer(args.port, load_fixture(args.fixture), args.latency_ms / 1000, args.jitter_ms / 1000)
+        logger.info(f"Replaying {args.fixture} on http://127.0.0.1:{args.port}")
+
+    # stop on `kill` as on Ctrl-C, so the fixture is closed properly
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if args.command == 'record':
+            recorder.close()
+        else:
+            logger.info(f"Answered {server.answered} requests, {server.missing} not recorded")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+"""
+Streaming Result Writer
+
+Appends collector result rows to the output CSV as soon as they are ready, instead of
+keeping every row in memory until the end of the run. After each flushed group of rows
+the processed addresses are appended to a checkpoint file, so an interrupted run can be
+resumed where it stopped.
+
+On resume, rows that reached the CSV but not the checkpoint (crash between the two
+writes) are truncated away, so no user appears twice in the output. A checkpoint line cut
+short by a crash in the middle of an append is dropped, its user is collected again.
+
+ParquetResultWriter writes the same rows as a columnar Parquet file (needs pyarrow).
+Addresses are fixed_size_binary(20) and uint256 values fixed_size_binary(32), big-endian,
+so values are exact and byte order is numeric order (decimal256 holds only 76 digits, a
+uint256 needs 78). Liquidity, prices, block and silo addresses go into the file metadata
+instead of a fake first row. Each full row group is written and synced as its own Parquet
+file in the checkpoint directory, so a crashed run resumes after its last row group. On
+close, including when a run stops on an error, the row groups are merged into the output
+under a temporary name and moved in place; a closed file can be resumed as well.
+
+    rows = iter_parquet_rows("silo-54-results.parquet")   # same dicts as the CSV rows
+    metadata = read_parquet_metadata("silo-54-results.parquet")
+"""
+
+import csv
+import json
+import logging
+import os
+import shutil
+from typing import Any, Dict, Iterable, Iterator, List, Optional
+
+from web3 import Web3
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # optional, only needed for Parquet output
+    pa = None
+    pq = None
+
+logger = logging.getLogger(__name__)
+
+RESULT_FIELDNAMES = [
+    'user_address',
+    'total_underlying_collateral',
+    'maxWithdraw_collateral',
+    'maxRepay',
+    'silo1_total_collateral',
+    'silo1_max_withdraw',
+    'silo0_maxRepay',
+    'user_ltv'
+]
+
+# header and liquidity row come before the first user row
+PREAMBLE_LINES = 2
+
+# Bytes read from the end of a checkpoint to find the last complete line, an entry is 43 bytes
+CHECKPOINT_TAIL_BYTES = 4096
+
+# uint256 result fields, every field but user_address
+UINT256_FIELDNAMES = RESULT_FIELDNAMES[1:]
+
+# Users per Parquet row group, each group is written when full
+DEFAULT_ROW_GROUP_SIZE = 65536
+
+PARQUET_FORMAT_VERSION = '1'
+
+
+def liquidity_row(silo0_liquidity: int, silo1_liquidity: int) -> Dict[str, Any]:
+    """First CSV row, carrying liquidity of both silos in the `user_address` column."""
+    row = {field: '' for field in RESULT_FIELDNAMES}
+    row['user_address'] = f'silo0_liquidity:{silo0_liquidity},silo1_liquidity:{silo1_liquidity}'
+    return row
+
+
+def default_checkpoint_file(output_file: str) -> str:
+    """Checkpoint file stored next to the output file."""
+    return output_file + '.checkpoint'
+
+
+def skip_processed(addresses: Iterable[str], processed: Iterable[str]) -> Iterator[str]:
+    """Drop the already processed prefix of `addresses`, checking it matches the checkpoint."""
+    remaining = iter(addresses)
+
+    for count, done in enumerate(processed, 1):
+        address = next(remaining, None)
+        if address is None or address.lower() != done.lower():
+            raise ValueError(f"checkpoint entry {count} ({done}) does not match input address {address}")
+
+    return remaining
+
+
+class CsvResultWriter:
+    """Writes result rows to `output_file` as they complete, tracking progress in `checkpoint_file`."""
+
+    def __init__(self, output_file: str, checkpoint_file: Optional[str] = None):
+        self.output_file = output_file
+        self.checkpoint_file = checkpoint_file or default_checkpoint_file(output_file)
+        self.output = None
+        self.checkpoint = None
+        self.writer = None
+        self.rows_written = 0
+
+    def start(self, silo0_liquidity: int, silo1_liquidity: int):
+        """Start a fresh output: header, liquidity row and an empty checkpoint."""
+        self.output = open(self.output_file, 'w', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.output, fieldnames=RESULT_FIELDNAMES)
+        self.writer.writeheader()
+        self.writer.writerow(liquidity_row(silo0_liquidity, silo1_liquidity))
+        self.output.flush()
+
+        self.checkpoint = open(self.checkpoint_file, 'w', encoding='utf-8')
+        logger.info(f"Writing results to {self.output_file}, checkpoint {self.checkpoint_file}")
+
+    def can_resume(self) -> bool:
+        """True when both the output and the checkpoint of a previous run exist."""
+        return os.path.exists(self.output_file) and os.path.exists(self.checkpoint_file)
+
+    def processed_addresses(self) -> Iterator[str]:
+        """Stream addresses recorded in the checkpoint, ignoring a partial last line."""
+        with open(self.checkpoint_file, 'r', encoding='utf-8') as f:
+            for line in f:
+                address = line.strip()
+                if address and line.endswith('\n'):
+                    yield address
+
+    def repair_checkpoint(self):
+        """Cut a partial last line left by a crash in the middle of an append."""
+        with open(self.checkpoint_file, 'r+b') as f:
+            size = f.seek(0, os.SEEK_END)
+            start = max(size - CHECKPOINT_TAIL_BYTES, 0)
+            f.seek(start)
+            tail = f.read()
+            if not tail or tail.endswith(b'\n'):
+                return
+
+            last_newline = tail.rfind(b'\n')
+            if last_newline < 0 and start > 0:
+                raise ValueError(f"{self.checkpoint_file} has no line break in its last {CHECKPOINT_TAIL_BYTES} bytes")
+
+            f.truncate(start + last_newline + 1)
+            logger.warning(f"Dropped partial last line of {self.checkpoint_file}: {tail[last_newline + 1:]!r}")
+
+    def resume(self) -> int:
+        """Reopen a previous run for appending. Returns the number of users already processed."""
+        self.repair_checkpoint()
+        processed = sum(1 for _ in self.processed_addresses())
+        keep_lines = PREAMBLE_LINES + processed
+
+        # cut rows written after the last checkpoint entry
+        with open(self.output_file, 'rb') as f:
+            for line_number in range(keep_lines):
+                if not f.readline():
+                    raise ValueError(
+                        f"{self.output_file} has {max(line_number - PREAMBLE_LINES, 0)} user rows, "
+                        f"checkpoint expects {processed}"
+                    )
+            offset = f.tell()
+
+        with open(self.output_file, 'r+b') as f:
+            f.truncate(offset)
+
+        self.output = open(self.output_file, 'a', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.output, fieldnames=RESULT_FIELDNAMES)
+        self.checkpoint = open(self.checkpoint_file, 'a', encoding='utf-8')
+        self.rows_written = processed
+
+        logger.info(f"Resuming {self.output_file}: {processed} users already processed")
+        return processed
+
+    def write_rows(self, rows: List[Dict[str, Any]]):
+        """Append rows to the output, addresses checksummed, then record their addresses in the checkpoint."""
+        self.writer.writerows({**row, 'user_address': Web3.to_checksum_address(row['user_address'])} for row in rows)
+        self.output.flush()
+        os.fsync(self.output.fileno())
+
+        self.checkpoint.writelines(f"{row['user_address']}\n" for row in rows)
+        self.checkpoint.flush()
+        os.fsync(self.checkpoint.fileno())
+        self.rows_written += len(rows)
+
+    def close(self, completed: bool = True):
+        """Close files. A completed run has nothing left to resume, so its checkpoint is removed."""
+        if self.output is not None:
+            self.output.close()
+            self.output = None
+
+        if self.checkpoint is not None:
+            self.checkpoint.close()
+            self.checkpoint = None
+
+            if completed:
+                os.remove(self.checkpoint_file)
+
+        logger.info(f"Results saved to: {self.output_file} ({self.rows_written} users)")
+
+
+def require_pyarrow():
+    if pa is None:
+        raise RuntimeError("Parquet output needs pyarrow, install it with: pip install pyarrow")
+
+
+def result_schema() -> "pa.Schema":
+    """Arrow schema of result rows: binary address and big-endian 32-byte uint256 columns."""
+    require_pyarrow()
+    return pa.schema(
+        [pa.field('user_address', pa.binary(20), nullable=False)]
+        + [pa.field(field, pa.binary(32), nullable=False) for field in UINT256_FIELDNAMES]
+    )
+
+
+def metadata_value(value: Any) -> str:
+    """File metadata is text: integers as decimal strings, dicts and lists as JSON with integers as strings."""
+    if isinstance(value, (dict, list, tuple)):
+        def stringify(item):
+            if isinstance(item, dict):
+                return {key: stringify(inner) for key, inner in item.items()}
+            if isinstance(item, (list, tuple)):
+                return [stringify(inner) for inner in item]
+            return str(item) if isinstance(item, int) and not isinstance(item, bool) else item
+        return json.dumps(stringify(value), sort_keys=True)
+    return str(value)
+
+
+def read_parquet_metadata(path: str) -> Dict[str, str]:
+    """Market metadata stored in a Parquet results file."""
+    require_pyarrow()
+    metadata = pq.read_schema(path).metadata or {}
+    return {key.decode(): value.decode() for key, value in metadata.items() if not key.startswith(b'ARROW')}
+
+
+def iter_parquet_rows(path: str, columns: Optional[List[str]] = None) -> Iterator[Dict[str, Any]]:
+    """Rows of a Parquet results file as dicts like the CSV rows, one row group in memory at a time."""
+    require_pyarrow()
+    parquet_file = pq.ParquetFile(path)
+    for batch in parquet_file.iter_batches(columns=columns):
+        values = batch.to_pydict()
+        addresses = values.pop('user_address', None)
+        for index in range(batch.num_rows):
+            row = {field: int.from_bytes(column[index], 'big') for field, column in values.items()}
+            if addresses is not None:
+                row['user_address'] = Web3.to_checksum_address(addresses[index])
+            yield row
+
+
+class ParquetResultWriter:
+    """Writes result rows to a Parquet file one row group at a time, same interface as CsvResultWriter.
+
+    `metadata` (block, silos, prices, ...) is stored in the file metadata along with the liquidity
+    given to `start`. Every row group is written as a complete Parquet file into the checkpoint
+    directory as soon as it is full, so a crash loses at most the rows not yet in a row group;
+    `close` merges them into the output and removes the directory.
+    """
+
+    def __init__(self, output_file: str, metadata: Optional[Dict[str, Any]] = None,
+                 row_group_size: int = DEFAULT_ROW_GROUP_SIZE, checkpoint_file: Optional[str] = None):
+        require_pyarrow()
+        self.output_file = output_file
+        self.checkpoint_file = checkpoint_file or default_checkpoint_file(output_file)
+        self.partial_file = output_file + '.partial'
+        self.metadata = metadata or {}
+        self.row_group_size = row_group_size
+        self.schema = None
+        self.columns: Dict[str, List[bytes]] = {}
+        self.parts = 0
+        self.rows_written = 0
+
+    def start(self, silo0_liquidity: int, silo1_liquidity: int):
+        """Start a fresh output, liquidity of both silos goes into the file metadata."""
+        metadata = {'format_version': PARQUET_FORMAT_VERSION, 'uint256_encoding': 'big-endian fixed_size_binary(32)'}
+        metadata.update(self.metadata)
+        metadata.update(silo0_liquidity=silo0_liquidity, silo1_liquidity=silo1_liquidity)
+
+        if os.path.isdir(self.checkpoint_file):
+            shutil.rmtree(self.checkpoint_file)
+        os.makedirs(self.checkpoint_file)
+
+        self.open(result_schema().with_metadata({key: metadata_value(value) for key, value in metadata.items()}))
+        # an empty first part keeps the schema and metadata for a resume before the first row group
+        self.write_part(pa.table(self.columns, schema=self.schema))
+        logger.info(f"Writing results to {self.output_file}, {self.row_group_size} users per row group, "
+                    f"checkpoint {self.checkpoint_file}")
+
+    def open(self, schema: "pa.Schema"):
+        self.schema = schema
+        self.columns = {field: [] for field in RESULT_FIELDNAMES}
+
+    def part_file(self, index: int) -> str:
+        return os.path.join(self.checkpoint_file, f"{index:06d}.parquet")
+
+    def part_files(self) -> List[str]:
+        """Finished row group files in write order."""
+        return [self.part_file(index) for index in range(self.parts)]
+
+    def write_part(self, table: "pa.Table"):
+        """Write a row group file under a temporary name, sync it and move it in place."""
+        path = self.part_file(self.parts)
+        with open(path + '.tmp', 'wb') as f:
+            pq.write_table(table, f, row_group_size=self.row_group_size)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + '.tmp', path)
+        self.parts += 1
+
+    def can_resume(self) -> bool:
+        """True when a previous run left row group files or a closed output."""
+        return os.path.isdir(self.checkpoint_file) or os.path.exists(self.output_file)
+
+    def processed_addresses(self) -> Iterator[str]:
+        """Stream user addresses of the row groups written so far, lowercase."""
+        for path in self.part_files():
+            for batch in pq.ParquetFile(path).iter_batches(columns=['user_address']):
+                for address in batch.column(0).to_pylist():
+                    yield '0x' + address.hex()
+
+    def resume(self) -> int:
+        """Continue after the row groups of a crashed run, or after a closed output. Returns the users processed."""
+        os.makedirs(self.checkpoint_file, exist_ok=True)
+        if not os.path.exists(self.part_file(0)) and os.path.exists(self.output_file):
+            # a closed output becomes the first part
+            os.replace(self.output_file, self.part_file(0))
+
+        names = sorted(name for name in os.listdir(self.checkpoint_file) if name.endswith('.parquet'))
+        if not names:
+            raise ValueError(f"{self.checkpoint_file} has no row group files")
+        if names != [os.path.basename(self.part_file(index)) for index in range(len(names))]:
+            raise ValueError(f"{self.checkpoint_file} has missing row group files: {', '.join(names)}")
+
+        # a part still being written at the crash never got its final name
+        for name in os.listdir(self.checkpoint_file):
+            if name.endswith('.tmp'):
+                os.remove(os.path.join(self.checkpoint_file, name))
+
+        self.parts = len(names)
+        schema = pq.read_schema(self.part_file(0))
+        if not schema.remove_metadata().equals(result_schema()):
+            raise ValueError(f"{self.checkpoint_file} does not have the result schema")
+
+        self.open(schema)
+        self.rows_written = sum(pq.ParquetFile(path).metadata.num_rows for path in self.part_files())
+
+        logger.info(f"Resuming {self.output_file}: {self.rows_written} users already processed")
+        return self.rows_written
+
+    def write_rows(self, rows: List[Dict[str, Any]]):
+        """Buffer rows, writing a row group whenever `row_group_size` users are buffered."""
+        addresses = self.columns['user_address']
+        for row in rows:
+            addresses.append(bytes.fromhex(row['user_address'][2:]))
+            for field in UINT256_FIELDNAMES:
+                self.columns[field].append(int(row[field]).to_bytes(32, 'big'))
+
+        if len(addresses) >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        """Write buffered rows as a row group file."""
+        count = len(self.columns['user_address'])
+        if not count:
+            return
+
+        self.write_part(pa.table(self.columns, schema=self.schema))
+        self.columns = {field: [] for field in RESULT_FIELDNAMES}
+        self.rows_written += count
+
+    def close(self, completed: bool = True):
+        """Write the remaining rows, merge the row group files into the output and remove them.
+
+        An incomplete run is closed the same way, its output is what `resume` continues from.
+        """
+        if self.schema is not None:
+            self.flush()
+            with pq.ParquetWriter(self.partial_file, self.schema) as writer:
+                for path in self.part_files():
+                    part = pq.ParquetFile(path)
+                    for index in range(part.num_row_groups):
+                        writer.write_table(part.read_row_group(index))
+            os.replace(self.partial_file, self.output_file)
+            shutil.rmtree(self.checkpoint_file)
+            self.schema = None
+
+        state = "" if completed else ", incomplete"
+        logger.info(f"Results saved to: {self.output_file} ({self.rows_written} users{state})")
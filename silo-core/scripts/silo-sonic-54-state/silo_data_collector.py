@@ -5,24 +5,102 @@ Silo Data Collector Script
 This script reads blockchain addresses from a JSON file, calls ISilo contract methods
 for each address, and saves the results to a CSV file.
 
+Addresses are streamed from the input (`--input`: a JSON array, one address per line or
+CSV), checked for their format only and checksummed when rows are written, so collection
+starts before a large input is read.
+
 Environment variables required:
 - RPC_SONIC: RPC endpoint URL
 
 Usage:
-    python3 silo_data_collector.py
+    python3 silo_data_collector.py [--input PATH] [--mode multicall|async|sequential|local-evm] [--batch-size N]
+                                   [--concurrency N] [--rps N] [--cache [PATH]] [--resume]
+                                   [--no-prefilter] [--lens-batch] [--lens-chunk-size N] [--lens-address ADDRESS]
+                                   [--workers N] [--state-snapshot PATH]
+                                   [--output-format csv|parquet] [--row-group-size N]
+
+By default user calls are packed into Multicall3 aggregate3 requests, `--batch-size` users
+per request. `--mode async` sends those requests concurrently, at most `--concurrency`
+in flight and `--rps` per second. `--mode sequential` makes one eth_call per method per user.
+
+In multicall and async modes users are first checked for collateral, protected and debt
+share token balances (`--prefilter-batch-size` users per request). Users without any
+position get zero rows without the expensive calls; `--no-prefilter` disables the check.
+
+With `--lens-batch`, user LTV is read for whole chunks of users through SiloLens
+getUsersHealth (`--lens-chunk-size` borrowers per call, halved when a call fails) instead
+of one getUserLTV per user, and silo APRs are printed from getAPRs. Those calls go to the SiloLens
+of deployments/sonic (`--lens-address` to use another one); the per-user calls keep using
+SILO_LENS_ADDRESS. The batch lens is checked for code at BLOCK_NUMBER and probed once at startup,
+and LTV is read per user when it has no getUsersHealth. Borrowers the lens fails for even alone
+get the per-user getUserLTV call.
+
+Rows are appended to the output as they complete and processed addresses are recorded in a
+checkpoint file; after a crash, `--resume` continues from the last checkpoint.
+
+RPC_SONIC may list several endpoints, comma separated. Requests are spread over them by
+observed latency and retried on another endpoint with jittered backoff (`--max-attempts`);
+`--hedge-after SECONDS` also sends a slow request to a second endpoint. When a request
+still fails the run stops, leaving a checkpoint for `--resume`, instead of writing zero rows.
+
+Per-user log lines are sampled (`--log-every`). `--metrics PATH` writes per-method and
+per-function RPC counters and latency histograms as JSON or Prometheus text
+(`--metrics-format`) at exit, or every `--metrics-interval` seconds.
+
+`--mode local-evm` runs the user calls on an in-process EVM (py-evm) instead of the node,
+`--workers` processes in parallel. Contract code and storage at BLOCK_NUMBER are fetched once
+into a state snapshot (`--state-snapshot`, by default in ~/.cache/silo-scripts): users whose
+calls miss state are traced with prestateTracer, `--batch-size` users per trace, and only what
+is still missing, or everything on nodes without the debug API, is fetched slot by slot with
+eth_getStorageAt. A rerun at the same block needs no RPC for the user calls. Needs py-evm.
+
+`--output-format parquet` writes silo-54-results.parquet instead of the CSV (needs pyarrow):
+uint256 values as 32-byte big-endian binary columns, written `--row-group-size` users at a
+time, with block, silo addresses, liquidity, assets, prices and ConfigData in the file
+metadata instead of a liquidity row. Finished row groups are kept in the checkpoint
+directory until the run ends, so `--resume` continues after the last one.
+
+silo_shards.py runs the same collection split into shards over several processes or
+machines, with a SQLite work queue and an ordered merge into this script's output.
+
+With `--cache` every call pinned to BLOCK_NUMBER is stored in a local SQLite cache, so a rerun
+at the same block is answered from disk without touching the RPC.
 
 """
 
+import argparse
+import asyncio
+import bisect
+import collections
+import itertools
 import json
-import csv
 import os
 import sys
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple, Iterable, Iterator, Callable
 from web3 import Web3
 from web3.exceptions import ContractLogicError
 import logging
 from decimal import Decimal
 
+# Shared helpers live one directory up, in silo-core/scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from address_stream import checksum, iter_addresses  # noqa: E402
+from multicall import (  # noqa: E402
+    MULTICALL3_ADDRESS, Call, CallResult, encode_aggregate3, execute_aggregate3, execute_aggregate3_async, execute_call
+)
+from rpc_async import AsyncRpcClient, RequestScheduler, DEFAULT_CONCURRENCY, DEFAULT_REQUESTS_PER_SECOND  # noqa: E402
+from rpc_cache import RpcCache, CachingHTTPProvider, DEFAULT_CACHE_PATH, DEFAULT_MAX_BYTES  # noqa: E402
+from rpc_pool import PooledHTTPProvider, RpcPoolError, DEFAULT_MAX_ATTEMPTS  # noqa: E402
+from rpc_metrics import (  # noqa: E402
+    METRICS, SampledLog, add_metrics_arguments, start_metrics_reporting, DEFAULT_LOG_SAMPLE_EVERY
+)
+from silo_lens import LensBatcher, fetch_aprs, supports_users_health, DEFAULT_LENS_CHUNK_SIZE  # noqa: E402
+from silo_resolver import SiloResolver, ResolverError  # noqa: E402
+from result_writer import (  # noqa: E402
+    CsvResultWriter, ParquetResultWriter, DEFAULT_ROW_GROUP_SIZE, require_pyarrow, skip_processed
+)
+
 # Minimal ABI for ISiloOracle
 ISILO_ORACLE_ABI = [
     {
@@ -94,19 +172,45 @@ ISILO_CONFIG_ABI = [
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
+# per-user events are logged once every `sampled.every` occurrences
+sampled = SampledLog(logger)
+
 
 
+# Sonic chain id, part of the RPC cache key
+SONIC_CHAIN_ID = 146
 
 # Hardcoded block number
 BLOCK_NUMBER = 42802010  # Replace with actual block number
 
-# Hardcoded SiloLens address
+# SiloLens for the per-user collateralBalanceOfUnderlying and getUserLTV calls
 SILO_LENS_ADDRESS = "0xB95AD415b0fcE49f84FbD5B26b14ec7cf4822c69"
 
+# SiloLens deployment, getUsersHealth and getAPRs need the deployed version of the lens
+SILO_LENS_DEPLOYMENT_FILE = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), '..', '..', 'deployments', 'sonic', 'SiloLens.sol.json'
+)
+
+def load_deployment_address(deployment_file: str) -> str:
+    """Contract address recorded in a deployments/<network>/<Contract>.sol.json file."""
+    with open(deployment_file, 'r') as f:
+        return Web3.to_checksum_address(json.load(f)['address'])
+
+DEPLOYED_SILO_LENS_ADDRESS = load_deployment_address(SILO_LENS_DEPLOYMENT_FILE)
+
 # Hardcoded Silo addresses
 SILO0_ADDRESS = "0x04f124bF435545a3c79A8EE3Ffb6C51213CF5175"
 SILO1_ADDRESS = "0xbE0D3c8801206CC9f35A6626f90ef9F4f2983A3D"
 
+# Number of users packed into a single aggregate3 request (7 calls per user)
+DEFAULT_USERS_PER_BATCH = 50
+
+# Number of users checked per balanceOf prefilter request (6 cheap calls per user)
+DEFAULT_PREFILTER_BATCH_SIZE = 500
+
+# Number of users executed together in local-evm mode, missing state is fetched per chunk
+DEFAULT_LOCAL_CHUNK_SIZE = 1000
+
 def handle_uint256(value) -> int:
     """Handle uint256 values properly, ensuring they fit in Python int."""
     if value is None:
@@ -154,49 +258,58 @@ def get_file_names() -> tuple[str, str]:
     return input_file, output_file
 
 def load_addresses_from_json(file_path: str) -> List[str]:
-    """Load addresses from JSON file (array of strings)."""
-    try:
-        with open(file_path, 'r') as f:
-            addresses = json.load(f)
-        
-        if not isinstance(addresses, list):
-            raise ValueError("JSON file must contain an array of addresses")
-        
-        # Validate addresses
-        valid_addresses = []
-        for addr in addresses:
-            if Web3.is_address(addr):
-                valid_addresses.append(Web3.to_checksum_address(addr))
-            else:
-                logger.warning(f"Invalid address format: {addr}")
-        
-        logger.info(f"Loaded {len(valid_addresses)} valid addresses from {file_path}")
-        return valid_addresses
-    
-    except FileNotFoundError:
+    """Load addresses from a JSON array (or NDJSON / CSV file), checksummed. Use iter_input_addresses for large files."""
+    return [checksum(address) for address in iter_input_addresses(file_path)]
+
+def iter_input_addresses(file_path: str) -> Iterator[str]:
+    """Stream addresses of a JSON array, newline-delimited or CSV file as written, format-checked only.
+
+    Exits when the file is missing or holds no valid address; a file found malformed further
+    down raises ValueError when that point is reached.
+    """
+    if not os.path.exists(file_path):
         logger.error(f"File not found: {file_path}")
         sys.exit(1)
-    except json.JSONDecodeError as e:
-        logger.error(f"Invalid JSON format: {e}")
+
+    addresses = iter_addresses(file_path)
+    try:
+        first = next(addresses, None)
+    except ValueError as e:
+        logger.error(f"Invalid input in {file_path}: {e}")
         sys.exit(1)
-    except Exception as e:
-        logger.error(f"Error loading addresses: {e}")
+
+    if first is None:
+        logger.error(f"No valid addresses found in {file_path}")
         sys.exit(1)
 
-def setup_web3() -> Web3:
-    """Setup Web3 connection."""
+    return itertools.chain([first], addresses)
+
+def get_rpc_url() -> str:
+    """Read RPC endpoint URL(s) from the environment, several endpoints comma separated."""
     rpc_url = os.getenv('RPC_SONIC')
     if not rpc_url:
         logger.error("RPC_SONIC environment variable not set")
         sys.exit(1)
+
+    return rpc_url
+
+def setup_web3(cache: RpcCache = None, max_attempts: int = DEFAULT_MAX_ATTEMPTS, hedge_after: float = None) -> Web3:
+    """Setup Web3 connection over the RPC endpoint pool, answering block-pinned calls from `cache` when given."""
+    rpc_url = get_rpc_url()
     
     try:
-        w3 = Web3(Web3.HTTPProvider(rpc_url))
-        if not w3.is_connected():
+        if cache is not None:
+            # no connectivity probe: a fully cached rerun should not touch the network
+            w3 = Web3(CachingHTTPProvider(rpc_url, cache, SONIC_CHAIN_ID, max_attempts=max_attempts, hedge_after=hedge_after))
+            logger.info(f"Using RPC endpoint(s) {rpc_url} with cache {cache.path}")
+            return w3
+
+        w3 = Web3(PooledHTTPProvider(rpc_url, max_attempts=max_attempts, hedge_after=hedge_after))
+        if not w3.provider.check_endpoints():
             logger.error("Failed to connect to RPC endpoint")
             sys.exit(1)
         
-        logger.info(f"Connected to RPC endpoint: {rpc_url}")
+        logger.info(f"Connected to RPC endpoint(s): {rpc_url}")
         return w3
     except Exception as e:
         logger.error(f"Error setting up Web3: {e}")
@@ -238,13 +351,17 @@ def get_silo_liquidity(contract: Any, silo_name: str) -> int:
         logger.warning(f"getLiquidity error for {silo_name}: {e}")
         return 0
 
+def get_resolver(w3: Web3) -> SiloResolver:
+    """Memoized market lookups at BLOCK_NUMBER, shared with every other lookup in the process."""
+    return SiloResolver(w3, SONIC_CHAIN_ID, BLOCK_NUMBER)
+
 def get_silo_asset(contract: Any, silo_name: str) -> str:
     """Get asset address from a Silo contract."""
     try:
-        asset = contract.functions.asset().call(block_identifier=BLOCK_NUMBER)
+        asset = get_resolver(contract.w3).silo_asset(contract.address)
         logger.info(f"{silo_name} asset: {asset}")
         return asset
-    except ContractLogicError as e:
+    except ResolverError as e:
         logger.warning(f"asset() failed for {silo_name}: {e}")
         return ""
     except Exception as e:
@@ -254,10 +371,10 @@ def get_silo_asset(contract: Any, silo_name: str) -> str:
 def get_silo_config(contract: Any, silo_name: str) -> str:
     """Get config address from a Silo contract."""
     try:
-        config = contract.functions.config().call(block_identifier=BLOCK_NUMBER)
+        config = get_resolver(contract.w3).silo_config(contract.address)
         logger.info(f"{silo_name} config: {config}")
         return config
-    except ContractLogicError as e:
+    except ResolverError as e:
         logger.warning(f"config() failed for {silo_name}: {e}")
         return ""
     except Exception as e:
@@ -265,34 +382,10 @@ def get_silo_config(contract: Any, silo_name: str) -> str:
         return ""
 
 def get_silo_config_data(w3: Web3, config_address: str, silo_address: str) -> Dict[str, Any]:
-    """Get config data from SiloConfig contract."""
+    """Get config data from SiloConfig contract, as a dict keyed by the ConfigData field names."""
     try:
-        config_contract = w3.eth.contract(address=config_address, abi=ISILO_CONFIG_ABI)
-        
-        config_data_tuple = config_contract.functions.getConfig(silo_address).call(block_identifier=BLOCK_NUMBER)
-        logger.info(f"Config data for {silo_address}: {config_data_tuple}")
-        
-        # Convert tuple to dictionary using the ConfigData struct field names
-        config_data = {
-            'daoFee': config_data_tuple[0],
-            'deployerFee': config_data_tuple[1],
-            'silo': config_data_tuple[2],
-            'token': config_data_tuple[3],
-            'protectedShareToken': config_data_tuple[4],
-            'collateralShareToken': config_data_tuple[5],
-            'debtShareToken': config_data_tuple[6],
-            'solvencyOracle': config_data_tuple[7],
-            'maxLtvOracle': config_data_tuple[8],
-            'interestRateModel': config_data_tuple[9],
-            'maxLtv': config_data_tuple[10],
-            'lt': config_data_tuple[11],
-            'liquidationTargetLtv': config_data_tuple[12],
-            'liquidationFee': config_data_tuple[13],
-            'flashloanFee': config_data_tuple[14],
-            'hookReceiver': config_data_tuple[15],
-            'callBeforeQuote': config_data_tuple[16]
-        }
-        
+        config_data = get_resolver(w3).config_data(config_address, silo_address)
+        logger.info(f"Config data for {silo_address}: {tuple(config_data.values())}")
         return config_data
     except Exception as e:
         logger.warning(f"getConfig failed for {silo_address}: {e}")
@@ -305,66 +398,109 @@ def get_oracle_price(w3: Web3, oracle_address: str, asset_address: str) -> int:
         return 10**18
     
     try:
-        oracle_contract = w3.eth.contract(address=oracle_address, abi=ISILO_ORACLE_ABI)
-        
         # Get price for 1e18 of asset
-        price = oracle_contract.functions.quote(10**18, asset_address).call(block_identifier=BLOCK_NUMBER)
+        price = get_resolver(w3).quote(oracle_address, asset_address)
         logger.info(f"Oracle price for {asset_address}: {price}")
         return handle_uint256(price)
-    except ContractLogicError as e:
+    except ResolverError as e:
         logger.warning(f"Oracle quote failed for {asset_address}: {e}")
         return 10**18  # Default to 1e18
     except Exception as e:
         logger.warning(f"Oracle quote error for {asset_address}: {e}")
         return 10**18  # Default to 1e18
 
-def fetch_silo_price(w3: Web3, silo_contract: Any, silo_name: str, silo_address: str) -> tuple[str, int]:
-    """Fetch and print price for a single silo."""
+def fetch_silo_price(w3: Web3, silo_contract: Any, silo_name: str, silo_address: str) -> tuple[str, int, Dict[str, Any]]:
+    """Fetch and print price for a single silo. Also returns the silo config data."""
     logger.info(f"=== Fetching {silo_name} Price ===")
     
     # Get asset
     asset = get_silo_asset(silo_contract, silo_name)
     if not asset:
         logger.error(f"Failed to get asset address for {silo_name}")
-        return "", 0
+        return "", 0, {}
     
     # Get config
     config = get_silo_config(silo_contract, silo_name)
     if not config:
         logger.error(f"Failed to get config address for {silo_name}")
-        return "", 0
+        return "", 0, {}
     
     # Get config data
     config_data = get_silo_config_data(w3, config, silo_address)
     if not config_data:
         logger.error(f"Failed to get config data for {silo_name}")
-        return "", 0
+        return "", 0, {}
     
     # Get solvency oracle address
     solvency_oracle = config_data.get('solvencyOracle', '')
     
     # Get price
     price = get_oracle_price(w3, solvency_oracle, asset)
+
+    try:
+        metadata = get_resolver(w3).asset_metadata(asset)
+        logger.info(f"{silo_name} asset {metadata.symbol or asset}, {metadata.decimals} decimals")
+    except Exception as e:
+        logger.warning(f"Asset metadata unavailable for {silo_name}: {e}")
     
     # Print result
     print(f"{silo_name} Asset: {asset}")
     print(f"{silo_name} Price (1e18): {price}")
     
-    return asset, price
+    return asset, price, config_data
 
-def fetch_silo_prices(w3: Web3, silo0_contract: Any, silo1_contract: Any):
-    """Fetch and print prices for both silos."""
+def fetch_silo_prices(w3: Web3, silo0_contract: Any, silo1_contract: Any) -> tuple[Dict[str, Any], Dict[str, Any]]:
+    """Fetch and print prices for both silos. Returns config data of silo0 and silo1."""
     logger.info("=== Fetching Silo Prices ===")
+
+    # config, ConfigData, quotes and asset metadata of both silos in three batched requests;
+    # the per-silo lookups below are then answered from the resolver
+    try:
+        get_resolver(w3).prefetch_market([SILO0_ADDRESS, SILO1_ADDRESS])
+    except Exception as e:
+        logger.warning(f"Market prefetch failed, resolving silos one call at a time: {e}")
     
     # Fetch prices for both silos
-    silo0_asset, silo0_price = fetch_silo_price(w3, silo0_contract, "Silo0", SILO0_ADDRESS)
-    silo1_asset, silo1_price = fetch_silo_price(w3, silo1_contract, "Silo1", SILO1_ADDRESS)
+    silo0_asset, silo0_price, silo0_config_data = fetch_silo_price(w3, silo0_contract, "Silo0", SILO0_ADDRESS)
+    silo1_asset, silo1_price, silo1_config_data = fetch_silo_price(w3, silo1_contract, "Silo1", SILO1_ADDRESS)
     
     print(f"==================\n")
 
-def call_contract_methods(silo0_contract: Any, silo1_contract: Any, silo_lens_contract: Any, user_address: str, w3: Web3) -> Dict[str, Any]:
-    """Call methods for a user address using silo0 for collateral and silo1 for maxRepay."""
-    results = {
+    return silo0_config_data, silo1_config_data
+
+def market_metadata(w3: Web3, config_datas: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Block, silos, assets, prices and ConfigData stored with columnar results, answered by the resolver."""
+    metadata: Dict[str, Any] = {'chain_id': SONIC_CHAIN_ID, 'block_number': BLOCK_NUMBER}
+    resolver = get_resolver(w3)
+
+    for name, silo_address, config_data in zip(('silo0', 'silo1'), (SILO0_ADDRESS, SILO1_ADDRESS), config_datas):
+        metadata[f'{name}_address'] = silo_address
+        if not config_data:
+            continue
+
+        try:
+            asset = resolver.silo_asset(silo_address)
+        except Exception:
+            asset = config_data['token']
+        metadata[f'{name}_asset'] = asset
+        metadata[f'{name}_price'] = get_oracle_price(w3, config_data.get('solvencyOracle', ''), asset)
+        metadata[f'{name}_config'] = config_data
+
+    return metadata
+
+def get_share_tokens(config_datas: List[Dict[str, Any]]) -> List[str]:
+    """Collateral, protected and debt share tokens of the silos, empty if any config data is missing."""
+    share_tokens = []
+    for config_data in config_datas:
+        if not config_data:
+            return []
+        share_tokens += [config_data['collateralShareToken'], config_data['protectedShareToken'], config_data['debtShareToken']]
+
+    return share_tokens
+
+def new_user_result(user_address: str) -> Dict[str, Any]:
+    """Result row for a user with all values defaulted to 0."""
+    return {
         'user_address': user_address,
         'total_underlying_collateral': 0,
         'maxWithdraw_collateral': 0,
@@ -374,126 +510,531 @@ def call_contract_methods(silo0_contract: Any, silo1_contract: Any, silo_lens_co
         'silo0_maxRepay': 0,
         'user_ltv': 0
     }
-    
-    try:
-        # Call SiloLens collateralBalanceOfUnderlying (silo0)
-        try:
-            total_collateral = silo_lens_contract.functions.collateralBalanceOfUnderlying(
-                silo0_contract.address, 
-                user_address
-            ).call(block_identifier=BLOCK_NUMBER)
-            results['total_underlying_collateral'] = handle_uint256(total_collateral)
-        except ContractLogicError as e:
-            logger.warning(f"collateralBalanceOfUnderlying failed for {user_address}: {e}")
-        except Exception as e:
-            logger.warning(f"collateralBalanceOfUnderlying error for {user_address}: {e}")
-        
-        # Call maxWithdraw for Collateral type (silo0)
-        try:
-            max_withdraw_collateral = silo0_contract.functions.maxWithdraw(
-                user_address
-            ).call(block_identifier=BLOCK_NUMBER)
-            results['maxWithdraw_collateral'] = handle_uint256(max_withdraw_collateral)
-        except ContractLogicError as e:
-            logger.warning(f"maxWithdraw (Collateral) failed for {user_address}: {e}")
-        except Exception as e:
-            logger.warning(f"maxWithdraw (Collateral) error for {user_address}: {e}")
-        
 
-        
-        # Call getUserLTV (silo1)
-        try:
-            user_ltv = silo_lens_contract.functions.getUserLTV(silo1_contract.address, user_address).call(block_identifier=BLOCK_NUMBER)
-            results['user_ltv'] = handle_uint256(user_ltv)
-        except ContractLogicError as e:
-            logger.warning(f"getUserLTV failed for {user_address}: {e}")
-        except Exception as e:
-            logger.warning(f"getUserLTV error for {user_address}: {e}")
-        
-        # Call maxRepay (silo1)
+def call_contract_methods(silo0_contract: Any, silo1_contract: Any, silo_lens_contract: Any, user_address: str, w3: Web3) -> Dict[str, Any]:
+    """Call methods for a user address using silo0 for collateral and silo1 for maxRepay.
+
+    Each call is a plain eth_call with calldata and result handled by the precompiled codec.
+    """
+    results = new_user_result(user_address)
+    plan = build_user_calls(silo0_contract.address, silo1_contract.address, silo_lens_contract.address, user_address)
+
+    for field, label, call in plan:
         try:
-            max_repay = silo1_contract.functions.maxRepay(user_address).call(block_identifier=BLOCK_NUMBER)
-            results['maxRepay'] = handle_uint256(max_repay)
-        except ContractLogicError as e:
-            logger.warning(f"maxRepay failed for {user_address}: {e}")
+            call_result = execute_call(w3, call, BLOCK_NUMBER)
+        except RpcPoolError:
+            raise
         except Exception as e:
-            logger.warning(f"maxRepay error for {user_address}: {e}")
-        
-        # Call SiloLens collateralBalanceOfUnderlying (silo1)
+            sampled.warning("call_error", call=label, user=user_address, error=e)
+            continue
+
+        if call_result.success:
+            results[field] = handle_uint256(call_result.value)
+        else:
+            sampled.warning("call_failed", call=label, user=user_address, error=call_result.error)
+
+    sampled.info("user_processed", user=user_address)
+    return results
+
+def build_balance_calls(share_tokens: List[str], user_addresses: List[str]) -> List[Call]:
+    """balanceOf of every share token for every user, share tokens of a user next to each other."""
+    return [Call(token, 'balanceOf(address)', (user_address,)) for user_address in user_addresses for token in share_tokens]
+
+def select_active_users(share_tokens: List[str], user_addresses: List[str], call_results: List[CallResult]) -> List[str]:
+    """Users holding any share token. A failed balanceOf counts as a position, to be safe."""
+    active = []
+    for index, user_address in enumerate(user_addresses):
+        balances = call_results[index * len(share_tokens):(index + 1) * len(share_tokens)]
+        if any(not result.success or result.value != 0 for result in balances):
+            active.append(user_address)
+
+    logger.info(f"Prefilter: {len(user_addresses) - len(active)} of {len(user_addresses)} users have no position")
+    return active
+
+def apply_users_health(results: List[Dict[str, Any]], healths: List[Any]) -> List[Dict[str, Any]]:
+    """Fill `user_ltv` of result rows from getUsersHealth. Returns the rows of borrowers it failed for."""
+    missing = []
+    for result, health in zip(results, healths):
+        if health is None:
+            missing.append(result)
+        else:
+            result['user_ltv'] = handle_uint256(health.ltv)
+
+    return missing
+
+def build_ltv_calls(silo1_address: str, silo_lens_address: str, results: List[Dict[str, Any]]) -> List[Call]:
+    """Per-user getUserLTV calls for result rows getUsersHealth failed for."""
+    return [
+        Call(silo_lens_address, 'getUserLTV(address,address)', (silo1_address, result['user_address']))
+        for result in results
+    ]
+
+def apply_ltv_results(results: List[Dict[str, Any]], call_results: List[CallResult]):
+    """Fill `user_ltv` of result rows from per-user getUserLTV results."""
+    for result, call_result in zip(results, call_results):
+        if call_result.success:
+            result['user_ltv'] = handle_uint256(call_result.value)
+        else:
+            sampled.warning("call_failed", call='getUserLTV', user=result['user_address'], error=call_result.error)
+
+def merge_chunk_results(user_addresses: List[str], active_results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Rows for a whole chunk in input order, zero rows for users skipped by the prefilter."""
+    by_address = {result['user_address']: result for result in active_results}
+    return [by_address.get(user_address) or new_user_result(user_address) for user_address in user_addresses]
+
+def build_user_calls(
+    silo0_address: str,
+    silo1_address: str,
+    silo_lens_address: str,
+    user_address: str,
+    include_ltv: bool = True
+) -> List[Tuple[str, str, Call]]:
+    """Calls made for a user as (result field, log label, call), same set as call_contract_methods.
+
+    Without `include_ltv` getUserLTV is left out, for callers reading LTV through getUsersHealth.
+    """
+    calls = [
+        ('total_underlying_collateral', 'collateralBalanceOfUnderlying',
+            Call(silo_lens_address, 'collateralBalanceOfUnderlying(address,address)', (silo0_address, user_address))),
+        ('maxWithdraw_collateral', 'maxWithdraw (Collateral)',
+            Call(silo0_address, 'maxWithdraw(address)', (user_address,))),
+        ('user_ltv', 'getUserLTV',
+            Call(silo_lens_address, 'getUserLTV(address,address)', (silo1_address, user_address))),
+        ('maxRepay', 'maxRepay',
+            Call(silo1_address, 'maxRepay(address)', (user_address,))),
+        ('silo1_total_collateral', 'silo1 collateralBalanceOfUnderlying',
+            Call(silo_lens_address, 'collateralBalanceOfUnderlying(address,address)', (silo1_address, user_address))),
+        ('silo1_max_withdraw', 'silo1 maxWithdraw',
+            Call(silo1_address, 'maxWithdraw(address)', (user_address,))),
+        ('silo0_maxRepay', 'silo0 maxRepay',
+            Call(silo0_address, 'maxRepay(address)', (user_address,))),
+    ]
+
+    return calls if include_ltv else [call for call in calls if call[0] != 'user_ltv']
+
+def build_batch_calls(
+    silo0_address: str,
+    silo1_address: str,
+    silo_lens_address: str,
+    user_addresses: List[str],
+    include_ltv: bool = True
+) -> Tuple[List[List[Tuple[str, str, Call]]], List[Call]]:
+    """Per-user call plans for a batch and the flat list of calls to send in one aggregate3."""
+    plans = [
+        build_user_calls(silo0_address, silo1_address, silo_lens_address, user_address, include_ltv)
+        for user_address in user_addresses
+    ]
+    calls = [call for plan in plans for _, _, call in plan]
+    return plans, calls
+
+def build_batch_results(
+    user_addresses: List[str],
+    plans: List[List[Tuple[str, str, Call]]],
+    call_results: List[CallResult]
+) -> List[Dict[str, Any]]:
+    """Map aggregate3 results back to per-user result rows, logging failures per user."""
+    results = [new_user_result(user_address) for user_address in user_addresses]
+    call_index = 0
+    for result, plan in zip(results, plans):
+        for field, label, _ in plan:
+            call_result = call_results[call_index]
+            call_index += 1
+
+            if call_result.success:
+                result[field] = handle_uint256(call_result.value)
+            else:
+                sampled.warning("call_failed", call=label, user=result['user_address'], error=call_result.error)
+
+    return results
+
+def collect_users_batch(
+    w3: Web3,
+    silo0_address: str,
+    silo1_address: str,
+    silo_lens_address: str,
+    user_addresses: List[str],
+    block_number: int = BLOCK_NUMBER,
+    include_ltv: bool = True
+) -> List[Dict[str, Any]]:
+    """Collect results for a batch of users with a single aggregate3 call. RPC failures are raised."""
+    plans, calls = build_batch_calls(silo0_address, silo1_address, silo_lens_address, user_addresses, include_ltv)
+    call_results = execute_aggregate3(w3, calls, block_number)
+    return build_batch_results(user_addresses, plans, call_results)
+
+async def collect_users_batch_async(
+    client: AsyncRpcClient,
+    silo0_address: str,
+    silo1_address: str,
+    silo_lens_address: str,
+    user_addresses: List[str],
+    block_number: int = BLOCK_NUMBER,
+    include_ltv: bool = True
+) -> List[Dict[str, Any]]:
+    """Async variant of collect_users_batch."""
+    plans, calls = build_batch_calls(silo0_address, silo1_address, silo_lens_address, user_addresses, include_ltv)
+    call_results = await execute_aggregate3_async(client, calls, block_number)
+    return build_batch_results(user_addresses, plans, call_results)
+
+def iter_batches(addresses: Iterable[str], batch_size: int) -> Iterator[List[str]]:
+    """Split addresses into lists of at most `batch_size`, without materializing the input."""
+    if batch_size < 1:
+        raise ValueError("batch_size must be at least 1")
+
+    iterator = iter(addresses)
+    while True:
+        batch = list(itertools.islice(iterator, batch_size))
+        if not batch:
+            return
+        yield batch
+
+def collect_users_sequential(
+    silo0_contract: Any,
+    silo1_contract: Any,
+    silo_lens_contract: Any,
+    user_addresses: Iterable[str],
+    w3: Web3,
+    on_rows: Callable[[List[Dict[str, Any]]], None]
+) -> int:
+    """Collect results one user at a time, handing each row to `on_rows`. Returns the number of users."""
+    processed = 0
+    for address in user_addresses:
+        processed += 1
+        on_rows([call_contract_methods(silo0_contract, silo1_contract, silo_lens_contract, address, w3)])
+
+    return processed
+
+def collect_users_chunk(
+    w3: Web3,
+    silo0_address: str,
+    silo1_address: str,
+    silo_lens_address: str,
+    user_addresses: List[str],
+    batch_size: int,
+    share_tokens: List[str],
+    block_number: int = BLOCK_NUMBER,
+    lens_batcher: LensBatcher = None,
+    health_lens_address: str = None
+) -> List[Dict[str, Any]]:
+    """Prefilter a chunk on share token balances, then collect users with a position `batch_size` per call.
+
+    With `lens_batcher`, LTV of the chunk comes from getUsersHealth of `health_lens_address`
+    (default `silo_lens_address`) instead of per-user getUserLTV.
+    """
+    active = user_addresses
+    if share_tokens:
         try:
-            silo1_total_collateral = silo_lens_contract.functions.collateralBalanceOfUnderlying(
-                silo1_contract.address, 
-                user_address
-            ).call(block_identifier=BLOCK_NUMBER)
-            results['silo1_total_collateral'] = handle_uint256(silo1_total_collateral)
-        except ContractLogicError as e:
-            logger.warning(f"silo1 collateralBalanceOfUnderlying failed for {user_address}: {e}")
+            balance_results = execute_aggregate3(w3, build_balance_calls(share_tokens, user_addresses), block_number)
+            active = select_active_users(share_tokens, user_addresses, balance_results)
+        except RpcPoolError:
+            raise
         except Exception as e:
-            logger.warning(f"silo1 collateralBalanceOfUnderlying error for {user_address}: {e}")
-        
-        # Call maxWithdraw for Collateral type (silo1)
+            logger.warning(f"Balance prefilter failed, querying all {len(user_addresses)} users: {e}")
+
+    active_results = []
+    for batch in iter_batches(active, batch_size):
+        active_results += collect_users_batch(
+            w3, silo0_address, silo1_address, silo_lens_address, batch, block_number, lens_batcher is None
+        )
+
+    if lens_batcher is not None:
+        healths = lens_batcher.users_health(
+            w3, health_lens_address or silo_lens_address, [(silo1_address, user) for user in active], block_number
+        )
+        missing = apply_users_health(active_results, healths)
+        if missing:
+            # borrowers failing getUsersHealth even alone get the per-user call
+            apply_ltv_results(missing, execute_aggregate3(w3, build_ltv_calls(silo1_address, silo_lens_address, missing), block_number))
+
+    return merge_chunk_results(user_addresses, active_results)
+
+async def collect_users_chunk_async(
+    client: AsyncRpcClient,
+    silo0_address: str,
+    silo1_address: str,
+    silo_lens_address: str,
+    user_addresses: List[str],
+    batch_size: int,
+    share_tokens: List[str],
+    block_number: int = BLOCK_NUMBER,
+    lens_batcher: LensBatcher = None,
+    health_lens_address: str = None
+) -> List[Dict[str, Any]]:
+    """Async variant of collect_users_chunk, batches of a chunk run concurrently."""
+    active = user_addresses
+    if share_tokens:
         try:
-            silo1_max_withdraw = silo1_contract.functions.maxWithdraw(user_address).call(block_identifier=BLOCK_NUMBER)
-            results['silo1_max_withdraw'] = handle_uint256(silo1_max_withdraw)
-        except ContractLogicError as e:
-            logger.warning(f"silo1 maxWithdraw failed for {user_address}: {e}")
+            balance_results = await execute_aggregate3_async(
+                client, build_balance_calls(share_tokens, user_addresses), block_number
+            )
+            active = select_active_users(share_tokens, user_addresses, balance_results)
+        except RpcPoolError:
+            raise
         except Exception as e:
-            logger.warning(f"silo1 maxWithdraw error for {user_address}: {e}")
-        
-        # Call maxRepay (silo0)
+            logger.warning(f"Balance prefilter failed, querying all {len(user_addresses)} users: {e}")
+
+    borrowers = [(silo1_address, user) for user in active]
+    batch_results, healths = await asyncio.gather(
+        asyncio.gather(*(
+            collect_users_batch_async(
+                client, silo0_address, silo1_address, silo_lens_address, batch, block_number, lens_batcher is None
+            )
+            for batch in iter_batches(active, batch_size)
+        )),
+        lens_batcher.users_health_async(client, health_lens_address or silo_lens_address, borrowers, block_number)
+        if lens_batcher else asyncio.sleep(0)
+    )
+    active_results = [result for batch in batch_results for result in batch]
+
+    if lens_batcher is not None:
+        missing = apply_users_health(active_results, healths)
+        if missing:
+            call_results = await execute_aggregate3_async(
+                client, build_ltv_calls(silo1_address, silo_lens_address, missing), block_number
+            )
+            apply_ltv_results(missing, call_results)
+
+    return merge_chunk_results(user_addresses, active_results)
+
+def collect_users_multicall(
+    w3: Web3,
+    silo0_address: str,
+    silo1_address: str,
+    silo_lens_address: str,
+    user_addresses: Iterable[str],
+    on_rows: Callable[[List[Dict[str, Any]]], None],
+    batch_size: int = DEFAULT_USERS_PER_BATCH,
+    block_number: int = BLOCK_NUMBER,
+    share_tokens: List[str] = None,
+    prefilter_batch_size: int = DEFAULT_PREFILTER_BATCH_SIZE,
+    lens_batcher: LensBatcher = None,
+    health_lens_address: str = None
+) -> int:
+    """Collect results `batch_size` users per aggregate3 call, handing rows to `on_rows`.
+
+    With `share_tokens`, users are first checked `prefilter_batch_size` at a time for any share token
+    balance and users without a position get zero rows without further calls.
+    """
+    processed = 0
+    chunk_size = prefilter_batch_size if share_tokens else batch_size
+    for chunk in iter_batches(user_addresses, chunk_size):
+        on_rows(collect_users_chunk(
+            w3, silo0_address, silo1_address, silo_lens_address, chunk, batch_size, share_tokens, block_number,
+            lens_batcher, health_lens_address
+        ))
+        processed += len(chunk)
+        sampled.info("users_processed", total=processed)
+
+    return processed
+
+async def collect_users_async(
+    rpc_url: str,
+    silo0_address: str,
+    silo1_address: str,
+    silo_lens_address: str,
+    user_addresses: Iterable[str],
+    on_rows: Callable[[List[Dict[str, Any]]], None],
+    batch_size: int = DEFAULT_USERS_PER_BATCH,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+    block_number: int = BLOCK_NUMBER,
+    cache: RpcCache = None,
+    share_tokens: List[str] = None,
+    prefilter_batch_size: int = DEFAULT_PREFILTER_BATCH_SIZE,
+    lens_batcher: LensBatcher = None,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    hedge_after: float = None,
+    health_lens_address: str = None
+) -> int:
+    """Collect results with concurrent aggregate3 calls. Chunks reach `on_rows` in input order."""
+    scheduler = RequestScheduler(concurrency, requests_per_second)
+    chunks = iter_batches(user_addresses, prefilter_batch_size if share_tokens else batch_size)
+    # keep a bounded window of batches in flight, so memory does not grow with the input
+    max_pending = concurrency * 2
+    pending = collections.deque()
+    processed = 0
+
+    async with AsyncRpcClient(
+        rpc_url, scheduler, cache=cache, chain_id=SONIC_CHAIN_ID, max_attempts=max_attempts, hedge_after=hedge_after
+    ) as client:
+        def schedule_next():
+            chunk = next(chunks, None)
+            if chunk is not None:
+                pending.append((len(chunk), asyncio.create_task(collect_users_chunk_async(
+                    client, silo0_address, silo1_address, silo_lens_address, chunk, batch_size, share_tokens, block_number,
+                    lens_batcher, health_lens_address
+                ))))
+
+        for _ in range(max_pending):
+            schedule_next()
+
         try:
-            silo0_max_repay = silo0_contract.functions.maxRepay(user_address).call(block_identifier=BLOCK_NUMBER)
-            results['silo0_maxRepay'] = handle_uint256(silo0_max_repay)
-        except ContractLogicError as e:
-            logger.warning(f"silo0 maxRepay failed for {user_address}: {e}")
-        except Exception as e:
-            logger.warning(f"silo0 maxRepay error for {user_address}: {e}")
-        
-        logger.info(f"Processed user: {user_address}")
-        return results
-    
-    except Exception as e:
-        logger.error(f"Error processing user {user_address}: {e}")
-        return results
+            while pending:
+                chunk_length, task = pending.popleft()
+                on_rows(await task)
+                processed += chunk_length
+                sampled.info("users_processed", total=processed)
+                schedule_next()
+        finally:
+            # a failed chunk stops the run, chunks after it are not written
+            for _, task in pending:
+                task.cancel()
+
+    return processed
+
+async def collect_users_local_evm(
+    rpc_url: str,
+    silo0_address: str,
+    silo1_address: str,
+    silo_lens_address: str,
+    user_addresses: Iterable[str],
+    on_rows: Callable[[List[Dict[str, Any]]], None],
+    workers: int = None,
+    snapshot_path: str = None,
+    batch_size: int = DEFAULT_USERS_PER_BATCH,
+    concurrency: int = DEFAULT_CONCURRENCY,
+    requests_per_second: float = DEFAULT_REQUESTS_PER_SECOND,
+    block_number: int = BLOCK_NUMBER,
+    cache: RpcCache = None,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS,
+    hedge_after: float = None
+) -> int:
+    """Collect results by running the user calls on a local EVM over a state snapshot at `block_number`.
 
-def save_to_csv(results: List[Dict[str, Any]], output_file: str, silo0_liquidity: int, silo1_liquidity: int):
-    """Save results to CSV file."""
+    Users whose calls miss state are traced with prestateTracer, one aggregate3 of `batch_size`
+    users per trace, in every chunk. State still missing after that, or all missing state when
+    the node has no debug_traceCall, is fetched slot by slot with `concurrency` requests in flight.
+    """
+    # py-evm is only needed in this mode
     try:
-        with open(output_file, 'w', newline='', encoding='utf-8') as csvfile:
-            fieldnames = ['user_address', 'total_underlying_collateral', 'maxWithdraw_collateral', 'maxRepay', 'silo1_total_collateral', 'silo1_max_withdraw', 'silo0_maxRepay', 'user_ltv']
-            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-            
-            writer.writeheader()
-            
-            # Write liquidity info as first row
-            liquidity_row = {
-                'user_address': f'silo0_liquidity:{silo0_liquidity},silo1_liquidity:{silo1_liquidity}',
-                'total_underlying_collateral': '',
-                'maxWithdraw_collateral': '',
-                'maxRepay': '',
-                'silo1_total_collateral': '',
-                'silo1_max_withdraw': '',
-                'silo0_maxRepay': '',
-                'user_ltv': ''
-            }
-            writer.writerow(liquidity_row)
-            
-            for result in results:
-                writer.writerow(result)
-        
-        logger.info(f"Results saved to: {output_file}")
-    except Exception as e:
-        logger.error(f"Error saving to CSV: {e}")
-        sys.exit(1)
+        from silo_local_evm import (
+            StateSnapshot, default_snapshot_path, execute_calls, fetch_header, fetch_prestate, is_trace_unavailable,
+            local_executor
+        )
+    except ImportError as e:
+        raise RuntimeError(f"--mode local-evm needs py-evm, install it with: pip install 'py-evm>=0.10.1b1' ({e})")
+
+    snapshot = StateSnapshot(snapshot_path or default_snapshot_path(SONIC_CHAIN_ID, block_number), SONIC_CHAIN_ID, block_number)
+    accounts, slots = snapshot.counts()
+    logger.info(f"State snapshot {snapshot.path}: {accounts} accounts, {slots} storage slots")
+
+    scheduler = RequestScheduler(concurrency, requests_per_second)
+    trace_available = True
+    processed = 0
+
+    async with AsyncRpcClient(
+        rpc_url, scheduler, cache=cache, chain_id=SONIC_CHAIN_ID, max_attempts=max_attempts, hedge_after=hedge_after
+    ) as client:
+        await fetch_header(client, snapshot)
+
+        with local_executor(snapshot.path, workers) as executor:
+            for chunk in iter_batches(user_addresses, DEFAULT_LOCAL_CHUNK_SIZE):
+                plans, calls = build_batch_calls(silo0_address, silo1_address, silo_lens_address, chunk)
+                # index of the first call of every user, and the end of the last one
+                starts = list(itertools.accumulate((len(plan) for plan in plans), initial=0))
+
+                async def trace_missed(missed: List[int]):
+                    nonlocal trace_available
+                    users = sorted({bisect.bisect_right(starts, index) - 1 for index in missed})
+                    batches = [users[start:start + batch_size] for start in range(0, len(users), batch_size)]
+                    outcomes = await asyncio.gather(*(
+                        fetch_prestate(client, snapshot, MULTICALL3_ADDRESS, encode_aggregate3(
+                            [call for user in batch for _, _, call in plans[user]]
+                        )) for batch in batches
+                    ), return_exceptions=True)
+
+                    errors = [outcome for outcome in outcomes if isinstance(outcome, Exception)]
+                    slots = sum(outcome for outcome in outcomes if not isinstance(outcome, Exception))
+                    logger.debug(f"Loaded {slots} storage slots from {len(batches) - len(errors)} prestate traces")
+
+                    if any(is_trace_unavailable(error) for error in errors):
+                        trace_available = False
+                        logger.warning(f"Prestate trace unavailable, discovering state slot by slot: {errors[0]}")
+                    elif errors:
+                        logger.warning(f"{len(errors)} of {len(batches)} prestate traces failed, "
+                                       f"fetching their state slot by slot: {errors[0]}")
+
+                call_results = await execute_calls(
+                    client, executor, snapshot, calls, prestate=trace_missed if trace_available else None
+                )
+                on_rows(build_batch_results(chunk, plans, call_results))
+                processed += len(chunk)
+                sampled.info("users_processed", total=processed)
+
+    accounts, slots = snapshot.counts()
+    logger.info(f"State snapshot now holds {accounts} accounts, {slots} storage slots")
+    snapshot.close()
+    return processed
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Collect Silo user state into a CSV or Parquet file")
+    parser.add_argument('--input', default=None, metavar='PATH',
+                        help=f"user addresses as a JSON array, one per line or CSV (default {get_file_names()[0]})")
+    parser.add_argument('--mode', choices=['multicall', 'async', 'sequential', 'local-evm'], default='multicall',
+                        help="multicall: batch user calls with Multicall3 aggregate3, "
+                             "async: concurrent aggregate3 requests, sequential: one eth_call per method, "
+                             "local-evm: run the calls on an in-process EVM over a state snapshot")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_USERS_PER_BATCH,
+                        help=f"users per aggregate3 request, and users per local-evm prestate trace (default {DEFAULT_USERS_PER_BATCH})")
+    parser.add_argument('--no-prefilter', action='store_true',
+                        help="skip the share token balance check and run all calls for every user")
+    parser.add_argument('--prefilter-batch-size', type=int, default=DEFAULT_PREFILTER_BATCH_SIZE,
+                        help=f"users per balanceOf prefilter request (default {DEFAULT_PREFILTER_BATCH_SIZE})")
+    parser.add_argument('--lens-batch', action='store_true',
+                        help="read LTV with SiloLens getUsersHealth for whole chunks instead of per-user getUserLTV")
+    parser.add_argument('--lens-chunk-size', type=int, default=DEFAULT_LENS_CHUNK_SIZE,
+                        help=f"borrowers per getUsersHealth call, halved on failure (default {DEFAULT_LENS_CHUNK_SIZE})")
+    parser.add_argument('--lens-address', default=DEPLOYED_SILO_LENS_ADDRESS,
+                        help=f"SiloLens for getUsersHealth and getAPRs with --lens-batch (default {DEPLOYED_SILO_LENS_ADDRESS})")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"max in-flight requests in async and local-evm modes (default {DEFAULT_CONCURRENCY})")
+    parser.add_argument('--rps', type=float, default=DEFAULT_REQUESTS_PER_SECOND,
+                        help=f"max requests per second in async and local-evm modes, 0 for no limit (default {DEFAULT_REQUESTS_PER_SECOND:g})")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes in local-evm mode (default: number of CPUs)")
+    parser.add_argument('--state-snapshot', default=None, metavar='PATH',
+                        help="state snapshot file in local-evm mode (default: per block in ~/.cache/silo-scripts)")
+    parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help=f"attempts per RPC request across endpoints before giving up (default {DEFAULT_MAX_ATTEMPTS})")
+    parser.add_argument('--hedge-after', type=float, default=None, metavar='SECONDS',
+                        help="send a request to a second endpoint when the first has not answered in time")
+    parser.add_argument('--cache', nargs='?', const=DEFAULT_CACHE_PATH, default=None, metavar='PATH',
+                        help=f"cache block-pinned RPC responses in SQLite (default path {DEFAULT_CACHE_PATH})")
+    parser.add_argument('--cache-max-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="evict least recently used cache entries above this size")
+    parser.add_argument('--output-format', choices=['csv', 'parquet'], default='csv',
+                        help="csv: decimal strings with a liquidity row, parquet: columnar file with market metadata")
+    parser.add_argument('--row-group-size', type=int, default=DEFAULT_ROW_GROUP_SIZE,
+                        help=f"users per Parquet row group, and users a crash can lose (default {DEFAULT_ROW_GROUP_SIZE})")
+    parser.add_argument('--resume', action='store_true',
+                        help="continue an interrupted run from its checkpoint instead of starting over")
+    parser.add_argument('--checkpoint', default=None, metavar='PATH',
+                        help="checkpoint file, for Parquet output a directory of finished row groups (default: <output file>.checkpoint)")
+    parser.add_argument('--log-every', type=int, default=DEFAULT_LOG_SAMPLE_EVERY, metavar='N',
+                        help="log every N-th per-user event (default %(default)s, 1 logs all)")
+    add_metrics_arguments(parser)
+    return parser.parse_args()
 
 def main():
     """Main function."""
+    args = parse_args()
+    sampled.every = max(args.log_every, 1)
+    start_metrics_reporting(args.metrics, args.metrics_format, args.metrics_interval)
+
     logger.info("Starting Silo Data Collection")
     logger.info(f"Silo0 address: {SILO0_ADDRESS}")
     logger.info(f"Silo1 address: {SILO1_ADDRESS}")
     
     # Generate file names
     input_file, output_file = get_file_names()
+    input_file = args.input or input_file
+    if args.output_format == 'parquet':
+        try:
+            require_pyarrow()
+        except RuntimeError as e:
+            logger.error(str(e))
+            sys.exit(1)
+        output_file = os.path.splitext(output_file)[0] + '.parquet'
     
     logger.info(f"Input file: {input_file}")
     logger.info(f"Output file: {output_file}")
@@ -508,15 +1049,17 @@ def main():
     silo_lens_abi_file_path = "../../deployments/sonic/SiloLens.sol.json"
     silo_lens_abi = load_abi_from_file(silo_lens_abi_file_path)
     logger.info(f"Loaded SiloLens ABI from: {silo_lens_abi_file_path}")
+
+    # Contract calls show up in the metrics by function signature
+    for contract_abi in (abi, silo_lens_abi, ISILO_CONFIG_ABI, ISILO_ORACLE_ABI):
+        METRICS.register_abi(contract_abi)
     
-    # Load addresses
-    addresses = load_addresses_from_json(input_file)
-    if not addresses:
-        logger.error("No valid addresses found")
-        sys.exit(1)
+    # Stream addresses, they are read as collection proceeds
+    addresses = iter_input_addresses(input_file)
     
     # Setup Web3 and contracts
-    w3 = setup_web3()
+    cache = RpcCache(args.cache, args.cache_max_mb * 1024 * 1024) if args.cache else None
+    w3 = setup_web3(cache, args.max_attempts, args.hedge_after)
     silo0_contract = get_silo_contract(w3, SILO0_ADDRESS, abi)
     silo1_contract = get_silo_contract(w3, SILO1_ADDRESS, abi)
     silo_lens_contract = get_silo_lens_contract(w3, silo_lens_abi)
@@ -526,17 +1069,119 @@ def main():
     silo1_liquidity = get_silo_liquidity(silo1_contract, "Silo1")
     
     # Fetch and print prices for both silos
-    fetch_silo_prices(w3, silo0_contract, silo1_contract)
+    silo0_config_data, silo1_config_data = fetch_silo_prices(w3, silo0_contract, silo1_contract)
+
+    # Share tokens for the zero balance prefilter
+    share_tokens = []
+    if args.mode in ('multicall', 'async') and not args.no_prefilter:
+        share_tokens = get_share_tokens([silo0_config_data, silo1_config_data])
+        if not share_tokens:
+            logger.warning("Share tokens unknown, prefilter disabled")
+    
+    # Batched lens health reads, with silo APRs from the same lens
+    lens_batcher = None
+    health_lens_address = None
+    if args.lens_batch and args.mode not in ('multicall', 'async'):
+        logger.warning(f"--lens-batch has no effect in {args.mode} mode")
+    elif args.lens_batch:
+        try:
+            health_lens_address = Web3.to_checksum_address(args.lens_address)
+        except ValueError as e:
+            logger.error(f"Invalid --lens-address: {e}")
+            sys.exit(1)
+
+        try:
+            lens_deployed = len(w3.eth.get_code(health_lens_address, BLOCK_NUMBER)) > 0
+            lens_supported = lens_deployed and supports_users_health(
+                w3, health_lens_address, silo1_contract.address, BLOCK_NUMBER
+            )
+        except RpcPoolError as e:
+            logger.error(f"Cannot reach the RPC to probe SiloLens: {e}")
+            sys.exit(1)
+
+        if not lens_deployed:
+            logger.warning(f"SiloLens {health_lens_address} has no code at block {BLOCK_NUMBER}, falling back to getUserLTV")
+        elif not lens_supported:
+            logger.warning(f"SiloLens {health_lens_address} has no getUsersHealth, falling back to getUserLTV")
+        else:
+            lens_batcher = LensBatcher(args.lens_chunk_size)
+            try:
+                aprs = fetch_aprs(w3, health_lens_address, [silo0_contract.address, silo1_contract.address], BLOCK_NUMBER)
+                for name, apr in zip(("Silo0", "Silo1"), aprs):
+                    print(f"{name} APR (1e18): deposit {apr.deposit_apr}, borrow {apr.borrow_apr}")
+            except Exception as e:
+                logger.warning(f"getAPRs failed: {e}")
     
-    # Process each address
-    results = []
-    for i, address in enumerate(addresses, 1):
-        logger.info(f"Processing {i}/{len(addresses)}: {address}")
-        result = call_contract_methods(silo0_contract, silo1_contract, silo_lens_contract, address, w3)
-        results.append(result)
+    # Open output, skipping users already processed by an interrupted run
+    if args.output_format == 'parquet':
+        writer = ParquetResultWriter(
+            output_file, market_metadata(w3, [silo0_config_data, silo1_config_data]), args.row_group_size, args.checkpoint
+        )
+    else:
+        writer = CsvResultWriter(output_file, args.checkpoint)
+    if args.resume and writer.can_resume():
+        try:
+            writer.resume()
+            pending = skip_processed(addresses, writer.processed_addresses())
+        except ValueError as e:
+            logger.error(f"Cannot resume: {e}")
+            sys.exit(1)
+    else:
+        if args.resume:
+            logger.warning(f"No checkpoint found at {writer.checkpoint_file}, starting from scratch")
+        writer.start(silo0_liquidity, silo1_liquidity)
+        pending = iter(addresses)
+    
+    # Process each address. RPC failures stop the run instead of writing zero rows;
+    # the checkpoint lets it continue with --resume
+    try:
+        if args.mode == 'multicall':
+            logger.info(f"Collecting users with Multicall3, {args.batch_size} users per request")
+            collect_users_multicall(
+                w3, silo0_contract.address, silo1_contract.address, silo_lens_contract.address, pending,
+                writer.write_rows, args.batch_size, share_tokens=share_tokens, prefilter_batch_size=args.prefilter_batch_size,
+                lens_batcher=lens_batcher, health_lens_address=health_lens_address
+            )
+        elif args.mode == 'async':
+            logger.info(
+                f"Collecting users asynchronously, {args.batch_size} users per request, "
+                f"{args.concurrency} in flight, {args.rps:g} requests/s"
+            )
+            asyncio.run(collect_users_async(
+                get_rpc_url(), silo0_contract.address, silo1_contract.address, silo_lens_contract.address, pending,
+                writer.write_rows, args.batch_size, args.concurrency, args.rps, cache=cache,
+                share_tokens=share_tokens, prefilter_batch_size=args.prefilter_batch_size, lens_batcher=lens_batcher,
+                max_attempts=args.max_attempts, hedge_after=args.hedge_after, health_lens_address=health_lens_address
+            ))
+        elif args.mode == 'local-evm':
+            logger.info(f"Collecting users on a local EVM, {args.workers or os.cpu_count()} workers")
+            asyncio.run(collect_users_local_evm(
+                get_rpc_url(), silo0_contract.address, silo1_contract.address, silo_lens_contract.address, pending,
+                writer.write_rows, args.workers, args.state_snapshot, args.batch_size, args.concurrency, args.rps,
+                cache=cache, max_attempts=args.max_attempts, hedge_after=args.hedge_after
+            ))
+        else:
+            collect_users_sequential(silo0_contract, silo1_contract, silo_lens_contract, pending, w3, writer.write_rows)
+    except Exception as e:
+        writer.close(completed=False)
+        if cache is not None:
+            cache.close()
+        logger.error(f"Collection stopped after {writer.rows_written} users: {e}")
+        logger.error("Rerun with --resume to continue from the checkpoint")
+        sys.exit(1)
     
-    # Save results
-    save_to_csv(results, output_file, silo0_liquidity, silo1_liquidity)
+    writer.close()
+    sampled.summary()
+
+    if isinstance(w3.provider, PooledHTTPProvider):
+        w3.provider.pool.log_summary()
+
+    if lens_batcher is not None:
+        logger.info(f"getUsersHealth: {lens_batcher.calls} calls, {lens_batcher.splits} split chunks, "
+                    f"final chunk size {lens_batcher.chunk_size}")
+
+    if cache is not None:
+        cache.close()
     
     logger.info("Data collection completed successfully!")
 
@@ -0,0 +1,530 @@
+#!/usr/bin/env python3
+"""
+Sharded Silo Data Collection
+
+Splits the collector's users x markets workload into shards kept in a SQLite work queue,
+runs them on a local process pool or on several machines pulling from the same queue, and
+merges the shard results into the collector's output in input order, without duplicates.
+
+The queue file holds everything a worker needs: the input addresses (deduplicated), the
+markets with their liquidity at BLOCK_NUMBER and, per shard, its state, lease and attempts.
+A worker leases the first pending shard, or one whose lease expired, or a failed one with
+attempts left, collects it like `silo_data_collector.py --mode multicall` and stores its
+rows together with the `done` state in one transaction, so a shard is either fully recorded
+or done again. Failed shards are retried up to `--shard-attempts` times, completed shards
+are never redone; a shard whose last lease expired is marked failed when the next worker
+looks for work, so merge reports it. A worker records a shard's result only while it still
+holds the lease (same owner and attempt), so a worker that lost its lease to another one
+cannot overwrite its state. Rows are keyed by (market, input position), so they are never
+duplicated.
+
+Other machines join by running `work` against the same queue file, on a shared filesystem
+with working file locks (SQLite's requirement), or by copying the queue back and forth. A
+queue file used by several machines needs `--shared-queue` on every command: SQLite's WAL
+journal only works between processes of one host, so the rollback journal is used instead.
+
+Markets are `SILO0:SILO1` pairs (`--market`, repeatable), by default the collector's silo
+54. A single market is merged into the collector's output file; with several markets each
+gets its own file, suffixed with its silo0 address.
+
+Environment variables required:
+- RPC_SONIC: RPC endpoint URL
+
+Usage:
+    python3 silo_shards.py init [--input users-54-unique.json] [--shard-size 2000] [--market SILO0:SILO1 ...]
+    python3 silo_shards.py work [--processes 4] [--shared-queue]
+    python3 silo_shards.py status
+    python3 silo_shards.py merge [--output-format csv|parquet]
+    python3 silo_shards.py run --processes 4      # init, work and merge in one go
+"""
+
+import argparse
+import concurrent.futures
+import contextlib
+import logging
+import os
+import socket
+import sqlite3
+import sys
+import time
+from typing import Any, Dict, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+
+from web3 import Web3
+
+# Shared helpers live one directory up, in silo-core/scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from multicall import Call, execute_call  # noqa: E402
+from result_writer import (  # noqa: E402
+    UINT256_FIELDNAMES, CsvResultWriter, ParquetResultWriter, require_pyarrow
+)
+from rpc_pool import DEFAULT_MAX_ATTEMPTS  # noqa: E402
+from silo_data_collector import (  # noqa: E402
+    BLOCK_NUMBER, SILO0_ADDRESS, SILO1_ADDRESS, SILO_LENS_ADDRESS, SONIC_CHAIN_ID, DEFAULT_USERS_PER_BATCH,
+    DEFAULT_PREFILTER_BATCH_SIZE, collect_users_multicall, get_file_names, get_resolver, get_share_tokens,
+    handle_uint256, iter_input_addresses, setup_web3
+)
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_QUEUE_FILE = "silo-54-shards.sqlite"
+
+# Users per shard, a shard is the unit of leasing, retrying and committing
+DEFAULT_SHARD_SIZE = 2000
+
+# Attempts per shard before it is left failed
+DEFAULT_SHARD_ATTEMPTS = 3
+
+# A leased shard not finished within this many seconds is handed to another worker
+DEFAULT_LEASE_SECONDS = 600
+
+# Rows read from the queue per write while merging
+MERGE_CHUNK_SIZE = 10000
+
+
+class Market(NamedTuple):
+    id: int
+    silo0: str
+    silo1: str
+    lens: str
+    silo0_liquidity: int
+    silo1_liquidity: int
+
+
+class Shard(NamedTuple):
+    id: int
+    market: int
+    start: int
+    stop: int
+    attempts: int
+    owner: str
+
+
+class ShardQueue:
+    """Work queue of collection shards and their results, in SQLite.
+
+    `shared` selects the rollback journal for a queue file that processes on several hosts
+    open over a shared filesystem; WAL, the default, needs all of them on one host.
+    """
+
+    def __init__(self, path: str, shared: bool = False):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=60, isolation_level=None)
+        if shared:
+            self.conn.execute("PRAGMA journal_mode=DELETE")
+        else:
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(f"""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS markets (
+                id INTEGER PRIMARY KEY, silo0 TEXT NOT NULL, silo1 TEXT NOT NULL, lens TEXT NOT NULL,
+                silo0_liquidity TEXT NOT NULL, silo1_liquidity TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS addresses (position INTEGER PRIMARY KEY, address TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS shards (
+                id INTEGER PRIMARY KEY, market INTEGER NOT NULL, start INTEGER NOT NULL, stop INTEGER NOT NULL,
+                state TEXT NOT NULL DEFAULT 'pending', attempts INTEGER NOT NULL DEFAULT 0,
+                owner TEXT, lease_until REAL, error TEXT
+            );
+            CREATE TABLE IF NOT EXISTS results (
+                market INTEGER NOT NULL, position INTEGER NOT NULL,
+                {', '.join(f'{field} TEXT NOT NULL' for field in UINT256_FIELDNAMES)},
+                PRIMARY KEY (market, position)
+            );
+        """)
+
+    def meta(self) -> Dict[str, str]:
+        return dict(self.conn.execute("SELECT key, value FROM meta"))
+
+    def initialized(self) -> bool:
+        return 'block_number' in self.meta()
+
+    def create(self, addresses: List[str], markets: List[Tuple[str, str, str, int, int]], shard_size: int):
+        """Fill a new queue: addresses, markets and one pending shard per `shard_size` users per market."""
+        with self.transaction():
+            self.conn.executemany(
+                "INSERT OR REPLACE INTO meta VALUES (?, ?)",
+                [('chain_id', str(SONIC_CHAIN_ID)), ('block_number', str(BLOCK_NUMBER)), ('shard_size', str(shard_size))]
+            )
+            self.conn.executemany("INSERT INTO addresses VALUES (?, ?)", enumerate(addresses))
+            for market_id, (silo0, silo1, lens, silo0_liquidity, silo1_liquidity) in enumerate(markets):
+                self.conn.execute(
+                    "INSERT INTO markets VALUES (?, ?, ?, ?, ?, ?)",
+                    (market_id, silo0, silo1, lens, str(silo0_liquidity), str(silo1_liquidity))
+                )
+                self.conn.executemany(
+                    "INSERT INTO shards (market, start, stop) VALUES (?, ?, ?)",
+                    [(market_id, start, min(start + shard_size, len(addresses))) for start in range(0, len(addresses), shard_size)]
+                )
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Write transaction that takes the lock up front, so concurrent leases cannot interleave."""
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield
+        except BaseException:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+
+    def markets(self) -> List[Market]:
+        return [
+            Market(id, silo0, silo1, lens, int(liquidity0), int(liquidity1))
+            for id, silo0, silo1, lens, liquidity0, liquidity1 in self.conn.execute("SELECT * FROM markets ORDER BY id")
+        ]
+
+    def lease(self, owner: str, lease_seconds: float, max_attempts: int) -> Optional[Shard]:
+        """Take the next shard to work on: pending, expired lease or failed with attempts left.
+
+        Expired leases without attempts left are marked failed first.
+        """
+        now = time.time()
+        with self.transaction():
+            self.conn.execute(
+                """
+                UPDATE shards SET state = 'failed', error = 'lease of ' || owner || ' expired'
+                WHERE state = 'leased' AND lease_until < ? AND attempts >= ?
+                """,
+                (now, max_attempts)
+            )
+            row = self.conn.execute(
+                """
+                SELECT id, market, start, stop, attempts FROM shards
+                WHERE (state = 'pending' OR (state = 'leased' AND lease_until < ?) OR state = 'failed')
+                    AND attempts < ?
+                ORDER BY id LIMIT 1
+                """,
+                (now, max_attempts)
+            ).fetchone()
+            if row is None:
+                return None
+
+            self.conn.execute(
+                "UPDATE shards SET state = 'leased', owner = ?, lease_until = ?, attempts = attempts + 1 WHERE id = ?",
+                (owner, now + lease_seconds, row[0])
+            )
+
+        return Shard(*row[:4], row[4] + 1, owner)
+
+    def shard_addresses(self, shard: Shard) -> List[str]:
+        return [
+            address for (address,) in self.conn.execute(
+                "SELECT address FROM addresses WHERE position >= ? AND position < ? ORDER BY position", (shard.start, shard.stop)
+            )
+        ]
+
+    def holds_lease(self, shard: Shard) -> bool:
+        """Whether the lease of `shard` was not taken over by a later lease."""
+        return self.conn.execute(
+            "SELECT 1 FROM shards WHERE id = ? AND owner = ? AND attempts = ? AND state != 'done'",
+            (shard.id, shard.owner, shard.attempts)
+        ).fetchone() is not None
+
+    def complete(self, shard: Shard, rows: List[Dict[str, Any]]) -> bool:
+        """Store the rows of a shard and mark it done, in one transaction. False when the lease was lost."""
+        with self.transaction():
+            if not self.holds_lease(shard):
+                return False
+
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO results VALUES (?, ?, {', '.join('?' for _ in UINT256_FIELDNAMES)})",
+                [
+                    (shard.market, position, *(str(row[field]) for field in UINT256_FIELDNAMES))
+                    for position, row in enumerate(rows, shard.start)
+                ]
+            )
+            self.conn.execute("UPDATE shards SET state = 'done', error = NULL WHERE id = ?", (shard.id,))
+
+        return True
+
+    def fail(self, shard: Shard, error: str) -> bool:
+        """Mark a shard failed. False when the lease was lost, the shard is then left to its new owner."""
+        with self.transaction():
+            if not self.holds_lease(shard):
+                return False
+
+            self.conn.execute("UPDATE shards SET state = 'failed', error = ? WHERE id = ?", (error, shard.id))
+
+        return True
+
+    def counts(self) -> Dict[str, int]:
+        return dict(self.conn.execute("SELECT state, COUNT(*) FROM shards GROUP BY state"))
+
+    def failures(self) -> List[Tuple[int, int, int, int, str]]:
+        return self.conn.execute(
+            "SELECT id, start, stop, attempts, error FROM shards WHERE state = 'failed' ORDER BY id"
+        ).fetchall()
+
+    def iter_rows(self, market: int) -> Iterator[List[Dict[str, Any]]]:
+        """Result rows of a market in input order, `MERGE_CHUNK_SIZE` rows at a time."""
+        cursor = self.conn.execute(
+            f"""
+            SELECT a.address, {', '.join(f'r.{field}' for field in UINT256_FIELDNAMES)}
+            FROM results r JOIN addresses a ON a.position = r.position
+            WHERE r.market = ? ORDER BY r.position
+            """,
+            (market,)
+        )
+        while True:
+            rows = cursor.fetchmany(MERGE_CHUNK_SIZE)
+            if not rows:
+                return
+            yield [
+                {'user_address': row[0], **{field: int(value) for field, value in zip(UINT256_FIELDNAMES, row[1:])}}
+                for row in rows
+            ]
+
+    def close(self):
+        self.conn.close()
+
+
+def parse_market(value: str) -> Tuple[str, str]:
+    """`SILO0:SILO1` into checksummed addresses."""
+    silos = value.split(':')
+    if len(silos) != 2 or not all(Web3.is_address(silo) for silo in silos):
+        raise argparse.ArgumentTypeError(f"expected SILO0:SILO1 addresses, got {value}")
+    return Web3.to_checksum_address(silos[0]), Web3.to_checksum_address(silos[1])
+
+
+def deduplicate(addresses: Iterable[str]) -> List[str]:
+    """Addresses in input order, later repeats (in any letter case) dropped."""
+    seen = set()
+    unique = []
+    total = 0
+    for address in addresses:
+        total += 1
+        key = address.lower()
+        if key not in seen:
+            seen.add(key)
+            unique.append(address)
+
+    if len(unique) < total:
+        logger.info(f"Dropped {total - len(unique)} duplicate addresses")
+    return unique
+
+
+def get_liquidity(w3: Web3, silo: str) -> int:
+    """getLiquidity() of a silo at BLOCK_NUMBER, 0 when the call fails."""
+    result = execute_call(w3, Call(silo, "getLiquidity()"), BLOCK_NUMBER)
+    if not result.success:
+        logger.warning(f"getLiquidity failed for {silo}: {result.error}")
+        return 0
+    return handle_uint256(result.value)
+
+
+def init_queue(queue: ShardQueue, args: argparse.Namespace):
+    """Create the shards of a new queue, or check an existing one matches BLOCK_NUMBER."""
+    if queue.initialized():
+        meta = queue.meta()
+        if int(meta['block_number']) != BLOCK_NUMBER:
+            logger.error(f"Queue {queue.path} is for block {meta['block_number']}, not {BLOCK_NUMBER}")
+            sys.exit(1)
+        logger.info(f"Queue {queue.path} already initialized, keeping its shards")
+        return
+
+    addresses = deduplicate(iter_input_addresses(args.input))
+
+    w3 = setup_web3(max_attempts=args.max_attempts)
+    markets = [
+        (silo0, silo1, SILO_LENS_ADDRESS, get_liquidity(w3, silo0), get_liquidity(w3, silo1))
+        for silo0, silo1 in (args.market or [(SILO0_ADDRESS, SILO1_ADDRESS)])
+    ]
+
+    queue.create(addresses, markets, args.shard_size)
+    logger.info(f"Queue {queue.path}: {len(addresses)} users x {len(markets)} markets in {sum(queue.counts().values())} shards")
+
+
+def market_share_tokens(w3: Web3, market: Market) -> List[str]:
+    """Share tokens of both silos for the balance prefilter, empty (no prefilter) when unknown."""
+    resolver = get_resolver(w3)
+    try:
+        resolver.prefetch_market([market.silo0, market.silo1])
+        config_datas = [resolver.config_data(resolver.silo_config(silo), silo) for silo in (market.silo0, market.silo1)]
+    except Exception as e:
+        logger.warning(f"Share tokens of market {market.id} unknown, prefilter disabled: {e}")
+        return []
+
+    return get_share_tokens(config_datas)
+
+
+def work(queue_path: str, options: Dict[str, Any]) -> int:
+    """Lease and collect shards until none is left. Returns the number of shards completed."""
+    owner = f"{socket.gethostname()}:{os.getpid()}"
+    queue = ShardQueue(queue_path, options['shared'])
+    w3 = setup_web3(max_attempts=options['max_attempts'], hedge_after=options['hedge_after'])
+    markets = {market.id: market for market in queue.markets()}
+    share_tokens: Dict[int, List[str]] = {}
+    completed = 0
+
+    try:
+        while True:
+            shard = queue.lease(owner, options['lease_seconds'], options['shard_attempts'])
+            if shard is None:
+                return completed
+
+            market = markets[shard.market]
+            if market.id not in share_tokens:
+                share_tokens[market.id] = market_share_tokens(w3, market) if options['prefilter'] else []
+
+            started = time.perf_counter()
+            try:
+                addresses = queue.shard_addresses(shard)
+                rows: List[Dict[str, Any]] = []
+                collect_users_multicall(
+                    w3, market.silo0, market.silo1, market.lens, addresses, rows.extend, options['batch_size'],
+                    share_tokens=share_tokens[market.id], prefilter_batch_size=options['prefilter_batch_size']
+                )
+                if len(rows) != len(addresses):
+                    raise RuntimeError(f"{len(rows)} rows for {len(addresses)} users")
+            except Exception as e:
+                logger.error(f"Shard {shard.id} (attempt {shard.attempts}) failed: {e}")
+                if not queue.fail(shard, str(e)):
+                    logger.warning(f"Shard {shard.id}: lease expired and was taken over, failure not recorded")
+                continue
+
+            if not queue.complete(shard, rows):
+                logger.warning(f"Shard {shard.id}: lease expired and was taken over, rows dropped")
+                continue
+            completed += 1
+            logger.info(f"Shard {shard.id}: {len(rows)} users of market {market.id} in {time.perf_counter() - started:.1f}s")
+    finally:
+        queue.close()
+
+
+def run_workers(queue_path: str, processes: int, options: Dict[str, Any]) -> int:
+    """Run `processes` workers on this machine, in-process for a single one."""
+    if processes <= 1:
+        return work(queue_path, options)
+
+    with concurrent.futures.ProcessPoolExecutor(max_workers=processes) as pool:
+        futures = [pool.submit(work, queue_path, options) for _ in range(processes)]
+        return sum(future.result() for future in futures)
+
+
+def output_path(output_file: str, output_format: str, market: Market, markets: int) -> str:
+    """Collector output name, per market suffix when there are several markets."""
+    stem, extension = os.path.splitext(output_file)
+    if output_format == 'parquet':
+        extension = '.parquet'
+    if markets > 1:
+        stem += f"-{market.silo0.lower()[:10]}"
+    return stem + extension
+
+
+def merge(queue: ShardQueue, output_file: str, output_format: str) -> bool:
+    """Write the results of every market in input order. False while shards are not done."""
+    counts = queue.counts()
+    unfinished = {state: count for state, count in counts.items() if state != 'done'}
+    if unfinished:
+        logger.error(f"Cannot merge, shards not done: {unfinished}")
+        return False
+
+    markets = queue.markets()
+    meta = queue.meta()
+    for market in markets:
+        path = output_path(output_file, output_format, market, len(markets))
+        if output_format == 'parquet':
+            metadata = {
+                'chain_id': meta['chain_id'], 'block_number': meta['block_number'],
+                'silo0_address': market.silo0, 'silo1_address': market.silo1
+            }
+            writer = ParquetResultWriter(path, metadata)
+        else:
+            writer = CsvResultWriter(path)
+
+        writer.start(market.silo0_liquidity, market.silo1_liquidity)
+        for rows in queue.iter_rows(market.id):
+            writer.write_rows(rows)
+        writer.close()
+
+    return True
+
+
+def print_status(queue: ShardQueue):
+    counts = queue.counts()
+    print(f"Shards: {sum(counts.values())} total, " + ", ".join(f"{count} {state}" for state, count in sorted(counts.items())))
+    for shard_id, start, stop, attempts, error in queue.failures():
+        print(f"  shard {shard_id} (users {start}-{stop - 1}), {attempts} attempts: {error}")
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    input_file, output_file = get_file_names()
+
+    parser = argparse.ArgumentParser(description="Sharded Silo data collection over a SQLite work queue")
+    parser.add_argument('command', choices=['init', 'work', 'status', 'merge', 'run'])
+    parser.add_argument('--queue', default=DEFAULT_QUEUE_FILE, metavar='PATH',
+                        help=f"work queue file (default {DEFAULT_QUEUE_FILE})")
+    parser.add_argument('--input', default=input_file, help=f"addresses as a JSON array, one per line or CSV (default {input_file})")
+    parser.add_argument('--market', type=parse_market, action='append', metavar='SILO0:SILO1',
+                        help="market to collect, repeatable (default: the collector's silo0 and silo1)")
+    parser.add_argument('--shard-size', type=int, default=DEFAULT_SHARD_SIZE,
+                        help=f"users per shard (default {DEFAULT_SHARD_SIZE})")
+    parser.add_argument('--processes', type=int, default=1, help="worker processes on this machine (default 1)")
+    parser.add_argument('--shared-queue', action='store_true',
+                        help="the queue file is used by several machines over a shared filesystem: use SQLite's "
+                             "rollback journal instead of WAL, which works on one host only (pass it to every command)")
+    parser.add_argument('--shard-attempts', type=int, default=DEFAULT_SHARD_ATTEMPTS,
+                        help=f"attempts per shard before it stays failed (default {DEFAULT_SHARD_ATTEMPTS})")
+    parser.add_argument('--lease-seconds', type=float, default=DEFAULT_LEASE_SECONDS,
+                        help=f"time after which an unfinished shard is given to another worker (default {DEFAULT_LEASE_SECONDS})")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_USERS_PER_BATCH,
+                        help=f"users per aggregate3 request (default {DEFAULT_USERS_PER_BATCH})")
+    parser.add_argument('--prefilter-batch-size', type=int, default=DEFAULT_PREFILTER_BATCH_SIZE,
+                        help=f"users per balanceOf prefilter request (default {DEFAULT_PREFILTER_BATCH_SIZE})")
+    parser.add_argument('--no-prefilter', action='store_true', help="skip the share token balance check")
+    parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help=f"attempts per RPC request across endpoints (default {DEFAULT_MAX_ATTEMPTS})")
+    parser.add_argument('--hedge-after', type=float, default=None, metavar='SECONDS',
+                        help="send a slow request to a second endpoint after this many seconds")
+    parser.add_argument('--output', default=output_file, help=f"merged output file (default {output_file})")
+    parser.add_argument('--output-format', choices=['csv', 'parquet'], default='csv')
+    return parser.parse_args()
+
+
+def main():
+    """Main function."""
+    args = parse_args()
+
+    if args.shard_size < 1:
+        logger.error("--shard-size must be at least 1")
+        sys.exit(1)
+
+    if args.output_format == 'parquet' and args.command in ('merge', 'run'):
+        try:
+            require_pyarrow()
+        except RuntimeError as e:
+            logger.error(str(e))
+            sys.exit(1)
+
+    queue = ShardQueue(args.queue, args.shared_queue)
+    if args.command in ('init', 'run'):
+        init_queue(queue, args)
+    elif not queue.initialized():
+        logger.error(f"Queue {args.queue} is not initialized, run init first")
+        sys.exit(1)
+
+    if args.command in ('work', 'run'):
+        options = {
+            'batch_size': args.batch_size, 'prefilter_batch_size': args.prefilter_batch_size,
+            'prefilter': not args.no_prefilter, 'max_attempts': args.max_attempts, 'hedge_after': args.hedge_after,
+            'shard_attempts': args.shard_attempts, 'lease_seconds': args.lease_seconds, 'shared': args.shared_queue,
+        }
+        started = time.perf_counter()
+        completed = run_workers(args.queue, args.processes, options)
+        logger.info(f"Completed {completed} shards in {time.perf_counter() - started:.1f}s")
+
+    if args.command in ('status', 'work', 'run'):
+        print_status(queue)
+
+    if args.command in ('merge', 'run') and not merge(queue, args.output, args.output_format):
+        logger.error("Rerun work to retry failed shards (--shard-attempts raises the limit), then merge")
+        sys.exit(1)
+
+    queue.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,479 @@
+#!/usr/bin/env python3
+"""
+Silo Solvency Engine
+
+Recomputes LTV and solvency of every borrower in a collector results CSV or Parquet file
+locally, and sweeps a grid of price shocks to show how many borrowers become liquidatable,
+without rerunning the collection.
+
+Market parameters are read once: `lt` and `maxLtv` from SiloConfig getConfig and the
+solvencyOracle and maxLtvOracle quotes for 1e18 of each silo asset at BLOCK_NUMBER. A failed
+quote stops the run; only a zero oracle address means a price of 1 (quote 1e18), as in
+SiloSolvencyLib. `--save-params` stores them as JSON and `--params` reuses a stored file, so
+later sweeps need no RPC.
+
+LTV follows SiloSolvencyLib: collateral (protected + collateral assets) and debt are valued
+with the solvency oracle quotes, ltv = ceil(debtValue * 1e18 / collateralValue) and a
+borrower is liquidatable when ltv > lt of the collateral silo. Borrowers above maxLtv are
+counted with the maxLtvOracle quotes, as SiloSolvencyLib does for that check. Quotes are scaled linearly
+from the 1e18 quote. Collateral counts in the other silo than the debt; for borrowers with
+collateral in both silos the silo whose LTV matches the collected getUserLTV is used.
+
+For the sweep, the debt to collateral ratio of all borrowers is sorted once with NumPy;
+each scenario is then a binary search plus exact prefix sums. Borrowers within a relative
+margin of a threshold, and dust positions where integer rounding matters, are decided with
+exact integer math, so counts are exact.
+
+Shocks are percent changes of the silo0 / silo1 asset price, as comma separated values or
+`start:stop:step` ranges; every combination of both lists is one scenario.
+
+Usage:
+    python3 silo_solvency.py --save-params params.json
+    python3 silo_solvency.py --params params.json --silo0-shocks -30:0:5 --output scenarios.csv
+"""
+
+import argparse
+import csv
+import itertools
+import json
+import logging
+import sys
+from decimal import Decimal
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from result_writer import RESULT_FIELDNAMES, iter_parquet_rows
+from silo_data_collector import (
+    BLOCK_NUMBER, SILO0_ADDRESS, SILO1_ADDRESS, ResolverError, get_file_names, get_resolver, get_silo_asset,
+    get_silo_config, get_silo_config_data, get_silo_contract, load_abi_from_file, setup_web3
+)
+
+logger = logging.getLogger(__name__)
+
+WAD = 10**18
+
+# SiloSolvencyLib._INFINITY, LTV of debt without collateral
+INFINITE_LTV = 2**256 - 1
+
+# Borrowers whose float LTV is this close (relatively) to a threshold are checked exactly
+EXACT_MARGIN = 1e-9
+
+# Positions valued below this many quote units are always checked exactly, integer
+# rounding of small quotes moves their LTV by more than EXACT_MARGIN
+DUST_VALUE = 10**15
+
+SILO_NAMES = ("silo0", "silo1")
+
+
+class SiloParams(NamedTuple):
+    """Solvency parameters of one silo."""
+    address: str
+    asset: str
+    lt: int
+    max_ltv: int
+    solvency_oracle: str
+    price: int
+    max_ltv_oracle: str
+    max_ltv_price: int
+
+
+class Borrower(NamedTuple):
+    """Collected position of one borrower."""
+    user: str
+    collateral: Tuple[int, int]
+    debt: Tuple[int, int]
+    ltv: int
+
+
+class ScenarioResult(NamedTuple):
+    """Liquidation totals of one price scenario. Values are in oracle quote token units."""
+    silo0_shock: Decimal
+    silo1_shock: Decimal
+    borrowers: int
+    liquidatable: int
+    liquidatable_debt_value: int
+    liquidatable_collateral_value: int
+    above_max_ltv: int
+    bad_debt: int
+    bad_debt_value: int
+
+
+SCENARIO_FIELDNAMES = list(ScenarioResult._fields)
+
+
+def quote(amount: int, price: int) -> int:
+    """Oracle value of `amount`, with `price` the quote for 1e18 of the asset."""
+    return amount * price // WAD
+
+
+def exact_ltv(collateral: int, debt: int, collateral_price: int, debt_price: int) -> int:
+    """SiloSolvencyLib.calculateLtv in integers."""
+    collateral_value = quote(collateral, collateral_price)
+    debt_value = quote(debt, debt_price)
+
+    if collateral_value == 0 and debt_value == 0:
+        return 0
+    if collateral_value == 0:
+        return INFINITE_LTV
+
+    return -(-debt_value * WAD // collateral_value)
+
+
+def parse_shocks(spec: str) -> List[Decimal]:
+    """Percent shocks from `-15,-10,0` or `start:stop:step` (stop included)."""
+    shocks = []
+    for part in spec.split(','):
+        part = part.strip()
+        if not part:
+            continue
+
+        if ':' in part:
+            start, stop, step = (Decimal(value) for value in part.split(':'))
+            if step <= 0:
+                raise ValueError(f"step of {part} must be positive")
+            value = start
+            while value <= stop:
+                shocks.append(value)
+                value += step
+        else:
+            shocks.append(Decimal(part))
+
+    if any(shock <= -100 for shock in shocks):
+        raise ValueError("shocks must be above -100%")
+
+    return sorted(set(shocks))
+
+
+def shocked_price(price: int, shock: Decimal) -> int:
+    """`price` moved by `shock` percent, rounded down."""
+    return int(price * (100 + shock) / 100)
+
+
+def load_borrowers(path: str) -> List[Borrower]:
+    """Users with debt in either silo from a collector results CSV or Parquet file."""
+    borrowers = []
+
+    for row in iter_result_rows(path):
+        if not row['user_address'].startswith('0x'):
+            # liquidity row
+            continue
+
+        debt = (int(row['silo0_maxRepay'] or 0), int(row['maxRepay'] or 0))
+        if debt == (0, 0):
+            continue
+
+        collateral = (int(row['total_underlying_collateral'] or 0), int(row['silo1_total_collateral'] or 0))
+        borrowers.append(Borrower(row['user_address'], collateral, debt, int(row['user_ltv'] or 0)))
+
+    logger.info(f"Loaded {len(borrowers)} borrowers from {path}")
+    return borrowers
+
+
+def iter_result_rows(path: str) -> Iterable[Dict[str, object]]:
+    """Result rows of a CSV, or of a Parquet file when the name ends in .parquet."""
+    if path.endswith('.parquet'):
+        try:
+            yield from iter_parquet_rows(path)
+        except RuntimeError as e:
+            raise ValueError(str(e))
+        return
+
+    with open(path, newline='') as f:
+        reader = csv.DictReader(f)
+        missing = set(RESULT_FIELDNAMES) - set(reader.fieldnames or [])
+        if missing:
+            raise ValueError(f"{path} lacks columns {', '.join(sorted(missing))}")
+
+        yield from reader
+
+
+def fetch_market_params() -> List[SiloParams]:
+    """lt, maxLtv and both oracle quotes of both silos at BLOCK_NUMBER. Exits when a quote fails."""
+    w3 = setup_web3()
+    abi = load_abi_from_file("../../deployments/sonic/Silo.sol.json")
+    resolver = get_resolver(w3)
+    params = []
+
+    # both silos in three batched requests, the lookups below are memoized
+    resolver.prefetch_market([SILO0_ADDRESS, SILO1_ADDRESS])
+
+    for name, address in zip(SILO_NAMES, (SILO0_ADDRESS, SILO1_ADDRESS)):
+        contract = get_silo_contract(w3, address, abi)
+        asset = get_silo_asset(contract, name)
+        config = get_silo_config(contract, name)
+        config_data = get_silo_config_data(w3, config, address) if config else {}
+
+        if not asset or not config_data:
+            logger.error(f"Could not read config of {name} {address}")
+            sys.exit(1)
+
+        oracle, max_ltv_oracle = config_data['solvencyOracle'], config_data['maxLtvOracle']
+        try:
+            # a zero oracle address quotes 1e18, a failing oracle is not replaced by a default
+            price = resolver.quote(oracle, asset)
+            max_ltv_price = resolver.quote(max_ltv_oracle, asset)
+        except ResolverError as e:
+            logger.error(f"Oracle quote of {name} asset {asset} failed: {e}")
+            sys.exit(1)
+
+        params.append(SiloParams(
+            address, asset, config_data['lt'], config_data['maxLtv'], oracle, price, max_ltv_oracle, max_ltv_price
+        ))
+
+    return params
+
+
+def load_params(path: str) -> List[SiloParams]:
+    """Market parameters stored by `--save-params`."""
+    with open(path, 'r') as f:
+        data = json.load(f)
+
+    if data.get('block') != BLOCK_NUMBER:
+        logger.warning(f"{path} was read at block {data.get('block')}, collector block is {BLOCK_NUMBER}")
+
+    for name in SILO_NAMES:
+        missing = set(SiloParams._fields) - set(data.get(name, {}))
+        if missing:
+            raise ValueError(f"{path} lacks {name} {', '.join(sorted(missing))}, store it again with --save-params")
+
+    return [SiloParams(**{field: data[name][field] for field in SiloParams._fields}) for name in SILO_NAMES]
+
+
+def save_params(path: str, params: List[SiloParams]):
+    """Store market parameters as JSON."""
+    data = {'block': BLOCK_NUMBER, **{name: p._asdict() for name, p in zip(SILO_NAMES, params)}}
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=2)
+    logger.info(f"Saved market parameters to {path}")
+
+
+def collateral_silo(borrower: Borrower, params: List[SiloParams]) -> Optional[int]:
+    """Index of the silo holding the borrower's collateral, None for debt in both silos."""
+    if all(borrower.debt):
+        return None
+
+    debt_silo = 0 if borrower.debt[0] else 1
+    other = 1 - debt_silo
+
+    if not borrower.collateral[debt_silo]:
+        return other
+    if not borrower.collateral[other]:
+        return debt_silo
+
+    # collateral in both silos: cross-silo or same-asset borrow, pick the one matching getUserLTV
+    def deviation(silo: int) -> int:
+        ltv = exact_ltv(borrower.collateral[silo], borrower.debt[debt_silo], params[silo].price, params[debt_silo].price)
+        return abs(ltv - borrower.ltv)
+
+    return min((other, debt_silo), key=deviation)
+
+
+class PositionGroup:
+    """Borrowers sharing collateral and debt silos, sorted by debt/collateral amount ratio."""
+
+    def __init__(self, collateral_index: int, debt_index: int, borrowers: List[Borrower], params: List[SiloParams], min_prices: List[int]):
+        self.collateral_index = collateral_index
+        self.debt_index = debt_index
+
+        collateral = np.array([b.collateral[collateral_index] for b in borrowers], dtype=object)
+        debt = np.array([b.debt[debt_index] for b in borrowers], dtype=object)
+
+        # dust values may round to a different LTV than the float ratio suggests
+        dust = np.array([
+            quote(c, min_prices[collateral_index]) < DUST_VALUE or quote(d, min_prices[debt_index]) < DUST_VALUE
+            for c, d in zip(collateral, debt)
+        ], dtype=bool)
+
+        self.dust_collateral = collateral[dust]
+        self.dust_debt = debt[dust]
+
+        collateral, debt = collateral[~dust], debt[~dust]
+        with np.errstate(divide='ignore'):
+            ratios = debt.astype(float) / collateral.astype(float)
+        order = np.argsort(ratios, kind='stable')
+
+        self.ratios = ratios[order]
+        self.collateral = collateral[order]
+        self.debt = debt[order]
+        # exact suffix sums, [i] holds the sum over sorted positions i..end
+        self.debt_suffix = suffix_sums(self.debt)
+        self.collateral_suffix = suffix_sums(self.collateral)
+
+    def __len__(self) -> int:
+        return len(self.ratios) + len(self.dust_debt)
+
+    def above(self, threshold: int, collateral_price: int, debt_price: int) -> Tuple[int, int, int]:
+        """(count, debt assets, collateral assets) of positions with LTV above `threshold`."""
+        # ltv > threshold  <=>  debt / collateral > threshold * collateralPrice / (1e18 * debtPrice)
+        bound = threshold / WAD * collateral_price / debt_price if debt_price else float('inf')
+        low = int(np.searchsorted(self.ratios, bound * (1 - EXACT_MARGIN), side='left'))
+        high = int(np.searchsorted(self.ratios, bound * (1 + EXACT_MARGIN), side='right'))
+
+        count = len(self.ratios) - high
+        debt = self.debt_suffix[high]
+        collateral = self.collateral_suffix[high]
+
+        # positions near the bound and dust positions are decided exactly
+        uncertain = itertools.chain(
+            zip(self.collateral[low:high], self.debt[low:high]), zip(self.dust_collateral, self.dust_debt)
+        )
+        for c, d in uncertain:
+            if exact_ltv(c, d, collateral_price, debt_price) > threshold:
+                count += 1
+                debt += d
+                collateral += c
+
+        return count, debt, collateral
+
+
+def suffix_sums(values: np.ndarray) -> List[int]:
+    """Exact sums of values[i:] for every i, plus a trailing 0."""
+    return list(itertools.accumulate(reversed(values.tolist()), initial=0))[::-1]
+
+
+def build_groups(borrowers: List[Borrower], params: List[SiloParams], min_prices: List[int]) -> List[PositionGroup]:
+    """Borrowers grouped by (collateral silo, debt silo)."""
+    grouped: Dict[Tuple[int, int], List[Borrower]] = {}
+    skipped = 0
+
+    for borrower in borrowers:
+        silo = collateral_silo(borrower, params)
+        if silo is None:
+            skipped += 1
+            continue
+        grouped.setdefault((silo, 0 if borrower.debt[0] else 1), []).append(borrower)
+
+    if skipped:
+        logger.warning(f"Skipped {skipped} borrowers with debt in both silos")
+
+    return [PositionGroup(c, d, members, params, min_prices) for (c, d), members in sorted(grouped.items())]
+
+
+def check_ltvs(borrowers: List[Borrower], params: List[SiloParams]) -> Tuple[int, int]:
+    """(matching, compared) borrowers whose local LTV equals the collected getUserLTV."""
+    matching = compared = 0
+    for borrower in borrowers:
+        silo = collateral_silo(borrower, params)
+        if silo is None or not borrower.ltv:
+            continue
+
+        debt_silo = 0 if borrower.debt[0] else 1
+        ltv = exact_ltv(borrower.collateral[silo], borrower.debt[debt_silo], params[silo].price, params[debt_silo].price)
+        compared += 1
+        matching += ltv == borrower.ltv
+
+    return matching, compared
+
+
+def run_scenarios(
+    groups: List[PositionGroup],
+    params: List[SiloParams],
+    silo0_shocks: Iterable[Decimal],
+    silo1_shocks: Iterable[Decimal]
+) -> List[ScenarioResult]:
+    """Liquidation totals for every combination of silo0 and silo1 price shocks."""
+    results = []
+
+    for shock0, shock1 in itertools.product(silo0_shocks, silo1_shocks):
+        prices = [shocked_price(params[0].price, shock0), shocked_price(params[1].price, shock1)]
+        max_ltv_prices = [shocked_price(params[0].max_ltv_price, shock0), shocked_price(params[1].max_ltv_price, shock1)]
+        totals = [0] * 6
+
+        for group in groups:
+            collateral_price, debt_price = prices[group.collateral_index], prices[group.debt_index]
+            lt = params[group.collateral_index].lt
+            max_ltv = params[group.collateral_index].max_ltv
+
+            count, debt, collateral = group.above(lt, collateral_price, debt_price)
+            above_max, _, _ = group.above(
+                max_ltv, max_ltv_prices[group.collateral_index], max_ltv_prices[group.debt_index]
+            )
+            bad, bad_debt, bad_collateral = group.above(WAD, collateral_price, debt_price)
+
+            totals[0] += count
+            totals[1] += quote(debt, debt_price)
+            totals[2] += quote(collateral, collateral_price)
+            totals[3] += above_max
+            totals[4] += bad
+            totals[5] += quote(bad_debt, debt_price) - quote(bad_collateral, collateral_price)
+
+        results.append(ScenarioResult(shock0, shock1, sum(len(g) for g in groups), *totals))
+
+    return results
+
+
+def print_scenarios(results: List[ScenarioResult]):
+    """Scenario table."""
+    print("\n" + "=" * 128)
+    print(f"{'silo0 %':>8} {'silo1 %':>8} {'Borrowers':>10} {'Liquidatable':>13} {'Liq. debt value':>28} "
+          f"{'Liq. collateral value':>28} {'> maxLtv':>9} {'Bad debt':>9}")
+    print("-" * 128)
+    for r in results:
+        print(f"{r.silo0_shock:>8} {r.silo1_shock:>8} {r.borrowers:>10} {r.liquidatable:>13} {r.liquidatable_debt_value:>28} "
+              f"{r.liquidatable_collateral_value:>28} {r.above_max_ltv:>9} {r.bad_debt:>9}")
+    print("=" * 128)
+
+
+def write_scenarios(path: str, results: List[ScenarioResult]):
+    """Scenario rows as CSV."""
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(SCENARIO_FIELDNAMES)
+        writer.writerows(results)
+    logger.info(f"Wrote {len(results)} scenarios to {path}")
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Local LTV, solvency and price shock sweep over collected positions")
+    parser.add_argument('--results', default=get_file_names()[1], help="collector results CSV or .parquet file")
+    parser.add_argument('--params', default=None, metavar='PATH',
+                        help="market parameters saved by --save-params (default: read from the RPC)")
+    parser.add_argument('--save-params', default=None, metavar='PATH', help="store market parameters as JSON")
+    parser.add_argument('--silo0-shocks', type=parse_shocks, default=[Decimal(0)],
+                        help="silo0 asset price changes in percent, e.g. -30:0:5 or -15,-10,0 (default 0)")
+    parser.add_argument('--silo1-shocks', type=parse_shocks, default=[Decimal(0)],
+                        help="silo1 asset price changes in percent (default 0)")
+    parser.add_argument('--output', default=None, metavar='PATH', help="write scenario rows to a CSV file")
+    return parser.parse_args()
+
+
+def main():
+    """Main function."""
+    args = parse_args()
+
+    try:
+        borrowers = load_borrowers(args.results)
+    except (OSError, ValueError) as e:
+        logger.error(f"Cannot read results: {e}")
+        sys.exit(1)
+
+    try:
+        params = load_params(args.params) if args.params else fetch_market_params()
+    except (OSError, ValueError) as e:
+        logger.error(f"Cannot read market parameters: {e}")
+        sys.exit(1)
+    if args.save_params:
+        save_params(args.save_params, params)
+
+    for name, p in zip(SILO_NAMES, params):
+        print(f"{name}: lt {p.lt}, maxLtv {p.max_ltv}, price (1e18) {p.price}, maxLtv oracle price {p.max_ltv_price}")
+
+    matching, compared = check_ltvs(borrowers, params)
+    logger.info(f"Local LTV matches getUserLTV for {matching} of {compared} borrowers")
+
+    min_prices = [
+        shocked_price(params[0].price, min(args.silo0_shocks)),
+        shocked_price(params[1].price, min(args.silo1_shocks)),
+    ]
+    groups = build_groups(borrowers, params, min_prices)
+    results = run_scenarios(groups, params, args.silo0_shocks, args.silo1_shocks)
+
+    print_scenarios(results)
+    if args.output:
+        write_scenarios(args.output, results)
+
+
+if __name__ == "__main__":
+    main()
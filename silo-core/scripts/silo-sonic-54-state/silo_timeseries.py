@@ -0,0 +1,305 @@
+#!/usr/bin/env python3
+"""
+Silo Time Series Collector
+
+Collects the silo 54 user positions of silo_data_collector.py at a series of blocks
+(`--from-block` to `--to-block` every `--step` blocks) into one CSV indexed by block.
+
+The first block is a full snapshot, taken like the collector's multicall mode. For every
+later block only part of the users is queried again:
+
+- users named in Silo or share token events (deposits, withdrawals, borrows, repays,
+  share transfers, liquidations) since the previous block are re-queried in full; accounts
+  not in the input list are added
+- other users with a position are refreshed for interest accrual: collateral and debt
+  amounts are rescaled by the change of each silo's assets per share (convertToAssets),
+  and LTV of borrowers is re-read in chunks through SiloLens getUsersHealth
+
+Rescaled rows are approximate (protected deposits do not accrue, maxWithdraw depends on
+liquidity); `--full-every N` takes a full snapshot every N steps to bound the drift.
+
+Each row carries a `source` column: snapshot, requery or accrued. By default a user only
+gets a row when its state changed, so the state at block B is the user's latest row at or
+before B; `--dense` writes every user at every block.
+
+Usage:
+    python3 silo_timeseries.py --from-block 42000000 --to-block 42800000 --step 100000 \\
+        --output silo-54-timeseries.csv [--full-every 4] [--cache]
+"""
+
+import argparse
+import csv
+import logging
+import os
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from web3 import Web3
+
+# Shared helpers live one directory up, in silo-core/scripts
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from multicall import Call, execute_aggregate3  # noqa: E402
+from result_writer import RESULT_FIELDNAMES  # noqa: E402
+from rpc_cache import RpcCache, DEFAULT_CACHE_PATH, DEFAULT_MAX_BYTES  # noqa: E402
+from rpc_metrics import add_metrics_arguments, start_metrics_reporting  # noqa: E402
+from rpc_pool import DEFAULT_MAX_ATTEMPTS  # noqa: E402
+from silo_lens import LensBatcher, DEFAULT_LENS_CHUNK_SIZE  # noqa: E402
+from silo_user_discovery import accounts_from_logs, iter_logs  # noqa: E402
+from silo_data_collector import (  # noqa: E402
+    SILO0_ADDRESS, SILO1_ADDRESS, SILO_LENS_ADDRESS, DEPLOYED_SILO_LENS_ADDRESS, DEFAULT_USERS_PER_BATCH,
+    DEFAULT_PREFILTER_BATCH_SIZE,
+    apply_ltv_results, apply_users_health, build_ltv_calls, collect_users_chunk, fetch_silo_prices, get_file_names,
+    get_share_tokens, get_silo_contract, iter_batches, load_abi_from_file, load_addresses_from_json, setup_web3
+)
+
+logger = logging.getLogger(__name__)
+
+TIMESERIES_FIELDNAMES = ['block'] + RESULT_FIELDNAMES + ['source']
+
+DEFAULT_OUTPUT_FILE = "silo-54-timeseries.csv"
+
+# ISilo.AssetType
+ASSET_TYPE_COLLATERAL = 1
+ASSET_TYPE_DEBT = 2
+
+# Shares carry 3 extra decimals, a large amount keeps the assets per share ratio precise
+SHARE_UNIT = 10**36
+
+# Result field -> (silo index, asset type) whose assets per share it follows
+ACCRUING_FIELDS = {
+    'total_underlying_collateral': (0, ASSET_TYPE_COLLATERAL),
+    'maxWithdraw_collateral': (0, ASSET_TYPE_COLLATERAL),
+    'silo0_maxRepay': (0, ASSET_TYPE_DEBT),
+    'silo1_total_collateral': (1, ASSET_TYPE_COLLATERAL),
+    'silo1_max_withdraw': (1, ASSET_TYPE_COLLATERAL),
+    'maxRepay': (1, ASSET_TYPE_DEBT),
+}
+
+SharePrices = Dict[Tuple[int, int], int]
+
+
+def block_steps(from_block: int, to_block: int, step: int) -> List[int]:
+    """Blocks from `from_block` every `step` blocks, always ending at `to_block`."""
+    if step < 1 or to_block < from_block:
+        raise ValueError("need step >= 1 and to_block >= from_block")
+
+    blocks = list(range(from_block, to_block + 1, step))
+    if blocks[-1] != to_block:
+        blocks.append(to_block)
+    return blocks
+
+
+def fetch_share_prices(w3: Web3, silos: List[str], block: int) -> SharePrices:
+    """{(silo index, asset type): assets for SHARE_UNIT shares} at `block`."""
+    keys = [(index, asset_type) for index in range(len(silos)) for asset_type in (ASSET_TYPE_COLLATERAL, ASSET_TYPE_DEBT)]
+    calls = [Call(silos[index], "convertToAssets(uint256,uint8)", (SHARE_UNIT, asset_type)) for index, asset_type in keys]
+
+    prices = {}
+    for key, result in zip(keys, execute_aggregate3(w3, calls, block)):
+        if not result.success or not result.value:
+            raise ValueError(f"convertToAssets failed for silo{key[0]} asset type {key[1]}: {result.error}")
+        prices[key] = result.value
+
+    return prices
+
+
+def accrue(row: Dict[str, Any], before: SharePrices, after: SharePrices) -> Dict[str, Any]:
+    """Copy of `row` with amounts rescaled from `before` to `after` assets per share."""
+    accrued = dict(row)
+    for field, key in ACCRUING_FIELDS.items():
+        accrued[field] = row[field] * after[key] // before[key]
+    return accrued
+
+
+def has_position(row: Dict[str, Any]) -> bool:
+    return any(row[field] for field in ACCRUING_FIELDS)
+
+
+def has_debt(row: Dict[str, Any]) -> bool:
+    return bool(row['maxRepay'] or row['silo0_maxRepay'])
+
+
+def touched_accounts(w3: Web3, contracts: List[str], from_block: int, to_block: int) -> set:
+    """Lowercase accounts named in user events of `contracts` within [from_block, to_block]."""
+    touched = set()
+    for _, _, logs in iter_logs(w3, contracts, from_block, to_block):
+        touched.update(account for _, account in accounts_from_logs(logs))
+    return touched
+
+
+class TimeSeriesWriter:
+    """Streams (block, result row, source) rows to a CSV file."""
+
+    def __init__(self, output_file: str):
+        self.file = open(output_file, 'w', newline='')
+        self.writer = csv.DictWriter(self.file, fieldnames=TIMESERIES_FIELDNAMES)
+        self.writer.writeheader()
+        self.rows_written = 0
+
+    def write(self, block: int, rows: Iterable[Tuple[Dict[str, Any], str]]):
+        for row, source in rows:
+            self.writer.writerow({'block': block, **row, 'source': source})
+            self.rows_written += 1
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+class TimeSeriesCollector:
+    """Per-user state carried from block to block."""
+
+    def __init__(self, w3: Web3, users: List[str], share_tokens: List[str], batch_size: int, lens_batcher: LensBatcher):
+        self.w3 = w3
+        self.share_tokens = share_tokens
+        self.batch_size = batch_size
+        self.lens_batcher = lens_batcher
+        # lowercase address -> latest result row, in input order
+        self.state: Dict[str, Dict[str, Any]] = {}
+        self.users = {user.lower(): user for user in users}
+        self.share_prices: Optional[SharePrices] = None
+
+    def query(self, users: List[str], block: int) -> List[Dict[str, Any]]:
+        """Full collector rows for `users` at `block`."""
+        rows = []
+        for chunk in iter_batches(users, DEFAULT_PREFILTER_BATCH_SIZE):
+            rows += collect_users_chunk(
+                self.w3, SILO0_ADDRESS, SILO1_ADDRESS, SILO_LENS_ADDRESS, chunk, self.batch_size, self.share_tokens, block
+            )
+        return rows
+
+    def snapshot(self, block: int) -> List[Tuple[Dict[str, Any], str]]:
+        """Query every user at `block`."""
+        self.share_prices = fetch_share_prices(self.w3, [SILO0_ADDRESS, SILO1_ADDRESS], block)
+        return [(row, 'snapshot') for row in self.query(list(self.users.values()), block)]
+
+    def step(self, previous_block: int, block: int) -> List[Tuple[Dict[str, Any], str]]:
+        """Re-query users touched since `previous_block`, refresh the others for accrued interest."""
+        touched = touched_accounts(self.w3, self.share_tokens, previous_block + 1, block)
+
+        new_users = sorted(touched - self.users.keys())
+        for address in new_users:
+            self.users[address] = Web3.to_checksum_address(address)
+
+        share_prices = fetch_share_prices(self.w3, [SILO0_ADDRESS, SILO1_ADDRESS], block)
+        requeried = self.query([self.users[address] for address in self.users if address in touched], block)
+
+        accrued = [
+            accrue(row, self.share_prices, share_prices)
+            for address, row in self.state.items() if address not in touched and has_position(row)
+        ]
+        borrowers = [row for row in accrued if has_debt(row)]
+        healths = self.lens_batcher.users_health(
+            self.w3, DEPLOYED_SILO_LENS_ADDRESS, [(SILO1_ADDRESS, row['user_address']) for row in borrowers], block
+        )
+        missing = apply_users_health(borrowers, healths)
+        if missing:
+            apply_ltv_results(missing, execute_aggregate3(self.w3, build_ltv_calls(SILO1_ADDRESS, SILO_LENS_ADDRESS, missing), block))
+
+        logger.info(
+            f"Block {block}: {len(touched)} accounts touched ({len(new_users)} new), "
+            f"{len(accrued)} positions accrued, {len(borrowers)} borrower LTVs refreshed"
+        )
+
+        self.share_prices = share_prices
+        changes = [(row, 'requery') for row in requeried] + [(row, 'accrued') for row in accrued]
+        return changes
+
+    def apply(self, changes: List[Tuple[Dict[str, Any], str]], dense: bool) -> List[Tuple[Dict[str, Any], str]]:
+        """Store `changes`, returning the rows to write: changed rows, or every user when `dense`."""
+        changed = []
+        sources = {}
+        for row, source in changes:
+            address = row['user_address'].lower()
+            if self.state.get(address) != row:
+                changed.append((row, source))
+            self.state[address] = row
+            sources[address] = source
+
+        if not dense:
+            return changed
+
+        # keep the order stable: input users first, discovered accounts after them
+        return [(self.state[address], sources.get(address, 'accrued')) for address in self.users if address in self.state]
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Collect silo 54 user positions at a series of blocks")
+    parser.add_argument('--from-block', type=int, required=True)
+    parser.add_argument('--to-block', type=int, required=True)
+    parser.add_argument('--step', type=int, required=True, help="blocks between snapshots")
+    parser.add_argument('--full-every', type=int, default=0, metavar='N',
+                        help="full snapshot every N steps instead of incremental refresh (default never)")
+    parser.add_argument('--dense', action='store_true', help="write every user at every block")
+    parser.add_argument('--input', default=get_file_names()[0], help="user addresses JSON")
+    parser.add_argument('--output', default=DEFAULT_OUTPUT_FILE)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_USERS_PER_BATCH,
+                        help="users per aggregate3 call")
+    parser.add_argument('--lens-chunk-size', type=int, default=DEFAULT_LENS_CHUNK_SIZE,
+                        help="borrowers per getUsersHealth call for the LTV refresh")
+    parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help="attempts per RPC request across endpoints")
+    parser.add_argument('--cache', nargs='?', const=DEFAULT_CACHE_PATH, default=None, metavar='PATH',
+                        help=f"cache block-pinned RPC responses in SQLite (default path {DEFAULT_CACHE_PATH})")
+    parser.add_argument('--cache-max-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="evict least recently used cache entries above this size")
+    add_metrics_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    """Main function."""
+    args = parse_args()
+    start_metrics_reporting(args.metrics, args.metrics_format, args.metrics_interval)
+
+    try:
+        blocks = block_steps(args.from_block, args.to_block, args.step)
+    except ValueError as e:
+        logger.error(f"Invalid block range: {e}")
+        sys.exit(1)
+
+    users = load_addresses_from_json(args.input)
+    if not users:
+        logger.error("No valid addresses found")
+        sys.exit(1)
+
+    cache = RpcCache(args.cache, args.cache_max_mb * 1024 * 1024) if args.cache else None
+    w3 = setup_web3(cache, args.max_attempts)
+
+    # share tokens come from the config, which does not change between blocks
+    abi = load_abi_from_file("../../deployments/sonic/Silo.sol.json")
+    config_datas = fetch_silo_prices(w3, get_silo_contract(w3, SILO0_ADDRESS, abi), get_silo_contract(w3, SILO1_ADDRESS, abi))
+    share_tokens = get_share_tokens(list(config_datas))
+    if not share_tokens:
+        logger.error("Share tokens unknown, cannot follow position changes")
+        sys.exit(1)
+
+    logger.info(f"Collecting {len(users)} users at {len(blocks)} blocks from {blocks[0]} to {blocks[-1]}")
+    collector = TimeSeriesCollector(w3, users, share_tokens, args.batch_size, LensBatcher(args.lens_chunk_size))
+    writer = TimeSeriesWriter(args.output)
+
+    try:
+        writer.write(blocks[0], collector.apply(collector.snapshot(blocks[0]), dense=True))
+
+        for number, (previous, block) in enumerate(zip(blocks, blocks[1:]), 1):
+            if args.full_every and number % args.full_every == 0:
+                logger.info(f"Block {block}: full snapshot")
+                changes = collector.snapshot(block)
+            else:
+                changes = collector.step(previous, block)
+            writer.write(block, collector.apply(changes, args.dense))
+    except Exception as e:
+        logger.error(f"Time series stopped: {e}")
+        sys.exit(1)
+    finally:
+        writer.close()
+        if cache is not None:
+            cache.close()
+
+    logger.info(f"Wrote {writer.rows_written} rows for {len(blocks)} blocks to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+"""Tests for result_writer: resumable CSV and Parquet output."""
+
+import csv
+import os
+
+from result_writer import (
+    CsvResultWriter, ParquetResultWriter, RESULT_FIELDNAMES, iter_parquet_rows, read_parquet_metadata, skip_processed
+)
+
+USERS = ['0x' + f"{i:040x}" for i in range(1, 6)]
+
+
+def result_row(user: str, value: int = 1) -> dict:
+    return {'user_address': user, **{field: value for field in RESULT_FIELDNAMES[1:]}}
+
+
+def user_rows(path) -> list:
+    with open(path, newline='') as f:
+        return [row['user_address'].lower() for row in list(csv.DictReader(f))[1:]]
+
+
+def test_resume_continues_after_checkpoint(tmp_path):
+    output = tmp_path / 'results.csv'
+    writer = CsvResultWriter(str(output))
+    writer.start(10, 20)
+    writer.write_rows([result_row(user) for user in USERS[:2]])
+    writer.close(completed=False)
+
+    writer = CsvResultWriter(str(output))
+    assert writer.can_resume()
+    assert writer.resume() == 2
+    pending = list(skip_processed(USERS, writer.processed_addresses()))
+    writer.write_rows([result_row(user) for user in pending])
+    writer.close()
+
+    assert pending == USERS[2:]
+    assert user_rows(output) == USERS
+    assert not writer.can_resume()
+
+
+def test_resume_drops_rows_and_partial_checkpoint_line_after_crash(tmp_path):
+    output = tmp_path / 'results.csv'
+    writer = CsvResultWriter(str(output))
+    writer.start(10, 20)
+    writer.write_rows([result_row(user) for user in USERS[:2]])
+    writer.close(completed=False)
+
+    # crash while appending the third user: its row reached the CSV, its checkpoint line only half
+    with open(output, 'a', newline='') as f:
+        csv.DictWriter(f, fieldnames=RESULT_FIELDNAMES).writerow(result_row(USERS[2]))
+    with open(writer.checkpoint_file, 'a') as f:
+        f.write(USERS[2][:20])
+
+    writer = CsvResultWriter(str(output))
+    assert writer.resume() == 2
+    with open(writer.checkpoint_file) as f:
+        assert f.read().splitlines() == USERS[:2]
+
+    writer.write_rows([result_row(user) for user in skip_processed(USERS, writer.processed_addresses())])
+    writer.close()
+
+    assert user_rows(output) == USERS
+
+
+def test_processed_addresses_ignores_unterminated_line(tmp_path):
+    writer = CsvResultWriter(str(tmp_path / 'results.csv'))
+    with open(writer.checkpoint_file, 'w') as f:
+        f.write(USERS[0] + '\n' + USERS[1][:10])
+
+    assert list(writer.processed_addresses()) == USERS[:1]
+
+
+def test_parquet_resume_after_crash_continues_after_last_row_group(tmp_path):
+    output = tmp_path / 'results.parquet'
+    writer = ParquetResultWriter(str(output), {'block_number': 5}, row_group_size=2)
+    writer.start(10, 20)
+    writer.write_rows([result_row(user, index) for index, user in enumerate(USERS[:3])])
+    writer.write_rows([result_row(USERS[3], 3)])
+    # crash: the fourth row is only buffered, a part was being written
+    open(os.path.join(writer.checkpoint_file, '000002.parquet.tmp'), 'wb').close()
+
+    writer = ParquetResultWriter(str(output), row_group_size=2)
+    assert not output.exists() and writer.can_resume()
+    assert writer.resume() == 3
+    pending = list(skip_processed(USERS, writer.processed_addresses()))
+    writer.write_rows([result_row(user, USERS.index(user)) for user in pending])
+    writer.close()
+
+    assert pending == USERS[3:]
+    assert [row['user_address'].lower() for row in iter_parquet_rows(str(output))] == USERS
+    assert [row['user_ltv'] for row in iter_parquet_rows(str(output))] == list(range(len(USERS)))
+    assert read_parquet_metadata(str(output))['silo1_liquidity'] == '20'
+    assert not os.path.exists(writer.checkpoint_file)
+
+
+def test_parquet_resume_continues_closed_output(tmp_path):
+    output = tmp_path / 'results.parquet'
+    writer = ParquetResultWriter(str(output), row_group_size=2)
+    writer.start(10, 20)
+    writer.write_rows([result_row(user) for user in USERS[:3]])
+    writer.close(completed=False)
+
+    writer = ParquetResultWriter(str(output), row_group_size=2)
+    assert writer.resume() == 3
+    writer.write_rows([result_row(user) for user in skip_processed(USERS, writer.processed_addresses())])
+    writer.close()
+
+    assert [row['user_address'].lower() for row in iter_parquet_rows(str(output))] == USERS
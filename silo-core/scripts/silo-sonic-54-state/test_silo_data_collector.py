@@ -0,0 +1,85 @@
+"""Tests for silo_data_collector: lens batch reads and their per-user fallback."""
+
+import os
+import sys
+
+import pytest
+from web3 import Web3
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from mock_silo_node import MockSiloNode, Revert, selector  # noqa: E402
+from rpc_pool import PooledHTTPProvider  # noqa: E402
+from silo_data_collector import (  # noqa: E402
+    BLOCK_NUMBER, DEPLOYED_SILO_LENS_ADDRESS, SILO0_ADDRESS, SILO1_ADDRESS, SILO_LENS_ADDRESS, collect_users_chunk,
+    load_deployment_address, SILO_LENS_DEPLOYMENT_FILE
+)
+from silo_lens import LensBatcher  # noqa: E402
+
+USERS = [Web3.to_checksum_address(f"0x{i:040x}") for i in range(1, 9)]
+
+
+@pytest.fixture
+def node():
+    node = MockSiloNode(port=0).start()
+    yield node
+    node.stop()
+
+
+@pytest.fixture
+def w3(node):
+    return Web3(PooledHTTPProvider(node.url, backoff=0))
+
+
+def test_batch_lens_address_comes_from_deployments():
+    assert DEPLOYED_SILO_LENS_ADDRESS == load_deployment_address(SILO_LENS_DEPLOYMENT_FILE)
+    assert SILO_LENS_ADDRESS == "0xB95AD415b0fcE49f84FbD5B26b14ec7cf4822c69"
+
+
+def test_per_user_calls_keep_the_original_lens(node, w3):
+    targets = {}
+    for signature in ("getUsersHealth((address,address)[])", "getUserLTV(address,address)",
+                      "collateralBalanceOfUnderlying(address,address)"):
+        handler = node.state.handlers[selector(signature)]
+
+        def recording(to, args, signature=signature, handler=handler):
+            targets.setdefault(signature, set()).add(to)
+            return handler(to, args)
+
+        node.state.handlers[selector(signature)] = recording
+
+    collect_users_chunk(
+        w3, SILO0_ADDRESS, SILO1_ADDRESS, SILO_LENS_ADDRESS, USERS, 3, [], BLOCK_NUMBER, LensBatcher(4),
+        DEPLOYED_SILO_LENS_ADDRESS
+    )
+
+    assert targets["getUsersHealth((address,address)[])"] == {DEPLOYED_SILO_LENS_ADDRESS.lower()}
+    assert targets["collateralBalanceOfUnderlying(address,address)"] == {SILO_LENS_ADDRESS.lower()}
+    assert "getUserLTV(address,address)" not in targets
+
+
+def test_lens_batch_rows_match_per_user_rows(w3):
+    per_user = collect_users_chunk(w3, SILO0_ADDRESS, SILO1_ADDRESS, SILO_LENS_ADDRESS, USERS, 3, [], BLOCK_NUMBER)
+    batched = collect_users_chunk(
+        w3, SILO0_ADDRESS, SILO1_ADDRESS, SILO_LENS_ADDRESS, USERS, 3, [], BLOCK_NUMBER, LensBatcher(4)
+    )
+
+    assert batched == per_user
+
+
+def test_borrower_failing_users_health_falls_back_to_get_user_ltv(node, w3):
+    failing = USERS[2].lower()
+    users_health = node.state.handlers[selector("getUsersHealth((address,address)[])")]
+
+    def users_health_failing_for_one(to, args):
+        if failing[2:] in args.hex():
+            raise Revert("borrower fails in getUsersHealth")
+        return users_health(to, args)
+
+    node.state.handlers[selector("getUsersHealth((address,address)[])")] = users_health_failing_for_one
+    batcher = LensBatcher(4)
+    rows = collect_users_chunk(w3, SILO0_ADDRESS, SILO1_ADDRESS, SILO_LENS_ADDRESS, USERS, 3, [], BLOCK_NUMBER, batcher)
+
+    assert batcher.splits > 0
+    assert [row['user_ltv'] for row in rows] == [node.state.borrower_value("ltv", SILO1_ADDRESS, user) for user in USERS]
+    assert rows[2]['user_ltv'] != 0
@@ -0,0 +1,97 @@
+"""Tests for silo_shards: leasing, lease ownership and results of the shard queue."""
+
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from result_writer import UINT256_FIELDNAMES  # noqa: E402
+from silo_shards import ShardQueue, deduplicate  # noqa: E402
+
+ADDRESSES = ['0x' + f"{i:040x}" for i in range(1, 6)]
+MARKET = ("0xsilo0", "0xsilo1", "0xlens", 10, 20)
+
+
+@pytest.fixture
+def queue(tmp_path):
+    queue = ShardQueue(str(tmp_path / 'shards.sqlite'))
+    queue.create(ADDRESSES, [MARKET], shard_size=2)
+    yield queue
+    queue.close()
+
+
+def shard_rows(shard, value: int = 1) -> list:
+    return [{field: value for field in UINT256_FIELDNAMES} for _ in range(shard.stop - shard.start)]
+
+
+def state(queue: ShardQueue, shard_id: int) -> str:
+    return queue.conn.execute("SELECT state FROM shards WHERE id = ?", (shard_id,)).fetchone()[0]
+
+
+def test_completed_shards_merge_in_input_order(queue):
+    shards = [queue.lease('a', 60, 3) for _ in range(3)]
+    assert queue.lease('a', 60, 3) is None
+
+    for shard in reversed(shards):
+        assert queue.complete(shard, shard_rows(shard))
+
+    rows = [row for chunk in queue.iter_rows(0) for row in chunk]
+    assert [row['user_address'] for row in rows] == ADDRESSES
+    assert queue.counts() == {'done': 3}
+
+
+def test_failed_shard_is_retried_until_attempts_run_out(queue):
+    first = queue.lease('a', 60, 2)
+    assert queue.fail(first, 'boom')
+
+    retry = queue.lease('a', 60, 2)
+    assert (retry.id, retry.attempts) == (first.id, 2)
+    assert queue.fail(retry, 'boom again')
+
+    assert queue.lease('a', 60, 2).id != first.id
+    assert queue.failures() == [(first.id, 0, 2, 2, 'boom again')]
+
+
+def test_expired_lease_without_attempts_left_is_marked_failed(queue):
+    expired = queue.lease('a', -1, 1)
+
+    queue.lease('b', 60, 1)
+
+    assert state(queue, expired.id) == 'failed'
+    assert queue.failures() == [(expired.id, 0, 2, 1, 'lease of a expired')]
+
+
+def test_lost_lease_cannot_complete_or_fail(queue):
+    lost = queue.lease('a', -1, 3)
+    taken = queue.lease('b', 60, 3)
+    assert (taken.id, taken.owner) == (lost.id, 'b')
+
+    assert not queue.fail(lost, 'late failure')
+    assert not queue.complete(lost, shard_rows(lost, 7))
+    assert state(queue, lost.id) == 'leased'
+    assert list(queue.iter_rows(0)) == []
+
+    assert queue.complete(taken, shard_rows(taken, 8))
+    assert [row['user_ltv'] for chunk in queue.iter_rows(0) for row in chunk] == [8, 8]
+
+
+def test_expired_lease_not_taken_over_can_still_complete(queue):
+    shard = queue.lease('a', -1, 1)
+    queue.lease('b', 60, 1)
+
+    assert queue.complete(shard, shard_rows(shard))
+    assert state(queue, shard.id) == 'done'
+
+
+@pytest.mark.parametrize("shared, journal_mode", [(False, 'wal'), (True, 'delete')])
+def test_shared_queue_uses_rollback_journal(tmp_path, shared, journal_mode):
+    queue = ShardQueue(str(tmp_path / 'shards.sqlite'), shared)
+
+    assert queue.conn.execute("PRAGMA journal_mode").fetchone()[0] == journal_mode
+    queue.close()
+
+
+def test_deduplicate_keeps_first_of_any_case():
+    assert deduplicate([ADDRESSES[0], ADDRESSES[1], ADDRESSES[0].upper().replace('0X', '0x')]) == ADDRESSES[:2]
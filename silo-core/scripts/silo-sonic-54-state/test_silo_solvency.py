@@ -0,0 +1,172 @@
+"""Tests for silo_solvency: the scenario sweep against per-borrower exact LTV, shocks and stored params."""
+
+import json
+import os
+import random
+import sys
+from decimal import Decimal
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from silo_solvency import (  # noqa: E402
+    BLOCK_NUMBER, WAD, Borrower, ScenarioResult, SiloParams, build_groups, collateral_silo, exact_ltv, load_params,
+    parse_shocks, quote, run_scenarios, save_params, shocked_price
+)
+
+SHOCKS = [Decimal(value) for value in ("-40", "-12.5", "-3", "0", "7")]
+
+
+def market(price0: int, price1: int, max_ltv_price0: int, max_ltv_price1: int) -> list:
+    return [
+        SiloParams("0xsilo0", "0xasset0", 85 * 10**16, 75 * 10**16, "0xoracle0", price0, "0xmax0", max_ltv_price0),
+        SiloParams("0xsilo1", "0xasset1", 90 * 10**16, 80 * 10**16, "0xoracle1", price1, "0xmax1", max_ltv_price1),
+    ]
+
+
+MARKETS = {
+    'wad prices': market(2 * WAD, WAD, 2 * WAD, WAD),
+    'different maxLtv oracle': market(1_987_654_321_987_654_321, 10**18 + 3, 2 * 10**18 - 7, 999_999_999_999_999_999),
+    'six decimal quote': market(3_100_123_456, 999_870, 3_100_000_000, 1_000_000),
+}
+
+
+def random_borrowers(params: list, count: int, seed: int) -> list:
+    """Borrowers of every kind: large, dust, near the lt/maxLtv thresholds and with collateral in both silos."""
+    rng = random.Random(seed)
+    borrowers = []
+
+    for i in range(count):
+        debt_silo = rng.randrange(2)
+        collateral_index = 1 - debt_silo
+        kind = rng.choice(('large', 'dust', 'near lt', 'near max', 'both'))
+        collateral = [0, 0]
+
+        if kind == 'dust':
+            collateral[collateral_index] = rng.randrange(1, 10**7)
+            debt = rng.randrange(1, 10**7)
+        else:
+            collateral[collateral_index] = rng.randrange(10**15, 10**25)
+            debt = rng.randrange(1, collateral[collateral_index] * 2)
+
+        if kind in ('near lt', 'near max'):
+            # debt at the threshold for one of the shocks, give or take a few wei
+            shock0, shock1 = rng.choice(SHOCKS), rng.choice(SHOCKS)
+            price_field = 'price' if kind == 'near lt' else 'max_ltv_price'
+            prices = [shocked_price(getattr(params[0], price_field), shock0), shocked_price(getattr(params[1], price_field), shock1)]
+            threshold = params[collateral_index].lt if kind == 'near lt' else params[collateral_index].max_ltv
+            value = quote(collateral[collateral_index], prices[collateral_index]) * threshold // WAD
+            debt = max(1, value * WAD // prices[debt_silo] + rng.randrange(-3, 4))
+
+        if kind == 'both':
+            collateral[debt_silo] = rng.randrange(10**15, 10**24)
+
+        debts = [0, 0]
+        debts[debt_silo] = debt
+        ltv = exact_ltv(collateral[collateral_index], debt, params[collateral_index].price, params[debt_silo].price)
+        borrowers.append(Borrower(f"0x{i:040x}", tuple(collateral), tuple(debts), ltv))
+
+    return borrowers
+
+
+def brute_force(borrowers: list, params: list, shock0: Decimal, shock1: Decimal) -> ScenarioResult:
+    """Scenario totals from exact_ltv of every borrower."""
+    prices = [shocked_price(params[0].price, shock0), shocked_price(params[1].price, shock1)]
+    max_ltv_prices = [shocked_price(params[0].max_ltv_price, shock0), shocked_price(params[1].max_ltv_price, shock1)]
+    # asset sums per (collateral silo, debt silo): liquidatable debt and collateral, bad debt and its collateral
+    sums = {}
+    counts = [0, 0, 0, 0]
+
+    for borrower in borrowers:
+        c = collateral_silo(borrower, params)
+        if c is None:
+            continue
+        d = 0 if borrower.debt[0] else 1
+        collateral, debt = borrower.collateral[c], borrower.debt[d]
+        group = sums.setdefault((c, d), [0, 0, 0, 0])
+        ltv = exact_ltv(collateral, debt, prices[c], prices[d])
+
+        counts[0] += 1
+        if ltv > params[c].lt:
+            counts[1] += 1
+            group[0] += debt
+            group[1] += collateral
+        if exact_ltv(collateral, debt, max_ltv_prices[c], max_ltv_prices[d]) > params[c].max_ltv:
+            counts[2] += 1
+        if ltv > WAD:
+            counts[3] += 1
+            group[2] += debt
+            group[3] += collateral
+
+    values = [0, 0, 0]
+    for (c, d), (liquidatable_debt, liquidatable_collateral, bad_debt, bad_collateral) in sums.items():
+        values[0] += quote(liquidatable_debt, prices[d])
+        values[1] += quote(liquidatable_collateral, prices[c])
+        values[2] += quote(bad_debt, prices[d]) - quote(bad_collateral, prices[c])
+
+    return ScenarioResult(shock0, shock1, counts[0], counts[1], values[0], values[1], counts[2], counts[3], values[2])
+
+
+@pytest.mark.parametrize("name", list(MARKETS))
+@pytest.mark.parametrize("seed", [1, 2])
+def test_scenarios_match_brute_force(name, seed):
+    params = MARKETS[name]
+    borrowers = random_borrowers(params, 400, seed)
+    min_prices = [shocked_price(params[0].price, min(SHOCKS)), shocked_price(params[1].price, min(SHOCKS))]
+
+    results = run_scenarios(build_groups(borrowers, params, min_prices), params, SHOCKS, SHOCKS)
+
+    expected = [brute_force(borrowers, params, shock0, shock1) for shock0 in SHOCKS for shock1 in SHOCKS]
+    assert results == expected
+    assert any(result.liquidatable for result in results) and any(result.bad_debt for result in results)
+
+
+def test_debt_in_both_silos_is_skipped():
+    params = MARKETS['wad prices']
+    borrowers = [Borrower("0x1", (10**18, 10**18), (10**17, 10**17), 0)]
+
+    (result,) = run_scenarios(build_groups(borrowers, params, [p.price for p in params]), params, [Decimal(0)], [Decimal(0)])
+
+    assert result.borrowers == 0
+
+
+@pytest.mark.parametrize("spec, shocks", [
+    ("-15,-10,0", ["-15", "-10", "0"]),
+    ("0, -10, 0,", ["-10", "0"]),
+    ("-30:0:10", ["-30", "-20", "-10", "0"]),
+    ("-1:1:0.5,5", ["-1", "-0.5", "0", "0.5", "1", "5"]),
+    ("0:1:3", ["0"]),
+])
+def test_parse_shocks(spec, shocks):
+    assert parse_shocks(spec) == [Decimal(shock) for shock in shocks]
+
+
+@pytest.mark.parametrize("spec, message", [
+    ("-10:0:0", "must be positive"),
+    ("-100", "above -100%"),
+    ("-120:0:10", "above -100%"),
+])
+def test_parse_shocks_rejects(spec, message):
+    with pytest.raises(ValueError, match=message):
+        parse_shocks(spec)
+
+
+def test_params_round_trip(tmp_path):
+    path = str(tmp_path / "params.json")
+    save_params(path, MARKETS['different maxLtv oracle'])
+
+    assert load_params(path) == MARKETS['different maxLtv oracle']
+
+
+def test_params_without_max_ltv_price_are_rejected(tmp_path):
+    path = tmp_path / "params.json"
+    old = {
+        'block': BLOCK_NUMBER,
+        **{name: {k: v for k, v in p._asdict().items() if k not in ('max_ltv_oracle', 'max_ltv_price')}
+           for name, p in zip(("silo0", "silo1"), MARKETS['wad prices'])},
+    }
+    path.write_text(json.dumps(old))
+
+    with pytest.raises(ValueError, match="max_ltv_price"):
+        load_params(str(path))
@@ -0,0 +1,614 @@
+#!/usr/bin/env python3
+"""
+Silo Deployment Analyzer
+
+Reads the SiloConfig addresses of every chain in silo-core/deploy/silo/_siloDeployments.json
+(or of `--chains`) and prints one combined report: silo0, factory address, implementation
+address and release of every config, so we can check what version was deployed where.
+
+silo0 must be an ERC-1167 minimal proxy. Its implementation is named from the artifacts under
+silo-core/deployments/<chain> (by address, else by runtime code hash) and its VERSION() when
+it has one. Proxies are grouped by code hash, so clones of one implementation are identified
+with a single lookup.
+
+Chains are analyzed concurrently, each with its own RPC client and pinned block. Inside a
+chain getSilos() of all configs and factory() of every silo0 are resolved through
+silo_resolver, one batched request each, and the silo0 bytecodes are fetched in parallel.
+
+Results are kept in a SQLite store (`--store`) keyed by (chain, config address): a deployed
+SiloConfig never changes its silos, factory or implementation, so later runs only query the
+configs that are new in the deployments file (`--refresh` queries all of them again). Each run
+writes a diff of what was added, changed, removed or failed, as JSON or CSV (`--diff-format`);
+`--table` prints the stored results of the chains as a table instead.
+
+Environment variables: RPC_<CHAIN> for every analyzed chain, see silo_deployments.py
+
+Usage:
+    python3 scripts/silo_analyzer.py [--chains sonic,avalanche] [--block sonic=42802010] [--cache [PATH]]
+        [--store PATH] [--refresh] [--diff-format json|csv] [--diff-output PATH] [--table]
+
+All calls of a chain are pinned to one block (`--block chain=N`, latest block at start by
+default). With `--cache` the responses are stored in a local SQLite cache, so rerunning with
+the same blocks does not touch the RPC. `--metrics PATH` writes RPC call counters and latency
+histograms at exit.
+"""
+
+import argparse
+import collections
+import csv
+import json
+import logging
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, TextIO, Tuple
+
+from web3 import Web3
+
+from multicall import Call
+from rpc_cache import RpcCache, CachingHTTPProvider, DEFAULT_CACHE_PATH, DEFAULT_MAX_BYTES
+from rpc_metrics import add_metrics_arguments, start_metrics_reporting
+from rpc_pool import PooledHTTPProvider, DEFAULT_MAX_ATTEMPTS
+from silo_deployments import (
+    Chain, CodeIndex, code_hash, get_chain, get_code_index, get_rpc_url, load_silo_deployments, parse_blocks, select_chains
+)
+from silo_resolver import SiloResolver, ResolverError, is_zero_address
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# eth_getCode requests in flight per chain
+DEFAULT_CODE_WORKERS = 8
+
+REPORT_WIDTH = 205
+
+DEFAULT_STORE_FILE = "silo-analyzer.sqlite"
+
+DIFF_FORMATS = ('json', 'csv')
+
+# ERC-1167 minimal proxy runtime code: prefix, implementation address, suffix
+ERC1167_PREFIX = bytes.fromhex("363d3d373d3d3d363d73")
+ERC1167_SUFFIX = bytes.fromhex("5af43d82803e903d91602b57fd5bf3")
+ERC1167_SIZE = len(ERC1167_PREFIX) + 20 + len(ERC1167_SUFFIX)
+
+# Implementation column when silo0 has none
+NO_CODE = "NO_CODE"
+NOT_PROXY = "NOT_PROXY"
+NO_IMPL = "NO_IMPL"
+ERROR = "ERROR"
+
+
+class Implementation(NamedTuple):
+    """Implementation behind a silo proxy, `name` from the deployment artifacts and on-chain VERSION() if known."""
+    address: str
+    name: str = ""
+    version: str = ""
+
+    @property
+    def release(self) -> str:
+        if self.version:
+            return self.version if self.version.startswith(self.name) else f"{self.name} {self.version}"
+        return self.name or ("unknown" if self.address.startswith("0x") else "")
+
+
+class ConfigReport(NamedTuple):
+    """Analysis of one SiloConfig. Empty silo addresses mean getSilos() failed, ERROR that factory() or eth_getCode did."""
+    chain: str
+    name: str
+    config: str
+    silo0: str = ""
+    silo1: str = ""
+    factory: str = ""
+    implementation: str = ""
+    release: str = ""
+    block: int = 0
+
+    @property
+    def ok(self) -> bool:
+        return bool(self.silo0 and self.silo1) and ERROR not in (self.factory, self.implementation)
+
+
+def connect(chain: Chain, cache: Optional[RpcCache] = None, block_number: Optional[int] = None,
+            max_attempts: int = DEFAULT_MAX_ATTEMPTS) -> Web3:
+    """Web3 for a chain, answering block-pinned calls from `cache` when given. Raises when it cannot connect."""
+    rpc_url = get_rpc_url(chain)
+    if not rpc_url:
+        raise ValueError(f"{chain.rpc_env} is not set")
+
+    if cache is not None:
+        w3 = Web3(CachingHTTPProvider(rpc_url, cache, chain.chain_id, max_attempts=max_attempts))
+        if block_number is not None:
+            # pinned and cached: skip the connectivity probe so a cached rerun stays offline
+            logger.info(f"{chain.name}: using RPC {rpc_url} with cache {cache.path}, block {block_number}")
+            return w3
+    else:
+        w3 = Web3(PooledHTTPProvider(rpc_url, max_attempts=max_attempts))
+
+    if not w3.is_connected():
+        raise ConnectionError(f"failed to connect to {rpc_url}")
+
+    logger.info(f"{chain.name}: connected. Latest block: {w3.eth.block_number}")
+    return w3
+
+
+def erc1167_implementation(code: bytes) -> Optional[str]:
+    """Implementation address of ERC-1167 minimal proxy runtime code, None for any other code."""
+    if len(code) != ERC1167_SIZE or not code.startswith(ERC1167_PREFIX) or not code.endswith(ERC1167_SUFFIX):
+        return None
+    return Web3.to_checksum_address(code[len(ERC1167_PREFIX):-len(ERC1167_SUFFIX)])
+
+
+def fetch_codes(resolver: SiloResolver, addresses: List[str], workers: int = DEFAULT_CODE_WORKERS) -> Dict[str, Optional[bytes]]:
+    """Runtime code of every address at the resolver's block, `workers` at a time. None when the fetch failed."""
+    def fetch(address: str) -> Optional[bytes]:
+        try:
+            return bytes(resolver.w3.eth.get_code(address, resolver.block))
+        except Exception as e:
+            logger.warning(f"Error reading bytecode of {address}: {e}")
+            return None
+
+    unique = list(dict.fromkeys(addresses))
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        return dict(zip(unique, executor.map(fetch, unique)))
+
+
+def version_call(contract: str) -> Call:
+    return Call(contract, "VERSION()", (), ("string",))
+
+
+def identify_implementations(
+    resolver: SiloResolver,
+    silos: List[str],
+    chain_name: Optional[str] = None,
+    index: Optional[CodeIndex] = None,
+    workers: int = DEFAULT_CODE_WORKERS
+) -> Dict[str, Implementation]:
+    """Implementation behind every silo proxy, named from the deployment artifacts.
+
+    Proxies are grouped by code hash, so clones of one implementation are identified once:
+    the implementation is looked up in the index by address, its code is only fetched when
+    the address is unknown, and VERSION() of all implementations is read in one batch.
+    """
+    index = index or get_code_index()
+    proxy_codes = fetch_codes(resolver, silos, workers)
+
+    by_code_hash: Dict[str, Tuple[bytes, Optional[str]]] = {}
+    silo_hashes = {silo: code_hash(code) for silo, code in proxy_codes.items() if code}
+    for silo, hash_ in silo_hashes.items():
+        if hash_ not in by_code_hash:
+            by_code_hash[hash_] = (proxy_codes[silo], erc1167_implementation(proxy_codes[silo]))
+
+    targets = list(dict.fromkeys(target for _, target in by_code_hash.values() if target and not is_zero_address(target)))
+    artifacts = {target: index.lookup_address(target, chain_name) for target in targets}
+    unknown = [target for target, artifact in artifacts.items() if artifact is None]
+    if unknown:
+        for target, code in fetch_codes(resolver, unknown, workers).items():
+            artifacts[target] = index.lookup_code(code, chain_name) if code else None
+
+    versions = {}
+    try:
+        for target, result in zip(targets, resolver.resolve([version_call(target) for target in targets])):
+            if result.success:
+                versions[target] = result.value
+    except Exception as e:
+        logger.warning(f"Error reading VERSION() of implementations: {e}")
+
+    identified: Dict[str, Implementation] = {}
+    for hash_, (code, target) in by_code_hash.items():
+        if target is None:
+            # not a minimal proxy, the silo itself may be a known contract
+            artifact = index.lookup_code(code, chain_name)
+            identified[hash_] = Implementation(NOT_PROXY, artifact.name if artifact else "")
+        elif is_zero_address(target):
+            identified[hash_] = Implementation(NO_IMPL)
+        else:
+            artifact = artifacts[target]
+            identified[hash_] = Implementation(target, artifact.name if artifact else "", versions.get(target, ""))
+
+    logger.info(f"{chain_name or resolver.chain_id}: identified {len(silos)} silos from {len(by_code_hash)} distinct codes, {len(unknown)} implementation code fetches")
+    implementations = {}
+    for silo in silos:
+        code = proxy_codes.get(silo)
+        if code is None:
+            implementations[silo] = Implementation(ERROR)
+        elif not code:
+            implementations[silo] = Implementation(NO_CODE)
+        else:
+            implementations[silo] = identified[silo_hashes[silo]]
+    return implementations
+
+
+def factory_call(silo: str) -> Call:
+    return Call(silo, "factory()", (), ("address",))
+
+
+def prefetch_configs(resolver: SiloResolver, config_addresses: List[str]) -> List[str]:
+    """getSilos() of all configs, then factory() of every silo0, one batched request each. Returns the silo0s."""
+    silos = []
+    try:
+        resolver.prefetch_silos(config_addresses)
+        for config_address in config_addresses:
+            try:
+                silos.append(resolver.silos(config_address)[0])
+            except ResolverError:
+                continue
+        silos = [silo for silo in silos if not is_zero_address(silo)]
+        resolver.resolve([factory_call(silo) for silo in silos])
+    except Exception as e:
+        logger.warning(f"Prefetch failed, resolving configs one at a time: {e}")
+    return silos
+
+
+def get_silos_from_config(
+    resolver: SiloResolver,
+    config_address: str,
+    implementations: Optional[Dict[str, Implementation]] = None
+) -> Tuple[str, str, str, Implementation]:
+    """Call getSilos() on a SiloConfig contract and return silo0, silo1, factory address, and implementation of silo0."""
+    try:
+        # Call getSilos()
+        silo0, silo1 = resolver.silos(config_address)
+
+        # Get factory address and implementation address from silo0
+        factory_address = ""
+        implementation = Implementation("")
+        if not is_zero_address(silo0):
+            try:
+                # Get factory address
+                factory_address = Web3.to_checksum_address(resolver.value(factory_call(silo0)))
+
+                # Get implementation from the minimal proxy bytecode
+                if implementations is None or silo0 not in implementations:
+                    implementations = identify_implementations(resolver, [silo0])
+                implementation = implementations[silo0]
+
+            except Exception as e:
+                logger.warning(f"Error calling factory() for silo0 {silo0}: {e}")
+                factory_address = ERROR
+
+        return silo0, silo1, factory_address, implementation
+    except ResolverError as e:
+        logger.warning(f"Contract logic error for {config_address}: {e}")
+        return "", "", "", Implementation("")
+    except Exception as e:
+        logger.warning(f"Error calling getSilos() for {config_address}: {e}")
+        return "", "", "", Implementation("")
+
+
+def analyze_chain(
+    chain_name: str,
+    configs: Dict[str, str],
+    block_number: Optional[int] = None,
+    cache: Optional[RpcCache] = None,
+    code_workers: int = DEFAULT_CODE_WORKERS,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+) -> List[ConfigReport]:
+    """Reports of the `configs` ({name: SiloConfig address}) of one chain, in their order.
+
+    A chain that cannot be reached gets failed reports for all of its configs.
+    """
+    chain = get_chain(chain_name)
+    try:
+        w3 = connect(chain, cache, block_number, max_attempts)
+        if block_number is None:
+            block_number = w3.eth.block_number
+    except Exception as e:
+        logger.error(f"{chain_name}: cannot connect, skipping {len(configs)} configs: {e}")
+        return [ConfigReport(chain_name, name, config) for name, config in configs.items()]
+
+    logger.info(f"{chain_name}: analyzing {len(configs)} configs at block {block_number}")
+    resolver = SiloResolver(w3, chain.chain_id, block_number)
+    silos = prefetch_configs(resolver, list(configs.values()))
+    implementations = identify_implementations(resolver, silos, chain_name, workers=code_workers)
+
+    reports = []
+    for name, config in configs.items():
+        silo0, silo1, factory_address, implementation = get_silos_from_config(resolver, config, implementations)
+        reports.append(ConfigReport(
+            chain_name, name, config, silo0, silo1, factory_address, implementation.address, implementation.release, block_number
+        ))
+    return reports
+
+
+def analyze_chains(
+    deployments: Dict[str, Dict[str, str]],
+    chains: List[str],
+    blocks: Optional[Dict[str, int]] = None,
+    cache: Optional[RpcCache] = None,
+    code_workers: int = DEFAULT_CODE_WORKERS,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+) -> List[ConfigReport]:
+    """Reports of every config of `chains`, chains analyzed concurrently, in deployment file order."""
+    blocks = blocks or {}
+    chains = [chain for chain in chains if deployments.get(chain)]
+    if not chains:
+        return []
+
+    with ThreadPoolExecutor(max_workers=len(chains), thread_name_prefix='chain') as executor:
+        futures = [
+            executor.submit(analyze_chain, chain, deployments[chain], blocks.get(chain), cache, code_workers, max_attempts)
+            for chain in chains
+        ]
+        return [report for future in futures for report in future.result()]
+
+
+class AnalyzerStore:
+    """SQLite store of analyzed SiloConfigs by (chain, config address). Only successful analyses are kept."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS configs (
+                chain TEXT NOT NULL,
+                config TEXT NOT NULL,
+                name TEXT NOT NULL,
+                address TEXT NOT NULL,
+                silo0 TEXT NOT NULL,
+                silo1 TEXT NOT NULL,
+                factory TEXT NOT NULL,
+                implementation TEXT NOT NULL,
+                release TEXT NOT NULL,
+                block INTEGER NOT NULL,
+                PRIMARY KEY (chain, config)
+            );
+            """
+        )
+        self.db.commit()
+
+    def reports(self, chain: str) -> Dict[str, ConfigReport]:
+        """Stored reports of a chain by lowercase config address."""
+        rows = self.db.execute(
+            "SELECT config, name, address, silo0, silo1, factory, implementation, release, block FROM configs WHERE chain = ?",
+            (chain,)
+        ).fetchall()
+        return {row[0]: ConfigReport(chain, *row[1:]) for row in rows}
+
+    def save(self, reports: List[ConfigReport]):
+        with self.db:
+            self.db.executemany(
+                "INSERT OR REPLACE INTO configs VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                [(report.chain, report.config.lower(), *report[1:]) for report in reports if report.ok]
+            )
+
+    def remove(self, reports: List[ConfigReport]):
+        with self.db:
+            self.db.executemany(
+                "DELETE FROM configs WHERE chain = ? AND config = ?",
+                [(report.chain, report.config.lower()) for report in reports]
+            )
+
+    def close(self):
+        self.db.close()
+
+
+class AnalysisDiff(NamedTuple):
+    """What a run changed in the store. `changed` holds (stored, new) pairs."""
+    added: List[ConfigReport]
+    changed: List[Tuple[ConfigReport, ConfigReport]]
+    removed: List[ConfigReport]
+    failed: List[ConfigReport]
+
+
+DIFF_FIELDNAMES = ['change', *ConfigReport._fields, 'previous']
+
+
+def changed_fields(old: ConfigReport, new: ConfigReport) -> List[str]:
+    """Fields that differ, ignoring the block the configs were read at."""
+    return [field for field in ConfigReport._fields if field != 'block' and getattr(old, field) != getattr(new, field)]
+
+
+def update_store(
+    store: AnalyzerStore,
+    deployments: Dict[str, Dict[str, str]],
+    chains: List[str],
+    refresh: bool = False,
+    **analyze_kwargs: Any
+) -> AnalysisDiff:
+    """Analyze the configs of `chains` missing from the store (all of them with `refresh`) and store the results.
+
+    Renamed configs are updated without RPC calls, configs gone from the deployments file are removed.
+    """
+    diff = AnalysisDiff([], [], [], [])
+    stored: Dict[str, Dict[str, ConfigReport]] = {}
+    pending: Dict[str, Dict[str, str]] = {}
+    renamed = []
+
+    for chain in chains:
+        stored[chain] = store.reports(chain)
+        configs = deployments[chain]
+        deployed = {config.lower() for config in configs.values()}
+        diff.removed.extend(report for key, report in stored[chain].items() if key not in deployed)
+
+        pending[chain] = {}
+        for name, config in configs.items():
+            old = stored[chain].get(config.lower())
+            if old is None or refresh:
+                pending[chain][name] = config
+            elif old.name != name:
+                renamed.append((old, old._replace(name=name)))
+
+        logger.info(f"{chain}: {len(configs) - len(pending[chain])} configs stored, {len(pending[chain])} to analyze")
+
+    reports = analyze_chains(pending, chains, **analyze_kwargs)
+    for report in reports:
+        old = stored[report.chain].get(report.config.lower())
+        if not report.ok:
+            diff.failed.append(report)
+        elif old is None:
+            diff.added.append(report)
+        elif changed_fields(old, report):
+            diff.changed.append((old, report))
+
+    diff.changed.extend(renamed)
+    store.remove(diff.removed)
+    store.save([report for report in reports if report.ok] + [new for _, new in renamed])
+    logger.info(
+        f"Store {store.path}: {len(diff.added)} added, {len(diff.changed)} changed, "
+        f"{len(diff.removed)} removed, {len(diff.failed)} failed"
+    )
+    return diff
+
+
+def stored_reports(store: AnalyzerStore, deployments: Dict[str, Dict[str, str]], chains: List[str]) -> List[ConfigReport]:
+    """Stored reports of every config of `chains` in deployment file order, failed reports for configs not stored."""
+    reports = []
+    for chain in chains:
+        stored = store.reports(chain)
+        for name, config in deployments[chain].items():
+            reports.append(stored.get(config.lower()) or ConfigReport(chain, name, config))
+    return reports
+
+
+def diff_rows(diff: AnalysisDiff) -> Iterator[Dict[str, Any]]:
+    """Flat diff rows: change kind, the report fields and the previous values of changed fields as JSON."""
+    for change, reports in (('added', diff.added), ('removed', diff.removed), ('failed', diff.failed)):
+        for report in reports:
+            yield {'change': change, **report._asdict(), 'previous': ''}
+
+    for old, new in diff.changed:
+        previous = {field: getattr(old, field) for field in changed_fields(old, new)}
+        yield {'change': 'changed', **new._asdict(), 'previous': json.dumps(previous)}
+
+
+def write_diff(diff: AnalysisDiff, output: TextIO, diff_format: str = 'json'):
+    """Write the diff as JSON ({added, changed, removed, failed}) or as CSV rows."""
+    if diff_format == 'csv':
+        writer = csv.DictWriter(output, fieldnames=DIFF_FIELDNAMES)
+        writer.writeheader()
+        writer.writerows(diff_rows(diff))
+        return
+
+    changed = [
+        {**new._asdict(), 'previous': {field: getattr(old, field) for field in changed_fields(old, new)}}
+        for old, new in diff.changed
+    ]
+    json.dump({
+        'added': [report._asdict() for report in diff.added],
+        'changed': changed,
+        'removed': [report._asdict() for report in diff.removed],
+        'failed': [report._asdict() for report in diff.failed],
+    }, output, indent=2)
+    output.write("\n")
+
+
+def print_report(reports: List[ConfigReport], title: str):
+    """Print the factory/implementation table and the number of configs per deployed version."""
+    print("\n" + "=" * REPORT_WIDTH)
+    print(title)
+    print("=" * REPORT_WIDTH)
+    print(f"{'Chain':<13} {'SiloConfig Name':<30} {'SiloConfig Address':<42} {'Silo0 Address':<42} "
+          f"{'Factory Address':<42} {'Implementation':<42} {'Release':<30}")
+    print("-" * REPORT_WIDTH)
+
+    for report in reports:
+        # failed factory() or code reads show up as ERROR in their column
+        if report.silo0 and report.silo1:
+            print(f"{report.chain:<13} {report.name:<30} {report.config:<42} {report.silo0:<42} "
+                  f"{report.factory:<42} {report.implementation:<42} {report.release:<30}")
+        else:
+            print(f"{report.chain:<13} {report.name:<30} {report.config:<42} {'ERROR':<42} {'ERROR':<42} {'ERROR':<42}")
+
+    versions = collections.Counter(
+        (report.chain, report.factory, report.implementation, report.release) for report in reports if report.ok
+    )
+    print("-" * REPORT_WIDTH)
+    print("Configs per factory and implementation:")
+    for (chain, factory_address, implementation_address, release), count in versions.items():
+        print(f"{chain:<13} {factory_address:<42} {implementation_address:<42} {release:<30} {count}")
+
+    failed = sum(1 for report in reports if not report.ok)
+    print("-" * REPORT_WIDTH)
+    print(f"Total SiloConfigs processed: {len(reports)}")
+    print(f"Successful calls: {len(reports) - failed}")
+    print(f"Failed calls: {failed}")
+    print("=" * REPORT_WIDTH)
+
+    if failed > 0:
+        logger.warning(f"{failed} calls failed. Check the logs above for details.")
+
+
+def add_rpc_arguments(parser: argparse.ArgumentParser):
+    """Cache, retry and metrics options shared by the analyzer scripts."""
+    parser.add_argument('--cache', nargs='?', const=DEFAULT_CACHE_PATH, default=None, metavar='PATH',
+                        help=f"cache block-pinned RPC responses in SQLite (default path {DEFAULT_CACHE_PATH})")
+    parser.add_argument('--cache-max-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="evict least recently used cache entries above this size")
+    parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                        help=f"attempts per RPC request across endpoints (default {DEFAULT_MAX_ATTEMPTS})")
+    parser.add_argument('--code-workers', type=int, default=DEFAULT_CODE_WORKERS,
+                        help=f"eth_getCode requests in flight per chain (default {DEFAULT_CODE_WORKERS})")
+    add_metrics_arguments(parser)
+
+
+def add_store_arguments(parser: argparse.ArgumentParser):
+    """Result store, diff and table options shared by the analyzer scripts."""
+    parser.add_argument('--store', default=DEFAULT_STORE_FILE, metavar='PATH',
+                        help=f"SQLite store of analyzed configs, only new configs are queried (default {DEFAULT_STORE_FILE})")
+    parser.add_argument('--refresh', action='store_true', help="query every config again instead of only new ones")
+    parser.add_argument('--diff-format', choices=DIFF_FORMATS, default='json', help="format of the diff output (default json)")
+    parser.add_argument('--diff-output', default=None, metavar='PATH', help="write the diff to a file instead of stdout")
+    parser.add_argument('--table', action='store_true', help="print the stored results as a table instead of the diff")
+
+
+def run(args: argparse.Namespace, deployments: Dict[str, Dict[str, str]], chains: List[str],
+        blocks: Dict[str, int], title: str):
+    """Update the store for `chains`, then write the diff and, with --table, print the stored results."""
+    cache = RpcCache(args.cache, args.cache_max_mb * 1024 * 1024) if args.cache else None
+    store = AnalyzerStore(args.store)
+    try:
+        diff = update_store(
+            store, deployments, chains, args.refresh,
+            blocks=blocks, cache=cache, code_workers=args.code_workers, max_attempts=args.max_attempts
+        )
+
+        if args.diff_output:
+            with open(args.diff_output, 'w', newline='', encoding='utf-8') as f:
+                write_diff(diff, f, args.diff_format)
+            logger.info(f"Diff saved to: {args.diff_output}")
+        elif not args.table:
+            write_diff(diff, sys.stdout, args.diff_format)
+
+        if args.table:
+            print_report(stored_reports(store, deployments, chains), title)
+    finally:
+        store.close()
+        if cache is not None:
+            cache.close()
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Print factory and implementation for every SiloConfig of every chain")
+    parser.add_argument('--chains', default=None, help="comma separated chains to analyze (default: all)")
+    parser.add_argument('--block', action='append', default=[], metavar='CHAIN=N',
+                        help="block to read a chain at (default: latest block at start), can be repeated")
+    add_rpc_arguments(parser)
+    add_store_arguments(parser)
+    return parser.parse_args()
+
+
+def main():
+    """Main function to analyze the SiloConfigs of all chains."""
+    args = parse_args()
+    start_metrics_reporting(args.metrics, args.metrics_format, args.metrics_interval)
+    logger.info("Starting Silo Analyzer")
+
+    try:
+        deployments = load_silo_deployments()
+        chains = select_chains(deployments, args.chains.split(',') if args.chains else None)
+        blocks = parse_blocks(args.block)
+        for chain in chains:
+            get_chain(chain)
+    except (OSError, ValueError) as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+    run(args, deployments, chains, blocks, "SILO CONFIG ANALYSIS: " + ", ".join(chains).upper())
+    logger.info("Silo Analyzer completed")
+
+
+if __name__ == "__main__":
+    main()
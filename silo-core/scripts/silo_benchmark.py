@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+"""
+Silo Scripts Benchmark Suite
+
+Runs the collection modes of silo-sonic-54-state/silo_data_collector.py and the per-config
+path of silo_analyzer.py against mock_silo_node.MockSiloNode with generated users
+and SiloConfigs, and reports per scenario:
+
+- throughput (users or configs per second)
+- p50 / p99 latency of single RPC requests, measured by the client
+- RPC request and failed request counts (failed requests are retried by rpc_pool)
+- peak RSS of the process running the scenario
+
+Every scenario runs in its own subprocess, so peak RSS is not shared between scenarios.
+Results can be stored as a baseline; later runs compared against it flag throughput, p99
+or RSS changes beyond `--tolerance` as regressions and exit with status 1.
+
+Usage:
+    python3 silo_benchmark.py --users 1000,10000 --latency-ms 5 --error-rate 0.01
+    python3 silo_benchmark.py --modes multicall,async --save-baseline benchmark-baseline.json
+    python3 silo_benchmark.py --baseline benchmark-baseline.json
+
+`--codec N` instead times the client side of N per-user calls without a node: web3 contract
+calls against silo_codec's plain eth_call, and aggregate3 batches encoded and decoded with
+eth_abi against silo_codec, reported in microseconds per call.
+
+    python3 silo_benchmark.py --codec 35000
+"""
+
+import argparse
+import contextlib
+import hashlib
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import time
+from typing import Any, Dict, Iterator, List
+
+from eth_abi import decode, encode
+from web3 import Web3
+from web3.providers.base import BaseProvider
+
+from mock_silo_node import MockSiloNode
+from rpc_metrics import METRICS
+from rpc_pool import PooledHTTPProvider
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+COLLECTOR_DIR = os.path.join(SCRIPTS_DIR, 'silo-sonic-54-state')
+SILO_ABI_FILE = os.path.join(SCRIPTS_DIR, '..', 'deployments', 'sonic', 'Silo.sol.json')
+SILO_LENS_ABI_FILE = os.path.join(SCRIPTS_DIR, '..', 'deployments', 'sonic', 'SiloLens.sol.json')
+
+# collector scenarios: name -> (collector mode, balance prefilter, lens batch)
+COLLECTOR_SCENARIOS = {
+    'sequential': ('sequential', False, False),
+    'multicall': ('multicall', False, False),
+    'multicall-prefilter': ('multicall', True, False),
+    'multicall-lens': ('multicall', True, True),
+    'async': ('async', False, False),
+    'async-prefilter': ('async', True, False),
+    'async-lens': ('async', True, True),
+}
+
+DEFAULT_MODES = 'multicall,multicall-prefilter,multicall-lens,async,async-prefilter,async-lens,sequential,analyzer'
+DEFAULT_USERS = '1000,10000'
+DEFAULT_CONFIGS = '37,370'
+DEFAULT_TOLERANCE = 0.2
+
+# sequential mode makes 7 requests per user, larger sets only measure patience
+SEQUENTIAL_MAX_USERS = 1000
+
+# single eth_call paths of the codec benchmark are timed on at most this many calls
+CODEC_SINGLE_MAX_CALLS = 7000
+
+
+def generate_addresses(count: int, kind: str, seed: int = 0) -> List[str]:
+    """`count` deterministic checksummed addresses."""
+    return [
+        Web3.to_checksum_address(hashlib.sha256(f"{seed}:{kind}:{i}".encode()).digest()[:20])
+        for i in range(count)
+    ]
+
+
+def percentile(values: List[float], share: float) -> float:
+    """Nearest-rank percentile, 0 for no values."""
+    if not values:
+        return 0.0
+
+    ordered = sorted(values)
+    return ordered[min(int(share * len(ordered)), len(ordered) - 1)]
+
+
+def peak_rss_mb() -> float:
+    """Peak RSS of this process in MB.
+
+    VmHWM starts fresh at exec, unlike ru_maxrss which on Linux keeps the RSS of the forking
+    parent, so it is preferred where /proc exists.
+    """
+    try:
+        with open('/proc/self/status', 'r') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+
+    # KiB on Linux, bytes on macOS
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 1024 / 1024 if sys.platform == 'darwin' else maxrss / 1024
+
+
+@contextlib.contextmanager
+def record_requests() -> Iterator[Dict[str, Any]]:
+    """Collect latency of answered and count of failed RPC requests seen by rpc_metrics while in the block."""
+    stats: Dict[str, Any] = {'latencies': [], 'failures': 0}
+
+    def record(method: str, latency: float, error: bool):
+        if error:
+            stats['failures'] += 1
+        else:
+            stats['latencies'].append(latency)
+
+    METRICS.add_listener(record)
+    try:
+        yield stats
+    finally:
+        METRICS.remove_listener(record)
+
+
+def run_collector(scenario: Dict[str, Any]) -> Dict[str, Any]:
+    """Collect `scenario['size']` generated users in one collection mode, rows are counted and dropped."""
+    sys.path.insert(0, COLLECTOR_DIR)
+    import silo_data_collector as collector
+    from silo_lens import LensBatcher
+
+    mode, prefilter, lens_batch = COLLECTOR_SCENARIOS[scenario['mode']]
+    rpc_url = scenario['rpc_url']
+    users = generate_addresses(scenario['size'], 'user', scenario['seed'])
+
+    w3 = Web3(PooledHTTPProvider(rpc_url))
+    silo0 = collector.get_silo_contract(w3, collector.SILO0_ADDRESS, collector.load_abi_from_file(SILO_ABI_FILE))
+    silo1 = collector.get_silo_contract(w3, collector.SILO1_ADDRESS, collector.load_abi_from_file(SILO_ABI_FILE))
+    lens = collector.get_silo_lens_contract(w3, collector.load_abi_from_file(SILO_LENS_ABI_FILE))
+
+    with contextlib.redirect_stdout(sys.stderr):
+        config_datas = collector.fetch_silo_prices(w3, silo0, silo1)
+    share_tokens = collector.get_share_tokens(list(config_datas)) if prefilter else []
+    lens_batcher = LensBatcher() if lens_batch else None
+
+    rows = 0
+
+    def on_rows(batch):
+        nonlocal rows
+        rows += len(batch)
+
+    with record_requests() as stats:
+        started = time.perf_counter()
+
+        if mode == 'sequential':
+            collector.collect_users_sequential(silo0, silo1, lens, users, w3, on_rows)
+        elif mode == 'multicall':
+            collector.collect_users_multicall(
+                w3, silo0.address, silo1.address, lens.address, users, on_rows,
+                share_tokens=share_tokens, lens_batcher=lens_batcher,
+                health_lens_address=collector.DEPLOYED_SILO_LENS_ADDRESS
+            )
+        else:
+            import asyncio
+            asyncio.run(collector.collect_users_async(
+                rpc_url, silo0.address, silo1.address, lens.address, users, on_rows,
+                concurrency=scenario['concurrency'], requests_per_second=0,
+                share_tokens=share_tokens, lens_batcher=lens_batcher,
+                health_lens_address=collector.DEPLOYED_SILO_LENS_ADDRESS
+            ))
+
+        elapsed = time.perf_counter() - started
+    return {'rows': rows, 'elapsed': elapsed, **stats}
+
+
+def run_analyzer(scenario: Dict[str, Any]) -> Dict[str, Any]:
+    """Run the analyzer's per-config calls for `scenario['size']` generated SiloConfigs."""
+    import silo_analyzer as analyzer
+    from silo_resolver import SiloResolver
+
+    configs = generate_addresses(scenario['size'], 'config', scenario['seed'])
+    w3 = Web3(PooledHTTPProvider(scenario['rpc_url']))
+    resolver = SiloResolver(w3, w3.eth.chain_id, w3.eth.block_number)
+
+    with record_requests() as stats:
+        started = time.perf_counter()
+
+        silos = analyzer.prefetch_configs(resolver, configs)
+        implementations = analyzer.identify_implementations(resolver, silos)
+        rows = sum(1 for config in configs if analyzer.get_silos_from_config(resolver, config, implementations)[0])
+
+        elapsed = time.perf_counter() - started
+    return {'rows': rows, 'elapsed': elapsed, **stats}
+
+
+class CannedProvider(BaseProvider):
+    """Answers every eth_call with the same uint256 word, so only client-side work is measured."""
+
+    RESULT = '0x' + (10**18).to_bytes(32, 'big').hex()
+
+    def make_request(self, method, params):
+        result = hex(146) if method == 'eth_chainId' else self.RESULT
+        return {'jsonrpc': '2.0', 'id': 0, 'result': result}
+
+    def is_connected(self, show_traceback: bool = False) -> bool:
+        return True
+
+
+def time_per_call(run, count: int) -> float:
+    """Microseconds per call of `run()`, which handles `count` calls."""
+    started = time.perf_counter()
+    run()
+    return (time.perf_counter() - started) / count * 1e6
+
+
+def run_codec(count: int) -> Dict[str, Dict[str, Any]]:
+    """Client-side cost per call of the collector's per-user calls on each encoding path."""
+    sys.path.insert(0, COLLECTOR_DIR)
+    import silo_data_collector as collector
+    from multicall import decode_aggregate3_result, encode_aggregate3, execute_call
+
+    w3 = Web3(CannedProvider())
+    silo0 = collector.get_silo_contract(w3, collector.SILO0_ADDRESS, collector.load_abi_from_file(SILO_ABI_FILE))
+    silo1 = collector.get_silo_contract(w3, collector.SILO1_ADDRESS, collector.load_abi_from_file(SILO_ABI_FILE))
+    lens = collector.get_silo_lens_contract(w3, collector.load_abi_from_file(SILO_LENS_ABI_FILE))
+    contracts = {contract.address: contract for contract in (silo0, silo1, lens)}
+
+    users = generate_addresses(-(-count // 7), 'user')
+    _, calls = collector.build_batch_calls(silo0.address, silo1.address, lens.address, users)
+    calls = calls[:count]
+    single = calls[:CODEC_SINGLE_MAX_CALLS]
+    block = collector.BLOCK_NUMBER
+
+    def web3_contract():
+        for call in single:
+            function = getattr(contracts[call.target].functions, call.signature.split('(')[0])
+            function(*call.args).call(block_identifier=block)
+
+    def codec_eth_call():
+        for call in single:
+            execute_call(w3, call, block)
+
+    # aggregate3 result with one uint256 per call, as returned by the node
+    raw = encode(['(bool,bytes)[]'], [[(True, (10**18).to_bytes(32, 'big'))] * len(calls)])
+
+    def eth_abi_aggregate3():
+        # encoding and decoding as done before silo_codec
+        payload = [
+            (Web3.to_checksum_address(call.target), True,
+             Web3.keccak(text=call.signature)[:4] + encode(['address'] * len(call.args), list(call.args)))
+            for call in calls
+        ]
+        encode(['(address,bool,bytes)[]'], [payload])
+        (results,) = decode(['(bool,bytes)[]'], raw)
+        for call, (_, data) in zip(calls, results):
+            decode(list(call.output_types), data)
+
+    def codec_aggregate3():
+        encode_aggregate3(calls)
+        decode_aggregate3_result(calls, raw)
+
+    # (path, calls, run, path it replaces)
+    paths = [
+        ('web3 contract call', len(single), web3_contract, None),
+        ('eth_call + silo_codec', len(single), codec_eth_call, 'web3 contract call'),
+        ('aggregate3 eth_abi', len(calls), eth_abi_aggregate3, None),
+        ('aggregate3 silo_codec', len(calls), codec_aggregate3, 'aggregate3 eth_abi'),
+    ]
+
+    results: Dict[str, Dict[str, Any]] = {}
+    for name, n, run, replaces in paths:
+        us_per_call = time_per_call(run, n)
+        speedup = results[replaces]['us_per_call'] / us_per_call if replaces else None
+        results[name] = {'calls': n, 'us_per_call': round(us_per_call, 2), 'speedup': speedup and round(speedup, 1)}
+
+    return results
+
+
+def print_codec_results(results: Dict[str, Dict[str, Any]]):
+    """Print the codec benchmark table, speedup relative to the path each fast path replaces."""
+    print("\n" + "=" * 64)
+    print(f"{'Path':<28} {'Calls':>8} {'us/call':>10} {'Speedup':>10}")
+    print("-" * 64)
+    for name, m in results.items():
+        speedup = f"{m['speedup']}x" if m['speedup'] else ''
+        print(f"{name:<28} {m['calls']:>8} {m['us_per_call']:>10} {speedup:>10}")
+    print("=" * 64)
+
+
+def run_worker(scenario: Dict[str, Any]):
+    """Subprocess entry: run one scenario and print its metrics as JSON on stdout."""
+    # keep per-batch progress logs out of the measurement
+    logging.getLogger().setLevel(logging.WARNING)
+
+    result = run_analyzer(scenario) if scenario['mode'] == 'analyzer' else run_collector(scenario)
+    latencies = result['latencies']
+
+    metrics = {
+        'rows': result['rows'],
+        'elapsed_s': round(result['elapsed'], 3),
+        'throughput': round(result['rows'] / result['elapsed'], 1) if result['elapsed'] else 0.0,
+        'requests': len(latencies) + result['failures'],
+        'failed': result['failures'],
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+    print(json.dumps(metrics))
+
+
+def run_scenario(scenario: Dict[str, Any]) -> Dict[str, Any]:
+    """Run a scenario in a fresh interpreter and return its metrics."""
+    process = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--worker', json.dumps(scenario)],
+        capture_output=True, text=True, cwd=SCRIPTS_DIR
+    )
+
+    if process.returncode != 0:
+        raise RuntimeError(f"{scenario['mode']} with {scenario['size']} failed:\n{process.stderr[-2000:]}")
+
+    return json.loads(process.stdout.strip().splitlines()[-1])
+
+
+def scenario_key(mode: str, size: int) -> str:
+    """Key of a scenario in results and baselines."""
+    return f"{mode}/{size}"
+
+
+def compare(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]], tolerance: float) -> List[str]:
+    """Regressions of `results` against `baseline`, as readable lines."""
+    regressions = []
+
+    for key, metrics in results.items():
+        before = baseline.get(key)
+        if before is None:
+            continue
+
+        if before['throughput'] and metrics['throughput'] < before['throughput'] * (1 - tolerance):
+            regressions.append(f"{key}: throughput {metrics['throughput']} < baseline {before['throughput']}")
+        if before['p99_ms'] and metrics['p99_ms'] > before['p99_ms'] * (1 + tolerance):
+            regressions.append(f"{key}: p99 {metrics['p99_ms']} ms > baseline {before['p99_ms']} ms")
+        if metrics['peak_rss_mb'] > before['peak_rss_mb'] * (1 + tolerance):
+            regressions.append(f"{key}: peak RSS {metrics['peak_rss_mb']} MB > baseline {before['peak_rss_mb']} MB")
+
+    return regressions
+
+
+def print_results(results: Dict[str, Dict[str, Any]]):
+    """Print the results table."""
+    print("\n" + "=" * 100)
+    print(f"{'Scenario':<30} {'Rows':>8} {'Time s':>9} {'Rows/s':>10} {'Requests':>9} {'Failed':>7} "
+          f"{'p50 ms':>8} {'p99 ms':>8} {'RSS MB':>8}")
+    print("-" * 100)
+    for key, m in results.items():
+        print(f"{key:<30} {m['rows']:>8} {m['elapsed_s']:>9} {m['throughput']:>10} {m['requests']:>9} {m['failed']:>7} "
+              f"{m['p50_ms']:>8} {m['p99_ms']:>8} {m['peak_rss_mb']:>8}")
+    print("=" * 100)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Benchmark the Silo scripts against a mock node")
+    parser.add_argument('--modes', default=DEFAULT_MODES,
+                        help=f"comma separated scenarios: {', '.join(COLLECTOR_SCENARIOS)}, analyzer")
+    parser.add_argument('--users', default=DEFAULT_USERS, help="comma separated user counts for collector scenarios")
+    parser.add_argument('--configs', default=DEFAULT_CONFIGS, help="comma separated SiloConfig counts for the analyzer")
+    parser.add_argument('--latency-ms', type=float, default=5.0, help="mock node latency per request")
+    parser.add_argument('--error-rate', type=float, default=0.0, help="share of requests the mock node throttles")
+    parser.add_argument('--revert-rate', type=float, default=0.01, help="share of per-user calls that revert")
+    parser.add_argument('--active-ratio', type=float, default=0.3, help="share of users holding a position")
+    parser.add_argument('--concurrency', type=int, default=8, help="in-flight requests in async scenarios")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=None, help="write results JSON here")
+    parser.add_argument('--baseline', default=None, help="baseline JSON to compare against")
+    parser.add_argument('--save-baseline', default=None, metavar='PATH', help="store results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE,
+                        help=f"relative change counted as regression (default {DEFAULT_TOLERANCE:g})")
+    parser.add_argument('--codec', type=int, default=0, metavar='CALLS',
+                        help="only time encoding and decoding of CALLS per-user calls, no node needed")
+    parser.add_argument('--worker', default=None, help=argparse.SUPPRESS)
+    return parser.parse_args()
+
+
+def main():
+    """Main function."""
+    args = parse_args()
+
+    if args.worker:
+        run_worker(json.loads(args.worker))
+        return
+
+    if args.codec:
+        logging.getLogger().setLevel(logging.WARNING)
+        print_codec_results(run_codec(args.codec))
+        return
+
+    modes = [mode.strip() for mode in args.modes.split(',') if mode.strip()]
+    unknown = [mode for mode in modes if mode != 'analyzer' and mode not in COLLECTOR_SCENARIOS]
+    if unknown:
+        logger.error(f"Unknown scenarios: {', '.join(unknown)}")
+        sys.exit(1)
+
+    node = MockSiloNode(
+        port=0, latency=args.latency_ms / 1000, error_rate=args.error_rate, revert_rate=args.revert_rate,
+        active_ratio=args.active_ratio, seed=args.seed
+    ).start()
+    logger.info(f"Mock node on {node.url}: {args.latency_ms:g} ms latency, {args.error_rate:g} error rate")
+
+    results: Dict[str, Dict[str, Any]] = {}
+    try:
+        for mode in modes:
+            sizes = args.configs if mode == 'analyzer' else args.users
+            for size in [int(size) for size in sizes.split(',')]:
+                if mode == 'sequential' and size > SEQUENTIAL_MAX_USERS:
+                    logger.info(f"Skipping sequential with {size} users (limit {SEQUENTIAL_MAX_USERS})")
+                    continue
+
+                logger.info(f"Running {mode} with {size}")
+                scenario = {
+                    'mode': mode, 'size': size, 'rpc_url': node.url, 'seed': args.seed, 'concurrency': args.concurrency
+                }
+                results[scenario_key(mode, size)] = run_scenario(scenario)
+    except RuntimeError as e:
+        logger.error(str(e))
+        sys.exit(1)
+    finally:
+        node.stop()
+
+    print_results(results)
+
+    report = {
+        'settings': {k: getattr(args, k) for k in ('latency_ms', 'error_rate', 'revert_rate', 'active_ratio', 'concurrency', 'seed')},
+        'results': results,
+    }
+    for path in (args.output, args.save_baseline):
+        if path:
+            with open(path, 'w') as f:
+                json.dump(report, f, indent=2)
+            logger.info(f"Results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            baseline = json.load(f)
+
+        if baseline.get('settings') != report['settings']:
+            logger.warning(f"Baseline settings differ: {baseline.get('settings')}")
+
+        regressions = compare(results, baseline['results'], args.tolerance)
+        for regression in regressions:
+            logger.error(f"Regression: {regression}")
+        if regressions:
+            sys.exit(1)
+        logger.info(f"No regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Silo Deployments Registry
+
+Shared lookups for the multi-chain scripts: chain ids and RPC endpoints of every chain
+in silo-core/deploy/silo/_siloDeployments.json, the SiloConfig addresses deployed on
+each chain and per-chain contract addresses from silo-core/deployments/<chain>.
+
+`get_code_index` indexes the deployment artifacts once per process by address and by
+runtime code hash, to name the contract behind a deployed implementation. Code that differs
+from an artifact only in its immutables and linked library addresses also matches: the
+library offsets come from the placeholders in the artifact bytecode, the immutable offsets
+from `immutableReferences` of the `forge build` artifact of the same contract (cache/foundry/out).
+Contracts without a matching build artifact are matched by exact code hash only.
+
+RPC endpoints are read from the same environment variables foundry.toml uses
+(RPC_MAINNET, RPC_ARBITRUM, RPC_OPTIMISM, RPC_SONIC, RPC_INK, RPC_AVALANCHE).
+"""
+
+import functools
+import glob
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, List, NamedTuple, Optional, Tuple
+
+from web3 import Web3
+
+logger = logging.getLogger(__name__)
+
+SILO_CORE_DIR = os.path.abspath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+SILO_DEPLOYMENTS_FILE = os.path.join(SILO_CORE_DIR, 'deploy', 'silo', '_siloDeployments.json')
+DEPLOYMENTS_DIR = os.path.join(SILO_CORE_DIR, 'deployments')
+# forge build output of the repository's foundry.toml profiles
+FOUNDRY_OUT_DIR = os.path.join(os.path.dirname(SILO_CORE_DIR), 'cache', 'foundry', 'out')
+
+# Unlinked library reference in artifact bytecode, 20 bytes once linked
+LIBRARY_PLACEHOLDER = re.compile(r"__\$[0-9a-fA-F]{34}\$__")
+
+# (start, length) byte ranges of runtime code filled in at deployment, sorted by start
+Wildcards = Tuple[Tuple[int, int], ...]
+
+
+class Chain(NamedTuple):
+    """Chain as named in _siloDeployments.json, with its chain id and RPC settings."""
+    name: str
+    chain_id: int
+    rpc_env: str
+    default_rpc: Optional[str] = None
+
+
+CHAINS: Dict[str, Chain] = {
+    'mainnet': Chain('mainnet', 1, 'RPC_MAINNET'),
+    'arbitrum_one': Chain('arbitrum_one', 42161, 'RPC_ARBITRUM'),
+    'optimism': Chain('optimism', 10, 'RPC_OPTIMISM'),
+    'sonic': Chain('sonic', 146, 'RPC_SONIC'),
+    'ink': Chain('ink', 57073, 'RPC_INK'),
+    'avalanche': Chain('avalanche', 43114, 'RPC_AVALANCHE', 'https://api.avax.network/ext/bc/C/rpc'),
+}
+
+
+def get_chain(name: str) -> Chain:
+    """Chain settings by _siloDeployments.json name."""
+    if name not in CHAINS:
+        raise ValueError(f"Unknown chain '{name}', known chains: {', '.join(CHAINS)}")
+
+    return CHAINS[name]
+
+
+def get_rpc_url(chain: Chain) -> Optional[str]:
+    """RPC URL for a chain from the environment, falling back to the chain's public RPC."""
+    return os.getenv(chain.rpc_env) or chain.default_rpc
+
+
+def load_silo_deployments(path: str = SILO_DEPLOYMENTS_FILE) -> Dict[str, Dict[str, str]]:
+    """Load {chain: {config name: SiloConfig address}} from _siloDeployments.json."""
+    with open(path, 'r') as f:
+        deployments = json.load(f)
+
+    logger.info(f"Loaded {sum(len(configs) for configs in deployments.values())} SiloConfigs on "
+                f"{len(deployments)} chains from {path}")
+    return deployments
+
+
+def select_chains(deployments: Dict[str, Dict[str, str]], names: Optional[List[str]] = None) -> List[str]:
+    """Chains to process: `names` if given, otherwise every chain in the deployments file."""
+    if not names:
+        return list(deployments)
+
+    missing = [name for name in names if name not in deployments]
+    if missing:
+        raise ValueError(f"No deployments for chain(s): {', '.join(missing)}")
+
+    return names
+
+
+def parse_blocks(values: List[str]) -> Dict[str, int]:
+    """Parse `chain=block` arguments."""
+    blocks = {}
+    for value in values:
+        chain, _, block = value.partition('=')
+        if not block:
+            raise ValueError(f"Invalid --block value '{value}', expected chain=number")
+        blocks[chain] = int(block)
+    return blocks
+
+
+def get_deployment_address(chain_name: str, contract_name: str) -> Optional[str]:
+    """Address of a contract from silo-core/deployments/<chain>/<contract>.sol.json, None if not deployed."""
+    path = os.path.join(DEPLOYMENTS_DIR, chain_name, f'{contract_name}.sol.json')
+
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)['address']
+    except FileNotFoundError:
+        return None
+
+
+class Artifact(NamedTuple):
+    """Deployed contract of silo-core/deployments/<chain>/<name>.sol.json."""
+    chain: str
+    name: str
+    address: str
+    code_hash: str
+    compiler: str
+    versioned: bool
+
+
+def code_hash(code: bytes) -> str:
+    return Web3.keccak(code).hex().removeprefix('0x')
+
+
+def matches_with_immutables(artifact_code: bytes, code: bytes, wildcards: Wildcards) -> bool:
+    """True when `code` equals `artifact_code` outside the immutable and library ranges in `wildcards`."""
+    if len(artifact_code) != len(code):
+        return False
+
+    position = 0
+    for start, length in wildcards:
+        if artifact_code[position:start] != code[position:start]:
+            return False
+        position = max(position, start + length)
+
+    return artifact_code[position:] == code[position:]
+
+
+def reference_ranges(references: Dict[str, Any]) -> List[Tuple[int, int]]:
+    """(start, length) of solc `immutableReferences` ({id: [...]}) or `linkReferences` ({file: {library: [...]}})."""
+    ranges = []
+    for value in references.values():
+        if isinstance(value, dict):
+            ranges += reference_ranges(value)
+        else:
+            ranges += [(reference['start'], reference['length']) for reference in value]
+    return ranges
+
+
+def placeholder_ranges(bytecode: str) -> List[Tuple[int, int]]:
+    """(start, length) of the unlinked library placeholders of hex bytecode without 0x."""
+    return [(match.start() // 2, 20) for match in LIBRARY_PLACEHOLDER.finditer(bytecode)]
+
+
+def index_build_artifacts(out_dir: str) -> Dict[str, List[str]]:
+    """Paths of `forge build` artifacts by contract name, `<Source>.sol/<Name>.json` anywhere under `out_dir`."""
+    paths: Dict[str, List[str]] = {}
+    for path in glob.glob(os.path.join(out_dir, '**', '*.sol', '*.json'), recursive=True):
+        paths.setdefault(os.path.basename(path).removesuffix('.json'), []).append(path)
+    return paths
+
+
+def load_immutable_ranges(paths: List[str], code: bytes) -> Optional[List[Tuple[int, int]]]:
+    """immutableReferences ranges of the build artifact whose runtime code is `code`, None when none is."""
+    for path in paths:
+        try:
+            with open(path, 'r') as f:
+                deployed = json.load(f)['deployedBytecode']
+            build_code = bytes.fromhex(LIBRARY_PLACEHOLDER.sub('0' * 40, deployed['object'].removeprefix('0x')))
+        except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+            logger.debug(f"Skipping build artifact {path}: {e}")
+            continue
+
+        # a build with other compiler settings has other immutable offsets
+        if build_code == code:
+            return reference_ranges(deployed.get('immutableReferences') or {})
+
+    return None
+
+
+class CodeIndex:
+    """Deployment artifacts by address and by runtime code hash."""
+
+    def __init__(self, artifacts: List[Tuple[Artifact, bytes, Wildcards]]):
+        self.by_address: Dict[str, List[Artifact]] = {}
+        self.by_code_hash: Dict[str, List[Artifact]] = {}
+        self.by_code_size: Dict[int, List[Tuple[Artifact, bytes, Wildcards]]] = {}
+
+        for artifact, code, wildcards in artifacts:
+            self.by_address.setdefault(artifact.address.lower(), []).append(artifact)
+            self.by_code_hash.setdefault(artifact.code_hash, []).append(artifact)
+            if wildcards:
+                self.by_code_size.setdefault(len(code), []).append((artifact, code, wildcards))
+
+    def __len__(self) -> int:
+        return sum(len(artifacts) for artifacts in self.by_address.values())
+
+    def lookup_address(self, address: str, chain_name: Optional[str] = None) -> Optional[Artifact]:
+        """Artifact deployed at `address`, preferring the one of `chain_name`."""
+        return prefer_chain(self.by_address.get(address.lower(), []), chain_name)
+
+    def lookup_code(self, code: bytes, chain_name: Optional[str] = None) -> Optional[Artifact]:
+        """Artifact with this runtime code, exactly or up to its immutables, preferring the one of `chain_name`."""
+        artifacts = self.by_code_hash.get(code_hash(code))
+        if not artifacts:
+            artifacts = [
+                artifact for artifact, artifact_code, wildcards in self.by_code_size.get(len(code), [])
+                if matches_with_immutables(artifact_code, code, wildcards)
+            ]
+        return prefer_chain(artifacts, chain_name)
+
+
+def prefer_chain(artifacts: List[Artifact], chain_name: Optional[str]) -> Optional[Artifact]:
+    for artifact in artifacts:
+        if artifact.chain == chain_name:
+            return artifact
+    return artifacts[0] if artifacts else None
+
+
+def load_artifacts(
+    deployments_dir: str = DEPLOYMENTS_DIR, out_dir: str = FOUNDRY_OUT_DIR
+) -> List[Tuple[Artifact, bytes, Wildcards]]:
+    """Artifacts with a deployed address and runtime code, with that code and its immutable and library ranges."""
+    build_artifacts = index_build_artifacts(out_dir)
+    artifacts = []
+    for path in sorted(glob.glob(os.path.join(deployments_dir, '*', '*.sol.json'))):
+        try:
+            with open(path, 'r') as f:
+                data = json.load(f)
+            bytecode = data['deployedBytecode'].removeprefix('0x')
+            code = bytes.fromhex(LIBRARY_PLACEHOLDER.sub('0' * 40, bytecode))
+        except (OSError, ValueError, KeyError, AttributeError) as e:
+            logger.warning(f"Skipping artifact {path}: {e}")
+            continue
+
+        if not code or not data.get('address'):
+            continue
+
+        name = os.path.basename(path).removesuffix('.sol.json')
+        immutables = load_immutable_ranges(build_artifacts.get(name, []), code)
+        if immutables is None:
+            logger.debug(f"No build artifact of {name} matches {path}, immutables are compared as written")
+        wildcards = tuple(sorted(set(placeholder_ranges(bytecode) + (immutables or []))))
+
+        versioned = any(item.get('type') == 'function' and item.get('name') == 'VERSION' for item in data.get('abi', []))
+        artifact = Artifact(
+            os.path.basename(os.path.dirname(path)), name,
+            Web3.to_checksum_address(data['address']), code_hash(code), data.get('compiler', ''), versioned
+        )
+        artifacts.append((artifact, code, wildcards))
+
+    return artifacts
+
+
+@functools.lru_cache(maxsize=None)
+def get_code_index(deployments_dir: str = DEPLOYMENTS_DIR, out_dir: str = FOUNDRY_OUT_DIR) -> CodeIndex:
+    """Index of the deployment artifacts, built on first use."""
+    index = CodeIndex(load_artifacts(deployments_dir, out_dir))
+    logger.info(f"Indexed {len(index)} deployment artifacts from {deployments_dir}")
+    return index
@@ -0,0 +1,544 @@
+#!/usr/bin/env python3
+"""
+Silo Deployment Graph
+
+Crawls every SiloConfig in silo-core/deploy/silo/_siloDeployments.json into a local SQLite
+index of the deployment graph, so questions like "which markets use oracle X", "which silos
+share IRM Y" or "which hook receiver does market Z use" are answered in milliseconds instead
+of minutes of RPC.
+
+`crawl` walks each chain at one pinned block, chains concurrently, in three batched steps
+through silo_resolver: getSilos() of every config; getConfig() and factory() of both silos;
+then symbol() and decimals() of assets and share tokens, quoteToken() of oracles, VERSION()
+of oracles, IRMs and hooks and hookReceiverConfig() of every silo. A crawl replaces the
+stored graph of its chains in one transaction.
+
+The database holds:
+- crawls: block each chain was read at
+- markets: chain, config, name, silo0, silo1
+- silos: the ConfigData of each silo, its factory and hook configuration
+- contracts: tokens, oracles, IRMs and hooks with symbol, decimals, quote token, version
+- links: one edge per (silo, role, address), indexed by address and by role
+
+Environment variables: RPC_<CHAIN> for every crawled chain, see silo_deployments.py
+
+Usage:
+    python3 scripts/silo_graph.py crawl [--chains sonic,avalanche] [--block sonic=42802010] [--cache [PATH]]
+    python3 scripts/silo_graph.py find 0xORACLE [--role oracle]      # markets using an address
+    python3 scripts/silo_graph.py market Silo_wS_USDC.e              # config, oracles, IRM, hook of a market
+    python3 scripts/silo_graph.py shared irm [--chain sonic]         # addresses used by several markets
+    python3 scripts/silo_graph.py stats
+
+    graph = DeploymentGraph("silo-graph.sqlite")
+    links = graph.find(oracle, roles=ROLE_GROUPS['oracle'])
+"""
+
+import argparse
+import logging
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from web3 import Web3
+
+from multicall import Call, CallResult
+from rpc_cache import RpcCache, DEFAULT_CACHE_PATH, DEFAULT_MAX_BYTES
+from rpc_pool import DEFAULT_MAX_ATTEMPTS
+from silo_analyzer import connect, factory_call, version_call
+from silo_deployments import get_chain, load_silo_deployments, parse_blocks, select_chains
+from silo_resolver import SiloResolver, ResolverError, config_data_call, is_zero_address, metadata_calls
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+DEFAULT_GRAPH_FILE = "silo-graph.sqlite"
+
+# silos columns linking a silo to another contract, by role
+ROLES = (
+    'token', 'protected_share_token', 'collateral_share_token', 'debt_share_token',
+    'solvency_oracle', 'max_ltv_oracle', 'interest_rate_model', 'hook_receiver', 'factory'
+)
+
+# Role names accepted by the queries for several roles at once
+ROLE_GROUPS = {
+    'oracle': ('solvency_oracle', 'max_ltv_oracle'),
+    'share_token': ('protected_share_token', 'collateral_share_token', 'debt_share_token'),
+    'irm': ('interest_rate_model',),
+    'hook': ('hook_receiver',),
+    **{role: (role,) for role in ROLES},
+}
+
+# ConfigData fields stored as silos columns, by silo_resolver field name
+CONFIG_COLUMNS = {
+    'token': 'token',
+    'protectedShareToken': 'protected_share_token',
+    'collateralShareToken': 'collateral_share_token',
+    'debtShareToken': 'debt_share_token',
+    'solvencyOracle': 'solvency_oracle',
+    'maxLtvOracle': 'max_ltv_oracle',
+    'interestRateModel': 'interest_rate_model',
+    'hookReceiver': 'hook_receiver',
+    'daoFee': 'dao_fee',
+    'deployerFee': 'deployer_fee',
+    'maxLtv': 'max_ltv',
+    'lt': 'lt',
+    'liquidationTargetLtv': 'liquidation_target_ltv',
+    'liquidationFee': 'liquidation_fee',
+    'flashloanFee': 'flashloan_fee',
+    'callBeforeQuote': 'call_before_quote',
+}
+
+SILO_COLUMNS = ('chain', 'silo', 'config', 'position', 'factory', *CONFIG_COLUMNS.values(), 'hooks_before', 'hooks_after')
+
+CONTRACT_COLUMNS = ('chain', 'address', 'kind', 'symbol', 'decimals', 'quote_token', 'version')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS crawls (
+    chain TEXT PRIMARY KEY,
+    block INTEGER NOT NULL,
+    crawled_at INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS markets (
+    chain TEXT NOT NULL,
+    config TEXT NOT NULL,
+    name TEXT NOT NULL,
+    silo0 TEXT NOT NULL,
+    silo1 TEXT NOT NULL,
+    PRIMARY KEY (chain, config)
+);
+CREATE INDEX IF NOT EXISTS markets_by_name ON markets (name);
+CREATE TABLE IF NOT EXISTS silos (
+    chain TEXT NOT NULL,
+    silo TEXT NOT NULL,
+    config TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    factory TEXT,
+    token TEXT,
+    protected_share_token TEXT,
+    collateral_share_token TEXT,
+    debt_share_token TEXT,
+    solvency_oracle TEXT,
+    max_ltv_oracle TEXT,
+    interest_rate_model TEXT,
+    hook_receiver TEXT,
+    dao_fee INTEGER,
+    deployer_fee INTEGER,
+    max_ltv INTEGER,
+    lt INTEGER,
+    liquidation_target_ltv INTEGER,
+    liquidation_fee INTEGER,
+    flashloan_fee INTEGER,
+    call_before_quote INTEGER,
+    hooks_before INTEGER,
+    hooks_after INTEGER,
+    PRIMARY KEY (chain, silo)
+);
+CREATE INDEX IF NOT EXISTS silos_by_config ON silos (chain, config);
+CREATE TABLE IF NOT EXISTS contracts (
+    chain TEXT NOT NULL,
+    address TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    symbol TEXT,
+    decimals INTEGER,
+    quote_token TEXT,
+    version TEXT,
+    PRIMARY KEY (chain, address, kind)
+);
+CREATE INDEX IF NOT EXISTS contracts_by_address ON contracts (address);
+CREATE TABLE IF NOT EXISTS links (
+    chain TEXT NOT NULL,
+    address TEXT NOT NULL,
+    role TEXT NOT NULL,
+    config TEXT NOT NULL,
+    silo TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS links_by_address ON links (address, role);
+CREATE INDEX IF NOT EXISTS links_by_role ON links (role, chain, address);
+"""
+
+# Kind of the contracts row for each role
+ROLE_KINDS = {
+    'token': 'token',
+    'protected_share_token': 'share_token',
+    'collateral_share_token': 'share_token',
+    'debt_share_token': 'share_token',
+    'solvency_oracle': 'oracle',
+    'max_ltv_oracle': 'oracle',
+    'interest_rate_model': 'irm',
+    'hook_receiver': 'hook',
+    'factory': 'factory',
+}
+
+
+class Link(NamedTuple):
+    """A silo of a market referencing `address` in `role`."""
+    chain: str
+    market: str
+    config: str
+    silo: str
+    role: str
+    address: str
+
+
+class ChainGraph(NamedTuple):
+    """Rows of one crawled chain."""
+    chain: str
+    block: int
+    markets: List[Tuple]
+    silos: List[Tuple]
+    contracts: List[Tuple]
+    links: List[Tuple]
+
+
+def sql_value(value: Any) -> Any:
+    """Values SQLite can store: integers above 64 bits as text, booleans as 0/1."""
+    if isinstance(value, bool):
+        return int(value)
+    if isinstance(value, int) and value >= 2**63:
+        return str(value)
+    return value
+
+
+def checksum(address: str) -> str:
+    """EIP-55 form of a query address. Raises ValueError when it is not an address."""
+    if not Web3.is_address(address):
+        raise ValueError(f"not an address: {address}")
+    return Web3.to_checksum_address(address)
+
+
+def resolve_values(resolver: SiloResolver, calls: Sequence[Call]) -> List[Optional[Any]]:
+    """Decoded values of `calls` in one batch, None for the calls that failed."""
+    results: List[CallResult] = resolver.resolve(list(calls)) if calls else []
+    return [result.value if result.success else None for result in results]
+
+
+def crawl_chain(
+    chain_name: str,
+    configs: Dict[str, str],
+    block_number: Optional[int] = None,
+    cache: Optional[RpcCache] = None,
+    max_attempts: int = DEFAULT_MAX_ATTEMPTS
+) -> ChainGraph:
+    """Graph rows of the `configs` ({name: SiloConfig address}) of one chain. Raises when the chain cannot be reached."""
+    chain = get_chain(chain_name)
+    w3 = connect(chain, cache, block_number, max_attempts)
+    if block_number is None:
+        block_number = w3.eth.block_number
+
+    resolver = SiloResolver(w3, chain.chain_id, block_number)
+    logger.info(f"{chain_name}: crawling {len(configs)} configs at block {block_number}")
+
+    # getSilos() of every config
+    resolver.prefetch_silos(list(configs.values()))
+    markets = []
+    for name, config in configs.items():
+        try:
+            markets.append((chain_name, Web3.to_checksum_address(config), name, *resolver.silos(config)))
+        except ResolverError as e:
+            logger.warning(f"{chain_name}: getSilos() failed for {name} ({config}): {e}")
+
+    # getConfig() and factory() of both silos
+    silo_configs = [(config, silo, position) for _, config, _, *silos in markets for position, silo in enumerate(silos)]
+    resolver.resolve([config_data_call(config, silo) for config, silo, _ in silo_configs])
+    factories = resolve_values(resolver, [factory_call(silo) for _, silo, _ in silo_configs])
+
+    silo_rows = []
+    for (config, silo, position), factory in zip(silo_configs, factories):
+        try:
+            data = resolver.config_data(config, silo)
+        except ResolverError as e:
+            logger.warning(f"{chain_name}: getConfig() failed for silo {silo}: {e}")
+            continue
+
+        row = {'chain': chain_name, 'silo': silo, 'config': config, 'position': position,
+               'factory': Web3.to_checksum_address(factory) if factory else None}
+        row.update({column: data[field] for field, column in CONFIG_COLUMNS.items()})
+        silo_rows.append(row)
+
+    # contracts the silos point at, and the hook configuration of every silo
+    contracts: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    links = []
+    for row in silo_rows:
+        for role in ROLES:
+            address = row[role]
+            if address and not is_zero_address(address):
+                links.append((chain_name, address, role, row['config'], row['silo']))
+                contracts.setdefault((address, ROLE_KINDS[role]), {})
+
+    tokens = [address for address, kind in contracts if kind in ('token', 'share_token')]
+    oracles = [address for address, kind in contracts if kind == 'oracle']
+    versioned = [address for address, kind in contracts if kind in ('oracle', 'irm', 'hook')]
+
+    metadata = resolve_values(resolver, [call for token in tokens for call in metadata_calls(token)])
+    quote_tokens = resolve_values(resolver, [Call(oracle, "quoteToken()", (), ("address",)) for oracle in oracles])
+    versions = resolve_values(resolver, [version_call(address) for address in versioned])
+    hook_configs = resolve_values(resolver, [
+        Call(row['hook_receiver'], "hookReceiverConfig(address)", (row['silo'],), ("uint24", "uint24"))
+        for row in silo_rows if not is_zero_address(row['hook_receiver'])
+    ])
+
+    for token, decimals, symbol in zip(tokens, metadata[::2], metadata[1::2]):
+        for kind in ('token', 'share_token'):
+            if (token, kind) in contracts:
+                contracts[(token, kind)].update(symbol=symbol, decimals=decimals)
+    for oracle, quote_token in zip(oracles, quote_tokens):
+        contracts[(oracle, 'oracle')]['quote_token'] = Web3.to_checksum_address(quote_token) if quote_token else None
+    for address, version in zip(versioned, versions):
+        for kind in ('oracle', 'irm', 'hook'):
+            if (address, kind) in contracts:
+                contracts[(address, kind)]['version'] = version
+
+    hooked = iter(hook_configs)
+    for row in silo_rows:
+        hooks = next(hooked) if not is_zero_address(row['hook_receiver']) else None
+        row['hooks_before'], row['hooks_after'] = hooks if hooks else (None, None)
+
+    contract_rows = [
+        (chain_name, address, kind, *(fields.get(column) for column in CONTRACT_COLUMNS[3:]))
+        for (address, kind), fields in contracts.items()
+    ]
+    logger.info(
+        f"{chain_name}: {len(markets)} markets, {len(silo_rows)} silos, {len(contract_rows)} contracts, {len(links)} links"
+    )
+    return ChainGraph(
+        chain_name, block_number, markets,
+        [tuple(sql_value(row[column]) for column in SILO_COLUMNS) for row in silo_rows],
+        [tuple(sql_value(value) for value in row) for row in contract_rows],
+        links
+    )
+
+
+class DeploymentGraph:
+    """SQLite index of crawled Silo markets, silos and the contracts they use."""
+
+    def __init__(self, path: str = DEFAULT_GRAPH_FILE):
+        self.path = path
+        self.db = sqlite3.connect(path)
+        self.db.executescript(SCHEMA)
+        self.db.commit()
+
+    def save(self, graph: ChainGraph):
+        """Replace the stored graph of a chain."""
+        with self.db:
+            for table in ('markets', 'silos', 'contracts', 'links'):
+                self.db.execute(f"DELETE FROM {table} WHERE chain = ?", (graph.chain,))
+            self.db.executemany("INSERT INTO markets VALUES (?, ?, ?, ?, ?)", graph.markets)
+            self.db.executemany(f"INSERT INTO silos VALUES ({', '.join('?' * len(SILO_COLUMNS))})", graph.silos)
+            self.db.executemany(f"INSERT INTO contracts VALUES ({', '.join('?' * len(CONTRACT_COLUMNS))})", graph.contracts)
+            self.db.executemany("INSERT INTO links VALUES (?, ?, ?, ?, ?)", graph.links)
+            self.db.execute("INSERT OR REPLACE INTO crawls VALUES (?, ?, ?)", (graph.chain, graph.block, int(time.time())))
+
+    def find(self, address: str, roles: Optional[Iterable[str]] = None, chain: Optional[str] = None) -> List[Link]:
+        """Silos referencing `address`, in any role or in `roles`."""
+        query = (
+            "SELECT l.chain, m.name, l.config, l.silo, l.role, l.address FROM links l "
+            "JOIN markets m ON m.chain = l.chain AND m.config = l.config WHERE l.address = ?"
+        )
+        params: List[Any] = [checksum(address)]
+        if roles:
+            roles = list(roles)
+            query += f" AND l.role IN ({', '.join('?' * len(roles))})"
+            params += roles
+        if chain:
+            query += " AND l.chain = ?"
+            params.append(chain)
+
+        return [Link(*row) for row in self.db.execute(query + " ORDER BY l.chain, m.name, l.silo", params)]
+
+    def markets(self, key: str) -> List[Dict[str, Any]]:
+        """Markets by name or SiloConfig address, with the silos rows of both silos under 'silos'."""
+        if Web3.is_address(key):
+            rows = self.db.execute("SELECT * FROM markets WHERE config = ?", (checksum(key),))
+        else:
+            rows = self.db.execute("SELECT * FROM markets WHERE name = ?", (key,))
+
+        columns = [column[0] for column in rows.description]
+        markets = [dict(zip(columns, row)) for row in rows.fetchall()]
+        for market in markets:
+            silos = self.db.execute(
+                "SELECT * FROM silos WHERE chain = ? AND config = ? ORDER BY position", (market['chain'], market['config'])
+            )
+            silo_columns = [column[0] for column in silos.description]
+            market['silos'] = [dict(zip(silo_columns, row)) for row in silos.fetchall()]
+        return markets
+
+    def contract(self, chain: str, address: str) -> Dict[str, Any]:
+        """Symbol, decimals, quote token and version known for a contract, merged over its kinds."""
+        rows = self.db.execute(
+            f"SELECT {', '.join(CONTRACT_COLUMNS[2:])} FROM contracts WHERE chain = ? AND address = ?", (chain, checksum(address))
+        ).fetchall()
+        merged: Dict[str, Any] = {}
+        for row in rows:
+            for column, value in zip(CONTRACT_COLUMNS[2:], row):
+                if value is not None:
+                    merged.setdefault(column, value)
+        return merged
+
+    def shared(self, roles: Iterable[str], chain: Optional[str] = None, min_markets: int = 2) -> List[Tuple[str, str, int, str]]:
+        """(chain, address, market count, market names) of addresses used in `roles` by at least `min_markets` markets."""
+        roles = list(roles)
+        query = (
+            "SELECT l.chain, l.address, COUNT(DISTINCT l.config) AS count, GROUP_CONCAT(DISTINCT m.name) FROM links l "
+            "JOIN markets m ON m.chain = l.chain AND m.config = l.config "
+            f"WHERE l.role IN ({', '.join('?' * len(roles))})"
+        )
+        params: List[Any] = roles
+        if chain:
+            query += " AND l.chain = ?"
+            params = roles + [chain]
+
+        query += " GROUP BY l.chain, l.address HAVING count >= ? ORDER BY count DESC, l.chain, l.address"
+        return self.db.execute(query, params + [min_markets]).fetchall()
+
+    def stats(self) -> List[Tuple[str, int, int, int, int]]:
+        """(chain, block, markets, silos, contracts) of every crawled chain."""
+        return self.db.execute(
+            "SELECT c.chain, c.block, "
+            "(SELECT COUNT(*) FROM markets m WHERE m.chain = c.chain), "
+            "(SELECT COUNT(*) FROM silos s WHERE s.chain = c.chain), "
+            "(SELECT COUNT(DISTINCT address) FROM contracts k WHERE k.chain = c.chain) "
+            "FROM crawls c ORDER BY c.chain"
+        ).fetchall()
+
+    def close(self):
+        self.db.close()
+
+
+def crawl(args: argparse.Namespace):
+    """Crawl the selected chains concurrently and store each chain as it completes."""
+    try:
+        deployments = load_silo_deployments()
+        chains = [chain for chain in select_chains(deployments, args.chains.split(',') if args.chains else None)
+                  if deployments[chain]]
+        blocks = parse_blocks(args.block)
+        for chain in chains:
+            get_chain(chain)
+    except (OSError, ValueError) as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+    cache = RpcCache(args.cache, args.cache_max_mb * 1024 * 1024) if args.cache else None
+    graph = DeploymentGraph(args.db)
+    failed = []
+    with ThreadPoolExecutor(max_workers=max(1, len(chains)), thread_name_prefix='chain') as executor:
+        futures = {
+            chain: executor.submit(crawl_chain, chain, deployments[chain], blocks.get(chain), cache, args.max_attempts)
+            for chain in chains
+        }
+        for chain, future in futures.items():
+            try:
+                graph.save(future.result())
+            except Exception as e:
+                logger.error(f"{chain}: crawl failed, keeping the stored graph: {e}")
+                failed.append(chain)
+
+    graph.close()
+    if cache is not None:
+        cache.close()
+
+    logger.info(f"Graph saved to: {args.db} ({len(chains) - len(failed)}/{len(chains)} chains)")
+    if failed:
+        sys.exit(1)
+
+
+def print_links(links: List[Link]):
+    print(f"{'Chain':<13} {'Market':<40} {'Silo':<42} {'Role':<24}")
+    print("-" * 122)
+    for link in links:
+        print(f"{link.chain:<13} {link.market:<40} {link.silo:<42} {link.role:<24}")
+    print(f"{len(links)} links, {len({(link.chain, link.config) for link in links})} markets")
+
+
+def print_market(graph: DeploymentGraph, market: Dict[str, Any]):
+    print(f"{market['chain']} {market['name']} (SiloConfig {market['config']})")
+    for silo in market['silos']:
+        print(f"  silo{silo['position']} {silo['silo']}")
+        for column in SILO_COLUMNS[4:]:
+            value = silo[column]
+            details = graph.contract(market['chain'], value) if column in ROLES and value and Web3.is_address(value) else {}
+            suffix = " ".join(f"{key}={details[key]}" for key in ('symbol', 'version', 'quote_token') if key in details)
+            print(f"    {column:<24} {value}" + (f"  ({suffix})" if suffix else ""))
+
+
+def query(args: argparse.Namespace):
+    """Answer a find, market, shared or stats query from the database."""
+    graph = DeploymentGraph(args.db)
+    started = time.perf_counter()
+    try:
+        if args.command == 'find':
+            print_links(graph.find(args.address, ROLE_GROUPS[args.role] if args.role else None, args.chain))
+        elif args.command == 'market':
+            markets = graph.markets(args.market)
+            if not markets:
+                logger.error(f"No market {args.market} in {args.db}")
+                sys.exit(1)
+            for market in markets:
+                print_market(graph, market)
+        elif args.command == 'shared':
+            rows = graph.shared(ROLE_GROUPS[args.role], args.chain, args.min_markets)
+            for chain, address, count, names in rows:
+                details = graph.contract(chain, address)
+                label = details.get('symbol') or details.get('version') or ''
+                print(f"{chain:<13} {address:<42} {label:<24} {count:>4} markets: {names}")
+        else:
+            print(f"{'Chain':<13} {'Block':>10} {'Markets':>8} {'Silos':>6} {'Contracts':>10}")
+            for chain, block, markets, silos, contracts in graph.stats():
+                print(f"{chain:<13} {block:>10} {markets:>8} {silos:>6} {contracts:>10}")
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
+    finally:
+        graph.close()
+
+    logger.info(f"Query answered in {(time.perf_counter() - started) * 1000:.1f} ms")
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Crawl and query the Silo deployment graph")
+    parser.add_argument('--db', default=DEFAULT_GRAPH_FILE, metavar='PATH', help=f"graph database (default {DEFAULT_GRAPH_FILE})")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    crawl_parser = commands.add_parser('crawl', help="crawl SiloConfigs into the database")
+    crawl_parser.add_argument('--chains', default=None, help="comma separated chains to crawl (default: all)")
+    crawl_parser.add_argument('--block', action='append', default=[], metavar='CHAIN=N',
+                              help="block to read a chain at (default: latest block at start), can be repeated")
+    crawl_parser.add_argument('--cache', nargs='?', const=DEFAULT_CACHE_PATH, default=None, metavar='PATH',
+                              help=f"cache block-pinned RPC responses in SQLite (default path {DEFAULT_CACHE_PATH})")
+    crawl_parser.add_argument('--cache-max-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                              help="evict least recently used cache entries above this size")
+    crawl_parser.add_argument('--max-attempts', type=int, default=DEFAULT_MAX_ATTEMPTS,
+                              help=f"attempts per RPC request across endpoints (default {DEFAULT_MAX_ATTEMPTS})")
+
+    roles = sorted(ROLE_GROUPS)
+    find_parser = commands.add_parser('find', help="markets whose silos use an address")
+    find_parser.add_argument('address')
+    find_parser.add_argument('--role', choices=roles, default=None, help="only links in this role")
+    find_parser.add_argument('--chain', default=None)
+
+    market_parser = commands.add_parser('market', help="config of a market by name or SiloConfig address")
+    market_parser.add_argument('market')
+
+    shared_parser = commands.add_parser('shared', help="addresses used in a role by several markets")
+    shared_parser.add_argument('role', choices=roles)
+    shared_parser.add_argument('--chain', default=None)
+    shared_parser.add_argument('--min-markets', type=int, default=2, help="minimum number of markets (default 2)")
+
+    commands.add_parser('stats', help="crawled chains and row counts")
+    return parser.parse_args()
+
+
+def main():
+    """Main function."""
+    args = parse_args()
+    if args.command == 'crawl':
+        crawl(args)
+    else:
+        query(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,247 @@
+#!/usr/bin/env python3
+"""
+SiloLens Batch Endpoints
+
+Reads borrower health for many users through the SiloLens array endpoints instead of one
+getUserLTV call per user:
+
+    getUsersHealth(Borrower[])  -> (lt, ltv) per borrower
+    getUsersLT(Borrower[])      -> lt per borrower
+    getAPRs(ISilo[])            -> (depositAPR, borrowAPR) per silo
+
+where `Borrower` is `(address silo, address wallet)`.
+
+Every borrower costs the lens a full solvency computation, so a large chunk can run into the
+node's eth_call gas cap or response size limit: a revert, or a -32000 "out of gas" or
+"response size exceeded" error, which rpc_pool returns without retrying. A failing chunk is
+split in half and retried, and following chunks start at the smaller size; every successful
+full chunk doubles the size again, up to the configured maximum, so one reverting borrower
+does not slow down the rest of the run. Only a single borrower whose call still fails is
+reported as missing (None); requests that fail on every RPC endpoint (rpc_pool.RpcPoolError)
+are raised.
+
+Usage:
+    if supports_users_health(w3, lens, silo, BLOCK_NUMBER):
+        batcher = LensBatcher(chunk_size=200)
+        healths = batcher.users_health(w3, lens, [(silo, user) for user in users], BLOCK_NUMBER)
+
+    # with rpc_async.AsyncRpcClient
+    healths = await batcher.users_health_async(client, lens, borrowers, BLOCK_NUMBER)
+"""
+
+import logging
+from typing import Any, List, NamedTuple, Optional, Sequence, Tuple
+
+from eth_abi import decode
+from web3 import Web3
+
+from multicall import Call, encode_call
+from rpc_pool import RpcPoolError
+
+logger = logging.getLogger(__name__)
+
+USERS_HEALTH_SIGNATURE = "getUsersHealth((address,address)[])"
+USERS_LT_SIGNATURE = "getUsersLT((address,address)[])"
+APRS_SIGNATURE = "getAPRs(address[])"
+
+# Borrowers per getUsersHealth/getUsersLT call before any failure shrinks it
+DEFAULT_LENS_CHUNK_SIZE = 200
+
+ZERO_ADDRESS = "0x" + "00" * 20
+
+Borrower = Tuple[str, str]
+
+
+class BorrowerHealth(NamedTuple):
+    """LT and LTV of a borrower, both in 18 decimals."""
+    lt: int
+    ltv: int
+
+
+class SiloApr(NamedTuple):
+    """Deposit and borrow APR of a silo, both in 18 decimals."""
+    deposit_apr: int
+    borrow_apr: int
+
+
+def build_users_health_call(lens_address: str, borrowers: Sequence[Borrower]) -> Call:
+    """getUsersHealth call for `borrowers`."""
+    return Call(lens_address, USERS_HEALTH_SIGNATURE, (list(borrowers),), ("(uint256,uint256)[]",))
+
+
+def build_users_lt_call(lens_address: str, borrowers: Sequence[Borrower]) -> Call:
+    """getUsersLT call for `borrowers`."""
+    return Call(lens_address, USERS_LT_SIGNATURE, (list(borrowers),), ("uint256[]",))
+
+
+def build_aprs_call(lens_address: str, silos: Sequence[str]) -> Call:
+    """getAPRs call for `silos`."""
+    return Call(lens_address, APRS_SIGNATURE, (list(silos),), ("(uint256,uint256)[]",))
+
+
+def decode_array(call: Call, raw: bytes, expected: int) -> list:
+    """Decode the array returned by a lens batch call, checking it has one entry per input."""
+    (values,) = decode(list(call.output_types), raw)
+
+    if len(values) != expected:
+        raise ValueError(f"{call.signature} returned {len(values)} entries for {expected} inputs")
+
+    return list(values)
+
+
+def fetch_aprs(w3: Web3, lens_address: str, silos: Sequence[str], block_identifier: Any = "latest") -> List[SiloApr]:
+    """APRs of `silos` with a single getAPRs call."""
+    call = build_aprs_call(lens_address, silos)
+    raw = w3.eth.call({"to": lens_address, "data": "0x" + encode_call(call).hex()}, block_identifier)
+    return [SiloApr(deposit, borrow) for deposit, borrow in decode_array(call, bytes(raw), len(silos))]
+
+
+def supports_users_health(w3: Web3, lens_address: str, silo_address: str, block_identifier: Any = "latest") -> bool:
+    """Whether the lens answers getUsersHealth, probed with a single empty borrower. RpcPoolError is raised."""
+    call = build_users_health_call(lens_address, [(silo_address, ZERO_ADDRESS)])
+
+    try:
+        raw = w3.eth.call({"to": lens_address, "data": "0x" + encode_call(call).hex()}, block_identifier)
+        decode_array(call, bytes(raw), 1)
+    except RpcPoolError:
+        raise
+    except Exception as e:
+        logger.debug(f"getUsersHealth probe of {lens_address} failed: {e}")
+        return False
+
+    return True
+
+
+class LensBatcher:
+    """Runs lens batch calls in chunks of at most `chunk_size`, halving chunks that fail."""
+
+    def __init__(self, chunk_size: int = DEFAULT_LENS_CHUNK_SIZE):
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+
+        self.max_chunk_size = chunk_size
+        self.chunk_size = chunk_size
+        self.calls = 0
+        self.splits = 0
+
+    def users_health(
+        self,
+        w3: Web3,
+        lens_address: str,
+        borrowers: Sequence[Borrower],
+        block_identifier: Any = "latest"
+    ) -> List[Optional[BorrowerHealth]]:
+        """Health of every borrower, None where the lens call failed even for that borrower alone."""
+        return self._run(w3, build_users_health_call, lens_address, borrowers, block_identifier, BorrowerHealth._make)
+
+    def users_lt(
+        self,
+        w3: Web3,
+        lens_address: str,
+        borrowers: Sequence[Borrower],
+        block_identifier: Any = "latest"
+    ) -> List[Optional[int]]:
+        """LT of every borrower, None where the lens call failed even for that borrower alone."""
+        return self._run(w3, build_users_lt_call, lens_address, borrowers, block_identifier, int)
+
+    async def users_health_async(
+        self,
+        client: Any,
+        lens_address: str,
+        borrowers: Sequence[Borrower],
+        block_identifier: Any = "latest"
+    ) -> List[Optional[BorrowerHealth]]:
+        """Async variant of users_health for an `rpc_async.AsyncRpcClient`."""
+        return await self._run_async(
+            client, build_users_health_call, lens_address, borrowers, block_identifier, BorrowerHealth._make
+        )
+
+    async def users_lt_async(
+        self,
+        client: Any,
+        lens_address: str,
+        borrowers: Sequence[Borrower],
+        block_identifier: Any = "latest"
+    ) -> List[Optional[int]]:
+        """Async variant of users_lt for an `rpc_async.AsyncRpcClient`."""
+        return await self._run_async(client, build_users_lt_call, lens_address, borrowers, block_identifier, int)
+
+    def _shrink(self, chunk_length: int, error: Exception):
+        self.splits += 1
+        half = max(chunk_length // 2, 1)
+
+        if half < self.chunk_size:
+            logger.warning(f"Lens batch of {chunk_length} failed ({error}), chunk size lowered to {half}")
+            self.chunk_size = half
+
+    def _grow(self, chunk_length: int):
+        if chunk_length >= self.chunk_size and self.chunk_size < self.max_chunk_size:
+            self.chunk_size = min(self.chunk_size * 2, self.max_chunk_size)
+
+    def _run(self, w3, build_call, lens_address, borrowers, block_identifier, convert) -> list:
+        results = []
+        start = 0
+
+        while start < len(borrowers):
+            chunk = borrowers[start:start + self.chunk_size]
+            results += self._run_chunk(w3, build_call, lens_address, chunk, block_identifier, convert)
+            start += len(chunk)
+
+        return results
+
+    def _run_chunk(self, w3, build_call, lens_address, chunk, block_identifier, convert) -> list:
+        call = build_call(lens_address, chunk)
+
+        try:
+            self.calls += 1
+            raw = w3.eth.call({"to": lens_address, "data": "0x" + encode_call(call).hex()}, block_identifier)
+            values = [convert(value) for value in decode_array(call, bytes(raw), len(chunk))]
+        except RpcPoolError:
+            # the node is unreachable, splitting would not help
+            raise
+        except Exception as e:
+            if len(chunk) == 1:
+                logger.warning(f"{call.signature.split('(')[0]} failed for {chunk[0][1]}: {e}")
+                return [None]
+
+            self._shrink(len(chunk), e)
+            middle = len(chunk) // 2
+            return (self._run_chunk(w3, build_call, lens_address, chunk[:middle], block_identifier, convert)
+                    + self._run_chunk(w3, build_call, lens_address, chunk[middle:], block_identifier, convert))
+
+        self._grow(len(chunk))
+        return values
+
+    async def _run_async(self, client, build_call, lens_address, borrowers, block_identifier, convert) -> list:
+        results = []
+        start = 0
+
+        while start < len(borrowers):
+            chunk = borrowers[start:start + self.chunk_size]
+            results += await self._run_chunk_async(client, build_call, lens_address, chunk, block_identifier, convert)
+            start += len(chunk)
+
+        return results
+
+    async def _run_chunk_async(self, client, build_call, lens_address, chunk, block_identifier, convert) -> list:
+        call = build_call(lens_address, chunk)
+
+        try:
+            self.calls += 1
+            raw = await client.eth_call(lens_address, encode_call(call), block_identifier)
+            values = [convert(value) for value in decode_array(call, raw, len(chunk))]
+        except RpcPoolError:
+            # the node is unreachable, splitting would not help
+            raise
+        except Exception as e:
+            if len(chunk) == 1:
+                logger.warning(f"{call.signature.split('(')[0]} failed for {chunk[0][1]}: {e}")
+                return [None]
+
+            self._shrink(len(chunk), e)
+            middle = len(chunk) // 2
+            return (await self._run_chunk_async(client, build_call, lens_address, chunk[:middle], block_identifier, convert)
+                    + await self._run_chunk_async(client, build_call, lens_address, chunk[middle:], block_identifier, convert))
+
+        self._grow(len(chunk))
+        return values
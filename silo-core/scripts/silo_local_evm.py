@@ -0,0 +1,477 @@
+#!/usr/bin/env python3
+"""
+Local EVM Execution
+
+Runs read-only contract calls on an in-process py-evm instead of the RPC node. Code, balances
+and storage slots at one block are kept in a StateSnapshot (SQLite); calls execute against it
+in a pool of worker processes, so once the state is local a call costs CPU time only.
+
+The state a call needs is discovered by running it: reads of accounts or slots missing from
+the snapshot are recorded and answered with zero, so a single pass finds every slot on the
+path taken. Calls that missed state are not trusted; the missing state is fetched with
+eth_getStorageAt / eth_getCode / eth_getBalance / eth_getTransactionCount at the block (all
+concurrent, and cached by rpc_cache when a cache is used) and the calls run again, until
+every call ran on known state only.
+
+State can be loaded in bulk with `prestateTracer` debug_traceCall traces: `execute_calls` takes
+a `prestate` callback that gets the calls which missed state in the first round, so each batch
+is traced before anything is fetched slot by slot. Nodes without the debug API fall back to
+discovering the state slot by slot.
+
+The snapshot is kept on disk, so a rerun at the same block executes without any request.
+
+Usage:
+    snapshot = StateSnapshot(path, chain_id, block_number)
+    await fetch_header(client, snapshot)
+
+    async def trace_missed(indexes):
+        calls_to_trace = [calls[index] for index in indexes]
+        await fetch_prestate(client, snapshot, MULTICALL3_ADDRESS, encode_aggregate3(calls_to_trace))
+
+    with local_executor(snapshot.path, workers=8) as executor:
+        results = await execute_calls(client, executor, snapshot, calls, prestate=trace_missed)
+"""
+
+import asyncio
+import concurrent.futures
+import logging
+import os
+import sqlite3
+from typing import Any, Awaitable, Callable, Dict, FrozenSet, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from eth.constants import BLANK_ROOT_HASH, ZERO_ADDRESS
+from eth.db.account import AccountDB
+from eth.db.atomic import AtomicDB
+from eth.rlp.accounts import Account
+from eth.vm.execution_context import ExecutionContext
+from eth.vm.forks.cancun.state import CancunState
+from eth.vm.message import Message
+from web3 import Web3
+
+from multicall import Call, CallResult, decode_call_result, encode_call
+from rpc_metrics import METRICS
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SNAPSHOT_DIR = os.path.join(os.path.expanduser("~"), ".cache", "silo-scripts")
+
+# Gas given to every call, as nodes do for eth_call without a gas field
+DEFAULT_CALL_GAS = 50_000_000
+
+# Calls per task sent to a worker process
+DEFAULT_TASK_SIZE = 200
+
+# A call needing more fetch rounds than this has a path that never settles
+MAX_ROUNDS = 32
+
+# Precompiles, present without being in any snapshot (0x01-0x11 covers Cancun and Prague)
+PRECOMPILE_ADDRESSES = frozenset((i).to_bytes(20, 'big') for i in range(1, 0x12))
+
+# JSON-RPC "method not found", how nodes without the debug API answer debug_traceCall
+METHOD_NOT_FOUND_CODE = -32601
+
+# Error messages of nodes that have debug_traceCall disabled or lack prestateTracer
+TRACE_UNAVAILABLE_MESSAGES = ("not available", "does not exist", "not supported", "unsupported", "not found", "disabled")
+
+# (address, slot) of a missing storage slot, (address, None) of a missing account
+StateKey = Tuple[bytes, Optional[int]]
+
+
+class LocalEvmError(Exception):
+    """Local execution could not complete."""
+
+
+class LocalCallOutcome(NamedTuple):
+    """Result of one call run locally, with the state it read that the snapshot did not have."""
+    result: CallResult
+    misses: FrozenSet[StateKey]
+
+
+def default_snapshot_path(chain_id: int, block_number: int) -> str:
+    return os.path.join(DEFAULT_SNAPSHOT_DIR, f"state-{chain_id}-{block_number}.sqlite")
+
+
+class StateSnapshot:
+    """Accounts and storage slots of one chain at one block, in SQLite.
+
+    Written by the process that fetches state; worker processes open it read-only and pick up
+    new rows incrementally with `read_new`.
+    """
+
+    def __init__(self, path: str, chain_id: int = None, block_number: int = None):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+            CREATE TABLE IF NOT EXISTS accounts (
+                address BLOB PRIMARY KEY, balance TEXT NOT NULL, nonce INTEGER NOT NULL, code BLOB NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS storage (
+                address BLOB NOT NULL, slot BLOB NOT NULL, value BLOB NOT NULL, PRIMARY KEY (address, slot)
+            );
+        """)
+        self.conn.commit()
+
+        meta = self.meta()
+        for key, value in (('chain_id', chain_id), ('block_number', block_number)):
+            if value is None:
+                continue
+            if key in meta and int(meta[key]) != value:
+                raise LocalEvmError(f"Snapshot {path} is for {key} {meta[key]}, not {value}")
+            if key not in meta:
+                self.set_meta({key: value})
+
+        self.account_rowid = 0
+        self.storage_rowid = 0
+
+    def meta(self) -> Dict[str, str]:
+        return dict(self.conn.execute("SELECT key, value FROM meta"))
+
+    def set_meta(self, values: Dict[str, Any]):
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", [(key, str(value)) for key, value in values.items()]
+        )
+        self.conn.commit()
+
+    @property
+    def block_number(self) -> int:
+        return int(self.meta()['block_number'])
+
+    def add_accounts(self, accounts: Iterable[Tuple[bytes, int, int, bytes]]):
+        """Store (address, balance, nonce, code) rows."""
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO accounts (address, balance, nonce, code) VALUES (?, ?, ?, ?)",
+            [(address, str(balance), nonce, code) for address, balance, nonce, code in accounts]
+        )
+        self.conn.commit()
+
+    def add_storage(self, slots: Iterable[Tuple[bytes, int, int]]):
+        """Store (address, slot, value) rows."""
+        self.conn.executemany(
+            "INSERT OR REPLACE INTO storage (address, slot, value) VALUES (?, ?, ?)",
+            [(address, slot.to_bytes(32, 'big'), value.to_bytes(32, 'big')) for address, slot, value in slots]
+        )
+        self.conn.commit()
+
+    def known_accounts(self) -> Set[bytes]:
+        return {row[0] for row in self.conn.execute("SELECT address FROM accounts")}
+
+    def read_new(self) -> Tuple[List[Tuple[bytes, int, int, bytes]], Dict[Tuple[bytes, int], int]]:
+        """Accounts and slots added since the previous call."""
+        accounts = []
+        for rowid, address, balance, nonce, code in self.conn.execute(
+            "SELECT rowid, address, balance, nonce, code FROM accounts WHERE rowid > ? ORDER BY rowid", (self.account_rowid,)
+        ):
+            self.account_rowid = rowid
+            accounts.append((address, int(balance), nonce, code))
+
+        storage = {}
+        for rowid, address, slot, value in self.conn.execute(
+            "SELECT rowid, address, slot, value FROM storage WHERE rowid > ? ORDER BY rowid", (self.storage_rowid,)
+        ):
+            self.storage_rowid = rowid
+            storage[(address, int.from_bytes(slot, 'big'))] = int.from_bytes(value, 'big')
+
+        return accounts, storage
+
+    def counts(self) -> Tuple[int, int]:
+        """Number of accounts and storage slots."""
+        accounts = self.conn.execute("SELECT COUNT(*) FROM accounts").fetchone()[0]
+        slots = self.conn.execute("SELECT COUNT(*) FROM storage").fetchone()[0]
+        return accounts, slots
+
+    def close(self):
+        self.conn.close()
+
+
+class SnapshotAccountDB(AccountDB):
+    """AccountDB with storage read from a dict of snapshot slots instead of a state trie.
+
+    Reads of accounts or slots the snapshot does not have are recorded in `misses` and return
+    empty values. Slots written during a call live in `written`, journaled with the checkpoints.
+    """
+
+    def __init__(self, db, state_root=BLANK_ROOT_HASH):
+        super().__init__(db, state_root)
+        self.storage: Dict[Tuple[bytes, int], int] = {}
+        self.accounts: Set[bytes] = set(PRECOMPILE_ADDRESSES)
+        self.written: Dict[Tuple[bytes, int], int] = {}
+        self.saved: Dict[Any, Dict[Tuple[bytes, int], int]] = {}
+        self.misses: Set[StateKey] = set()
+        # off while the state is being set up, accounts created then are not misses
+        self.tracking = False
+
+    def get_storage(self, address, slot, from_journal=True):
+        key = (address, slot)
+        if from_journal and key in self.written:
+            return self.written[key]
+
+        value = self.storage.get(key)
+        if value is None:
+            if self.tracking and address in self.accounts:
+                self.misses.add(key)
+            return 0
+
+        return value
+
+    def set_storage(self, address, slot, value):
+        self.written[(address, slot)] = value
+
+    def _get_account(self, address, from_journal=True):
+        if self.tracking and address not in self.accounts:
+            self.misses.add((address, None))
+            return Account()
+
+        return super()._get_account(address, from_journal)
+
+    def record(self):
+        checkpoint = super().record()
+        self.saved[checkpoint] = dict(self.written)
+        return checkpoint
+
+    def discard(self, checkpoint):
+        super().discard(checkpoint)
+        self.written = self.saved.pop(checkpoint)
+
+    def commit(self, checkpoint):
+        super().commit(checkpoint)
+        self.saved.pop(checkpoint, None)
+
+
+class SnapshotState(CancunState):
+    account_db_class = SnapshotAccountDB
+
+
+class LocalEvm:
+    """In-process EVM over a StateSnapshot. Not thread safe; one per process."""
+
+    def __init__(self, snapshot: StateSnapshot, gas: int = DEFAULT_CALL_GAS):
+        meta = snapshot.meta()
+        if 'timestamp' not in meta:
+            raise LocalEvmError(f"Snapshot {snapshot.path} has no block header, run fetch_header first")
+
+        self.snapshot = snapshot
+        self.gas = gas
+        context = ExecutionContext(
+            coinbase=bytes.fromhex(meta['coinbase'][2:]),
+            timestamp=int(meta['timestamp']),
+            block_number=int(meta['block_number']),
+            difficulty=0,
+            mix_hash=bytes.fromhex(meta['mix_hash'][2:]),
+            gas_limit=int(meta['gas_limit']),
+            # BLOCKHASH reads as zero, Silo view calls do not use it
+            prev_hashes=(),
+            chain_id=int(meta['chain_id']),
+            base_fee_per_gas=int(meta['base_fee']),
+            excess_blob_gas=0,
+        )
+        self.state = SnapshotState(AtomicDB(), context, BLANK_ROOT_HASH)
+        self.account_db: SnapshotAccountDB = self.state._account_db
+        self.tx_context = self.state.get_transaction_context_class()(gas_price=0, origin=ZERO_ADDRESS)
+        self.refresh()
+
+    def refresh(self):
+        """Load state added to the snapshot since the last refresh."""
+        accounts, storage = self.snapshot.read_new()
+        self.account_db.storage.update(storage)
+
+        if accounts:
+            self.account_db.tracking = False
+            for address, balance, nonce, code in accounts:
+                self.state.set_balance(address, balance)
+                self.state.set_nonce(address, nonce)
+                self.state.set_code(address, code)
+                self.account_db.accounts.add(address)
+            self.state.persist()
+
+    def call(self, to: bytes, data: bytes) -> Tuple[bool, bytes, FrozenSet[StateKey]]:
+        """eth_call `data` to `to`: (success, output or revert data, state missing from the snapshot)."""
+        account_db = self.account_db
+        account_db.misses = set()
+        account_db.tracking = True
+        checkpoint = self.state.snapshot()
+
+        try:
+            message = Message(
+                gas=self.gas, to=to, sender=ZERO_ADDRESS, value=0, data=data, code=self.state.get_code(to)
+            )
+            computation = self.state.computation_class.apply_message(self.state, message, self.tx_context)
+            success, output = computation.is_success, computation.output
+        except Exception as e:
+            # execution on a speculative path can fail in ways a real call would not
+            if not account_db.misses:
+                raise LocalEvmError(f"local execution failed: {e!r}") from e
+            success, output = False, b""
+        finally:
+            self.state.revert(checkpoint)
+            self.state.clear_transient_storage()
+            account_db.tracking = False
+
+        return success, output, frozenset(account_db.misses)
+
+
+# Worker process state, set by init_worker
+_worker_evm: Optional[LocalEvm] = None
+
+
+def init_worker(snapshot_path: str):
+    global _worker_evm
+    _worker_evm = LocalEvm(StateSnapshot(snapshot_path))
+
+
+def run_calls(calls: Sequence[Call]) -> List[LocalCallOutcome]:
+    """Execute calls on the worker's EVM, after loading any state fetched since its last task."""
+    _worker_evm.refresh()
+    outcomes = []
+    for call in calls:
+        success, output, misses = _worker_evm.call(bytes.fromhex(call.target[2:]), encode_call(call))
+        outcomes.append(LocalCallOutcome(decode_call_result(call, success, output), misses))
+
+    return outcomes
+
+
+def local_executor(snapshot_path: str, workers: int = None) -> concurrent.futures.ProcessPoolExecutor:
+    """Process pool whose workers each hold a LocalEvm over the snapshot at `snapshot_path`."""
+    return concurrent.futures.ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(snapshot_path,))
+
+
+def to_address(address: bytes) -> str:
+    return Web3.to_checksum_address(address)
+
+
+async def fetch_header(client: Any, snapshot: StateSnapshot):
+    """Store the block header fields the EVM exposes (TIMESTAMP, BASEFEE, ...), once per snapshot."""
+    if 'timestamp' in snapshot.meta():
+        return
+
+    block = await client.request("eth_getBlockByNumber", [hex(snapshot.block_number), False])
+    if block is None:
+        raise LocalEvmError(f"Block {snapshot.block_number} not found")
+
+    snapshot.set_meta({
+        'coinbase': block['miner'],
+        'timestamp': int(block['timestamp'], 16),
+        'mix_hash': block.get('mixHash') or '0x' + '00' * 32,
+        'gas_limit': int(block['gasLimit'], 16),
+        'base_fee': int(block.get('baseFeePerGas') or '0x0', 16),
+    })
+
+
+async def fetch_prestate(client: Any, snapshot: StateSnapshot, to: str, data: bytes) -> int:
+    """Load all state read by one call, with a prestateTracer trace. Returns the number of slots.
+
+    Raises the RPC error when the node has no debug_traceCall.
+    """
+    trace = await client.request(
+        "debug_traceCall",
+        [{"to": to, "data": "0x" + data.hex()}, hex(snapshot.block_number), {"tracer": "prestateTracer"}]
+    )
+
+    accounts = []
+    slots = []
+    for address, account in trace.items():
+        raw_address = bytes.fromhex(address[2:])
+        code = account.get('code') or '0x'
+        balance = account.get('balance') or '0x0'
+        accounts.append((
+            raw_address,
+            int(balance, 16) if isinstance(balance, str) else balance,
+            int(account.get('nonce') or 0),
+            bytes.fromhex(code[2:]),
+        ))
+        slots += [
+            (raw_address, int(slot, 16), int(value, 16)) for slot, value in (account.get('storage') or {}).items()
+        ]
+
+    snapshot.add_accounts(accounts)
+    snapshot.add_storage(slots)
+    return len(slots)
+
+
+def is_trace_unavailable(error: Exception) -> bool:
+    """Whether a failed fetch_prestate means the node cannot trace at all, rather than a failed request."""
+    message = str(error).lower()
+    return getattr(error, 'code', None) == METHOD_NOT_FOUND_CODE or any(text in message for text in TRACE_UNAVAILABLE_MESSAGES)
+
+
+async def fetch_state(client: Any, snapshot: StateSnapshot, keys: Iterable[StateKey]):
+    """Fetch missing accounts and storage slots at the snapshot block, concurrently."""
+    block = hex(snapshot.block_number)
+    known = snapshot.known_accounts()
+    addresses = {address for address, slot in keys if slot is None and address not in known}
+    slots = sorted((address, slot) for address, slot in keys if slot is not None)
+
+    async def account(address: bytes) -> Tuple[bytes, int, int, bytes]:
+        checksum = to_address(address)
+        balance, nonce, code = await asyncio.gather(
+            client.request("eth_getBalance", [checksum, block]),
+            client.request("eth_getTransactionCount", [checksum, block]),
+            client.request("eth_getCode", [checksum, block]),
+        )
+        return address, int(balance, 16), int(nonce, 16), bytes.fromhex(code[2:])
+
+    async def storage(address: bytes, slot: int) -> Tuple[bytes, int, int]:
+        value = await client.request("eth_getStorageAt", [to_address(address), hex(slot), block])
+        return address, slot, int(value, 16)
+
+    accounts, values = await asyncio.gather(
+        asyncio.gather(*(account(address) for address in addresses)),
+        asyncio.gather(*(storage(address, slot) for address, slot in slots)),
+    )
+    snapshot.add_accounts(accounts)
+    snapshot.add_storage(values)
+    logger.debug(f"Fetched {len(accounts)} accounts and {len(values)} storage slots")
+
+
+async def execute_calls(
+    client: Any,
+    executor: concurrent.futures.Executor,
+    snapshot: StateSnapshot,
+    calls: Sequence[Call],
+    task_size: int = DEFAULT_TASK_SIZE,
+    prestate: Callable[[List[int]], Awaitable[Any]] = None
+) -> List[CallResult]:
+    """Run `calls` on the local EVM, fetching missing state until every call ran on known state only.
+
+    `prestate` is awaited once with the indexes of the calls that missed state in the first round,
+    to load their state with traces before the rest is fetched slot by slot.
+    """
+    loop = asyncio.get_running_loop()
+    results: List[Optional[CallResult]] = [None] * len(calls)
+    pending = list(range(len(calls)))
+
+    for _ in range(MAX_ROUNDS):
+        if not pending:
+            break
+
+        tasks = [pending[start:start + task_size] for start in range(0, len(pending), task_size)]
+        outcomes = await asyncio.gather(*(
+            loop.run_in_executor(executor, run_calls, [calls[index] for index in task]) for task in tasks
+        ))
+
+        missing: Set[StateKey] = set()
+        pending = []
+        for task, task_outcomes in zip(tasks, outcomes):
+            for index, outcome in zip(task, task_outcomes):
+                if outcome.misses:
+                    missing |= outcome.misses
+                    pending.append(index)
+                else:
+                    results[index] = outcome.result
+
+        if missing and prestate is not None:
+            await prestate(pending)
+            prestate = None
+        elif missing:
+            await fetch_state(client, snapshot, missing)
+    else:
+        if pending:
+            raise LocalEvmError(f"{len(pending)} calls still miss state after {MAX_ROUNDS} rounds")
+
+    METRICS.observe_calls((call.signature for call in calls), (result.success for result in results))
+    return results
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+"""
+Silo Position Scanner
+
+Collects per-user positions for every market in silo-core/deploy/silo/_siloDeployments.json
+(or a subset of chains / markets) in one run. Each SiloConfig is resolved to its two silos
+with getSilos(), then for every user and silo we read:
+
+- collateral: SiloLens.collateralBalanceOfUnderlying(silo, user)
+- max_withdraw: Silo.maxWithdraw(user)
+- max_repay: Silo.maxRepay(user)
+- user_ltv: SiloLens.getUserLTV(silo0, user), same value for both silos of a market
+
+Calls are batched with Multicall3 and all markets are scanned concurrently through a
+single aiohttp session and one RequestScheduler (shared concurrency and rate limit).
+Every chain is read at one pinned block: `--block chain=N`, or the latest block at start.
+
+Output is one CSV in long format keyed by (chain, market, silo, user), written in
+deployment file order as results arrive. `status` is `ok`, `failed: <calls>` when single
+calls reverted (their values are left at 0), or `error: <message>` when no value could be
+read for the user. A batch whose aggregate3 call fails is split and retried; a run whose
+RPC endpoints stop answering is aborted.
+
+Environment variables: RPC_<CHAIN> for every scanned chain, see silo_deployments.py
+
+Usage:
+    python3 silo-core/scripts/silo_position_scanner.py --users users.json [--chains sonic,avalanche]
+        [--markets REGEX] [--output positions.csv] [--block sonic=42802010] [--cache [PATH]]
+"""
+
+import argparse
+import asyncio
+import collections
+import csv
+import itertools
+import json
+import logging
+import re
+import sys
+from typing import Any, Callable, Dict, Iterator, List, NamedTuple, Tuple
+
+import aiohttp
+from web3 import Web3
+
+from multicall import Call, CallResult, execute_aggregate3_async, DEFAULT_BATCH_SIZE
+from rpc_async import AsyncRpcClient, RequestScheduler, RpcError, DEFAULT_CONCURRENCY, DEFAULT_REQUESTS_PER_SECOND
+from rpc_cache import RpcCache, DEFAULT_CACHE_PATH, DEFAULT_MAX_BYTES
+from rpc_pool import RpcPoolError
+from silo_deployments import (
+    get_chain, get_deployment_address, get_rpc_url, load_silo_deployments, parse_blocks, select_chains
+)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Number of users packed into a single aggregate3 request (7 calls per user)
+DEFAULT_USERS_PER_BATCH = 50
+
+OUTPUT_FIELDNAMES = [
+    'chain', 'market', 'silo_config', 'silo', 'silo_index', 'user_address',
+    'collateral', 'max_withdraw', 'max_repay', 'user_ltv', 'status'
+]
+
+
+class Market(NamedTuple):
+    """A SiloConfig resolved to its silos, with the lens and block used to read it."""
+    chain: str
+    name: str
+    config: str
+    silo0: str
+    silo1: str
+    lens: str
+    block: int
+
+
+def load_user_addresses(file_path: str) -> List[str]:
+    """Load user addresses from a JSON array, skipping invalid entries."""
+    with open(file_path, 'r') as f:
+        addresses = json.load(f)
+
+    if not isinstance(addresses, list):
+        raise ValueError("JSON file must contain an array of addresses")
+
+    valid_addresses = []
+    for address in addresses:
+        if Web3.is_address(address):
+            valid_addresses.append(Web3.to_checksum_address(address))
+        else:
+            logger.warning(f"Invalid address format: {address}")
+
+    logger.info(f"Loaded {len(valid_addresses)} valid addresses from {file_path}")
+    return valid_addresses
+
+
+async def resolve_markets(
+    client: AsyncRpcClient,
+    chain: str,
+    configs: Dict[str, str],
+    lens: str,
+    block: int
+) -> List[Market]:
+    """Resolve SiloConfigs of a chain to their silos with batched getSilos() calls."""
+    names = list(configs)
+    calls = [Call(configs[name], "getSilos()", (), ("address", "address")) for name in names]
+    results: List[CallResult] = []
+
+    for start in range(0, len(calls), DEFAULT_BATCH_SIZE):
+        results.extend(await execute_aggregate3_async(client, calls[start:start + DEFAULT_BATCH_SIZE], block))
+
+    markets = []
+    for name, result in zip(names, results):
+        if not result.success:
+            logger.warning(f"getSilos() failed for {chain} {name} ({configs[name]}): {result.error}")
+            continue
+
+        silo0, silo1 = result.value
+        markets.append(Market(chain, name, Web3.to_checksum_address(configs[name]), silo0, silo1, lens, block))
+
+    logger.info(f"{chain}: resolved {len(markets)}/{len(configs)} markets at block {block}")
+    return markets
+
+
+def build_user_calls(market: Market, user_address: str) -> List[Tuple[int, str, str, Call]]:
+    """Calls for one user in one market as (silo index, result field, log label, call)."""
+    calls = [(0, 'user_ltv', 'getUserLTV', Call(market.lens, 'getUserLTV(address,address)', (market.silo0, user_address)))]
+
+    for index, silo in enumerate((market.silo0, market.silo1)):
+        calls += [
+            (index, 'collateral', f'silo{index} collateralBalanceOfUnderlying',
+                Call(market.lens, 'collateralBalanceOfUnderlying(address,address)', (silo, user_address))),
+            (index, 'max_withdraw', f'silo{index} maxWithdraw', Call(silo, 'maxWithdraw(address)', (user_address,))),
+            (index, 'max_repay', f'silo{index} maxRepay', Call(silo, 'maxRepay(address)', (user_address,))),
+        ]
+
+    return calls
+
+
+def new_position_rows(market: Market, user_address: str) -> List[Dict[str, Any]]:
+    """Output rows for a user in both silos of a market, values defaulted to 0."""
+    return [
+        {
+            'chain': market.chain,
+            'market': market.name,
+            'silo_config': market.config,
+            'silo': silo,
+            'silo_index': index,
+            'user_address': user_address,
+            'collateral': 0,
+            'max_withdraw': 0,
+            'max_repay': 0,
+            'user_ltv': 0,
+            'status': 'ok'
+        }
+        for index, silo in enumerate((market.silo0, market.silo1))
+    ]
+
+
+async def collect_market_batch(client: AsyncRpcClient, market: Market, user_addresses: List[str]) -> List[Dict[str, Any]]:
+    """Collect positions of a batch of users in one market with a single aggregate3 call.
+
+    A failing aggregate3 call (out of gas, response too large, undecodable output) is split in
+    halves and retried; a single user that still fails gets rows with an `error` status.
+    RpcPoolError, raised when no endpoint answers, is not handled here.
+    """
+    plans = [build_user_calls(market, user_address) for user_address in user_addresses]
+    calls = [call for plan in plans for _, _, _, call in plan]
+    rows = [new_position_rows(market, user_address) for user_address in user_addresses]
+
+    try:
+        call_results = await execute_aggregate3_async(client, calls, market.block)
+    except (RpcError, ValueError) as e:
+        if len(user_addresses) > 1:
+            middle = len(user_addresses) // 2
+            logger.warning(f"aggregate3 failed for {len(user_addresses)} users in {market.chain} {market.name}, "
+                           f"retrying in halves: {e}")
+            first = await collect_market_batch(client, market, user_addresses[:middle])
+            return first + await collect_market_batch(client, market, user_addresses[middle:])
+
+        logger.error(f"Error processing {user_addresses[0]} in {market.chain} {market.name}: {e}")
+        for row in rows[0]:
+            row['status'] = f"error: {e}"
+        return rows[0]
+
+    results = iter(call_results)
+    for user_address, plan, user_rows in zip(user_addresses, plans, rows):
+        failed: List[List[str]] = [[], []]
+        for index, field, label, _ in plan:
+            result = next(results)
+            if not result.success:
+                logger.warning(f"{label} failed for {user_address} in {market.chain} {market.name}: {result.error}")
+                # getUserLTV is read once for the market and fills both rows
+                for failed_index in ((0, 1) if field == 'user_ltv' else (index,)):
+                    failed[failed_index].append(field)
+                continue
+
+            if field == 'user_ltv':
+                for row in user_rows:
+                    row[field] = result.value
+            else:
+                user_rows[index][field] = result.value
+
+        for row, fields in zip(user_rows, failed):
+            if fields:
+                row['status'] = f"failed: {','.join(fields)}"
+
+    return [row for user_rows in rows for row in user_rows]
+
+
+def iter_work(markets: List[Market], user_addresses: List[str], batch_size: int) -> Iterator[Tuple[Market, List[str]]]:
+    """(market, user batch) work items in market order."""
+    for market in markets:
+        for start in range(0, len(user_addresses), batch_size):
+            yield market, user_addresses[start:start + batch_size]
+
+
+async def scan_positions(
+    markets: List[Market],
+    clients: Dict[str, AsyncRpcClient],
+    user_addresses: List[str],
+    on_rows: Callable[[List[Dict[str, Any]]], None],
+    batch_size: int,
+    max_pending: int
+) -> int:
+    """Scan all markets concurrently, handing rows to `on_rows` in work order. Returns rows written."""
+    work = iter_work(markets, user_addresses, batch_size)
+    pending = collections.deque()
+    total_batches = len(markets) * ((len(user_addresses) + batch_size - 1) // batch_size)
+    done_batches = 0
+    rows_written = 0
+
+    def schedule_next():
+        item = next(work, None)
+        if item is not None:
+            market, batch = item
+            pending.append(asyncio.create_task(collect_market_batch(clients[market.chain], market, batch)))
+
+    for _ in range(max_pending):
+        schedule_next()
+
+    while pending:
+        rows = await pending.popleft()
+        on_rows(rows)
+        rows_written += len(rows)
+        done_batches += 1
+        schedule_next()
+
+        if done_batches % 100 == 0 or done_batches == total_batches:
+            logger.info(f"Processed {done_batches}/{total_batches} batches, {rows_written} rows")
+
+    return rows_written
+
+
+async def run_scan(args: argparse.Namespace, user_addresses: List[str], on_rows: Callable[[List[Dict[str, Any]]], None]) -> int:
+    """Resolve markets on all selected chains and scan positions."""
+    deployments = load_silo_deployments()
+    chains = select_chains(deployments, args.chains.split(',') if args.chains else None)
+    blocks = parse_blocks(args.block)
+    market_filter = re.compile(args.markets) if args.markets else None
+    cache = RpcCache(args.cache, args.cache_max_mb * 1024 * 1024) if args.cache else None
+
+    scheduler = RequestScheduler(args.concurrency, args.rps)
+    clients: Dict[str, AsyncRpcClient] = {}
+    markets: List[Market] = []
+
+    # one connection pool for every chain
+    async with aiohttp.ClientSession() as session:
+        for chain_name in chains:
+            chain = get_chain(chain_name)
+            rpc_url = get_rpc_url(chain)
+            lens = get_deployment_address(chain_name, 'SiloLens')
+
+            if not rpc_url:
+                logger.warning(f"{chain.rpc_env} not set, skipping {chain_name}")
+                continue
+            if not lens:
+                logger.warning(f"No SiloLens deployment for {chain_name}, skipping")
+                continue
+
+            clients[chain_name] = AsyncRpcClient(rpc_url, scheduler, session=session, cache=cache, chain_id=chain.chain_id)
+
+        async def resolve_chain(chain_name: str) -> List[Market]:
+            client = clients[chain_name]
+            block = blocks.get(chain_name)
+            if block is None:
+                block = int(await client.request("eth_blockNumber", []), 16)
+
+            configs = {
+                name: address for name, address in deployments[chain_name].items()
+                if market_filter is None or market_filter.search(name)
+            }
+            lens = Web3.to_checksum_address(get_deployment_address(chain_name, 'SiloLens'))
+            return await resolve_markets(client, chain_name, configs, lens, block)
+
+        resolved = await asyncio.gather(*(resolve_chain(chain_name) for chain_name in clients))
+        markets = list(itertools.chain.from_iterable(resolved))
+
+        logger.info(f"Scanning {len(user_addresses)} users in {len(markets)} markets on {len(clients)} chains")
+        rows = await scan_positions(markets, clients, user_addresses, on_rows, args.batch_size, args.concurrency * 2)
+
+    if cache is not None:
+        cache.close()
+
+    return rows
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Collect user positions for many Silo markets at once")
+    parser.add_argument('--users', required=True, help="JSON array of user addresses to scan in every market")
+    parser.add_argument('--output', default='silo-positions.csv', help="output CSV file")
+    parser.add_argument('--chains', default=None, help="comma separated chains to scan (default: all)")
+    parser.add_argument('--markets', default=None, metavar='REGEX', help="only scan markets whose name matches")
+    parser.add_argument('--block', action='append', default=[], metavar='CHAIN=N',
+                        help="block to read a chain at (default: latest block at start), can be repeated")
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_USERS_PER_BATCH,
+                        help=f"users per aggregate3 request (default {DEFAULT_USERS_PER_BATCH})")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help=f"max in-flight requests across all chains (default {DEFAULT_CONCURRENCY})")
+    parser.add_argument('--rps', type=float, default=DEFAULT_REQUESTS_PER_SECOND,
+                        help=f"max requests per second across all chains, 0 for no limit (default {DEFAULT_REQUESTS_PER_SECOND:g})")
+    parser.add_argument('--cache', nargs='?', const=DEFAULT_CACHE_PATH, default=None, metavar='PATH',
+                        help=f"cache block-pinned RPC responses in SQLite (default path {DEFAULT_CACHE_PATH})")
+    parser.add_argument('--cache-max-mb', type=int, default=DEFAULT_MAX_BYTES // (1024 * 1024),
+                        help="evict least recently used cache entries above this size")
+    return parser.parse_args()
+
+
+def main():
+    """Main function."""
+    args = parse_args()
+    logger.info("Starting Silo Position Scanner")
+
+    try:
+        user_addresses = load_user_addresses(args.users)
+    except (OSError, ValueError) as e:
+        logger.error(f"Error loading addresses: {e}")
+        sys.exit(1)
+
+    if not user_addresses:
+        logger.error("No valid addresses found")
+        sys.exit(1)
+
+    with open(args.output, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.DictWriter(f, fieldnames=OUTPUT_FIELDNAMES)
+        writer.writeheader()
+
+        def write_rows(rows: List[Dict[str, Any]]):
+            writer.writerows(rows)
+            f.flush()
+
+        try:
+            rows = asyncio.run(run_scan(args, user_addresses, write_rows))
+        except ValueError as e:
+            logger.error(str(e))
+            sys.exit(1)
+        except RpcPoolError as e:
+            logger.error(f"Scan aborted, {args.output} is incomplete: {e}")
+            sys.exit(1)
+
+    logger.info(f"Results saved to: {args.output} ({rows} rows)")
+    logger.info("Position scan completed successfully!")
+
+
+if __name__ == "__main__":
+    main()
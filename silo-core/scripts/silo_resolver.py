@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Silo Market Resolver
+
+Memoized lookups of what every Silo script resolves before its real work: the silos of a
+SiloConfig, ConfigData of a silo, asset metadata (symbol, decimals) and oracle quotes.
+Results are kept in a process-wide LRU keyed by (chain id, block, target, calldata), so the
+same SiloConfig, oracle or token met again in a scan, or by another script in the same
+process, costs nothing. Across runs the aggregate3 requests are answered by rpc_cache when a
+cache is used.
+
+Lookups missing from the LRU are sent as one Multicall3 aggregate3 request.
+`prefetch_market` resolves a whole market in three requests, both silos at once: config() and
+asset(), getConfig() and then the oracle quotes together with decimals() and symbol() of both
+assets.
+
+Usage:
+    resolver = SiloResolver(w3, chain_id=146, block=BLOCK_NUMBER)
+    resolver.prefetch_market([silo0, silo1])
+
+    config_data = resolver.config_data(resolver.silo_config(silo0), silo0)
+    price = resolver.quote(config_data['solvencyOracle'], config_data['token'])
+"""
+
+import collections
+import logging
+import threading
+from typing import Any, Dict, Hashable, List, NamedTuple, Optional, Sequence, Tuple
+
+from web3 import Web3
+
+from multicall import Call, CallResult, encode_call, multicall
+from silo_codec import CONFIG_DATA_TYPE
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_ENTRIES = 16384
+
+# Base amount of oracle quotes: the price of one whole token in 18 decimals
+QUOTE_AMOUNT = 10**18
+
+# ISiloConfig.ConfigData fields, in the order of silo_codec.CONFIG_DATA_TYPE
+CONFIG_DATA_FIELDS = (
+    'daoFee', 'deployerFee', 'silo', 'token', 'protectedShareToken', 'collateralShareToken', 'debtShareToken',
+    'solvencyOracle', 'maxLtvOracle', 'interestRateModel', 'maxLtv', 'lt', 'liquidationTargetLtv',
+    'liquidationFee', 'flashloanFee', 'hookReceiver', 'callBeforeQuote'
+)
+
+
+class ResolverError(ValueError):
+    """A lookup call reverted or returned nothing usable."""
+
+
+class AssetMetadata(NamedTuple):
+    """ERC20 metadata, symbol is empty when the token has none."""
+    address: str
+    symbol: str
+    decimals: int
+
+
+class ResolverCache:
+    """Thread-safe LRU of call results."""
+
+    def __init__(self, max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries: "collections.OrderedDict[Hashable, CallResult]" = collections.OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable) -> Optional[CallResult]:
+        with self.lock:
+            result = self.entries.get(key)
+            if result is None:
+                self.misses += 1
+                return None
+
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return result
+
+    def put(self, key: Hashable, result: CallResult):
+        with self.lock:
+            self.entries[key] = result
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+
+# Shared by every resolver in the process, entries are keyed by chain and block
+RESOLVER_CACHE = ResolverCache()
+
+
+def is_zero_address(address: str) -> bool:
+    return not address or int(address, 16) == 0
+
+
+class SiloResolver:
+    """Memoized Silo market lookups at one block of one chain."""
+
+    def __init__(self, w3: Web3, chain_id: int, block: int, cache: ResolverCache = RESOLVER_CACHE):
+        self.w3 = w3
+        self.chain_id = chain_id
+        self.block = block
+        self.cache = cache
+
+    def key(self, call: Call) -> Tuple[int, int, str, bytes]:
+        return self.chain_id, self.block, call.target.lower(), encode_call(call)
+
+    def resolve(self, calls: Sequence[Call]) -> List[CallResult]:
+        """Results of `calls`, sending the ones not memoized yet in aggregate3 batches."""
+        keys = [self.key(call) for call in calls]
+        results = [self.cache.get(key) for key in keys]
+
+        missing: Dict[Tuple[int, int, str, bytes], Call] = {}
+        for key, call, result in zip(keys, calls, results):
+            if result is None:
+                missing.setdefault(key, call)
+
+        if missing:
+            logger.debug(f"Resolving {len(missing)} calls at block {self.block}")
+            fetched = dict(zip(missing, multicall(self.w3, list(missing.values()), self.block)))
+            for key, result in fetched.items():
+                self.cache.put(key, result)
+
+            results = [result if result is not None else fetched[key] for key, result in zip(keys, results)]
+
+        return results
+
+    def value(self, call: Call) -> Any:
+        """Decoded value of one call, ResolverError when it failed."""
+        (result,) = self.resolve([call])
+        if not result.success:
+            raise ResolverError(f"{call.signature} on {call.target} failed: {result.error}")
+        return result.value
+
+    def silos(self, config: str) -> Tuple[str, str]:
+        """silo0 and silo1 of a SiloConfig."""
+        silo0, silo1 = self.value(silos_call(config))
+        return Web3.to_checksum_address(silo0), Web3.to_checksum_address(silo1)
+
+    def silo_config(self, silo: str) -> str:
+        return Web3.to_checksum_address(self.value(config_call(silo)))
+
+    def silo_asset(self, silo: str) -> str:
+        return Web3.to_checksum_address(self.value(asset_call(silo)))
+
+    def config_data(self, config: str, silo: str) -> Dict[str, Any]:
+        """ConfigData of `silo` as a dict keyed by the struct field names."""
+        values = self.value(config_data_call(config, silo))
+        return {field: normalize(value) for field, value in zip(CONFIG_DATA_FIELDS, values)}
+
+    def asset_metadata(self, token: str) -> AssetMetadata:
+        """Symbol and decimals of an ERC20. A token without symbol() gets an empty symbol."""
+        decimals_result, symbol_result = self.resolve(metadata_calls(token))
+        if not decimals_result.success:
+            raise ResolverError(f"decimals() on {token} failed: {decimals_result.error}")
+
+        symbol = symbol_result.value if symbol_result.success else ""
+        return AssetMetadata(Web3.to_checksum_address(token), symbol, decimals_result.value)
+
+    def quote(self, oracle: str, asset: str, amount: int = QUOTE_AMOUNT) -> int:
+        """Oracle quote of `amount` of `asset`; without an oracle the price is 1, so `amount`."""
+        if is_zero_address(oracle):
+            return amount
+        return self.value(quote_call(oracle, asset, amount))
+
+    def prefetch_silos(self, configs: Sequence[str]):
+        """getSilos() of many SiloConfigs in one request."""
+        self.resolve([silos_call(config) for config in configs])
+
+    def prefetch_market(self, silos: Sequence[str]):
+        """config(), asset(), ConfigData, solvency oracle quotes and asset metadata of the silos, one request per step.
+
+        Failed lookups are memoized as failures and reported by the lookup methods.
+        """
+        results = self.resolve([call for silo in silos for call in (config_call(silo), asset_call(silo))])
+        markets = [
+            (silo, config.value, asset.value if asset.success else None)
+            for silo, config, asset in zip(silos, results[::2], results[1::2]) if config.success
+        ]
+
+        data_results = self.resolve([config_data_call(config, silo) for silo, config, _ in markets])
+        calls = []
+        for (_, _, asset), result in zip(markets, data_results):
+            if result.success:
+                data = dict(zip(CONFIG_DATA_FIELDS, result.value))
+                asset = asset or data['token']
+                calls += metadata_calls(asset)
+                if not is_zero_address(data['solvencyOracle']):
+                    calls.append(quote_call(data['solvencyOracle'], asset))
+
+        self.resolve(calls)
+
+
+def normalize(value: Any) -> Any:
+    """Checksummed addresses, other values unchanged."""
+    if isinstance(value, str) and Web3.is_address(value):
+        return Web3.to_checksum_address(value)
+    return value
+
+
+def config_call(silo: str) -> Call:
+    return Call(silo, "config()", (), ("address",))
+
+
+def asset_call(silo: str) -> Call:
+    return Call(silo, "asset()", (), ("address",))
+
+
+def silos_call(config: str) -> Call:
+    return Call(config, "getSilos()", (), ("address", "address"))
+
+
+def config_data_call(config: str, silo: str) -> Call:
+    return Call(config, "getConfig(address)", (Web3.to_checksum_address(silo),), (CONFIG_DATA_TYPE,))
+
+
+def metadata_calls(token: str) -> List[Call]:
+    return [Call(token, "decimals()", (), ("uint8",)), Call(token, "symbol()", (), ("string",))]
+
+
+def quote_call(oracle: str, asset: str, amount: int = QUOTE_AMOUNT) -> Call:
+    return Call(oracle, "quote(uint256,address)", (amount, Web3.to_checksum_address(asset)))
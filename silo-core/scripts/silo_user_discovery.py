@@ -0,0 +1,352 @@
+#!/usr/bin/env python3
+"""
+Silo User Discovery Script
+
+Finds every account that interacted with a set of silos up to a given block by scanning
+eth_getLogs for Silo Deposit/Withdraw/Borrow/Repay events (protected variants included)
+and Transfer events of the collateral, protected and debt share tokens. Every indexed
+address of those events (sender, receiver, owner, from, to) is recorded.
+
+Block ranges adapt to the provider: a range the provider refuses for its size (block range
+or result limit, response size) is halved and retried, a range that succeeds makes the next
+one twice as large. Other errors, and endpoints that stop answering, abort the scan; the
+ranges scanned so far are kept.
+
+Progress is kept in a SQLite state file: the last scanned block per contract and the
+accounts seen so far. Rerunning with a higher `--to-block` only scans the new blocks.
+
+Usage:
+    python3 silo-core/scripts/silo_user_discovery.py --chain sonic \\
+        --silos 0x04f124bF435545a3c79A8EE3Ffb6C51213CF5175,0xbE0D3c8801206CC9f35A6626f90ef9F4f2983A3D \\
+        --to-block 42802010 --output users-54-discovered.json
+
+    python3 silo-core/scripts/silo_user_discovery.py --chain sonic --markets '^Silo_OS_scUSD$' --output users.json
+"""
+
+import argparse
+import json
+import logging
+import re
+import sqlite3
+import sys
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from web3 import Web3
+
+from multicall import Call, multicall
+from rpc_pool import PooledHTTPProvider, RpcPoolError, is_log_limit_error
+from silo_deployments import get_chain, get_rpc_url, load_silo_deployments
+
+# Configure logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+ZERO_ADDRESS = "0x0000000000000000000000000000000000000000"
+
+DEFAULT_STATE_FILE = "silo-user-discovery.sqlite"
+
+DEFAULT_INITIAL_RANGE = 10_000
+DEFAULT_MAX_RANGE = 2_000_000
+
+# Silo and share token events, any indexed address in them is an account that interacted
+USER_EVENTS = [
+    "Deposit(address,address,uint256,uint256)",
+    "DepositProtected(address,address,uint256,uint256)",
+    "Withdraw(address,address,address,uint256,uint256)",
+    "WithdrawProtected(address,address,address,uint256,uint256)",
+    "Borrow(address,address,address,uint256,uint256)",
+    "Repay(address,address,uint256,uint256)",
+    "Transfer(address,address,uint256)",
+]
+
+USER_EVENT_TOPICS = ["0x" + Web3.keccak(text=event).hex().removeprefix("0x") for event in USER_EVENTS]
+
+# ISiloConfig.ConfigData
+CONFIG_DATA_TYPE = (
+    "(uint256,uint256,address,address,address,address,address,address,address,address,"
+    "uint256,uint256,uint256,uint256,uint256,address,bool)"
+)
+PROTECTED_SHARE_TOKEN_INDEX = 4
+COLLATERAL_SHARE_TOKEN_INDEX = 5
+DEBT_SHARE_TOKEN_INDEX = 6
+
+
+class DiscoveryState:
+    """SQLite store of scanned block per contract and of discovered accounts."""
+
+    def __init__(self, path: str):
+        self.db = sqlite3.connect(path)
+        self.db.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS scan_progress (
+                chain_id INTEGER NOT NULL,
+                contract TEXT NOT NULL,
+                scanned_to INTEGER NOT NULL,
+                PRIMARY KEY (chain_id, contract)
+            );
+            CREATE TABLE IF NOT EXISTS users (
+                chain_id INTEGER NOT NULL,
+                contract TEXT NOT NULL,
+                address TEXT NOT NULL,
+                first_block INTEGER NOT NULL,
+                PRIMARY KEY (chain_id, contract, address)
+            );
+            """
+        )
+        self.db.commit()
+
+    def scanned_to(self, chain_id: int, contract: str) -> Optional[int]:
+        """Last block scanned for a contract, None if never scanned."""
+        row = self.db.execute(
+            "SELECT scanned_to FROM scan_progress WHERE chain_id = ? AND contract = ?", (chain_id, contract.lower())
+        ).fetchone()
+        return row[0] if row else None
+
+    def record_range(self, chain_id: int, contracts: List[str], to_block: int, seen: Dict[Tuple[str, str], int]):
+        """Atomically store accounts seen in a range and move the contracts' progress to `to_block`."""
+        with self.db:
+            self.db.executemany(
+                "INSERT OR IGNORE INTO users VALUES (?, ?, ?, ?)",
+                [(chain_id, contract, address, block) for (contract, address), block in seen.items()]
+            )
+            self.db.executemany(
+                "INSERT OR REPLACE INTO scan_progress VALUES (?, ?, ?)",
+                [(chain_id, contract.lower(), to_block) for contract in contracts]
+            )
+
+    def users(self, chain_id: int, contracts: Iterable[str]) -> List[str]:
+        """Accounts seen on any of `contracts`, ordered by first appearance."""
+        contracts = [contract.lower() for contract in contracts]
+        placeholders = ",".join("?" * len(contracts))
+        rows = self.db.execute(
+            f"SELECT address, MIN(first_block) AS first FROM users WHERE chain_id = ? AND contract IN ({placeholders}) "
+            f"GROUP BY address ORDER BY first, address",
+            [chain_id, *contracts]
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        self.db.close()
+
+
+def resolve_share_tokens(w3: Web3, silos: List[str], block: int) -> List[str]:
+    """Silos plus their protected and debt share tokens (the collateral share token is the silo)."""
+    config_results = multicall(w3, [Call(silo, "config()", (), ("address",)) for silo in silos], block)
+    calls = []
+    for silo, result in zip(silos, config_results):
+        if not result.success:
+            raise ValueError(f"config() failed for silo {silo}: {result.error}")
+        calls.append(Call(result.value, "getConfig(address)", (silo,), (CONFIG_DATA_TYPE,)))
+
+    contracts = []
+    for silo, result in zip(silos, multicall(w3, calls, block)):
+        if not result.success:
+            raise ValueError(f"getConfig() failed for silo {silo}: {result.error}")
+
+        config = result.value
+        for index in (COLLATERAL_SHARE_TOKEN_INDEX, PROTECTED_SHARE_TOKEN_INDEX, DEBT_SHARE_TOKEN_INDEX):
+            contracts.append(Web3.to_checksum_address(config[index]))
+
+    return contracts
+
+
+def resolve_market_silos(w3: Web3, chain_name: str, market_pattern: str, block: int) -> List[str]:
+    """Silos of every market on a chain whose name matches `market_pattern`."""
+    deployments = load_silo_deployments()
+    pattern = re.compile(market_pattern)
+    configs = {name: address for name, address in deployments.get(chain_name, {}).items() if pattern.search(name)}
+
+    if not configs:
+        raise ValueError(f"No {chain_name} markets match '{market_pattern}'")
+
+    silos = []
+    results = multicall(w3, [Call(address, "getSilos()", (), ("address", "address")) for address in configs.values()], block)
+    for name, result in zip(configs, results):
+        if not result.success:
+            raise ValueError(f"getSilos() failed for {name}: {result.error}")
+        logger.info(f"Market {name}: silos {result.value[0]}, {result.value[1]}")
+        silos.extend(result.value)
+
+    return silos
+
+
+class LogRangeError(ValueError):
+    """The provider refuses an eth_getLogs range for its size."""
+
+
+def get_logs(w3: Web3, contracts: List[str], from_block: int, to_block: int) -> List[Dict]:
+    """Raw eth_getLogs for user events of `contracts`. Raises on any provider error, LogRangeError on range limits."""
+    response = w3.provider.make_request("eth_getLogs", [{
+        "address": contracts,
+        "fromBlock": hex(from_block),
+        "toBlock": hex(to_block),
+        "topics": [USER_EVENT_TOPICS],
+    }])
+
+    if "error" in response:
+        message = response["error"].get("message", str(response["error"]))
+        if is_log_limit_error(response["error"]):
+            raise LogRangeError(message)
+        raise ValueError(message)
+
+    return response["result"]
+
+
+def accounts_from_logs(logs: List[Dict]) -> Dict[Tuple[str, str], int]:
+    """{(contract, account): first block} for every indexed address in `logs`."""
+    seen: Dict[Tuple[str, str], int] = {}
+
+    for log in logs:
+        contract = log["address"].lower()
+        block = int(log["blockNumber"], 16)
+
+        for topic in log["topics"][1:]:
+            address = "0x" + topic[-40:].lower()
+            if address != ZERO_ADDRESS and (contract, address) not in seen:
+                seen[(contract, address)] = block
+
+    return seen
+
+
+def iter_logs(
+    w3: Web3,
+    contracts: List[str],
+    from_block: int,
+    to_block: int,
+    initial_range: int = DEFAULT_INITIAL_RANGE,
+    max_range: int = DEFAULT_MAX_RANGE
+) -> Iterator[Tuple[int, int, List[Dict]]]:
+    """User event logs of [from_block, to_block] as (start, end, logs) ranges, with adaptive range sizing."""
+    range_size = initial_range
+    start = from_block
+
+    while start <= to_block:
+        end = min(start + range_size - 1, to_block)
+
+        try:
+            logs = get_logs(w3, contracts, start, end)
+        except LogRangeError as e:
+            if range_size == 1:
+                raise ValueError(f"eth_getLogs fails even for a single block {start}: {e}")
+
+            range_size = max(1, range_size // 2)
+            logger.debug(f"eth_getLogs {start}-{end} failed ({e}), range shrunk to {range_size}")
+            continue
+
+        yield start, end, logs
+
+        start = end + 1
+        range_size = min(range_size * 2, max_range)
+
+
+def scan_contracts(
+    w3: Web3,
+    state: DiscoveryState,
+    chain_id: int,
+    contracts: List[str],
+    from_block: int,
+    to_block: int,
+    initial_range: int = DEFAULT_INITIAL_RANGE,
+    max_range: int = DEFAULT_MAX_RANGE
+) -> int:
+    """Scan [from_block, to_block] for `contracts` with adaptive range sizing. Returns logs processed."""
+    total_logs = 0
+
+    for start, end, logs in iter_logs(w3, contracts, from_block, to_block, initial_range, max_range):
+        state.record_range(chain_id, contracts, end, accounts_from_logs(logs))
+        total_logs += len(logs)
+        logger.info(f"Scanned blocks {start}-{end}: {len(logs)} logs")
+
+    return total_logs
+
+
+def discover_users(
+    w3: Web3,
+    state: DiscoveryState,
+    chain_id: int,
+    contracts: List[str],
+    from_block: int,
+    to_block: int,
+    initial_range: int = DEFAULT_INITIAL_RANGE,
+    max_range: int = DEFAULT_MAX_RANGE
+) -> List[str]:
+    """Bring every contract up to `to_block` and return all accounts seen on them."""
+    # contracts scanned up to the same block are scanned together
+    groups: Dict[int, List[str]] = {}
+    for contract in contracts:
+        scanned_to = state.scanned_to(chain_id, contract)
+        next_block = from_block if scanned_to is None else scanned_to + 1
+        groups.setdefault(next_block, []).append(contract)
+
+    for next_block, group in sorted(groups.items()):
+        if next_block > to_block:
+            logger.info(f"{len(group)} contracts already scanned up to block {to_block}")
+            continue
+
+        logger.info(f"Scanning {len(group)} contracts from block {next_block} to {to_block}")
+        scan_contracts(w3, state, chain_id, group, next_block, to_block, initial_range, max_range)
+
+    return state.users(chain_id, contracts)
+
+
+def parse_args() -> argparse.Namespace:
+    """Parse command line arguments."""
+    parser = argparse.ArgumentParser(description="Discover accounts that interacted with Silo markets")
+    parser.add_argument('--chain', required=True, help="chain name as in _siloDeployments.json")
+    targets = parser.add_mutually_exclusive_group(required=True)
+    targets.add_argument('--silos', help="comma separated silo addresses")
+    targets.add_argument('--markets', metavar='REGEX', help="scan both silos of every market whose name matches")
+    parser.add_argument('--from-block', type=int, default=0, help="first block for contracts never scanned before")
+    parser.add_argument('--to-block', type=int, default=None, help="last block to scan (default: latest)")
+    parser.add_argument('--initial-range', type=int, default=DEFAULT_INITIAL_RANGE, help="first eth_getLogs block range")
+    parser.add_argument('--max-range', type=int, default=DEFAULT_MAX_RANGE, help="largest eth_getLogs block range")
+    parser.add_argument('--state', default=DEFAULT_STATE_FILE, help="SQLite file with scan progress and accounts")
+    parser.add_argument('--output', required=True, help="JSON file to write the discovered accounts to")
+    return parser.parse_args()
+
+
+def main():
+    """Main function."""
+    args = parse_args()
+    logger.info("Starting Silo User Discovery")
+
+    chain = get_chain(args.chain)
+    rpc_url = get_rpc_url(chain)
+    if not rpc_url:
+        logger.error(f"{chain.rpc_env} environment variable not set")
+        sys.exit(1)
+
+    w3 = Web3(PooledHTTPProvider(rpc_url))
+    to_block = args.to_block if args.to_block is not None else w3.eth.block_number
+    logger.info(f"Discovering users on {chain.name} up to block {to_block}")
+
+    try:
+        if args.silos:
+            silos = [Web3.to_checksum_address(silo) for silo in args.silos.split(',')]
+        else:
+            silos = resolve_market_silos(w3, chain.name, args.markets, to_block)
+
+        contracts = resolve_share_tokens(w3, silos, to_block)
+    except ValueError as e:
+        logger.error(str(e))
+        sys.exit(1)
+
+    state = DiscoveryState(args.state)
+    try:
+        users = discover_users(w3, state, chain.chain_id, contracts, args.from_block, to_block,
+                               args.initial_range, args.max_range)
+    except (RpcPoolError, ValueError) as e:
+        logger.error(f"Discovery stopped, progress is kept in {args.state}: {e}")
+        sys.exit(1)
+    finally:
+        state.close()
+
+    with open(args.output, 'w') as f:
+        json.dump(users, f, indent=2)
+
+    logger.info(f"Saved {len(users)} accounts to {args.output}")
+    logger.info("User discovery completed successfully!")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Tests for address_set: set operations in memory and by sort-merge on disk."""
+
+import json
+
+import pytest
+
+from address_set import SetStats, select_addresses, write_json_array, write_lines
+
+A, B, C, D, E = ['0x' + f"{i:040x}" for i in (5, 3, 9, 1, 7)]
+UPPER_B = '0x' + B[2:].upper()
+
+INPUTS = {
+    'first.json': [A, B, A, C, D],
+    'second.txt': [UPPER_B, E, D, 'not an address', D],
+    'third.csv': [D, B, E],
+}
+
+EXPECTED = {
+    'union': [A, B, C, D, E],
+    'intersection': [B, D],
+    'difference': [A, C],
+}
+
+
+@pytest.fixture
+def paths(tmp_path):
+    (tmp_path / 'first.json').write_text(json.dumps(INPUTS['first.json']))
+    (tmp_path / 'second.txt').write_text("\n".join(INPUTS['second.txt']) + "\n")
+    (tmp_path / 'third.csv').write_text("address\n" + "\n".join(INPUTS['third.csv']) + "\n")
+    return [str(tmp_path / name) for name in INPUTS]
+
+
+@pytest.mark.parametrize("operation", list(EXPECTED))
+@pytest.mark.parametrize("external, memory_budget", [(False, 1 << 20), (True, 1 << 20), (True, 1)])
+def test_operations_keep_input_order_and_first_spelling(paths, operation, external, memory_budget):
+    stats = SetStats()
+
+    result = list(select_addresses(paths, operation, memory_budget, stats=stats, external=external))
+
+    assert result == EXPECTED[operation]
+    assert stats.read == 12 and stats.invalid == 1
+    assert stats.unique == 5
+    assert stats.written == len(result)
+
+
+def test_tiny_budget_sorts_in_many_runs(paths):
+    stats = SetStats()
+
+    list(select_addresses(paths, 'union', memory_budget=80 * 2, stats=stats, external=True))
+
+    assert stats.runs == 6
+
+
+def test_first_occurrence_spelling_wins(tmp_path):
+    (tmp_path / 'a.txt').write_text(UPPER_B + "\n" + B + "\n")
+
+    for external in (False, True):
+        assert list(select_addresses([str(tmp_path / 'a.txt')], external=external)) == [UPPER_B]
+
+
+@pytest.mark.parametrize("paths, operation, message", [
+    ([], 'union', "no input files"),
+    (['x.json'], 'xor', "unknown operation"),
+])
+def test_invalid_arguments_are_rejected(paths, operation, message):
+    with pytest.raises(ValueError, match=message):
+        list(select_addresses(paths, operation))
+
+
+@pytest.mark.parametrize("addresses", [[], [A], [A, B, C]])
+def test_written_json_matches_json_dump(tmp_path, addresses):
+    path = tmp_path / 'out.json'
+
+    assert write_json_array(iter(addresses), str(path)) == len(addresses)
+    assert path.read_text() == json.dumps(addresses, indent=2)
+
+
+def test_written_lines(tmp_path):
+    path = tmp_path / 'out.txt'
+
+    assert write_lines([A, B], str(path)) == 2
+    assert path.read_text() == f"{A}\n{B}\n"
@@ -0,0 +1,86 @@
+"""Tests for address_stream: incremental JSON, line and CSV address input."""
+
+import io
+import json
+
+import pytest
+
+from address_stream import detect_format, iter_addresses, iter_json_array
+
+ADDRESSES = ['0x' + f"{i:040x}" for i in range(1, 6)] + ["0x4d25031857A0ac2D855FaD858cC5c374106C6a5f"]
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 43, 1 << 20])
+def test_json_array_split_at_any_chunk_boundary(chunk_size):
+    values = ADDRESSES + [12345678901234567890, 1.5e-7, None, [1, "x"], {"a": "]"}, "with , and ]"]
+    text = json.dumps(values, indent=1)
+
+    assert list(iter_json_array(io.StringIO(text), chunk_size)) == values
+
+
+@pytest.mark.parametrize("text", ["[]", "  [ ]  ", "\n[\n]\n"])
+def test_empty_json_array(text):
+    assert list(iter_json_array(io.StringIO(text), 2)) == []
+
+
+@pytest.mark.parametrize("text, message", [
+    ('{"a": 1}', "must be an array"),
+    ('["0x1", "0x2"', "not closed"),
+    ('["0x1" "0x2"]', "expected ','"),
+])
+def test_malformed_json_array_is_rejected(text, message):
+    with pytest.raises(ValueError, match=message):
+        list(iter_json_array(io.StringIO(text), 3))
+
+
+@pytest.mark.parametrize("text", ['[,]', '["0x1",]', '["0x1", "unterminated]'])
+def test_invalid_json_values_are_rejected(text):
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO(text), 4))
+
+
+def test_oversized_element_fails_without_reading_the_whole_file():
+    with pytest.raises(ValueError):
+        list(iter_json_array(io.StringIO('["' + "a" * (1 << 17)), 1024))
+
+
+@pytest.mark.parametrize("name, content, input_format", [
+    ("users.json", json.dumps(ADDRESSES), 'json'),
+    ("users.txt", "\n".join(ADDRESSES) + "\n", 'lines'),
+    ("users.ndjson", "\n".join(f'"{address}",' for address in ADDRESSES), 'lines'),
+    ("users.csv", "user_address,ltv\n" + "".join(f"{address},1\n" for address in ADDRESSES), 'csv'),
+    ("users.csv", "".join(f"{address},1\n" for address in ADDRESSES), 'csv'),
+    ("users.data", "\n\n  " + json.dumps(ADDRESSES), 'json'),
+])
+def test_formats_yield_addresses_as_written(tmp_path, name, content, input_format):
+    path = tmp_path / name
+    path.write_text(content)
+
+    assert detect_format(str(path)) == input_format
+    assert list(iter_addresses(str(path))) == ADDRESSES
+
+
+def test_csv_prefers_named_address_column(tmp_path):
+    path = tmp_path / "users.csv"
+    path.write_text("ltv,user\n1," + ADDRESSES[0] + "\n2\n")
+
+    invalid = []
+    assert list(iter_addresses(str(path), on_invalid=invalid.append)) == ADDRESSES[:1]
+    assert invalid == [""]
+
+
+def test_invalid_entries_go_to_callback(tmp_path):
+    path = tmp_path / "users.json"
+    path.write_text(json.dumps([ADDRESSES[0], "0x1234", 7, ADDRESSES[0][:-1] + "g", ADDRESSES[1]]))
+
+    invalid = []
+    assert list(iter_addresses(str(path), on_invalid=invalid.append)) == ADDRESSES[:2]
+    assert invalid == ["0x1234", 7, ADDRESSES[0][:-1] + "g"]
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    path = tmp_path / "users.json"
+    path.write_text("[]")
+
+    with pytest.raises(ValueError, match="unknown input format"):
+        list(iter_addresses(str(path), input_format='xml'))
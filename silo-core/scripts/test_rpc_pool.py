@@ -0,0 +1,37 @@
+"""Tests for rpc_pool: which error responses are final."""
+
+import pytest
+
+from rpc_pool import is_final_response
+
+
+def error(code: int, message: str) -> dict:
+    return {"jsonrpc": "2.0", "id": 1, "error": {"code": code, "message": message}}
+
+
+@pytest.mark.parametrize("response", [
+    {"jsonrpc": "2.0", "id": 1, "result": "0x"},
+    error(3, "execution reverted"),
+    error(-32000, "execution reverted: SiloLens: wrong silo"),
+    error(-32000, "out of gas"),
+    error(-32000, "gas required exceeds allowance (50000000)"),
+    error(-32000, "response size exceeded"),
+    error(-32000, "execution aborted (timeout = 5s)"),
+    error(-32602, "invalid argument 0"),
+    error(-32005, "block range exceeds 10000"),
+    error(-32005, "query returned more than 10000 results"),
+    error(-32000, "Log response size exceeded. You can make eth_getLogs requests with up to a 2K block range"),
+])
+def test_final_responses(response):
+    assert is_final_response(response)
+
+
+@pytest.mark.parametrize("response", [
+    error(-32005, "rate limit exceeded"),
+    error(-32000, "header not found"),
+    error(-32000, "missing trie node"),
+    error(-32603, "internal error"),
+    error(-32005, "daily request count exceeded, request rate limited"),
+])
+def test_retried_responses(response):
+    assert not is_final_response(response)
@@ -0,0 +1,81 @@
+"""Tests for rpc_replay: which answers get recorded and how a fixture is loaded."""
+
+import pytest
+
+from mock_silo_node import MockSiloNode
+from rpc_replay import FixtureRecorder, RecordingServer, load_fixture, request_key
+
+PARAMS = [{"to": "0x" + "a" * 40, "data": "0x70a08231"}, "0x28d1a5a"]
+KEY = request_key("eth_call", PARAMS)
+
+
+def error(code: int, message: str) -> dict:
+    return {"jsonrpc": "2.0", "id": 1, "error": {"code": code, "message": message}}
+
+
+RESULT = {"jsonrpc": "2.0", "id": 1, "result": "0x01"}
+REVERT = error(3, "execution reverted")
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / "fixture.rpc.gz")
+
+
+def record(path: str, *responses: dict) -> list:
+    recorder = FixtureRecorder(path)
+    recorded = [recorder.record("eth_call", PARAMS, response) for response in responses]
+    recorder.close()
+    return recorded
+
+
+@pytest.mark.parametrize("response", [
+    error(429, "Too Many Requests"),
+    error(-32005, "daily request count exceeded, request rate limited"),
+    error(-32000, "request timed out"),
+    error(-32603, "internal error"),
+])
+def test_retryable_errors_are_not_recorded(path, response):
+    assert record(path, response, RESULT) == [False, True]
+    assert load_fixture(path) == {KEY: {"result": "0x01"}}
+
+
+def test_result_replaces_recorded_revert(path):
+    assert record(path, REVERT) == [True]
+    assert record(path, RESULT, REVERT, RESULT) == [True, False, False]
+
+    assert load_fixture(path) == {KEY: {"result": "0x01"}}
+
+
+def test_recorded_revert_is_kept(path):
+    record(path, REVERT)
+
+    assert record(path, error(-32000, "execution reverted: paused")) == [False]
+    assert load_fixture(path) == {KEY: {"error": REVERT["error"]}}
+
+
+def test_retryable_errors_of_old_recordings_are_skipped(path):
+    recorder = FixtureRecorder(path)
+    recorder.file.write('{"method":"eth_call","params":[],"error":{"code":429,"message":"Too Many Requests"}}\n')
+    recorder.close()
+
+    assert load_fixture(path) == {}
+    assert record(path, RESULT) == [True]
+
+
+def test_recording_server_records_the_retry(path):
+    node = MockSiloNode(port=0).start()
+    answer, failures = node.answer, [error(-32005, "rate limited")]
+    node.answer = lambda request: {**failures.pop(), "id": request.get("id")} if failures else answer(request)
+    server = RecordingServer(0, node.url, FixtureRecorder(path))
+    request = {"jsonrpc": "2.0", "id": 1, "method": "eth_chainId", "params": []}
+
+    try:
+        assert "error" in server.answer(request)
+        assert server.answer(request)["result"] == hex(node.chain_id)
+    finally:
+        server.recorder.close()
+        server.server_close()
+        node.stop()
+
+    assert load_fixture(path) == {request_key("eth_chainId", []): {"result": hex(node.chain_id)}}
@@ -0,0 +1,126 @@
+"""Tests for silo_analyzer: the result store, its updates and the diff output."""
+
+import csv
+import io
+import json
+
+import pytest
+
+from mock_silo_node import MockSiloNode
+from silo_analyzer import AnalysisDiff, AnalyzerStore, ConfigReport, stored_reports, update_store, write_diff
+
+CONFIGS = {f"config {i}": f"0x{i:040x}" for i in range(1, 4)}
+BLOCK = 42802010
+
+
+@pytest.fixture
+def node(monkeypatch):
+    node = MockSiloNode(port=0, chain_id=146).start()
+    monkeypatch.setenv("RPC_SONIC", node.url)
+    yield node
+    node.stop()
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = AnalyzerStore(str(tmp_path / "analyzer.sqlite"))
+    yield store
+    store.close()
+
+
+def update(store: AnalyzerStore, configs: dict, refresh: bool = False) -> AnalysisDiff:
+    return update_store(store, {'sonic': configs}, ['sonic'], refresh, blocks={'sonic': BLOCK}, max_attempts=1)
+
+
+def test_second_run_uses_the_store_only(node, store):
+    first = update(store, CONFIGS)
+    requests = node.requests
+    second = update(store, CONFIGS)
+
+    assert [report.name for report in first.added] == list(CONFIGS)
+    assert all(report.ok and report.block == BLOCK for report in first.added)
+    assert second == AnalysisDiff([], [], [], [])
+    assert node.requests == requests
+
+
+def test_renamed_and_removed_configs_need_no_rpc(node, store):
+    update(store, CONFIGS)
+    requests = node.requests
+    configs = {"renamed": CONFIGS["config 1"], "config 2": CONFIGS["config 2"]}
+
+    diff = update(store, configs)
+
+    assert node.requests == requests
+    assert [(old.name, new.name) for old, new in diff.changed] == [("config 1", "renamed")]
+    assert [report.name for report in diff.removed] == ["config 3"]
+    assert [report.name for report in stored_reports(store, {'sonic': configs}, ['sonic'])] == ["renamed", "config 2"]
+
+
+def test_failed_configs_are_not_stored_and_retried(node, store, monkeypatch):
+    monkeypatch.setenv("RPC_SONIC", "http://127.0.0.1:9")
+    failed = update(store, CONFIGS)
+    assert [report.name for report in failed.failed] == list(CONFIGS)
+    assert store.reports('sonic') == {}
+
+    monkeypatch.setenv("RPC_SONIC", node.url)
+    assert [report.name for report in update(store, CONFIGS).added] == list(CONFIGS)
+
+
+def test_config_with_failed_code_fetch_is_retried(node, store):
+    answer, failures = node.answer, [{"code": -32603, "message": "internal error"}]
+
+    def failing_once(request):
+        if request.get("method") == "eth_getCode" and failures:
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": failures.pop()}
+        return answer(request)
+
+    node.answer = failing_once
+    first = update(store, CONFIGS)
+
+    assert [report.implementation for report in first.failed] == ["ERROR"]
+    assert len(first.added) == len(CONFIGS) - 1
+    assert first.failed[0].config.lower() not in store.reports('sonic')
+
+    second = update(store, CONFIGS)
+    assert [report.name for report in second.added] == [first.failed[0].name]
+    assert second.added[0].ok and second.failed == []
+
+
+def test_refresh_reports_changed_fields(node, store):
+    update(store, CONFIGS)
+    store.db.execute("UPDATE configs SET factory = 'old factory' WHERE config = ?", (CONFIGS["config 2"],))
+    store.db.commit()
+
+    diff = update(store, CONFIGS, refresh=True)
+
+    assert [(old.factory, new.name) for old, new in diff.changed] == [("old factory", "config 2")]
+    assert diff.added == []
+
+
+@pytest.mark.parametrize("report, ok", [
+    (ConfigReport('sonic', 'x', '0x1', '0xa', '0xb', '0xf', '0xi'), True),
+    (ConfigReport('sonic', 'x', '0x1', '0xa', '0xb', 'ERROR', '0xi'), False),
+    (ConfigReport('sonic', 'x', '0x1', '0xa', '0xb', '0xf', 'ERROR'), False),
+    (ConfigReport('sonic', 'x', '0x1', '0xa', '', '0xf', '0xi'), False),
+])
+def test_report_with_any_error_is_not_ok(report, ok):
+    assert report.ok == ok
+
+
+def test_diff_as_json_and_csv():
+    added = ConfigReport('sonic', 'new', '0x1', '0xa', '0xb', '0xf', '0xi', '2.0', BLOCK)
+    old = ConfigReport('sonic', 'old name', '0x2', '0xa', '0xb', '0xf', '0xi', '1.0', BLOCK - 1)
+    diff = AnalysisDiff([added], [(old, old._replace(name='new name', block=BLOCK))], [], [ConfigReport('sonic', 'x', '0x3')])
+
+    output = io.StringIO()
+    write_diff(diff, output, 'json')
+    data = json.loads(output.getvalue())
+    assert data['added'] == [added._asdict()]
+    assert data['changed'][0]['name'] == 'new name' and data['changed'][0]['previous'] == {'name': 'old name'}
+    assert [report['name'] for report in data['failed']] == ['x']
+
+    output = io.StringIO()
+    write_diff(diff, output, 'csv')
+    rows = list(csv.DictReader(io.StringIO(output.getvalue())))
+    assert [(row['change'], row['name']) for row in rows] == [('added', 'new'), ('failed', 'x'), ('changed', 'new name')]
+    assert json.loads(rows[2]['previous']) == {'name': 'old name'}
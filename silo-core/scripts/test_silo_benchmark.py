@@ -0,0 +1,69 @@
+"""Tests for the benchmark harness: mock node failure modes and request recording."""
+
+import pytest
+from web3 import Web3
+
+from mock_silo_node import LENS_BATCH_LIMIT, MockSiloNode
+from multicall import encode_call
+from rpc_pool import PooledHTTPProvider
+from silo_benchmark import generate_addresses, record_requests
+from silo_lens import LensBatcher, build_users_health_call
+
+LENS = "0x4d25031857A0ac2D855FaD858cC5c374106C6a5f"
+SILO = "0xbE0D3c8801206CC9f35A6626f90ef9F4f2983A3D"
+
+
+@pytest.fixture
+def start_node():
+    """Start mock nodes with the given latency in seconds, stopped after the test."""
+    nodes = []
+
+    def start(latency: float = 0.0) -> MockSiloNode:
+        node = MockSiloNode(port=0, latency=latency).start()
+        nodes.append(node)
+        return node
+
+    yield start
+    for node in nodes:
+        node.stop()
+
+
+def test_oversized_lens_batch_fails_like_a_node(start_node):
+    node = start_node()
+    w3 = Web3(PooledHTTPProvider(node.url, backoff=0))
+    borrowers = [(SILO, user) for user in generate_addresses(LENS_BATCH_LIMIT + 1, 'user')]
+    call = build_users_health_call(LENS, borrowers)
+
+    response = w3.provider.make_request("eth_call", [{"to": LENS, "data": "0x" + encode_call(call).hex()}, "latest"])
+
+    assert response["error"] == {"code": -32000, "message": "out of gas"}
+    assert w3.provider.pool.retries == 0
+
+
+def test_batcher_halves_chunks_over_the_node_limit(start_node):
+    node = start_node()
+    w3 = Web3(PooledHTTPProvider(node.url, backoff=0))
+    users = generate_addresses(LENS_BATCH_LIMIT + 44, 'user')
+    batcher = LensBatcher(chunk_size=len(users))
+
+    healths = batcher.users_health(w3, LENS, [(SILO, user) for user in users], 'latest')
+
+    # the failed chunk and its two halves
+    assert batcher.splits == 1
+    assert batcher.calls == 3
+    assert all(health is not None for health in healths)
+    assert w3.provider.pool.retries == 0
+
+
+def test_record_requests_sees_injected_latency(start_node):
+    node = start_node(latency=0.02)
+    w3 = Web3(PooledHTTPProvider(node.url))
+
+    with record_requests() as stats:
+        for _ in range(3):
+            w3.eth.get_block_number()
+    w3.eth.get_block_number()
+
+    assert len(stats['latencies']) == 3
+    assert stats['failures'] == 0
+    assert min(stats['latencies']) >= 0.02
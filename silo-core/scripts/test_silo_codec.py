@@ -0,0 +1,91 @@
+"""Tests for silo_codec: precompiled encoders and decoders match eth_abi."""
+
+import pytest
+from eth_abi import encode
+from web3 import Web3
+
+from silo_codec import (
+    AGGREGATE3_SELECTOR, CONFIG_DATA_TYPE, KNOWN_METHODS, MethodCodec, codec_for, decode_aggregate3_output,
+    encode_aggregate3_calls, split_types
+)
+
+ADDRESS = "0x4d25031857a0ac2d855fad858cc5c374106c6a5f"
+OTHER = "0xbe0d3c8801206cc9f35a6626f90ef9f4f2983a3d"
+
+ARGUMENTS = {
+    "address": ADDRESS,
+    "uint256": 2**256 - 1,
+    "uint8": 255,
+}
+
+CONFIG_DATA = (1, 2, *[ADDRESS] * 8, 3, 4, 5, 6, 7, OTHER, True)
+
+
+def sample_values(abi_type: str):
+    if abi_type == CONFIG_DATA_TYPE:
+        return CONFIG_DATA
+    return {"uint256": 10**30, "address": OTHER, "uint8": 18, "string": "wS"}[abi_type]
+
+
+@pytest.mark.parametrize("signature, output_types", KNOWN_METHODS)
+def test_known_methods_match_eth_abi(signature, output_types):
+    codec = codec_for(signature, output_types)
+    input_types = split_types(signature[signature.index("(") + 1:-1])
+    args = [ARGUMENTS[abi_type] for abi_type in input_types]
+    values = tuple(sample_values(abi_type) for abi_type in output_types)
+
+    assert codec.encode(args) == bytes(Web3.keccak(text=signature)[:4]) + encode(input_types, args)
+    assert codec.decode(encode(list(output_types), list(values))) == values
+
+
+def test_dynamic_types_fall_back_to_eth_abi():
+    codec = MethodCodec("getUsersHealth((address,address)[])", ("(uint256,uint256,uint256)[]",))
+    args = [[(ADDRESS, OTHER)]]
+    result = [(1, 2, 3), (4, 5, 6)]
+
+    assert codec.encoders is None and codec.decoder is None
+    assert codec.encode(args)[4:] == encode(["(address,address)[]"], args)
+    assert list(codec.decode(encode(["(uint256,uint256,uint256)[]"], [result]))[0]) == result
+
+
+@pytest.mark.parametrize("signature, args", [
+    ("maxWithdraw(address)", ["0x1234"]),
+    ("convertToAssets(uint256,uint8)", [1, 256]),
+    ("convertToAssets(uint256,uint8)", [1]),
+    ("getConfig(address)", [bytes(19)]),
+])
+def test_invalid_arguments_are_rejected(signature, args):
+    with pytest.raises(ValueError):
+        codec_for(signature).encode(args)
+
+
+@pytest.mark.parametrize("output_types, data", [
+    (("address",), b"\x01" + bytes(31)),
+    (("uint8",), (256).to_bytes(32, "big")),
+    (("uint256",), bytes(31)),
+    ((CONFIG_DATA_TYPE,), encode([CONFIG_DATA_TYPE], [CONFIG_DATA])[:-32] + (2).to_bytes(32, "big")),
+])
+def test_dirty_or_short_results_are_rejected(output_types, data):
+    with pytest.raises(ValueError):
+        MethodCodec("f()", output_types).decode(data)
+
+
+def test_aggregate3_calldata_matches_eth_abi():
+    calls = [(ADDRESS, bytes.fromhex("01020304")), (OTHER, bytes(36)), (ADDRESS, b"")]
+
+    expected = encode(["(address,bool,bytes)[]"], [[(target, True, data) for target, data in calls]])
+
+    assert encode_aggregate3_calls(calls) == AGGREGATE3_SELECTOR + expected
+
+
+def test_aggregate3_output_round_trip():
+    results = [(True, (5).to_bytes(32, "big")), (False, b"\x08\xc3\x79\xa0"), (True, b"")]
+
+    assert decode_aggregate3_output(encode(["(bool,bytes)[]"], [results])) == results
+
+
+def test_truncated_aggregate3_output_is_rejected():
+    raw = encode(["(bool,bytes)[]"], [[(True, bytes(64))]])
+
+    with pytest.raises(ValueError):
+        decode_aggregate3_output(raw[:-64])
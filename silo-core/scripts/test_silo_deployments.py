@@ -0,0 +1,74 @@
+"""Tests for silo_deployments: naming deployed code up to its immutables and libraries."""
+
+import json
+
+import pytest
+
+from silo_deployments import CodeIndex, load_artifacts, matches_with_immutables
+
+ADDRESS = "0x4d25031857A0ac2D855FaD858cC5c374106C6a5f"
+PLACEHOLDER = "__$" + "ab" * 17 + "$__"
+
+# 8 bytes, a 32-byte immutable at offset 8, then code with zero bytes of its own
+CODE = "6080604052348015" + "00" * 32 + "6000600060006000"
+IMMUTABLE = "11" * 31 + "01"
+
+
+def write_json(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(json.dumps(data))
+
+
+@pytest.fixture
+def dirs(tmp_path):
+    deployments, out = tmp_path / "deployments", tmp_path / "out"
+    write_json(deployments / "sonic" / "Silo.sol.json", {"address": ADDRESS, "abi": [], "deployedBytecode": "0x" + CODE})
+    write_json(deployments / "sonic" / "Lens.sol.json", {
+        "address": ADDRESS, "abi": [], "deployedBytecode": "0x73" + PLACEHOLDER + "00" * 4,
+    })
+    write_json(out / "silo-core" / "Silo.sol" / "Silo.json", {
+        "deployedBytecode": {"object": "0x" + CODE, "immutableReferences": {"7": [{"start": 8, "length": 32}]}},
+    })
+    return str(deployments), str(out)
+
+
+def index(dirs) -> CodeIndex:
+    return CodeIndex(load_artifacts(*dirs))
+
+
+def test_code_with_immutables_filled_in_matches(dirs):
+    code = bytes.fromhex(CODE[:16] + IMMUTABLE + CODE[80:])
+
+    assert index(dirs).lookup_code(code).name == "Silo"
+
+
+def test_zero_bytes_outside_immutables_must_match(dirs):
+    code = bytes.fromhex(CODE[:-2] + "ff")
+
+    assert index(dirs).lookup_code(code) is None
+
+
+def test_linked_library_address_matches_without_build_artifact(dirs):
+    code = bytes.fromhex("73" + ADDRESS[2:] + "00" * 4)
+
+    assert index(dirs).lookup_code(code).name == "Lens"
+    assert index(dirs).lookup_code(bytes.fromhex("73" + ADDRESS[2:] + "00" * 3 + "01")) is None
+
+
+def test_build_artifact_of_other_code_gives_no_immutables(dirs, tmp_path):
+    write_json(tmp_path / "out" / "silo-core" / "Silo.sol" / "Silo.json", {
+        "deployedBytecode": {"object": "0x" + CODE + "00", "immutableReferences": {"7": [{"start": 8, "length": 32}]}},
+    })
+
+    assert index(dirs).lookup_code(bytes.fromhex(CODE[:16] + IMMUTABLE + CODE[80:])) is None
+    assert index(dirs).lookup_code(bytes.fromhex(CODE)).name == "Silo"
+
+
+@pytest.mark.parametrize("code, matches", [
+    (b"\x01\x02\x03\x04", True),
+    (b"\x01\xff\xff\x04", True),
+    (b"\xff\x02\x03\x04", False),
+    (b"\x01\x02\x03", False),
+])
+def test_matches_only_inside_wildcards(code, matches):
+    assert matches_with_immutables(b"\x01\x00\x00\x04", code, ((1, 2), (2, 1))) == matches
@@ -0,0 +1,117 @@
+"""Tests for silo_graph: crawling markets from a mock node and the deployment graph queries."""
+
+import pytest
+from eth_abi import decode, encode
+from web3 import Web3
+
+from mock_silo_node import MockSiloNode, Revert, selector
+from silo_graph import ROLE_GROUPS, DeploymentGraph, crawl_chain
+from silo_resolver import CONFIG_DATA_TYPE
+
+CONFIGS = {f"market {i}": f"0x{i:040x}" for i in range(1, 4)}
+BLOCK = 42802010
+SHARED_ORACLE = Web3.to_checksum_address("0x" + "0a" * 20)
+SHARED_IRM = Web3.to_checksum_address("0x" + "1b" * 20)
+QUOTE_TOKEN = Web3.to_checksum_address("0x" + "2c" * 20)
+
+# ConfigData positions of the fields the test rewires
+SOLVENCY_ORACLE, MAX_LTV_ORACLE, IRM, HOOK_RECEIVER = 7, 8, 9, 15
+
+
+@pytest.fixture
+def node(monkeypatch):
+    """Mock node where every silo uses SHARED_IRM and silo0 of markets 1 and 2 use SHARED_ORACLE."""
+    node = MockSiloNode(port=0, chain_id=146).start()
+    monkeypatch.setenv("RPC_SONIC", node.url)
+    state = node.state
+    config_data = state.handlers[selector("getConfig(address)")]
+    silo0s = {state.address("silo0", CONFIGS[name].lower()).lower() for name in ("market 1", "market 2")}
+
+    def rewired_config_data(to, args):
+        (data,) = decode([CONFIG_DATA_TYPE], config_data(to, args))
+        data = list(data)
+        if data[2].lower() in silo0s:
+            data[SOLVENCY_ORACLE] = data[MAX_LTV_ORACLE] = SHARED_ORACLE
+        data[IRM] = SHARED_IRM
+        # one hook receiver per market
+        data[HOOK_RECEIVER] = state.address("hook", to)
+        return encode([CONFIG_DATA_TYPE], [tuple(data)])
+
+    state.handlers.update({
+        selector("getConfig(address)"): rewired_config_data,
+        selector("quoteToken()"): lambda to, args: encode(["address"], [QUOTE_TOKEN]),
+        selector("VERSION()"): lambda to, args: encode(["string"], [f"Mock {to[2:6]} 1.0"]),
+        selector("hookReceiverConfig(address)"): lambda to, args: encode(["uint24", "uint24"], [3, 5]),
+    })
+    yield node
+    node.stop()
+
+
+@pytest.fixture
+def graph(node, tmp_path):
+    graph = DeploymentGraph(str(tmp_path / "graph.sqlite"))
+    graph.save(crawl_chain('sonic', CONFIGS, BLOCK, max_attempts=1))
+    yield graph
+    graph.close()
+
+
+def test_markets_using_an_oracle(graph):
+    links = graph.find(SHARED_ORACLE, roles=ROLE_GROUPS['oracle'])
+
+    assert sorted((link.market, link.role) for link in links) == [
+        ("market 1", "max_ltv_oracle"), ("market 1", "solvency_oracle"),
+        ("market 2", "max_ltv_oracle"), ("market 2", "solvency_oracle"),
+    ]
+    assert graph.find(SHARED_ORACLE, roles=ROLE_GROUPS['irm']) == []
+    assert graph.contract('sonic', SHARED_ORACLE) == {'kind': 'oracle', 'quote_token': QUOTE_TOKEN, 'version': 'Mock 0a0a 1.0'}
+
+
+def test_silos_sharing_an_irm(graph):
+    assert {link.market for link in graph.find(SHARED_IRM, roles=ROLE_GROUPS['irm'])} == set(CONFIGS)
+    assert len(graph.find(SHARED_IRM)) == 2 * len(CONFIGS)
+
+    (shared_irm,) = graph.shared(ROLE_GROUPS['irm'])
+    assert shared_irm[:3] == ('sonic', SHARED_IRM, 3)
+    assert sorted(shared_irm[3].split(',')) == list(CONFIGS)
+
+    (shared_oracle,) = graph.shared(ROLE_GROUPS['oracle'], chain='sonic')
+    assert shared_oracle[1:3] == (SHARED_ORACLE, 2)
+    assert graph.shared(ROLE_GROUPS['hook']) == []
+
+
+def test_hook_of_a_market(graph, node):
+    (market,) = graph.markets("market 3")
+    hook = node.state.address("hook", CONFIGS["market 3"].lower())
+
+    assert [silo['hook_receiver'] for silo in market['silos']] == [hook, hook]
+    assert [(silo['hooks_before'], silo['hooks_after']) for silo in market['silos']] == [(3, 5), (3, 5)]
+    assert [silo['silo'] for silo in market['silos']] == [market['silo0'], market['silo1']]
+    assert graph.markets(market['config']) == [market]
+    assert [link.market for link in graph.find(hook, roles=ROLE_GROUPS['hook'])] == ["market 3", "market 3"]
+
+
+def test_stats_and_recrawl_replace_the_chain(graph, node):
+    (chain, block, markets, silos, contracts), = graph.stats()
+    assert (chain, block, markets, silos) == ('sonic', BLOCK, 3, 6)
+    assert contracts > 0
+
+    # a config whose getSilos() reverts is left out of the new crawl,
+    # at a later block since resolved calls are memoized per block
+    silos_handler = node.state.handlers[selector("getSilos()")]
+
+    def reverting_for_market_3(to, args):
+        if to == CONFIGS["market 3"].lower():
+            raise Revert("not a config")
+        return silos_handler(to, args)
+
+    node.state.handlers[selector("getSilos()")] = reverting_for_market_3
+    graph.save(crawl_chain('sonic', CONFIGS, BLOCK + 1, max_attempts=1))
+
+    assert graph.stats()[0][1:4] == (BLOCK + 1, 2, 4)
+    assert graph.markets("market 3") == []
+    assert graph.shared(ROLE_GROUPS['irm'])[0][2] == 2
+
+
+def test_query_address_must_be_an_address(graph):
+    with pytest.raises(ValueError, match="not an address"):
+        graph.find("0x1234")
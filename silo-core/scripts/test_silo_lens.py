@@ -0,0 +1,94 @@
+"""Tests for silo_lens: getUsersHealth probe and chunk splitting."""
+
+import asyncio
+
+import pytest
+from eth_abi import decode
+from web3 import Web3
+
+from mock_silo_node import MockSiloNode, selector
+from rpc_async import AsyncRpcClient
+from rpc_pool import PooledHTTPProvider
+from silo_lens import LensBatcher, supports_users_health
+
+LENS = "0x4d25031857A0ac2D855FaD858cC5c374106C6a5f"
+SILO = "0xbE0D3c8801206CC9f35A6626f90ef9F4f2983A3D"
+BLOCK = 42802010
+
+USERS_HEALTH = selector("getUsersHealth((address,address)[])")
+USERS = [Web3.to_checksum_address(f"0x{i:040x}") for i in range(1, 21)]
+
+
+@pytest.fixture
+def node():
+    node = MockSiloNode(port=0).start()
+    yield node
+    node.stop()
+
+
+@pytest.fixture
+def w3(node):
+    return Web3(PooledHTTPProvider(node.url, backoff=0))
+
+
+def fail_out_of_gas_above(node, limit):
+    """Answer getUsersHealth calls with more than `limit` borrowers with a node's -32000 out of gas error."""
+    answer = node.answer
+
+    def answering(request):
+        params = request.get("params") or []
+        data = (params[0].get("data") or params[0].get("input")) if request.get("method") == "eth_call" else "0x"
+        call_data = bytes.fromhex(data[2:])
+        if call_data[:4] == USERS_HEALTH and len(decode(["(address,address)[]"], call_data[4:])[0]) > limit:
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32000, "message": "out of gas"}}
+        return answer(request)
+
+    node.answer = answering
+
+
+def expected_ltvs(node) -> list:
+    return [node.state.borrower_value("ltv", SILO, user) for user in USERS]
+
+
+def test_probe_accepts_lens_with_users_health(w3):
+    assert supports_users_health(w3, LENS, SILO, BLOCK)
+
+
+def test_probe_rejects_lens_without_users_health(node, w3):
+    del node.state.handlers[selector("getUsersHealth((address,address)[])")]
+
+    assert not supports_users_health(w3, LENS, SILO, BLOCK)
+
+
+def test_batcher_matches_per_user_health(node, w3):
+    healths = LensBatcher(chunk_size=4).users_health(w3, LENS, [(SILO, user) for user in USERS], BLOCK)
+
+    assert [health.ltv for health in healths] == expected_ltvs(node)
+
+
+def test_out_of_gas_chunk_is_split_without_retries(node, w3):
+    fail_out_of_gas_above(node, 5)
+    batcher = LensBatcher(chunk_size=16)
+
+    healths = batcher.users_health(w3, LENS, [(SILO, user) for user in USERS], BLOCK)
+
+    assert [health.ltv for health in healths] == expected_ltvs(node)
+    assert batcher.splits > 0
+    assert batcher.chunk_size <= 8
+    assert w3.provider.pool.retries == 0
+
+
+def test_out_of_gas_chunk_is_split_without_retries_async(node):
+    fail_out_of_gas_above(node, 5)
+    batcher = LensBatcher(chunk_size=16)
+
+    async def run():
+        async with AsyncRpcClient(node.url, backoff=0) as client:
+            healths = await batcher.users_health_async(client, LENS, [(SILO, user) for user in USERS], BLOCK)
+            return healths, client.pool.retries
+
+    healths, retries = asyncio.run(run())
+
+    assert [health.ltv for health in healths] == expected_ltvs(node)
+    assert batcher.splits > 0
+    assert retries == 0
@@ -0,0 +1,93 @@
+"""Tests for silo_local_evm: state discovery with and without prestate traces."""
+
+import asyncio
+import concurrent.futures
+
+import pytest
+
+from multicall import Call, CallResult
+from rpc_async import RpcError
+from rpc_pool import RpcPoolError
+from silo_local_evm import StateSnapshot, execute_calls, fetch_prestate, init_worker, is_trace_unavailable
+
+BLOCK = 100
+CONTRACT = "0x00000000000000000000000000000000000000c0"
+# returns storage slot 0 for every call: SLOAD(0), MSTORE(0), RETURN(0, 32)
+CODE = bytes.fromhex("60005460005260206000f3")
+VALUE = 12345
+
+
+class StateNode:
+    """Answers the state requests of one contract, counting them by method."""
+
+    def __init__(self):
+        self.requests = {}
+
+    async def request(self, method: str, params: list):
+        self.requests[method] = self.requests.get(method, 0) + 1
+        if method == "debug_traceCall":
+            return {CONTRACT: {"balance": "0x0", "nonce": 0, "code": "0x" + CODE.hex(), "storage": {"0x0": hex(VALUE)}}}
+        return {
+            "eth_getBalance": "0x0",
+            "eth_getTransactionCount": "0x0",
+            "eth_getCode": "0x" + CODE.hex(),
+            "eth_getStorageAt": hex(VALUE),
+        }[method]
+
+
+@pytest.fixture
+def snapshot(tmp_path):
+    snapshot = StateSnapshot(str(tmp_path / "state.sqlite"), 146, BLOCK)
+    snapshot.set_meta({
+        'coinbase': "0x" + "00" * 20, 'timestamp': 1, 'mix_hash': "0x" + "00" * 32, 'gas_limit': 30_000_000, 'base_fee': 0,
+    })
+    yield snapshot
+    snapshot.close()
+
+
+def run(snapshot: StateSnapshot, client: StateNode, prestate=None) -> list:
+    calls = [Call(CONTRACT, "value()")] * 3
+
+    async def execute():
+        with concurrent.futures.ThreadPoolExecutor(1, initializer=init_worker, initargs=(snapshot.path,)) as executor:
+            return await execute_calls(client, executor, snapshot, calls, prestate=prestate)
+
+    return asyncio.run(execute())
+
+
+def test_missing_state_is_fetched_slot_by_slot(snapshot):
+    client = StateNode()
+
+    assert run(snapshot, client) == [CallResult(True, VALUE)] * 3
+    assert client.requests["eth_getStorageAt"] == 1
+
+
+def test_prestate_trace_loads_the_state_of_missed_calls(snapshot):
+    client = StateNode()
+    traced = []
+
+    async def trace(missed):
+        traced.append(missed)
+        await fetch_prestate(client, snapshot, CONTRACT, b"")
+
+    assert run(snapshot, client, trace) == [CallResult(True, VALUE)] * 3
+    assert traced == [[0, 1, 2]]
+    assert client.requests == {"debug_traceCall": 1}
+
+
+def test_rerun_on_a_complete_snapshot_sends_no_request(snapshot):
+    run(snapshot, StateNode())
+    client = StateNode()
+
+    assert run(snapshot, client, prestate=pytest.fail) == [CallResult(True, VALUE)] * 3
+    assert client.requests == {}
+
+
+@pytest.mark.parametrize("error, unavailable", [
+    (RpcError("the method debug_traceCall does not exist/is not available", code=-32601), True),
+    (RpcError("debug namespace is disabled", code=-32000), True),
+    (RpcPoolError("debug_traceCall failed after 3 attempts: timeout"), False),
+    (RpcError("execution timeout", code=-32000), False),
+])
+def test_trace_unavailable_only_for_missing_debug_api(error, unavailable):
+    assert is_trace_unavailable(error) == unavailable
@@ -0,0 +1,84 @@
+"""Tests for silo_position_scanner: splitting failed batches and aborting on dead endpoints."""
+
+import asyncio
+
+import pytest
+from eth_abi import decode
+from web3 import Web3
+
+from mock_silo_node import ExecutionError, MockSiloNode, Revert, selector
+from rpc_async import AsyncRpcClient
+from rpc_pool import RpcPoolError
+from silo_position_scanner import Market, collect_market_batch
+
+LENS = "0x4d25031857A0ac2D855FaD858cC5c374106C6a5f"
+MARKET = Market('sonic', 'market', "0x" + "c" * 40, "0x" + "a" * 40, "0x" + "b" * 40, LENS, 42802010)
+USERS = [Web3.to_checksum_address(f"0x{i:040x}") for i in range(1, 9)]
+AGGREGATE3 = selector("aggregate3((address,bool,bytes)[])")
+MAX_WITHDRAW = selector("maxWithdraw(address)")
+
+
+@pytest.fixture
+def node():
+    node = MockSiloNode(port=0).start()
+    yield node
+    node.stop()
+
+
+def fail_aggregate3_above(node, limit, user=None):
+    """Fail aggregate3 with more than `limit` calls, or any aggregate3 reading `user`, as out of gas."""
+    aggregate3 = node.state.handlers[AGGREGATE3]
+
+    def handler(to, args):
+        (calls,) = decode(["(address,bool,bytes)[]"], args)
+        if len(calls) > limit or (user and any(user[2:].lower() in data.hex() for _, _, data in calls)):
+            raise ExecutionError("out of gas")
+        return aggregate3(to, args)
+
+    node.state.handlers[AGGREGATE3] = handler
+
+
+def collect(url, users):
+    async def run():
+        async with AsyncRpcClient(url, backoff=0) as client:
+            return await collect_market_batch(client, MARKET, users)
+
+    return asyncio.run(run())
+
+
+def test_failed_batch_is_split_and_retried(node):
+    expected = collect(node.url, USERS)
+    fail_aggregate3_above(node, 2 * 7)
+
+    rows = collect(node.url, USERS)
+
+    assert rows == expected
+    assert all(row['status'] == 'ok' and row['user_ltv'] > 0 for row in rows)
+
+
+def test_single_failing_user_is_marked_not_zeroed(node):
+    fail_aggregate3_above(node, len(USERS) * 7, user=USERS[3])
+
+    rows = collect(node.url, USERS)
+
+    assert [row['user_address'] for row in rows] == [user for user in USERS for _ in range(2)]
+    errors = [row for row in rows if row['status'] != 'ok']
+    assert [row['user_address'] for row in errors] == [USERS[3]] * 2
+    assert errors[0]['status'] == "error: out of gas"
+
+
+def test_reverted_calls_are_listed_in_status(node):
+    def revert(to, args):
+        raise Revert("paused")
+
+    node.state.handlers[MAX_WITHDRAW] = revert
+
+    rows = collect(node.url, USERS[:1])
+
+    assert [row['status'] for row in rows] == ["failed: max_withdraw"] * 2
+    assert rows[0]['collateral'] > 0
+
+
+def test_unreachable_endpoint_aborts():
+    with pytest.raises(RpcPoolError):
+        collect("http://127.0.0.1:9", USERS[:2])
@@ -0,0 +1,133 @@
+"""Tests for silo_user_discovery: adaptive eth_getLogs ranges and resumable scans."""
+
+import pytest
+from web3 import Web3
+
+from mock_silo_node import MAX_LOG_RANGE, MockSiloNode
+from rpc_pool import PooledHTTPProvider, RpcPoolError
+from silo_user_discovery import DiscoveryState, discover_users, iter_logs
+
+CHAIN_ID = 146
+SILO0 = "0x04f124bF435545a3c79A8EE3Ffb6C51213CF5175"
+SILO1 = "0xbE0D3c8801206CC9f35A6626f90ef9F4f2983A3D"
+
+
+@pytest.fixture
+def node():
+    node = MockSiloNode(port=0, chain_id=CHAIN_ID).start()
+    node.queries = []
+    answer = node.answer
+
+    def answering(request):
+        if request.get("method") == "eth_getLogs":
+            query = request["params"][0]
+            node.queries.append((query["address"], int(query["fromBlock"], 16), int(query["toBlock"], 16)))
+        return answer(request)
+
+    node.answer = answering
+    yield node
+    node.stop()
+
+
+@pytest.fixture
+def w3(node):
+    return Web3(PooledHTTPProvider(node.url, max_attempts=2, backoff=0))
+
+
+@pytest.fixture
+def state(tmp_path):
+    state = DiscoveryState(str(tmp_path / "discovery.sqlite"))
+    yield state
+    state.close()
+
+
+def answer_logs_with(node, error):
+    """Answer every eth_getLogs with a JSON-RPC `error`."""
+    answer = node.answer
+
+    def answering(request):
+        if request.get("method") == "eth_getLogs":
+            answer(request)
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": error}
+        return answer(request)
+
+    node.answer = answering
+
+
+def test_range_shrinks_on_range_limit_and_covers_every_block(node, w3):
+    ranges = [(start, end) for start, end, _ in iter_logs(w3, [SILO0], 0, 50_000, initial_range=40_000)]
+
+    assert ranges[0][0] == 0 and ranges[-1][1] == 50_000
+    assert all(end + 1 == start for (_, end), (start, _) in zip(ranges, ranges[1:]))
+    assert all(end - start <= MAX_LOG_RANGE for start, end in ranges)
+    # the refused ranges were asked for once each, not retried
+    assert len(node.queries) > len(ranges)
+    assert w3.provider.pool.retries == 0
+
+
+def test_range_grows_back_up_to_max_range(node, w3):
+    sizes = [end - start + 1 for start, end, _ in iter_logs(w3, [SILO0], 0, 9_999, initial_range=10, max_range=2_000)]
+
+    assert sizes[:5] == [10, 20, 40, 80, 160]
+    assert max(sizes) == 2_000
+    assert sum(sizes) == 10_000
+
+
+def test_logs_of_every_range_are_returned(node, w3):
+    logs = [log for _, _, logs in iter_logs(w3, [SILO0, SILO1], 0, 25_000, initial_range=3_000) for log in logs]
+
+    assert [int(log["blockNumber"], 16) for log in logs[::2]] == list(range(0, 25_001, 1000))
+
+
+def test_unreachable_endpoint_is_raised_without_shrinking(node, w3):
+    answer_logs_with(node, {"code": -32005, "message": "daily request count exceeded, request rate limited"})
+
+    with pytest.raises(RpcPoolError):
+        list(iter_logs(w3, [SILO0], 0, 50_000, initial_range=5_000))
+
+    assert {end - start for _, start, end in node.queries} == {4_999}
+
+
+def test_other_provider_errors_are_raised(node, w3):
+    answer_logs_with(node, {"code": -32602, "message": "invalid argument 0: unknown topic"})
+
+    with pytest.raises(ValueError, match="unknown topic"):
+        list(iter_logs(w3, [SILO0], 0, 50_000, initial_range=5_000))
+
+    assert len(node.queries) == 1
+
+
+def test_resume_scans_only_new_blocks(node, w3, state):
+    first = discover_users(w3, state, CHAIN_ID, [SILO0], 0, 20_000)
+    assert state.scanned_to(CHAIN_ID, SILO0) == 20_000
+
+    node.queries.clear()
+    users = discover_users(w3, state, CHAIN_ID, [SILO0, SILO1], 0, 30_000)
+
+    assert min(start for address, start, _ in node.queries if address == [SILO1]) == 0
+    assert min(start for address, start, _ in node.queries if address == [SILO0]) == 20_001
+    assert state.scanned_to(CHAIN_ID, SILO0) == state.scanned_to(CHAIN_ID, SILO1) == 30_000
+    assert users[:len(first)] == first and len(users) > len(first)
+
+
+def test_interrupted_scan_keeps_scanned_ranges(node, w3, state):
+    answer = node.answer
+
+    def failing_after(request):
+        if request.get("method") == "eth_getLogs" and int(request["params"][0]["fromBlock"], 16) >= 25_000:
+            return {"jsonrpc": "2.0", "id": request.get("id"), "error": {"code": -32603, "message": "internal error"}}
+        return answer(request)
+
+    node.answer = failing_after
+    with pytest.raises(RpcPoolError):
+        discover_users(w3, state, CHAIN_ID, [SILO0], 0, 30_000, initial_range=5_000)
+
+    scanned_to = state.scanned_to(CHAIN_ID, SILO0)
+    assert scanned_to == 24_999
+
+    node.answer = answer
+    node.queries.clear()
+    discover_users(w3, state, CHAIN_ID, [SILO0], 0, 30_000, initial_range=5_000)
+
+    assert node.queries[0][1] == scanned_to + 1
+    assert state.scanned_to(CHAIN_ID, SILO0) == 30_000